@@ -0,0 +1,102 @@
+"""
+Benchmarks grouped run listings, comparing the query plans of the current lateral
+query against the earlier ROW_NUMBER() query. Expects a migrated test database, as
+configured for the integration tests.
+
+    python -m benchmarks.grouped_runs [flow_count] [runs_per_flow] [group_limit]
+"""
+
+import asyncio
+import sys
+
+from services.data.postgres_async_db import FLOW_TABLE_NAME, RUN_TABLE_NAME
+from services.ui_backend_service.data.db import AsyncPostgresDB
+from services.utils.tests import get_test_dbconf
+
+
+async def benchmark(flow_count=500, runs_per_flow=200, group_limit=10, repeat=5):
+    """
+    Compares grouped run listings, with _group=flow_id, against the earlier query which
+    numbered the rows of every group along with their join columns.
+    Expects a migrated test database.
+    """
+    db_conf = get_test_dbconf()
+    db_conf.timeout = 600
+    db = AsyncPostgresDB()
+    await db._init(db_conf=db_conf, create_triggers=False)
+    table = db.run_table_postgres
+
+    async def _clean():
+        with await db.pool.cursor() as cur:
+            for table_name in [RUN_TABLE_NAME, FLOW_TABLE_NAME]:
+                await cur.execute(
+                    "DELETE FROM {} WHERE flow_id LIKE 'BenchmarkFlow%%'".format(
+                        table_name
+                    )
+                )
+
+    await _clean()
+    with await db.pool.cursor() as cur:
+        await cur.execute(
+            """
+            INSERT INTO {flows} (flow_id, user_name, ts_epoch, tags, system_tags)
+            SELECT 'BenchmarkFlow' || f, 'benchmark', 0, '[]', '[]'
+            FROM generate_series(1, %s) f
+            """.format(flows=FLOW_TABLE_NAME),
+            [flow_count],
+        )
+        await cur.execute(
+            """
+            INSERT INTO {runs} (flow_id, user_name, ts_epoch, tags, system_tags)
+            SELECT 'BenchmarkFlow' || f, 'benchmark', r, '[]', '[]'
+            FROM generate_series(1, %s) f, generate_series(1, %s) r
+            """.format(runs=RUN_TABLE_NAME),
+            [flow_count, runs_per_flow],
+        )
+        await cur.execute("ANALYZE {}".format(RUN_TABLE_NAME))
+
+    row_number_sql = """
+        SELECT * FROM (
+            SELECT *, ROW_NUMBER() OVER(PARTITION BY "flow_id" ORDER BY "ts_epoch" DESC)
+            FROM (
+                SELECT {keys} FROM {table_name} {joins}
+            ) T
+        ) G
+        WHERE row_number <= {group_limit}
+        """.format(
+        keys=",".join(table.select_columns + table.join_columns),
+        table_name=table.table_name,
+        joins=" ".join(table.joins),
+        group_limit=group_limit,
+    )
+
+    def _execution_time(plan):
+        return float(plan.rsplit("Execution Time:", 1)[1].split()[0])
+
+    try:
+        row_number, lateral = [], []
+        for _ in range(repeat):
+            plan = await table.benchmark_sql(select_sql=row_number_sql)
+            row_number.append(_execution_time(plan))
+            _, _, plan = await table.find_records(
+                groups=['"flow_id"'],
+                group_limit=group_limit,
+                order=['"ts_epoch" DESC'],
+                enable_joins=True,
+                benchmark=True,
+            )
+            lateral.append(_execution_time(plan))
+        print(
+            "{} flows of {} runs, {} runs per group: "
+            "row_number {:.1f}ms, lateral {:.1f}ms".format(
+                flow_count, runs_per_flow, group_limit, min(row_number), min(lateral)
+            )
+        )
+    finally:
+        await _clean()
+
+
+if __name__ == "__main__":
+    asyncio.get_event_loop().run_until_complete(
+        benchmark(*[int(arg) for arg in sys.argv[1:]])
+    )
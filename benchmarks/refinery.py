@@ -0,0 +1,165 @@
+"""
+Benchmarks TaskRefiner.postprocess over cached GetTask values, comparing the earlier
+per-record path (one json.loads per cached value, one coroutine per record) against
+the current single pass with batched decoding.
+
+Reports the wall time of postprocess along with the time the event loop was blocked
+by it, as seen by a concurrent coroutine that yields back to the loop continuously.
+
+    python -m benchmarks.refinery [num_tasks]
+"""
+
+import asyncio
+import json
+import sys
+import time
+
+from services.data.db_utils import DBResponse
+from services.ui_backend_service.data import unpack_processed_value
+from services.ui_backend_service.data.cache.get_data_action import (
+    target_from_cache_key,
+)
+from services.ui_backend_service.data.cache.get_task_action import GetTask
+from services.ui_backend_service.data.refiner import TaskRefiner
+from services.ui_backend_service.data.refiner.refinery import format_error_body
+from services.ui_backend_service.tests.unit_tests.refinery_test import (
+    MockCacheResult,
+    MockCacheStore,
+    _cached_tasks,
+    _task_records,
+)
+
+# Gaps between loop iterations shorter than this are not counted as blocking.
+BLOCKED_THRESHOLD = 0.001
+
+
+class PerValueCacheResult(MockCacheResult):
+    def get(self):
+        # GetData.response before the cached values were decoded in a single pass.
+        prefix = "data:{}:".format(GetTask.__name__)
+        collected = {}
+        for key, val in self.keys_objs.items():
+            if key.startswith(prefix):
+                collected[target_from_cache_key(key, prefix)] = json.loads(val)
+        return collected
+
+
+class PerValueCache:
+    def __init__(self, keys_objs):
+        self.keys_objs = keys_objs
+
+    async def GetTask(self, targets, invalidate_cache=False):
+        return PerValueCacheResult(self.keys_objs)
+
+
+class PerValueCacheStore:
+    def __init__(self, keys_objs):
+        self.cache = PerValueCache(keys_objs)
+
+
+class PerRecordTaskRefiner(TaskRefiner):
+    """TaskRefiner with the postprocess path that awaited the refinement of each record."""
+
+    async def _refine_record(self, record, values):
+        return self.refine_record(record, values)
+
+    async def postprocess(self, response: DBResponse, invalidate_cache=False):
+        if response.response_code != 200 or not response.body:
+            return response
+
+        if isinstance(response.body, list):
+            input = [self._record_to_action_input(task) for task in response.body]
+        else:
+            input = [self._record_to_action_input(response.body)]
+
+        data = await self.fetch_data(input, invalidate_cache=invalidate_cache)
+
+        async def _process(record):
+            target = self._record_to_action_input(record)
+
+            if target in data:
+                success, value, detail, trace = unpack_processed_value(data[target])
+                if success:
+                    record = await self._refine_record(record, value)
+                else:
+                    record["postprocess_error"] = format_error_body(
+                        value if value else "artifact-handle-failed",
+                        detail if detail else "Unknown error during postprocessing",
+                        trace,
+                    )
+            else:
+                record["postprocess_error"] = format_error_body(
+                    "artifact-value-not-found", "Artifact value not found"
+                )
+
+            return record
+
+        if isinstance(response.body, list):
+            body = [await _process(task) for task in response.body]
+        else:
+            body = await _process(response.body)
+
+        return DBResponse(response_code=response.response_code, body=body)
+
+
+async def _timed(coro):
+    """
+    Runs coro while a concurrent coroutine measures the gaps between its turns on the
+    event loop. Returns the wall time of coro, the longest gap and the total time of
+    the gaps above BLOCKED_THRESHOLD.
+    """
+    done = False
+    gaps = []
+
+    async def _ticker():
+        last = time.perf_counter()
+        while not done:
+            await asyncio.sleep(0)
+            now = time.perf_counter()
+            gaps.append(now - last)
+            last = now
+
+    ticker = asyncio.ensure_future(_ticker())
+    await asyncio.sleep(0)  # let the ticker take its first turn
+    started = time.perf_counter()
+    try:
+        result = await coro
+    finally:
+        elapsed = time.perf_counter() - started
+        done = True
+        await ticker
+    blocked = [gap for gap in gaps if gap > BLOCKED_THRESHOLD]
+    return result, elapsed, max(gaps, default=0), sum(blocked)
+
+
+async def benchmark(num_tasks=10000, repeat=5):
+    keys_objs = _cached_tasks(num_tasks)
+    refiners = {
+        "per record": PerRecordTaskRefiner(cache=PerValueCacheStore(keys_objs)),
+        "single pass": TaskRefiner(cache=MockCacheStore(keys_objs)),
+    }
+
+    bodies = {}
+    for name, refiner in refiners.items():
+        timings = []
+        for _ in range(repeat):
+            response, elapsed, longest, blocked = await _timed(
+                refiner.postprocess(DBResponse(200, _task_records(num_tasks)))
+            )
+            timings.append((elapsed, longest, blocked))
+        bodies[name] = response.body
+        elapsed, longest, blocked = min(timings)
+        print(
+            "{:<12} {} tasks: postprocess {:.1f}ms, "
+            "loop blocked {:.1f}ms (longest {:.1f}ms)".format(
+                name, num_tasks, elapsed * 1000, blocked * 1000, longest * 1000
+            )
+        )
+
+    assert bodies["per record"] == bodies["single pass"]
+
+
+if __name__ == "__main__":
+    asyncio.get_event_loop().run_until_complete(
+        benchmark(*[int(arg) for arg in sys.argv[1:]])
+    )
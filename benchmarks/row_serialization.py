@@ -0,0 +1,66 @@
+"""
+Benchmarks the serialization of query results, comparing DictCursor rows turned into
+row objects and serialized one by one against the tuple row serializers.
+
+    python -m benchmarks.row_serialization [row_count]
+"""
+
+import json
+import sys
+import timeit
+
+from services.data.models import (
+    ArtifactRow,
+    FlowRow,
+    MetadataRow,
+    StepRow,
+    TaskRow,
+)
+from services.data.postgres_async_db import (
+    AsyncArtifactTablePostgres,
+    AsyncFlowTablePostgres,
+    AsyncMetadataTablePostgres,
+    AsyncStepTablePostgres,
+    AsyncTaskTablePostgres,
+)
+from services.metadata_service.tests.unit_tests.row_serialization_test import (
+    ROWS,
+    _dict_row,
+)
+
+
+def benchmark(row_count=50000, repeat=5):
+    "Compares DictCursor rows with model objects against the tuple row serializers"
+    tables = {
+        FlowRow: AsyncFlowTablePostgres,
+        StepRow: AsyncStepTablePostgres,
+        TaskRow: AsyncTaskTablePostgres,
+        MetadataRow: AsyncMetadataTablePostgres,
+        ArtifactRow: AsyncArtifactTablePostgres,
+    }
+    for row_type, table in tables.items():
+        record = ROWS[row_type][0]
+        columns = [column for column in table.keys if column in record]
+        values = tuple(record[column] for column in columns)
+        tuples = [values] * row_count
+        dict_rows = [_dict_row(columns, values) for _ in range(row_count)]
+
+        def _model_path():
+            return json.dumps([row_type(**record).serialize() for record in dict_rows])
+
+        def _serializer_path():
+            serialize_row = row_type.serializer(columns)
+            return json.dumps([serialize_row(record) for record in tuples])
+
+        assert _model_path() == _serializer_path()
+        model = min(timeit.repeat(_model_path, number=1, repeat=repeat))
+        serializer = min(timeit.repeat(_serializer_path, number=1, repeat=repeat))
+        print(
+            "{:<12} {} rows: model {:.3f}s, serializer {:.3f}s ({:.1f}x)".format(
+                row_type.__name__, row_count, model, serializer, model / serializer
+            )
+        )
+
+
+if __name__ == "__main__":
+    benchmark(*[int(arg) for arg in sys.argv[1:]])
@@ -35,6 +35,32 @@ def db_status(base_url):
     print(response.json())
 
 
+@tools.command()
+@click.option(
+    "--base-url",
+    default=None,
+    required=True,
+    help="url to migration service ex: http://localhost:8082",
+)
+@click.option(
+    "--projection",
+    default="task_attempts",
+    show_default=True,
+    help="derived table to populate from existing data",
+)
+@click.option(
+    "--flow-id",
+    default=None,
+    help="only backfill data of this flow",
+)
+def backfill(base_url, projection, flow_id):
+    """populate a derived table from existing data"""
+    url = base_url + "/backfill/" + projection
+    params = {"flow_id": flow_id} if flow_id else None
+    response = requests.patch(url, params=params)
+    print(response.text)
+
+
 @tools.command()
 @click.option(
     "--base-url",
@@ -122,19 +122,21 @@ def filter_artifacts_by_attempt_id_for_tasks(
     return result
 
 
-def decode_cursor(cursor: str | None) -> dict:
+def decode_cursor(cursor: str | None, required_keys=("ts_epoch",)) -> dict:
     try:
         decoded = json.loads(b64decode(cursor).decode())
 
     except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError):
         raise ValueError("invalid_cursor")
 
-    if "ts_epoch" not in decoded:
+    if not isinstance(decoded, dict) or any(
+        key not in decoded for key in required_keys
+    ):
         raise ValueError("invalid_cursor")
 
     return decoded
 
 
 def encode_cursor(cursor: dict) -> str:
-    cursor_bytes = json.dumps(cursor).encode()
+    cursor_bytes = json.dumps(cursor, default=str).encode()
     return b64encode(cursor_bytes).decode()
@@ -0,0 +1,122 @@
+import asyncio
+from collections import defaultdict
+from typing import Dict, Optional, Tuple
+
+from services.utils import logging
+from .db_utils import new_heartbeat_ts
+
+
+class HeartbeatAccumulator(object):
+    """
+    Coalesces heartbeat writes in memory and flushes them periodically as one
+    set-based UPDATE per table and key layout.
+
+    The first heartbeat for a row is always written synchronously, so that
+    non-existent rows are still reported back to the client. Once a row is known to exist,
+    later heartbeats only record the latest timestamp in memory, respecting the same
+    `wait_time` throttling that the synchronous update applies in the database.
+
+    Parameters
+    ----------
+    flush_interval : float
+        Seconds to wait before flushing accumulated heartbeats.
+    wait_time : int
+        Minimum number of seconds between persisted heartbeats of a row.
+    """
+
+    def __init__(self, flush_interval: float, wait_time: int):
+        self.flush_interval = flush_interval
+        self.wait_time = wait_time
+        self.logger = logging.getLogger("HeartbeatAccumulator")
+        # (table, filter items) -> last heartbeat ts that was accepted for the row
+        self._accepted: Dict[Tuple, int] = {}
+        # (table, filter items) -> heartbeat ts waiting to be flushed
+        self._pending: Dict[Tuple, int] = {}
+        self._tables = {}
+        # timer of the next flush, and flushes in progress
+        self._flush_timer: Optional[asyncio.TimerHandle] = None
+        self._flushes = set()
+
+    def register(self, table, filter_dict: Dict, heartbeat_ts: int) -> Optional[int]:
+        """
+        Try to accumulate a heartbeat for the row matching `filter_dict`.
+
+        Returns
+        -------
+        int or None
+            Response code for the heartbeat if it was handled by the accumulator,
+            None if the heartbeat needs to be written synchronously.
+        """
+        key = (table.table_name, tuple(filter_dict.items()))
+        last_ts = self._accepted.get(key)
+        if last_ts is None:
+            return None
+        if last_ts > heartbeat_ts - self.wait_time:
+            # Throttled, same as a synchronous update matching no rows.
+            return 404
+
+        self._accepted[key] = heartbeat_ts
+        self._pending[key] = heartbeat_ts
+        self._tables[table.table_name] = table
+        self._schedule_flush()
+        return 200
+
+    def accepted(self, table, filter_dict: Dict, heartbeat_ts: int):
+        "Record a heartbeat that was written synchronously for an existing row."
+        self._accepted[(table.table_name, tuple(filter_dict.items()))] = heartbeat_ts
+
+    def _schedule_flush(self):
+        if self._flush_timer is None:
+            self._flush_timer = asyncio.get_event_loop().call_later(
+                self.flush_interval, self._start_flush
+            )
+
+    def _start_flush(self):
+        self._flush_timer = None
+        task = asyncio.ensure_future(self.flush())
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+
+    async def flush(self):
+        """
+        Write all accumulated heartbeats with one UPDATE per table and key layout.
+        Heartbeats registered meanwhile are flushed after another interval.
+        """
+        pending, self._pending = self._pending, {}
+
+        batches = defaultdict(list)
+        for (table_name, filter_items), heartbeat_ts in pending.items():
+            columns = tuple(col for col, _ in filter_items)
+            batches[(table_name, columns)].append(
+                tuple(val for _, val in filter_items) + (heartbeat_ts,)
+            )
+
+        for (table_name, columns), rows in batches.items():
+            try:
+                await self._tables[table_name].update_heartbeats(list(columns), rows)
+            except Exception:
+                self.logger.exception(
+                    "Flushing {} heartbeats for {} failed".format(len(rows), table_name)
+                )
+
+        self._prune()
+        if self._pending:
+            self._schedule_flush()
+
+    async def close(self):
+        "Flush the accumulated heartbeats right away, f.ex. when the service stops."
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        await asyncio.gather(*self._flushes)
+        while self._pending:
+            await self.flush()
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+
+    def _prune(self):
+        # Forget rows that have not been heart-beating for a while, their next
+        # heartbeat will be written synchronously again.
+        cutoff = new_heartbeat_ts() - 3 * self.wait_time
+        self._accepted = {key: ts for key, ts in self._accepted.items() if ts >= cutoff}
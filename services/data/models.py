@@ -1,6 +1,46 @@
 import time
+from functools import lru_cache
+from operator import itemgetter
 from .db_utils import get_exposed_run_id, get_exposed_task_id
 
+# The serializer() of each row type below builds the serialized dict straight from
+# query result rows, used when reading many rows. It precompiles the column positions
+# of a query result once, without an intermediate row object per result row.
+# serialize() of a row object goes through the same serializer, over the _fields of
+# its type, so that both produce identical dicts.
+
+
+def _column_getter(columns, fields):
+    """
+    Returns a function that picks the given fields, in order, from a result row
+    with the given columns. Fields that are not part of the result are returned as
+    None, as with the defaults of the row constructors.
+    """
+    position = {column: i for i, column in enumerate(columns)}
+    missing = len(columns)
+    getter = itemgetter(*(position.get(field, missing) for field in fields))
+    if all(field in position for field in fields):
+        return getter
+    return lambda row: getter(tuple(row) + (None,))
+
+
+@lru_cache(maxsize=None)
+def _object_serializer(row_type, expanded):
+    return row_type.serializer(row_type._fields, expanded)
+
+
+def _serialize_object(row, expanded):
+    "Serializes a row object with the serializer of its type"
+    return _object_serializer(type(row), expanded)(
+        tuple(getattr(row, field) for field in row._fields)
+    )
+
+
+def _ts_epoch(ts_epoch):
+    if ts_epoch is None:
+        return int(round(time.time() * 1000))
+    return ts_epoch
+
 
 class FlowRow(object):
     flow_id: str = None
@@ -16,14 +56,26 @@ class FlowRow(object):
         self.tags = tags
         self.system_tags = system_tags
 
+    _fields = ("flow_id", "user_name", "ts_epoch", "tags", "system_tags")
+
     def serialize(self, expanded: bool = False):
-        return {
-            "flow_id": self.flow_id,
-            "user_name": self.user_name,
-            "ts_epoch": self.ts_epoch,
-            "tags": self.tags,
-            "system_tags": self.system_tags,
-        }
+        return _serialize_object(self, expanded)
+
+    @classmethod
+    def serializer(cls, columns, expanded: bool = False):
+        get = _column_getter(columns, cls._fields)
+
+        def serialize(row):
+            flow_id, user_name, ts_epoch, tags, system_tags = get(row)
+            return {
+                "flow_id": flow_id,
+                "user_name": user_name,
+                "ts_epoch": _ts_epoch(ts_epoch),
+                "tags": tags,
+                "system_tags": system_tags,
+            }
+
+        return serialize
 
 
 class RunRow(object):
@@ -62,33 +114,67 @@ class RunRow(object):
         # derived verified owner, present when fetched with the filter select columns
         self.user = user
 
+    _fields = (
+        "flow_id",
+        "run_number",
+        "run_id",
+        "user_name",
+        "ts_epoch",
+        "tags",
+        "system_tags",
+        "last_heartbeat_ts",
+        "status",
+        "user",
+    )
+
     def serialize(self, expanded: bool = False):
-        if expanded:
-            body = {
-                "flow_id": self.flow_id,
-                "run_number": self.run_number,
-                "run_id": self.run_id,
-                "user_name": self.user_name,
-                "ts_epoch": self.ts_epoch,
-                "tags": self.tags,
-                "system_tags": self.system_tags,
-                "last_heartbeat_ts": self.last_heartbeat_ts,
-            }
-        else:
-            body = {
-                "flow_id": self.flow_id,
-                "run_number": get_exposed_run_id(self.run_number, self.run_id),
-                "user_name": self.user_name,
-                "ts_epoch": self.ts_epoch,
-                "tags": self.tags,
-                "system_tags": self.system_tags,
-                "last_heartbeat_ts": self.last_heartbeat_ts,
-            }
-        if self.status is not None:
-            body["status"] = self.status
-        if self.user is not None:
-            body["user"] = self.user
-        return body
+        return _serialize_object(self, expanded)
+
+    @classmethod
+    def serializer(cls, columns, expanded: bool = False):
+        get = _column_getter(columns, cls._fields)
+
+        def serialize(row):
+            (
+                flow_id,
+                run_number,
+                run_id,
+                user_name,
+                ts_epoch,
+                tags,
+                system_tags,
+                last_heartbeat_ts,
+                status,
+                user,
+            ) = get(row)
+            if expanded:
+                body = {
+                    "flow_id": flow_id,
+                    "run_number": run_number,
+                    "run_id": run_id,
+                    "user_name": user_name,
+                    "ts_epoch": _ts_epoch(ts_epoch),
+                    "tags": tags,
+                    "system_tags": system_tags,
+                    "last_heartbeat_ts": last_heartbeat_ts,
+                }
+            else:
+                body = {
+                    "flow_id": flow_id,
+                    "run_number": get_exposed_run_id(run_number, run_id),
+                    "user_name": user_name,
+                    "ts_epoch": _ts_epoch(ts_epoch),
+                    "tags": tags,
+                    "system_tags": system_tags,
+                    "last_heartbeat_ts": last_heartbeat_ts,
+                }
+            if status is not None:
+                body["status"] = status
+            if user is not None:
+                body["user"] = user
+            return body
+
+        return serialize
 
 
 class StepRow(object):
@@ -128,29 +214,60 @@ class StepRow(object):
         self.tags = tags
         self.system_tags = system_tags
 
+    _fields = (
+        "flow_id",
+        "run_number",
+        "run_id",
+        "step_name",
+        "user_name",
+        "ts_epoch",
+        "tags",
+        "system_tags",
+    )
+
     def serialize(self, expanded: bool = False):
-        if expanded:
-            return {
-                "flow_id": self.flow_id,
-                "run_number": self.run_number,
-                "run_id": self.run_id,
-                "step_name": self.step_name,
-                "user_name": self.user_name,
-                "ts_epoch": self.ts_epoch,
-                "tags": self.tags,
-                "system_tags": self.system_tags,
-            }
-        else:
+        return _serialize_object(self, expanded)
+
+    @classmethod
+    def serializer(cls, columns, expanded: bool = False):
+        get = _column_getter(columns, cls._fields)
+
+        def serialize(row):
+            (
+                flow_id,
+                run_number,
+                run_id,
+                step_name,
+                user_name,
+                ts_epoch,
+                tags,
+                system_tags,
+            ) = get(row)
+            if run_id is None:
+                run_id = str(run_number)
+            if expanded:
+                return {
+                    "flow_id": flow_id,
+                    "run_number": run_number,
+                    "run_id": run_id,
+                    "step_name": step_name,
+                    "user_name": user_name,
+                    "ts_epoch": _ts_epoch(ts_epoch),
+                    "tags": tags,
+                    "system_tags": system_tags,
+                }
             return {
-                "flow_id": self.flow_id,
-                "run_number": get_exposed_run_id(self.run_number, self.run_id),
-                "step_name": self.step_name,
-                "user_name": self.user_name,
-                "ts_epoch": self.ts_epoch,
-                "tags": self.tags,
-                "system_tags": self.system_tags,
+                "flow_id": flow_id,
+                "run_number": get_exposed_run_id(run_number, run_id),
+                "step_name": step_name,
+                "user_name": user_name,
+                "ts_epoch": _ts_epoch(ts_epoch),
+                "tags": tags,
+                "system_tags": system_tags,
             }
 
+        return serialize
+
 
 class TaskRow(object):
     flow_id: str = None
@@ -193,34 +310,69 @@ class TaskRow(object):
         self.system_tags = system_tags
         self.last_heartbeat_ts = last_heartbeat_ts
 
+    _fields = (
+        "flow_id",
+        "run_number",
+        "run_id",
+        "step_name",
+        "task_id",
+        "task_name",
+        "user_name",
+        "ts_epoch",
+        "tags",
+        "system_tags",
+        "last_heartbeat_ts",
+    )
+
     def serialize(self, expanded: bool = False):
-        if expanded:
-            return {
-                "flow_id": self.flow_id,
-                "run_number": self.run_number,
-                "run_id": self.run_id,
-                "step_name": self.step_name,
-                "task_id": self.task_id,
-                "task_name": self.task_name,
-                "user_name": self.user_name,
-                "ts_epoch": self.ts_epoch,
-                "tags": self.tags,
-                "system_tags": self.system_tags,
-                "last_heartbeat_ts": self.last_heartbeat_ts,
-            }
-        else:
+        return _serialize_object(self, expanded)
+
+    @classmethod
+    def serializer(cls, columns, expanded: bool = False):
+        get = _column_getter(columns, cls._fields)
+
+        def serialize(row):
+            (
+                flow_id,
+                run_number,
+                run_id,
+                step_name,
+                task_id,
+                task_name,
+                user_name,
+                ts_epoch,
+                tags,
+                system_tags,
+                last_heartbeat_ts,
+            ) = get(row)
+            if expanded:
+                return {
+                    "flow_id": flow_id,
+                    "run_number": run_number,
+                    "run_id": run_id,
+                    "step_name": step_name,
+                    "task_id": task_id,
+                    "task_name": task_name,
+                    "user_name": user_name,
+                    "ts_epoch": _ts_epoch(ts_epoch),
+                    "tags": tags,
+                    "system_tags": system_tags,
+                    "last_heartbeat_ts": last_heartbeat_ts,
+                }
             return {
-                "flow_id": self.flow_id,
-                "run_number": get_exposed_run_id(self.run_number, self.run_id),
-                "step_name": self.step_name,
-                "task_id": get_exposed_task_id(self.task_id, self.task_name),
-                "user_name": self.user_name,
-                "ts_epoch": self.ts_epoch,
-                "tags": self.tags,
-                "system_tags": self.system_tags,
-                "last_heartbeat_ts": self.last_heartbeat_ts,
+                "flow_id": flow_id,
+                "run_number": get_exposed_run_id(run_number, run_id),
+                "step_name": step_name,
+                "task_id": get_exposed_task_id(task_id, task_name),
+                "user_name": user_name,
+                "ts_epoch": _ts_epoch(ts_epoch),
+                "tags": tags,
+                "system_tags": system_tags,
+                "last_heartbeat_ts": last_heartbeat_ts,
             }
 
+        return serialize
+
 
 class MetadataRow(object):
     flow_id: str = None
@@ -273,21 +425,63 @@ class MetadataRow(object):
         self.tags = tags
         self.system_tags = system_tags
 
+    _fields = (
+        "id",
+        "flow_id",
+        "run_number",
+        "run_id",
+        "step_name",
+        "task_id",
+        "task_name",
+        "field_name",
+        "value",
+        "type",
+        "user_name",
+        "ts_epoch",
+        "tags",
+        "system_tags",
+    )
+
     def serialize(self, expanded: bool = False):
-        return {
-            "id": self.id,
-            "flow_id": self.flow_id,
-            "run_number": get_exposed_run_id(self.run_number, self.run_id),
-            "step_name": self.step_name,
-            "task_id": get_exposed_task_id(self.task_id, self.task_name),
-            "field_name": self.field_name,
-            "value": self.value,
-            "type": self.type,
-            "user_name": self.user_name,
-            "ts_epoch": self.ts_epoch,
-            "tags": self.tags,
-            "system_tags": self.system_tags,
-        }
+        return _serialize_object(self, expanded)
+
+    @classmethod
+    def serializer(cls, columns, expanded: bool = False):
+        get = _column_getter(columns, cls._fields)
+
+        def serialize(row):
+            (
+                id,
+                flow_id,
+                run_number,
+                run_id,
+                step_name,
+                task_id,
+                task_name,
+                field_name,
+                value,
+                type,
+                user_name,
+                ts_epoch,
+                tags,
+                system_tags,
+            ) = get(row)
+            return {
+                "id": id,
+                "flow_id": flow_id,
+                "run_number": get_exposed_run_id(run_number, run_id),
+                "step_name": step_name,
+                "task_id": get_exposed_task_id(task_id, task_name),
+                "field_name": field_name,
+                "value": value,
+                "type": type,
+                "user_name": user_name,
+                "ts_epoch": _ts_epoch(ts_epoch),
+                "tags": tags,
+                "system_tags": system_tags,
+            }
+
+        return serialize
 
 
 class ArtifactRow(object):
@@ -347,21 +541,69 @@ class ArtifactRow(object):
         self.tags = tags
         self.system_tags = system_tags
 
+    _fields = (
+        "flow_id",
+        "run_number",
+        "run_id",
+        "step_name",
+        "task_id",
+        "task_name",
+        "name",
+        "location",
+        "ds_type",
+        "sha",
+        "type",
+        "content_type",
+        "user_name",
+        "attempt_id",
+        "ts_epoch",
+        "tags",
+        "system_tags",
+    )
+
     def serialize(self, expanded: bool = False):
-        return {
-            "flow_id": self.flow_id,
-            "run_number": get_exposed_run_id(self.run_number, self.run_id),
-            "step_name": self.step_name,
-            "task_id": get_exposed_task_id(self.task_id, self.task_name),
-            "name": self.name,
-            "location": self.location,
-            "ds_type": self.ds_type,
-            "sha": self.sha,
-            "type": self.type,
-            "content_type": self.content_type,
-            "user_name": self.user_name,
-            "attempt_id": self.attempt_id,
-            "ts_epoch": self.ts_epoch,
-            "tags": self.tags,
-            "system_tags": self.system_tags,
-        }
+        return _serialize_object(self, expanded)
+
+    @classmethod
+    def serializer(cls, columns, expanded: bool = False):
+        get = _column_getter(columns, cls._fields)
+
+        def serialize(row):
+            (
+                flow_id,
+                run_number,
+                run_id,
+                step_name,
+                task_id,
+                task_name,
+                name,
+                location,
+                ds_type,
+                sha,
+                type,
+                content_type,
+                user_name,
+                attempt_id,
+                ts_epoch,
+                tags,
+                system_tags,
+            ) = get(row)
+            return {
+                "flow_id": flow_id,
+                "run_number": get_exposed_run_id(run_number, run_id),
+                "step_name": step_name,
+                "task_id": get_exposed_task_id(task_id, task_name),
+                "name": name,
+                "location": location,
+                "ds_type": ds_type,
+                "sha": sha,
+                "type": type,
+                "content_type": content_type,
+                "user_name": user_name,
+                "attempt_id": attempt_id,
+                "ts_epoch": _ts_epoch(ts_epoch),
+                "tags": tags,
+                "system_tags": system_tags,
+            }
+
+        return serialize
@@ -0,0 +1,302 @@
+import asyncio
+import os
+import time
+import weakref
+from collections import OrderedDict
+from contextvars import ContextVar
+
+import aiopg
+from aiopg.pool import _PoolCursorContextManager
+
+from services.utils import DBConfiguration, DBType, USE_SEPARATE_READER_POOL
+
+from .query_metrics import query_metrics
+from .service_configs import (
+    pool_acquire_timeout_seconds,
+    pool_idle_seconds,
+    pool_quotas,
+    read_after_write_seconds,
+    shared_pool_max,
+)
+
+AIOPG_ECHO = os.environ.get("AIOPG_ECHO", 0) == "1"
+
+
+class PurposePool(object):
+    """
+    The share of a pool of database connections used for one purpose, such as the
+    'ui:websocket' database adapter. Provides the parts of the aiopg.Pool interface
+    used by the services: cursor(), acquire() and release(), and the size of the pool.
+
+    A purpose holds at most `quota` connections of the shared pool at a time. Further
+    acquisitions wait in a queue, for at most acquire_timeout seconds, after which
+    asyncio.TimeoutError is raised.
+    """
+
+    def __init__(
+        self,
+        pool: aiopg.Pool,
+        purpose: str,
+        role: str,
+        quota: int = None,
+        acquire_timeout: float = None,
+    ):
+        self.shared = pool
+        self.purpose = purpose
+        self.role = role
+        self.quota = min(quota or pool.maxsize, pool.maxsize)
+        self.acquire_timeout = acquire_timeout or None
+        self._slots = asyncio.Semaphore(self.quota)
+        # connections held and acquisitions waiting for the quota or the shared pool
+        self.in_use = 0
+        self.waiting = 0
+
+    @property
+    def minsize(self) -> int:
+        return self.shared.minsize
+
+    @property
+    def maxsize(self) -> int:
+        return self.shared.maxsize
+
+    @property
+    def size(self) -> int:
+        return self.shared.size
+
+    @property
+    def freesize(self) -> int:
+        return self.shared.freesize
+
+    @property
+    def closed(self) -> bool:
+        return self.shared.closed
+
+    async def _acquire(self):
+        waited = self._slots.locked() or (
+            self.shared.freesize == 0 and self.shared.size >= self.shared.maxsize
+        )
+        started = time.perf_counter()
+        self.waiting += 1
+        try:
+            try:
+                await asyncio.wait_for(self._slots.acquire(), self.acquire_timeout)
+            except asyncio.TimeoutError:
+                query_metrics.observe_acquire_timeout(self.purpose, self.role)
+                raise
+            try:
+                conn = await self.shared.acquire()
+            except BaseException:
+                self._slots.release()
+                raise
+        finally:
+            self.waiting -= 1
+        self.in_use += 1
+        query_metrics.observe_acquire(
+            self.purpose, self.role, time.perf_counter() - started, waited
+        )
+        return conn
+
+    def release(self, conn):
+        self.in_use -= 1
+        self._slots.release()
+        return self.shared.release(conn)
+
+    def acquire(self):
+        "Acquire a connection, either with `await` or as an asynchronous context manager"
+        return _AcquireContext(self)
+
+    async def cursor(
+        self,
+        name=None,
+        cursor_factory=None,
+        scrollable=None,
+        withhold=False,
+        *,
+        timeout=None,
+    ):
+        conn = await self._acquire()
+        try:
+            cursor = await conn.cursor(
+                name=name,
+                cursor_factory=cursor_factory,
+                scrollable=scrollable,
+                withhold=withhold,
+                timeout=timeout,
+            )
+        except BaseException:
+            self.release(conn)
+            raise
+        return _PoolCursorContextManager(self, conn, cursor)
+
+
+class _AcquireContext(object):
+    def __init__(self, pool: PurposePool):
+        self._pool = pool
+        self._conn = None
+
+    def __await__(self):
+        return self._pool._acquire().__await__()
+
+    async def __aenter__(self):
+        self._conn = await self._pool._acquire()
+        return self._conn
+
+    async def __aexit__(self, exc_type, exc, tb):
+        conn, self._conn = self._conn, None
+        await self._pool.release(conn)
+
+
+def shared_pool_size(pool_max: int, purpose: str) -> int:
+    """
+    Maximum size of the pool shared by the database adapters of the service of a purpose,
+    f.ex. 'ui' for 'ui:cache'. The adapters without a quota can use pool_max connections
+    on top of the quotas of the others, as they could with pools of their own.
+    Overridden by MF_SERVICE_POOL_MAX.
+    """
+    if shared_pool_max:
+        return shared_pool_max
+    service = purpose.split(":")[0]
+    return pool_max + sum(
+        quota
+        for quota_purpose, quota in pool_quotas.items()
+        if quota_purpose.split(":")[0] == service
+    )
+
+
+class PoolManager(object):
+    """
+    Shares pools of database connections between the database adapters of a process,
+    with one pool per database host and event loop.
+
+    Pools start at pool_min connections and grow on demand up to pool_max of the
+    database configuration, plus the quotas of the adapters of the service, see
+    shared_pool_size(). Connections that have been idle for pool_idle_seconds are
+    closed, so that the pools shrink back when the load decreases. Each adapter takes
+    its connections through a PurposePool, limited by its quota in pool_quotas.
+    """
+
+    def __init__(self):
+        # Pools are only referenced weakly, so that they are closed along with the
+        # adapters using them, as are pools created on event loops that are gone.
+        # (event loop, role, dsn) -> aiopg.Pool
+        self._pools = weakref.WeakValueDictionary()
+        # (event loop, role, dsn) -> Future of an aiopg.Pool being created
+        self._creating = {}
+        # (event loop, purpose, role, dsn) -> PurposePool
+        self._purposes = weakref.WeakValueDictionary()
+
+    async def _shared_pool(
+        self, db_conf: DBConfiguration, role: str, dsn: str, purpose: str
+    ):
+        key = (asyncio.get_running_loop(), role, dsn)
+        pool = self._pools.get(key)
+        if pool is not None and not pool.closed:
+            return pool
+
+        future = self._creating.get(key)
+        if future is None:
+            future = self._creating[key] = asyncio.ensure_future(
+                aiopg.create_pool(
+                    dsn,
+                    minsize=db_conf.pool_min,
+                    maxsize=shared_pool_size(db_conf.pool_max, purpose),
+                    timeout=db_conf.timeout,
+                    pool_recycle=pool_idle_seconds or 10 * db_conf.timeout,
+                    echo=AIOPG_ECHO,
+                )
+            )
+            future.add_done_callback(lambda _: self._creating.pop(key, None))
+        pool = await asyncio.shield(future)
+        self._pools[key] = pool
+        return pool
+
+    async def get_pool(
+        self, db_conf: DBConfiguration, purpose: str, type: DBType = DBType.WRITER
+    ) -> PurposePool:
+        "Returns the share of the pool of the writer or reader database for the purpose"
+        role = "reader" if type == DBType.READER else "writer"
+        dsn = db_conf.get_dsn(type=type)
+        pool = await self._shared_pool(db_conf, role, dsn, purpose)
+
+        key = (asyncio.get_running_loop(), purpose, role, dsn)
+        purpose_pool = self._purposes.get(key)
+        if purpose_pool is None or purpose_pool.shared is not pool:
+            purpose_pool = self._purposes[key] = PurposePool(
+                pool,
+                purpose,
+                role,
+                quota=pool_quotas.get(purpose),
+                acquire_timeout=pool_acquire_timeout_seconds,
+            )
+        return purpose_pool
+
+    async def get_pools(self, db_conf: DBConfiguration, purpose: str):
+        "Returns the writer and reader pools for the purpose"
+        pool = await self.get_pool(db_conf, purpose, DBType.WRITER)
+        if not USE_SEPARATE_READER_POOL:
+            return pool, pool
+        return pool, await self.get_pool(db_conf, purpose, DBType.READER)
+
+
+# Key of the run that the reads of the current request are about. See ReadRouting.
+read_consistency_key: ContextVar = ContextVar("read_consistency_key", default=None)
+
+
+def consistency_key(flow_id: str, run_id=None):
+    """
+    Returns the key identifying a run, either by run number or run id,
+    or a flow when run_id is None.
+    """
+    return (flow_id, None if run_id is None else str(run_id))
+
+
+def write_consistency_keys(values: dict):
+    "Returns the keys of the run (or flow) that a write with the given column values is about"
+    flow_id = values.get("flow_id")
+    if flow_id is None:
+        return []
+    keys = [
+        consistency_key(flow_id, values[column])
+        for column in ("run_number", "run_id")
+        if values.get(column) is not None
+    ]
+    return keys or [consistency_key(flow_id)]
+
+
+class ReadRouting(object):
+    """
+    Read-after-write consistency for reads from a read replica.
+
+    Reads are routed to the reader pool, unless the request reads about a run
+    (see read_consistency_key) that this process wrote to within the last `window`
+    seconds. Those reads go to the writer, so that they observe the write regardless
+    of the replication lag. Writes done by other processes are not tracked.
+    """
+
+    def __init__(self, window: float):
+        self.window = window
+        # key -> time of the latest write, oldest first
+        self._writes = OrderedDict()
+
+    def record_write(self, keys):
+        if self.window <= 0:
+            return
+        now = time.monotonic()
+        for key in keys:
+            self._writes[key] = now
+            self._writes.move_to_end(key)
+        while self._writes:
+            key, written_at = next(iter(self._writes.items()))
+            if now - written_at < self.window:
+                break
+            self._writes.popitem(last=False)
+
+    def use_writer(self, key=None) -> bool:
+        "Whether reads about the key, or the run of the current request, should go to the writer"
+        key = key if key is not None else read_consistency_key.get()
+        written_at = self._writes.get(key) if key is not None else None
+        return written_at is not None and time.monotonic() - written_at < self.window
+
+
+pool_manager = PoolManager()
+read_routing = ReadRouting(read_after_write_seconds)
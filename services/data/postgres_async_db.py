@@ -2,12 +2,14 @@ import psycopg2
 import psycopg2.extras
 import os
 import aiopg
+import asyncio
 import json
 import math
 import re
 import time
-from services.utils import logging, DBType
-from typing import List, Tuple, Any
+from collections import OrderedDict
+from services.utils import logging
+from typing import AsyncIterator, List, Tuple, Any
 
 from .db_utils import (
     DBResponse,
@@ -24,9 +26,17 @@ from services.utils import DBConfiguration, USE_SEPARATE_READER_POOL
 from services.data.service_configs import (
     max_connection_retires,
     connection_retry_wait_time_seconds,
+    heartbeat_flush_interval_seconds,
+    stream_batch_size,
+    use_prepared_statements,
+    slow_query_threshold_seconds,
+    slow_query_explain_interval_seconds,
+    slow_query_max_explains,
 )
-
-AIOPG_ECHO = os.environ.get("AIOPG_ECHO", 0) == "1"
+from .heartbeats import HeartbeatAccumulator
+from .query_cache import PreparedStatements, QueryShapeCache
+from .query_metrics import query_metrics
+from .pool_manager import pool_manager, read_routing, write_consistency_keys
 
 WAIT_TIME = 10
 
@@ -42,6 +52,16 @@ STEP_TABLE_NAME = os.environ.get("DB_TABLE_NAME_STEPS", "steps_v3")
 TASK_TABLE_NAME = os.environ.get("DB_TABLE_NAME_TASKS", "tasks_v3")
 METADATA_TABLE_NAME = os.environ.get("DB_TABLE_NAME_METADATA", "metadata_v3")
 ARTIFACT_TABLE_NAME = os.environ.get("DB_TABLE_NAME_ARTIFACT", "artifact_v3")
+# Task attempt summary, maintained by database triggers on metadata and artifact inserts.
+TASK_ATTEMPT_TABLE_NAME = os.environ.get(
+    "DB_TABLE_NAME_TASK_ATTEMPTS", "task_attempts_v3"
+)
+# Outcome of the 'end' step of runs, maintained by database triggers on metadata inserts.
+RUN_STATUS_TABLE_NAME = os.environ.get("DB_TABLE_NAME_RUN_STATUS", "run_status_v3")
+# Distinct tags of runs and their usage counts, maintained by database triggers on run writes.
+TAG_DICTIONARY_TABLE_NAME = os.environ.get(
+    "DB_TABLE_NAME_TAG_DICTIONARY", "tag_dictionary_v3"
+)
 DB_SCHEMA_NAME = os.environ.get("DB_SCHEMA_NAME", "public")
 
 # Time before a run with a heartbeat is considered inactive (and thus failed).
@@ -55,6 +75,53 @@ operator_match = re.compile("([^:]*):([=><]+)$")
 TRIGGER_VERSION = "05092024"
 TRIGGER_NAME_PREFIX = "notify_ui"
 
+# Number of slow query shapes whose last EXPLAIN is remembered
+MAX_EXPLAINED_SHAPES = 1000
+
+
+class SlowQueryExplains(object):
+    """
+    Limits the EXPLAINs of slow queries: each query shape of a table is explained at most
+    once per `interval` seconds, with at most `max_in_flight` EXPLAINs running at a time.
+    """
+
+    def __init__(self, interval: float, max_in_flight: int):
+        self.interval = interval
+        self.max_in_flight = max_in_flight
+        self._explained = OrderedDict()  # (table, shape) -> time.monotonic() of EXPLAIN
+        self._in_flight = set()
+
+    def should_explain(self, table: str, sql: str) -> bool:
+        "Whether to explain a slow query now, which is then recorded as explained"
+        if len(self._in_flight) >= self.max_in_flight:
+            return False
+        key = (table, query_metrics.shape(sql))
+        now = time.monotonic()
+        explained = self._explained.get(key)
+        if explained is not None and now - explained < self.interval:
+            return False
+        self._explained[key] = now
+        self._explained.move_to_end(key)
+        while len(self._explained) > MAX_EXPLAINED_SHAPES:
+            self._explained.popitem(last=False)
+        return True
+
+    def add(self, explain) -> asyncio.Future:
+        "Runs an EXPLAIN coroutine in the background"
+        task = asyncio.ensure_future(explain)
+        self._in_flight.add(task)
+        task.add_done_callback(self._in_flight.discard)
+        return task
+
+    async def join(self):
+        "Waits for the EXPLAINs in flight"
+        await asyncio.gather(*self._in_flight, return_exceptions=True)
+
+
+slow_query_explains = SlowQueryExplains(
+    slow_query_explain_interval_seconds, slow_query_max_explains
+)
+
 
 class _AsyncPostgresDB(object):
     connection = None
@@ -68,10 +135,18 @@ class _AsyncPostgresDB(object):
     pool = None
     reader_pool = None
     db_conf: DBConfiguration = None
+    heartbeats: HeartbeatAccumulator = None
+    prepared_statements: PreparedStatements = None
 
     def __init__(self, name="global"):
         self.name = name
         self.logger = logging.getLogger("AsyncPostgresDB:{name}".format(name=self.name))
+        if heartbeat_flush_interval_seconds > 0:
+            self.heartbeats = HeartbeatAccumulator(
+                flush_interval=heartbeat_flush_interval_seconds, wait_time=WAIT_TIME
+            )
+        if use_prepared_statements:
+            self.prepared_statements = PreparedStatements()
 
         tables = []
         self.flow_table_postgres = AsyncFlowTablePostgres(self)
@@ -94,26 +169,9 @@ class _AsyncPostgresDB(object):
         retries = max_connection_retires
         for i in range(retries):
             try:
-                self.pool = await aiopg.create_pool(
-                    db_conf.get_dsn(),
-                    minsize=db_conf.pool_min,
-                    maxsize=db_conf.pool_max,
-                    timeout=db_conf.timeout,
-                    pool_recycle=10 * db_conf.timeout,
-                    echo=AIOPG_ECHO,
-                )
-
-                self.reader_pool = (
-                    await aiopg.create_pool(
-                        db_conf.get_dsn(type=DBType.READER),
-                        minsize=db_conf.pool_min,
-                        maxsize=db_conf.pool_max,
-                        timeout=db_conf.timeout,
-                        pool_recycle=10 * db_conf.timeout,
-                        echo=AIOPG_ECHO,
-                    )
-                    if USE_SEPARATE_READER_POOL
-                    else self.pool
+                # Pools are shared with the other adapters of the process, see PoolManager
+                self.pool, self.reader_pool = await pool_manager.get_pools(
+                    db_conf, purpose=self.name
                 )
 
                 for table in self.tables:
@@ -206,6 +264,10 @@ class AsyncPostgresTable(object):
         self.db = db
         if self.table_name is None:
             raise NotImplementedError("need to specify table name")
+        # row serializers, compiled once per result shape. See _row_serializer
+        self._serializers = {}
+        # rendered SQL of the queries generated by this table
+        self._query_shapes = QueryShapeCache()
 
     async def _init(self, create_triggers: bool):
         if create_triggers:
@@ -304,6 +366,36 @@ class AsyncPostgresTable(object):
         enable_joins=False,
         cur: aiopg.Cursor = None,
     ) -> Tuple[DBResponse, DBPagination]:
+        select_sql = self._select_sql(
+            conditions=conditions,
+            limit=limit,
+            offset=offset,
+            order=order,
+            enable_joins=enable_joins,
+        )
+
+        return await self.execute_sql(
+            select_sql=select_sql,
+            values=list(values) + [value for value in (limit, offset) if value],
+            fetch_single=fetch_single,
+            expanded=expanded,
+            limit=limit,
+            offset=offset,
+            cur=cur,
+        )
+
+    def _select_sql(
+        self,
+        conditions: List[str] = None,
+        limit: int = 0,
+        offset: int = 0,
+        order: List[str] = None,
+        enable_joins=False,
+    ) -> str:
+        """
+        Renders the select query of the given shape. The limit and offset are left as
+        placeholders, so their values follow the values of the conditions.
+        """
         sql_template = """
         SELECT * FROM (
             SELECT
@@ -317,30 +409,52 @@ class AsyncPostgresTable(object):
         {offset}
         """
 
-        select_sql = sql_template.format(
-            keys=",".join(
-                self.select_columns
-                + (self.join_columns if enable_joins and self.join_columns else [])
-            ),
-            table_name=self.table_name,
-            joins=(
-                " ".join(self.joins) if enable_joins and self.joins is not None else ""
-            ),
-            where="WHERE {}".format(" AND ".join(conditions)) if conditions else "",
-            order_by="ORDER BY {}".format(", ".join(order)) if order else "",
-            limit="LIMIT {}".format(limit) if limit else "",
-            offset="OFFSET {}".format(offset) if offset else "",
-        ).strip()
+        def _render():
+            return sql_template.format(
+                keys=",".join(
+                    self.select_columns
+                    + (self.join_columns if enable_joins and self.join_columns else [])
+                ),
+                table_name=self.table_name,
+                joins=(
+                    " ".join(self.joins)
+                    if enable_joins and self.joins is not None
+                    else ""
+                ),
+                where="WHERE {}".format(" AND ".join(conditions)) if conditions else "",
+                order_by="ORDER BY {}".format(", ".join(order)) if order else "",
+                limit="LIMIT %s" if limit else "",
+                offset="OFFSET %s" if offset else "",
+            ).strip()
+
+        shape = (
+            tuple(conditions or ()),
+            tuple(order or ()),
+            bool(limit),
+            bool(offset),
+            bool(enable_joins),
+        )
+        return self._query_shapes.get(shape, _render)
 
-        return await self.execute_sql(
+    async def stream_records(
+        self,
+        conditions: List[str] = None,
+        values=[],
+        order: List[str] = None,
+        expanded=False,
+        enable_joins=False,
+        batch_size: int = None,
+    ) -> AsyncIterator[List[dict]]:
+        select_sql = self._select_sql(
+            conditions=conditions, order=order, enable_joins=enable_joins
+        )
+        async for batch in self.stream_sql(
             select_sql=select_sql,
             values=values,
-            fetch_single=fetch_single,
             expanded=expanded,
-            limit=limit,
-            offset=offset,
-            cur=cur,
-        )
+            batch_size=batch_size,
+        ):
+            yield batch
 
     async def execute_sql(
         self,
@@ -353,17 +467,29 @@ class AsyncPostgresTable(object):
         cur: aiopg.Cursor = None,
         serialize: bool = True,
     ) -> Tuple[DBResponse, DBPagination]:
-        async def _execute_on_cursor(_cur):
-            await _cur.execute(select_sql, values)
-
-            rows = []
-            records = await _cur.fetchall()
+        async def _execute_on_cursor(_cur, prepare=False):
+            started = time.perf_counter()
+            try:
+                if prepare and self.db.prepared_statements is not None:
+                    await self.db.prepared_statements.execute(_cur, select_sql, values)
+                else:
+                    await _cur.execute(select_sql, values)
+
+                records = await _cur.fetchall()
+            except Exception:
+                query_metrics.observe_error(self.table_name, "select")
+                raise
+            self._observe_query(
+                "select",
+                select_sql,
+                values,
+                time.perf_counter() - started,
+                len(records),
+            )
+            columns = [column.name for column in _cur.description]
             if serialize:
-                for record in records:
-                    # pylint-initial-ignore: Lack of __init__ makes this too hard for pylint
-                    # pylint: disable=not-callable
-                    row = self._row_type(**record)
-                    rows.append(row.serialize(expanded))
+                serialize_row = self._row_serializer(columns, expanded)
+                rows = [serialize_row(record) for record in records]
             else:
                 rows = records
 
@@ -379,7 +505,9 @@ class AsyncPostgresTable(object):
                 page=math.floor(int(offset) / max(int(limit), 1)) + 1,
                 # Used for cursor when has_next (records == limit + 1); ignored otherwise
                 next_cursor_record=(
-                    records[-2] if records is not None and len(records) > 1 else None
+                    dict(zip(columns, records[-2]))
+                    if records is not None and len(records) > 1
+                    else None
                 ),
             )
             return body, pagination
@@ -390,13 +518,10 @@ class AsyncPostgresTable(object):
                 body, pagination = await _execute_on_cursor(cur)
                 return DBResponse(response_code=200, body=body), pagination
             else:
-                db_pool = (
-                    self.db.reader_pool if USE_SEPARATE_READER_POOL else self.db.pool
-                )
-                with await db_pool.cursor(
-                    cursor_factory=psycopg2.extras.DictCursor
+                with await self._read_pool().cursor(
+                    cursor_factory=self._cursor_factory(serialize)
                 ) as cur:
-                    body, pagination = await _execute_on_cursor(cur)
+                    body, pagination = await _execute_on_cursor(cur, prepare=True)
                     cur.close()
                     return DBResponse(response_code=200, body=body), pagination
         except IndexError as error:
@@ -405,6 +530,141 @@ class AsyncPostgresTable(object):
             self.db.logger.exception("Exception occurred")
             return aiopg_exception_handling(error), None
 
+    async def stream_sql(
+        self,
+        select_sql: str,
+        values=[],
+        expanded=False,
+        batch_size: int = None,
+    ) -> AsyncIterator[List[dict]]:
+        """
+        Yields the serialized rows of a query in batches of at most batch_size rows.
+
+        Rows are read through a server-side cursor so that only a single batch is held
+        in memory at a time, regardless of the size of the result set. Asynchronous
+        psycopg2 connections do not support named cursors, so the cursor is declared
+        explicitly and lives in a transaction for the duration of the iteration.
+        Close the iterator (e.g. with contextlib.aclosing) when stopping early.
+        """
+        batch_size = batch_size or stream_batch_size
+        with await self._read_pool().cursor(
+            cursor_factory=self._cursor_factory()
+        ) as cur:
+            async with cur.begin():
+                # Only the time spent in the database counts towards the duration,
+                # not the time spent by the consumer of the batches.
+                started = time.perf_counter()
+                rows = 0
+                await cur.execute(
+                    "DECLARE stream_cursor NO SCROLL CURSOR FOR {}".format(select_sql),
+                    values,
+                )
+                duration = time.perf_counter() - started
+                while True:
+                    started = time.perf_counter()
+                    await cur.execute(
+                        "FETCH FORWARD {} FROM stream_cursor".format(batch_size)
+                    )
+                    records = await cur.fetchall()
+                    duration += time.perf_counter() - started
+                    if not records:
+                        self._observe_query(
+                            "stream", select_sql, values, duration, rows
+                        )
+                        break
+                    rows += len(records)
+                    serialize_row = self._row_serializer(
+                        [column.name for column in cur.description], expanded
+                    )
+                    yield [serialize_row(record) for record in records]
+
+    def _read_pool(self):
+        """
+        Returns the pool to read from: the reader pool, unless the current request
+        reads about a run that was recently written to. See ReadRouting.
+        """
+        if self.db.reader_pool is not self.db.pool and read_routing.use_writer():
+            return self.db.pool
+        return self.db.reader_pool
+
+    def _observe_query(
+        self, operation: str, sql: str, values, duration: float, rows: int
+    ):
+        """
+        Records the duration, in seconds, and row count of a query. Queries slower than
+        slow_query_threshold_seconds are logged along with their plan, which is explained
+        in the background for shapes that have not been explained recently.
+        """
+        query_metrics.observe_query(self.table_name, operation, sql, duration, rows)
+        if 0 < slow_query_threshold_seconds <= duration:
+            if slow_query_explains.should_explain(self.table_name, sql):
+                slow_query_explains.add(
+                    self._log_slow_query(operation, sql, values, duration, rows)
+                )
+            else:
+                self._log_slow_query_plan(
+                    operation, sql, duration, rows, "explained recently"
+                )
+
+    async def _log_slow_query(
+        self, operation: str, sql: str, values, duration: float, rows: int
+    ):
+        try:
+            with await self.db.pool.cursor() as cur:
+                await cur.execute("EXPLAIN (FORMAT JSON) {}".format(sql), values)
+                plan = (await cur.fetchone())[0]
+                cur.close()
+        except (Exception, psycopg2.DatabaseError) as error:
+            plan = "could not explain query: {}".format(error)
+        self._log_slow_query_plan(operation, sql, duration, rows, plan)
+
+    def _log_slow_query_plan(
+        self, operation: str, sql: str, duration: float, rows: int, plan
+    ):
+        self.db.logger.warning(
+            "Slow query on {table}: {operation} took {duration:.3f}s ({rows} rows), shape {shape}\n"
+            "{sql}\nPlan: {plan}".format(
+                table=self.table_name,
+                operation=operation,
+                duration=duration,
+                rows=rows,
+                shape=query_metrics.shape(sql),
+                sql=sql.strip(),
+                plan=json.dumps(plan),
+            )
+        )
+
+    def _cursor_factory(self, serialize: bool = True):
+        # Rows are read as plain tuples when the row type can serialize them directly,
+        # which skips building a DictRow for every record.
+        if serialize and hasattr(self._row_type, "serializer"):
+            return None
+        return psycopg2.extras.DictCursor
+
+    def _row_serializer(self, columns: List[str], expanded=False):
+        """
+        Returns a function serializing a result row with the given columns,
+        equivalent to _row_type(**record).serialize(expanded).
+
+        Row types that provide a serializer() are compiled once per result shape and
+        read rows by position. Other row types fall back to a row object per record.
+        """
+        key = (tuple(columns), expanded)
+        if key not in self._serializers:
+            if hasattr(self._row_type, "serializer"):
+                serialize_row = self._row_type.serializer(columns, expanded)
+            else:
+
+                def serialize_row(record):
+                    # pylint-initial-ignore: Lack of __init__ makes this too hard for pylint
+                    # pylint: disable=not-callable
+                    return self._row_type(**dict(zip(columns, record))).serialize(
+                        expanded
+                    )
+
+            self._serializers[key] = serialize_row
+        return self._serializers[key]
+
     async def create_record(self, record_dict):
         # note: need to maintain order
         cols = []
@@ -435,9 +695,16 @@ class AsyncPostgresTable(object):
             with await self.db.pool.cursor(
                 cursor_factory=psycopg2.extras.DictCursor
             ) as cur:
-
+                started = time.perf_counter()
                 await cur.execute(insert_sql, tuple(values))
                 records = await cur.fetchall()
+                self._observe_query(
+                    "insert",
+                    insert_sql,
+                    values,
+                    time.perf_counter() - started,
+                    len(records),
+                )
                 record = records[0]
                 filtered_record = {}
                 for key, value in record.items():
@@ -446,10 +713,12 @@ class AsyncPostgresTable(object):
                 response_body = self._row_type(
                     **filtered_record
                 ).serialize()  # pylint: disable=not-callable
+                read_routing.record_write(write_consistency_keys(filtered_record))
                 # todo make sure connection is closed even with error
                 cur.close()
             return DBResponse(response_code=200, body=response_body)
         except (Exception, psycopg2.DatabaseError) as error:
+            query_metrics.observe_error(self.table_name, "insert")
             self.db.logger.exception("Exception occurred")
             return aiopg_exception_handling(error)
 
@@ -478,42 +747,58 @@ class AsyncPostgresTable(object):
     ):
         # Build a single values list in the same order as SQL placeholders:
         # UPDATE ... SET col1=%s, col2=%s WHERE col3=%s AND col4=%s
-        values = []
-
-        # generate SET clause (values come first in SQL)
-        sets = []
-        for col_name, col_val in update_dict.items():
-            sets.append("%s = %%s" % col_name)
-            values.append(col_val)
-        set_clause = ", ".join(sets)
-
-        # generate WHERE clause (values come second in SQL)
-        filters = []
-        for col_name, col_val in filter_dict.items():
-            operator = "="
-            find_operator = operator_match.match(col_name)
-            if find_operator:
-                col_name = find_operator.group(1)
-                operator = find_operator.group(2)
-                filters.append(
-                    "(%s IS NULL or %s %s %%s)" % (col_name, col_name, operator)
-                )
-            else:
-                filters.append("%s %s %%s" % (col_name, operator))
-            values.append(col_val)
-        where_clause = " and ".join(filters)
+        # (values of the SET clause come first in SQL, followed by the WHERE clause)
+        values = tuple(update_dict.values()) + tuple(filter_dict.values())
+
+        def _render():
+            # generate SET clause
+            sets = []
+            for col_name in update_dict:
+                sets.append("%s = %%s" % col_name)
+            set_clause = ", ".join(sets)
+
+            # generate WHERE clause
+            filters = []
+            for col_name in filter_dict:
+                operator = "="
+                find_operator = operator_match.match(col_name)
+                if find_operator:
+                    col_name = find_operator.group(1)
+                    operator = find_operator.group(2)
+                    filters.append(
+                        "(%s IS NULL or %s %s %%s)" % (col_name, col_name, operator)
+                    )
+                else:
+                    filters.append("%s %s %%s" % (col_name, operator))
+            where_clause = " and ".join(filters)
 
-        update_sql = """
+            return """
                 UPDATE {0} SET {1} WHERE {2};
-        """.format(self.table_name, set_clause, where_clause)
-        values = tuple(values)
+            """.format(self.table_name, set_clause, where_clause)
+
+        update_sql = self._query_shapes.get(
+            ("update", tuple(update_dict), tuple(filter_dict)), _render
+        )
 
         async def _execute_update_on_cursor(_cur):
-            await _cur.execute(update_sql, values)
+            started = time.perf_counter()
+            try:
+                await _cur.execute(update_sql, values)
+            except Exception:
+                query_metrics.observe_error(self.table_name, "update")
+                raise
+            self._observe_query(
+                "update",
+                update_sql,
+                values,
+                time.perf_counter() - started,
+                _cur.rowcount,
+            )
             if _cur.rowcount < 1:
                 return DBResponse(response_code=404, body={"msg": "could not find row"})
             if _cur.rowcount > 1:
                 return DBResponse(response_code=500, body={"msg": "duplicate rows"})
+            read_routing.record_write(write_consistency_keys(filter_dict))
             return DBResponse(response_code=200, body={"rowcount": _cur.rowcount})
 
         if cur:
@@ -529,6 +814,70 @@ class AsyncPostgresTable(object):
             self.db.logger.exception("Exception occurred")
             return aiopg_exception_handling(error)
 
+    async def update_heartbeat_row(self, filter_dict: dict) -> DBResponse:
+        """
+        Update the heartbeat of the row matching filter_dict, throttled to once every WAIT_TIME seconds.
+        Heartbeats of rows that are known to exist are accumulated and flushed in batches.
+        """
+        new_hb = new_heartbeat_ts()
+        body = json.dumps({"wait_time_in_seconds": WAIT_TIME})
+        accumulator = self.db.heartbeats
+        if accumulator:
+            response_code = accumulator.register(self, filter_dict, new_hb)
+            if response_code is not None:
+                return DBResponse(response_code=response_code, body=body)
+
+        result = await self.update_row(
+            filter_dict={**filter_dict, "last_heartbeat_ts:<=": new_hb - WAIT_TIME},
+            update_dict={"last_heartbeat_ts": new_hb},
+        )
+        if accumulator and result.response_code == 200:
+            accumulator.accepted(self, filter_dict, new_hb)
+
+        return DBResponse(response_code=result.response_code, body=body)
+
+    async def update_heartbeats(self, key_columns: List[str], rows: List[Tuple]):
+        """
+        Set-based heartbeat update for multiple rows, applying the same WAIT_TIME throttling
+        as update_heartbeat_row.
+
+        Parameters
+        ----------
+        key_columns : List[str]
+            Columns identifying a row, f.ex. ["flow_id", "run_number"]
+        rows : List[Tuple]
+            Values for the key columns, followed by the new heartbeat timestamp.
+        """
+        columns = key_columns + ["last_heartbeat_ts"]
+        row_template = "({})".format(
+            ", ".join(
+                "%s::bigint" if col in _BIGINT_COLUMNS else "%s::text"
+                for col in columns
+            )
+        )
+        update_sql = """
+            UPDATE {table_name} AS t SET last_heartbeat_ts = v.last_heartbeat_ts
+            FROM (VALUES {rows}) AS v({columns})
+            WHERE {conditions}
+            AND (t.last_heartbeat_ts IS NULL OR t.last_heartbeat_ts <= v.last_heartbeat_ts - {wait_time})
+        """.format(
+            table_name=self.table_name,
+            rows=", ".join([row_template] * len(rows)),
+            columns=", ".join(columns),
+            conditions=" AND ".join("t.{0} = v.{0}".format(col) for col in key_columns),
+            wait_time=WAIT_TIME,
+        )
+        values = tuple(val for row in rows for val in row)
+        with await self.db.pool.cursor() as cur:
+            await cur.execute(update_sql, values)
+            rowcount = cur.rowcount
+            cur.close()
+        return rowcount
+
+
+# Key columns that need an explicit cast when used in a VALUES list.
+_BIGINT_COLUMNS = {"run_number", "task_id", "last_heartbeat_ts"}
+
 
 class PostgresUtils(object):
     @staticmethod
@@ -732,55 +1081,29 @@ class AsyncRunTablePostgres(AsyncPostgresTable):
     flow_table_name = AsyncFlowTablePostgres.table_name
 
     # Derived run status (running/completed/failed). This mirrors the definition in
-    # ui_backend_service so filtering agrees with what the UI shows. The two lateral
-    # joins below pull the 'end' step's attempt metadata that the status depends on.
+    # ui_backend_service so filtering agrees with what the UI shows. The outcome of the
+    # 'end' step is read from the run status table that the database maintains on
+    # metadata inserts, leaving only the heartbeat liveness check to query time.
     # Only used when joins are enabled (i.e. when filtering by status), so the plain
     # get_all_runs path stays a simple, join-free query.
     joins = [
         """
-        LEFT JOIN LATERAL (
-            SELECT
-                ts_epoch,
-                (CASE
-                    WHEN pg_typeof(value)='jsonb'::regtype
-                    THEN value::jsonb->>0
-                    ELSE value::text
-                END)::boolean as value
-            FROM {metadata_table} as attempt_ok
-            WHERE
-                {table_name}.flow_id = attempt_ok.flow_id AND
-                {table_name}.run_number = attempt_ok.run_number AND
-                attempt_ok.step_name = 'end' AND
-                attempt_ok.field_name = 'attempt_ok'
-            ORDER BY ts_epoch DESC
-            LIMIT 1
-        ) as end_attempt_ok ON true
-        """.format(table_name=RUN_TABLE_NAME, metadata_table=METADATA_TABLE_NAME),
-        """
-        LEFT JOIN LATERAL (
-            SELECT ts_epoch
-            FROM {metadata_table} as attempt
-            WHERE
-                {table_name}.flow_id = attempt.flow_id AND
-                {table_name}.run_number = attempt.run_number AND
-                attempt.step_name = 'end' AND
-                attempt.field_name = 'attempt' AND
-                end_attempt_ok.value IS FALSE
-            ORDER BY ts_epoch DESC
-            LIMIT 1
-        ) as end_attempt ON true
-        """.format(table_name=RUN_TABLE_NAME, metadata_table=METADATA_TABLE_NAME),
+        LEFT JOIN {run_status_table} as run_status ON (
+            {table_name}.flow_id = run_status.flow_id AND
+            {table_name}.run_number = run_status.run_number
+        )
+        """.format(table_name=RUN_TABLE_NAME, run_status_table=RUN_STATUS_TABLE_NAME),
     ]
 
     join_columns = [
         """
         (CASE
-            WHEN end_attempt IS NOT NULL
-                AND end_attempt_ok.ts_epoch < end_attempt.ts_epoch
+            WHEN run_status.end_attempt_ok IS FALSE
+                AND run_status.end_attempt_ok_ts < run_status.end_attempt_started_at
             THEN 'running'
-            WHEN end_attempt_ok IS NOT NULL AND end_attempt_ok.value IS TRUE
+            WHEN run_status.end_attempt_ok IS TRUE
             THEN 'completed'
-            WHEN end_attempt_ok IS NOT NULL AND end_attempt_ok.value IS FALSE
+            WHEN run_status.end_attempt_ok IS FALSE
             THEN 'failed'
             WHEN {table_name}.last_heartbeat_ts IS NOT NULL
                 AND @(extract(epoch from now())-{table_name}.last_heartbeat_ts)<={cutoff}
@@ -838,6 +1161,12 @@ class AsyncRunTablePostgres(AsyncPostgresTable):
 
         return await self.get_records(filter_dict=filter_dict)
 
+    async def stream_all_runs(self, flow_id: str, batch_size: int = None):
+        async for batch in self.stream_records(
+            conditions=["flow_id = %s"], values=[flow_id], batch_size=batch_size
+        ):
+            yield batch
+
     async def get_filtered_runs_paginated(
         self,
         conditions: List[str],
@@ -881,17 +1210,8 @@ class AsyncRunTablePostgres(AsyncPostgresTable):
 
     async def update_heartbeat(self, flow_id: str, run_id: str):
         run_key, run_value = translate_run_key(run_id)
-        new_hb = new_heartbeat_ts()
-        filter_dict = {
-            "flow_id": flow_id,
-            run_key: str(run_value),
-            "last_heartbeat_ts:<=": new_hb - WAIT_TIME,
-        }
-        set_dict = {"last_heartbeat_ts": new_hb}
-        result = await self.update_row(filter_dict=filter_dict, update_dict=set_dict)
-        body = {"wait_time_in_seconds": WAIT_TIME}
-
-        return DBResponse(response_code=result.response_code, body=json.dumps(body))
+        filter_dict = {"flow_id": flow_id, run_key: str(run_value)}
+        return await self.update_heartbeat_row(filter_dict)
 
     async def update_run_tags(
         self, flow_id: str, run_id: str, run_tags: list, cur: aiopg.Cursor = None
@@ -1057,20 +1377,13 @@ class AsyncTaskTablePostgres(AsyncPostgresTable):
     ):
         run_key, run_value = translate_run_key(run_id)
         task_key, task_value = translate_task_key(task_id)
-        new_hb = new_heartbeat_ts()
         filter_dict = {
             "flow_id": flow_id,
             run_key: str(run_value),
             "step_name": step_name,
             task_key: str(task_value),
-            "last_heartbeat_ts:<=": new_hb - WAIT_TIME,
         }
-        set_dict = {"last_heartbeat_ts": new_hb}
-        result = await self.update_row(filter_dict=filter_dict, update_dict=set_dict)
-
-        body = {"wait_time_in_seconds": WAIT_TIME}
-
-        return DBResponse(response_code=result.response_code, body=json.dumps(body))
+        return await self.update_heartbeat_row(filter_dict)
 
 
 class AsyncMetadataTablePostgres(AsyncPostgresTable):
@@ -1144,6 +1457,17 @@ class AsyncMetadataTablePostgres(AsyncPostgresTable):
         filter_dict = {"flow_id": flow_id, run_id_key: run_id_value}
         return await self.get_records(filter_dict=filter_dict)
 
+    async def stream_metadata_in_runs(
+        self, flow_id: str, run_id: str, batch_size: int = None
+    ):
+        run_id_key, run_id_value = translate_run_key(run_id)
+        async for batch in self.stream_records(
+            conditions=["flow_id = %s", "{} = %s".format(run_id_key)],
+            values=[flow_id, run_id_value],
+            batch_size=batch_size,
+        ):
+            yield batch
+
     async def get_metadata_paginated_in_runs(
         self,
         flow_id: str,
@@ -1364,6 +1688,34 @@ class AsyncArtifactTablePostgres(AsyncPostgresTable):
         }
         return await self.get_records(filter_dict=filter_dict, ordering=self.ordering)
 
+    async def stream_artifacts_in_runs(
+        self, flow_id: str, run_id: int, batch_size: int = None
+    ):
+        # Streaming counterpart of get_artifacts_in_runs followed by
+        # filter_artifacts_for_latest_attempt. The latest attempt per task is resolved
+        # in the query, as the rows of a task may be spread over several batches.
+        run_id_key, run_id_value = translate_run_key(run_id)
+        select_sql = """
+        SELECT {keys} FROM (
+            SELECT {keys}, max(attempt_id) OVER (PARTITION BY task_id) AS latest_attempt_id
+            FROM {table}
+            WHERE flow_id = %s AND {run_id_key} = %s
+        ) T
+        WHERE attempt_id = latest_attempt_id
+        ORDER BY {order}
+        """.format(
+            keys=", ".join(self.keys),
+            table=self.table_name,
+            run_id_key=run_id_key,
+            order=", ".join(self.ordering),
+        )
+        async for batch in self.stream_sql(
+            select_sql=select_sql,
+            values=[flow_id, run_id_value],
+            batch_size=batch_size,
+        ):
+            yield batch
+
     async def get_artifacts_in_runs_paginated(
         self,
         flow_id: str,
@@ -0,0 +1,140 @@
+import hashlib
+import re
+import weakref
+from collections import Counter, OrderedDict
+from typing import Callable, Hashable
+
+import psycopg2
+import psycopg2.errors
+
+# Counters of the query caches, shared by all tables.
+#   shape_hits / shape_misses: rendered SQL reused / rendered for a query shape
+#   prepared: statements prepared on a pooled connection
+#   prepared_hits: executions of a statement already prepared on the connection
+#   prepared_fallbacks: executions of statements that could not be prepared
+query_cache_stats = Counter()
+
+_placeholder = re.compile(r"%%|%s")
+
+
+class QueryShapeCache(object):
+    """
+    LRU cache of rendered SQL, keyed on the shape of a query: everything that
+    affects the statement text, but not the values bound to it.
+    """
+
+    def __init__(self, max_size: int = 1024):
+        self.max_size = max_size
+        self._cache = OrderedDict()
+
+    def get(self, key: Hashable, render: Callable[[], str]) -> str:
+        sql = self._cache.get(key)
+        if sql is not None:
+            self._cache.move_to_end(key)
+            query_cache_stats["shape_hits"] += 1
+            return sql
+        query_cache_stats["shape_misses"] += 1
+        sql = self._cache[key] = render()
+        if len(self._cache) > self.max_size:
+            self._cache.popitem(last=False)
+        return sql
+
+
+def to_prepared_sql(sql: str):
+    """
+    Converts SQL with psycopg2 style placeholders into the statement of a
+    server-side PREPARE. Returns the statement and the number of parameters.
+    """
+    count = 0
+
+    def _replace(match):
+        nonlocal count
+        if match.group(0) == "%%":
+            return "%"
+        count += 1
+        return "${}".format(count)
+
+    return _placeholder.sub(_replace, sql), count
+
+
+# Statement names prepared on each pooled connection, least recently used first. Shared by
+# all database adapters of the process, as they share pooled connections.
+_prepared_on_connections = weakref.WeakKeyDictionary()
+
+
+def statement_name(sql: str) -> str:
+    "Name of the prepared statement of a query, the same for every adapter and connection"
+    return "mf_statement_{}".format(hashlib.sha1(sql.encode("utf-8")).hexdigest()[:24])
+
+
+class PreparedStatements(object):
+    """
+    Executes queries as server-side prepared statements, so that Postgres can reuse
+    their plans. Statements are prepared once on every pooled connection they are
+    executed on, under a name derived from their SQL. At most max_size statements
+    are kept prepared on a connection, the least recently used ones are deallocated.
+    Statements that Postgres can not prepare (e.g. when the type of a parameter can
+    not be inferred) are executed as plain queries instead.
+
+    Only use with cursors that are not part of a transaction, as a failing PREPARE
+    would abort it.
+    """
+
+    def __init__(self, max_size: int = 1024):
+        self.max_size = max_size
+        # sql -> (statement name, PREPARE sql, parameter count), or None if unpreparable
+        self._statements = OrderedDict()
+
+    def _statement(self, sql: str):
+        if sql in self._statements:
+            self._statements.move_to_end(sql)
+            return self._statements[sql]
+        if len(self._statements) >= self.max_size:
+            self._statements.popitem(last=False)
+        name = statement_name(sql)
+        statement, parameter_count = to_prepared_sql(sql)
+        self._statements[sql] = (
+            name,
+            "PREPARE {} AS {}".format(name, statement),
+            parameter_count,
+        )
+        return self._statements[sql]
+
+    async def execute(self, cur, sql: str, values=[]):
+        statement = self._statement(sql)
+        if statement is None or statement[2] != len(values):
+            query_cache_stats["prepared_fallbacks"] += 1
+            return await cur.execute(sql, values)
+
+        name, prepare_sql, parameter_count = statement
+        prepared = _prepared_on_connections.setdefault(cur.connection, OrderedDict())
+        if name in prepared:
+            prepared.move_to_end(name)
+            query_cache_stats["prepared_hits"] += 1
+        else:
+            while len(prepared) >= self.max_size:
+                evicted, _ = prepared.popitem(last=False)
+                try:
+                    await cur.execute("DEALLOCATE {}".format(evicted))
+                except psycopg2.Error:
+                    pass
+            try:
+                await cur.execute(prepare_sql)
+            except psycopg2.errors.DuplicatePreparedStatement:
+                # prepared on the connection without being recorded, f.ex. by a
+                # concurrent request on a shared connection
+                pass
+            except psycopg2.Error:
+                self._statements[sql] = None
+                query_cache_stats["prepared_fallbacks"] += 1
+                return await cur.execute(sql, values)
+            prepared[name] = True
+            query_cache_stats["prepared"] += 1
+
+        if parameter_count:
+            execute_sql = "EXECUTE {} ({})".format(
+                name, ", ".join(["%s"] * parameter_count)
+            )
+        else:
+            execute_sql = "EXECUTE {}".format(name)
+        return await cur.execute(execute_sql, values)
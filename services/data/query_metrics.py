@@ -0,0 +1,255 @@
+import hashlib
+from bisect import bisect_left
+from collections import Counter
+from typing import Dict, Iterable, List, Tuple
+
+from .query_cache import query_cache_stats
+
+# Upper bounds of the histogram buckets, in seconds and in rows.
+LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+)
+ROW_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Queries of shapes beyond this many are reported under a shared 'other' shape,
+# to keep the number of series bounded for queries with inlined values.
+MAX_SHAPES = 500
+
+
+class Histogram(object):
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.sum += value
+        self.count += 1
+        position = bisect_left(self.buckets, value)
+        if position < len(self.counts):
+            self.counts[position] += 1
+
+    def samples(self, name: str, labels: str) -> List[str]:
+        lines = []
+        cumulative = 0
+        for bucket, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(
+                '{}_bucket{{{},le="{}"}} {}'.format(name, labels, bucket, cumulative)
+            )
+        lines.append('{}_bucket{{{},le="+Inf"}} {}'.format(name, labels, self.count))
+        lines.append("{}_sum{{{}}} {}".format(name, labels, self.sum))
+        lines.append("{}_count{{{}}} {}".format(name, labels, self.count))
+        return lines
+
+
+def _labels(**labels) -> str:
+    return ",".join(
+        '{}="{}"'.format(key, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+        for key, value in labels.items()
+    )
+
+
+class QueryMetrics(object):
+    """
+    Aggregates the latency and row counts of database queries per table, operation
+    and query shape, along with the time spent acquiring pooled connections.
+    Rendered in the Prometheus text format by render().
+
+    A query shape is identified by a short hash of its SQL, which the slow query
+    log includes along with the full statement.
+    """
+
+    def __init__(self):
+        self._shapes: Dict[str, str] = {}
+        self._durations: Dict[Tuple, Histogram] = {}
+        self._rows: Dict[Tuple, Histogram] = {}
+        self._acquire: Dict[Tuple, Histogram] = {}
+        self._pool_waits = Counter()
+        self._acquire_timeouts = Counter()
+        self._errors = Counter()
+
+    def shape(self, sql: str) -> str:
+        shape = self._shapes.get(sql)
+        if shape is None:
+            if len(self._shapes) >= MAX_SHAPES:
+                return "other"
+            shape = self._shapes[sql] = hashlib.sha1(sql.encode()).hexdigest()[:12]
+        return shape
+
+    def observe_query(
+        self, table: str, operation: str, sql: str, duration: float, rows: int
+    ):
+        key = (table, operation, self.shape(sql))
+        if key not in self._durations:
+            self._durations[key] = Histogram(LATENCY_BUCKETS)
+            self._rows[key] = Histogram(ROW_BUCKETS)
+        self._durations[key].observe(duration)
+        self._rows[key].observe(rows)
+
+    def observe_error(self, table: str, operation: str):
+        self._errors[(table, operation)] += 1
+
+    def observe_acquire(self, db: str, pool: str, duration: float, waited: bool):
+        key = (db, pool)
+        if key not in self._acquire:
+            self._acquire[key] = Histogram(LATENCY_BUCKETS)
+        self._acquire[key].observe(duration)
+        if waited:
+            self._pool_waits[key] += 1
+
+    def observe_acquire_timeout(self, db: str, pool: str):
+        self._acquire_timeouts[(db, pool)] += 1
+
+    def render(self, dbs: Iterable = ()) -> str:
+        """
+        Renders the metrics in the Prometheus text format, along with the current
+        state of the connection pools of the given databases (see PoolManager).
+        """
+        lines = [
+            "# HELP mf_db_query_duration_seconds Duration of database queries, including fetching the results.",
+            "# TYPE mf_db_query_duration_seconds histogram",
+        ]
+        for (table, operation, shape), histogram in self._durations.items():
+            lines.extend(
+                histogram.samples(
+                    "mf_db_query_duration_seconds",
+                    _labels(table=table, operation=operation, shape=shape),
+                )
+            )
+        lines.extend(
+            [
+                "# HELP mf_db_query_rows Number of rows returned or affected by database queries.",
+                "# TYPE mf_db_query_rows histogram",
+            ]
+        )
+        for (table, operation, shape), histogram in self._rows.items():
+            lines.extend(
+                histogram.samples(
+                    "mf_db_query_rows",
+                    _labels(table=table, operation=operation, shape=shape),
+                )
+            )
+        lines.extend(
+            [
+                "# HELP mf_db_query_errors_total Database queries that failed.",
+                "# TYPE mf_db_query_errors_total counter",
+            ]
+        )
+        for (table, operation), count in self._errors.items():
+            lines.append(
+                "mf_db_query_errors_total{{{}}} {}".format(
+                    _labels(table=table, operation=operation), count
+                )
+            )
+        lines.extend(
+            [
+                "# HELP mf_db_connection_acquire_seconds Time spent acquiring a connection from the pool.",
+                "# TYPE mf_db_connection_acquire_seconds histogram",
+            ]
+        )
+        for (db, pool), histogram in self._acquire.items():
+            lines.extend(
+                histogram.samples(
+                    "mf_db_connection_acquire_seconds", _labels(db=db, pool=pool)
+                )
+            )
+        lines.extend(
+            [
+                "# HELP mf_db_pool_waits_total Connection acquisitions that had to wait for a busy pool.",
+                "# TYPE mf_db_pool_waits_total counter",
+            ]
+        )
+        for (db, pool), count in self._pool_waits.items():
+            lines.append(
+                "mf_db_pool_waits_total{{{}}} {}".format(
+                    _labels(db=db, pool=pool), count
+                )
+            )
+        lines.extend(
+            [
+                "# HELP mf_db_pool_acquire_timeouts_total Connection acquisitions that timed out waiting for the quota of the database adapter.",
+                "# TYPE mf_db_pool_acquire_timeouts_total counter",
+            ]
+        )
+        for (db, pool), count in self._acquire_timeouts.items():
+            lines.append(
+                "mf_db_pool_acquire_timeouts_total{{{}}} {}".format(
+                    _labels(db=db, pool=pool), count
+                )
+            )
+        lines.extend(
+            [
+                "# HELP mf_db_query_cache_total Events of the query shape and prepared statement caches.",
+                "# TYPE mf_db_query_cache_total counter",
+            ]
+        )
+        for event, count in sorted(query_cache_stats.items()):
+            lines.append(
+                "mf_db_query_cache_total{{{}}} {}".format(_labels(event=event), count)
+            )
+        purpose_pools = []
+        for db in dbs:
+            for pool in (db.pool, db.reader_pool):
+                if pool is not None and pool not in purpose_pools:
+                    purpose_pools.append(pool)
+        lines.extend(
+            [
+                "# HELP mf_db_pool_connections Connections of the shared pools, by state.",
+                "# TYPE mf_db_pool_connections gauge",
+            ]
+        )
+        shared_pools = []
+        for pool in purpose_pools:
+            if pool.shared in shared_pools:
+                continue
+            shared_pools.append(pool.shared)
+            for state, count in (
+                ("free", pool.freesize),
+                ("used", pool.size - pool.freesize),
+                ("max", pool.maxsize),
+            ):
+                lines.append(
+                    "mf_db_pool_connections{{{}}} {}".format(
+                        _labels(pool=pool.role, state=state), count
+                    )
+                )
+        lines.extend(
+            [
+                "# HELP mf_db_pool_purpose_connections Connections of the shared pools held by, waited for and allowed to each database adapter.",
+                "# TYPE mf_db_pool_purpose_connections gauge",
+            ]
+        )
+        for pool in purpose_pools:
+            for state, count in (
+                ("in_use", pool.in_use),
+                ("waiting", pool.waiting),
+                ("quota", pool.quota),
+            ):
+                lines.append(
+                    "mf_db_pool_purpose_connections{{{}}} {}".format(
+                        _labels(db=pool.purpose, pool=pool.role, state=state), count
+                    )
+                )
+        return "\n".join(lines) + "\n"
+
+
+# Metrics of all queries executed by this process.
+query_metrics = QueryMetrics()
@@ -0,0 +1,458 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import time
+from collections import OrderedDict
+from email.utils import formatdate
+from typing import Optional, Tuple
+
+from aiohttp import web
+
+from services.utils import RESPONSE_COMPRESSION_THRESHOLD, format_baseurl, logging
+
+from .db_utils import translate_run_key
+from .postgres_async_db import RUN_STATUS_TABLE_NAME, RUN_TABLE_NAME
+from .service_configs import (
+    response_cache_dir,
+    response_cache_disk_max_bytes,
+    response_cache_max_bytes,
+    response_cache_ttl_seconds,
+)
+
+logger = logging.getLogger("ResponseCache")
+
+# Routes about a run whose responses are cached once the run has completed: the run itself
+# and its steps, tasks, attempts, artifacts, metadata, DAG and parameters.
+# Logs, cards, heartbeats and searches are not cached.
+CACHED_ROUTE = re.compile(
+    r"/flows/\{flow_id\}/runs/\{run_number\}"
+    r"(/(steps|tasks|attempts?|artifacts?|metadata|dag|parameters"
+    r"|filtered_tasks|step|task|\{\w+\}))*/?$"
+)
+# Requests with these query parameters bypass the cache: the UI refreshes its caches with
+# 'invalidate', and the artifact content fetched with 'postprocess' may be unavailable for now.
+UNCACHED_QUERY_PARAMETERS = ("invalidate", "postprocess")
+# Response headers that are set again for every response served from the cache
+UNCACHED_HEADERS = {
+    "Content-Length",
+    "Content-Encoding",
+    "Transfer-Encoding",
+    "Date",
+    "Server",
+    "ETag",
+    "Last-Modified",
+    "Cache-Control",
+}
+# Request storage key marking requests already handled by a response cache middleware
+HANDLED_KEY = "response_cache_handled"
+# Number of runs whose invalidation times, completion and run ids are remembered,
+# least recently used ones are forgotten first. See ResponseCache.put()
+MAX_TRACKED_RUNS = 10000
+# Runs found to be incomplete are not looked up again for this many seconds
+INCOMPLETE_RUN_RECHECK_SECONDS = 5
+
+RunKey = Tuple[str, str]  # (flow_id, run_number)
+
+
+class CachedResponse(object):
+    """
+    A response body along with its status and headers, served with a weak ETag derived
+    from its hash, and with the time it was cached as its Last-Modified time.
+    Clients revalidating with If-None-Match or If-Modified-Since get a 304.
+    """
+
+    __slots__ = ("status", "headers", "body", "etag", "created")
+
+    def __init__(self, status: int, headers, body: bytes, created: float = None):
+        self.status = status
+        self.headers = [
+            (name, value) for name, value in headers if name not in UNCACHED_HEADERS
+        ]
+        self.body = body
+        self.etag = 'W/"{}"'.format(hashlib.sha1(body).hexdigest())
+        self.created = created if created is not None else time.time()
+
+    @classmethod
+    def from_response(cls, response: web.Response) -> "CachedResponse":
+        return cls(response.status, response.headers.items(), response.body)
+
+    @property
+    def size(self) -> int:
+        return len(self.body) + sum(len(k) + len(v) for k, v in self.headers)
+
+    def not_modified(self, request: web.Request) -> bool:
+        if_none_match = request.headers.get("If-None-Match")
+        if if_none_match:
+            etag = self.etag[2:]
+            tags = {
+                tag.strip().replace("W/", "", 1) for tag in if_none_match.split(",")
+            }
+            return "*" in tags or etag in tags
+        if_modified_since = request.if_modified_since
+        if if_modified_since is not None:
+            return int(self.created) <= if_modified_since.timestamp()
+        return False
+
+    def response(self, request: web.Request) -> web.Response:
+        headers = {
+            "ETag": self.etag,
+            "Last-Modified": formatdate(self.created, usegmt=True),
+            "Cache-Control": "no-cache",
+        }
+        if self.not_modified(request):
+            return web.Response(status=304, headers=headers)
+        response = web.Response(status=self.status, body=self.body)
+        response.headers.extend(self.headers)
+        response.headers.update(headers)
+        if (
+            RESPONSE_COMPRESSION_THRESHOLD
+            and len(self.body) >= RESPONSE_COMPRESSION_THRESHOLD
+        ):
+            response.enable_compression()
+        return response
+
+    def dumps(self) -> bytes:
+        meta = {"status": self.status, "headers": self.headers, "created": self.created}
+        return json.dumps(meta).encode("utf-8") + b"\n" + self.body
+
+    @classmethod
+    def loads(cls, content: bytes) -> "CachedResponse":
+        meta, _, body = content.partition(b"\n")
+        meta = json.loads(meta)
+        return cls(meta["status"], meta["headers"], body, meta["created"])
+
+
+class ResponseCache(object):
+    """
+    Responses about completed runs, keyed by their URL. Apart from tag mutations, the
+    resources of a completed run no longer change, so that their responses can be served
+    without querying the database again.
+
+    Responses are kept in memory up to max_bytes, least recently used ones first out.
+    With a directory, responses evicted from memory are kept on disk up to disk_max_bytes.
+    The disk tier is not persistent, it is emptied when first used by a process.
+
+    The responses about a run are dropped when the run is invalidated, which is done on
+    writes about the run, such as tag mutations, and on database notifications.
+    Invalidations that are not seen by this process, such as tag mutations through
+    another instance of the service, are picked up once the responses are older than ttl.
+
+    Parameters
+    ----------
+    max_bytes : int
+        Bytes of responses to keep in memory. The cache is disabled with 0.
+    ttl : float
+        Seconds to serve a response for.
+    directory : str (optional)
+        Directory of the disk tier.
+    disk_max_bytes : int (optional)
+        Bytes of responses to keep on disk.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int,
+        ttl: float,
+        directory: str = None,
+        disk_max_bytes: int = 0,
+    ):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.directory = (
+            os.path.join(directory, str(os.getpid())) if directory else None
+        )
+        self.disk_max_bytes = disk_max_bytes if directory else 0
+        self._memory = OrderedDict()  # key -> CachedResponse
+        self._memory_size = 0
+        self._disk = OrderedDict()  # key -> size of the file
+        self._disk_size = 0
+        self._disk_ready = False
+        self._runs = {}  # run -> keys of its responses in memory or on disk
+        self._entry_runs = {}  # key -> run
+        self._aliases = OrderedDict()  # (flow_id, run_id) -> (flow_id, run_number)
+        self._invalidated = OrderedDict()  # (flow_id, run) -> time of invalidation
+        self._completed = OrderedDict()  # runs known to be completed -> True
+        self._incomplete = OrderedDict()  # (flow_id, run) -> time of the lookup
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def clear(self):
+        for key in list(self._entry_runs):
+            self._drop(key)
+        self._aliases.clear()
+        self._invalidated.clear()
+        self._completed.clear()
+        self._incomplete.clear()
+
+    @staticmethod
+    def _remember(runs: OrderedDict, run_key, value):
+        "Records a value about a run, returns the least recently used ones over the limit"
+        runs[run_key] = value
+        runs.move_to_end(run_key)
+        evicted = []
+        while len(runs) > MAX_TRACKED_RUNS:
+            evicted.append(runs.popitem(last=False))
+        return evicted
+
+    def _alias(self, flow_id: str, run, run_key: RunKey):
+        "Records the number of a run given by its id"
+        if str(run) == run_key[1]:
+            return
+        for _, evicted_run_key in self._remember(
+            self._aliases, (flow_id, str(run)), run_key
+        ):
+            # without its alias, the run could no longer be invalidated by its id
+            for key in list(self._runs.get(evicted_run_key, [])):
+                self._drop(key)
+
+    def _run_key(self, flow_id: str, run) -> RunKey:
+        run_key = (flow_id, str(run))
+        return self._aliases.get(run_key, run_key)
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        cached = self._memory.get(key)
+        if cached is None and key in self._disk:
+            cached = self._read(key)
+            run = self._entry_runs.get(key)
+            self._drop(key)
+            if cached is not None and run is not None:
+                self._store(key, run, cached)
+        if cached is None:
+            return None
+        if time.time() - cached.created >= self.ttl:
+            self._drop(key)
+            return None
+        self._memory.move_to_end(key)
+        return cached
+
+    def put(
+        self,
+        key: str,
+        flow_id: str,
+        run,
+        run_number,
+        response: web.Response,
+        started: float,
+    ) -> Optional[CachedResponse]:
+        """
+        Caches the response about a completed run, unless the run was invalidated since
+        the response started to be produced.
+        """
+        run_key = (flow_id, str(run_number))
+        self._alias(flow_id, run, run_key)
+        if (
+            max(
+                self._invalidated.get((flow_id, str(run)), 0),
+                self._invalidated.get(run_key, 0),
+            )
+            >= started
+        ):
+            return None
+        cached = CachedResponse.from_response(response)
+        if cached.size > self.max_bytes:
+            return None
+        self._drop(key)
+        self._store(key, run_key, cached)
+        return cached
+
+    def _store(self, key: str, run_key: RunKey, cached: CachedResponse):
+        self._memory[key] = cached
+        self._memory_size += cached.size
+        self._entry_runs[key] = run_key
+        self._runs.setdefault(run_key, set()).add(key)
+        while self._memory_size > self.max_bytes:
+            evicted_key, evicted = self._memory.popitem(last=False)
+            self._memory_size -= evicted.size
+            if not self._write(evicted_key, evicted):
+                self._forget(evicted_key)
+
+    def _forget(self, key: str):
+        run_key = self._entry_runs.pop(key, None)
+        keys = self._runs.get(run_key)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._runs[run_key]
+
+    def _drop(self, key: str):
+        cached = self._memory.pop(key, None)
+        if cached is not None:
+            self._memory_size -= cached.size
+        size = self._disk.pop(key, None)
+        if size is not None:
+            self._disk_size -= size
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+        self._forget(key)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(
+            self.directory, hashlib.sha1(key.encode("utf-8")).hexdigest()
+        )
+
+    def _write(self, key: str, cached: CachedResponse) -> bool:
+        "Moves a response evicted from memory to disk, returns whether it was written"
+        if not self.disk_max_bytes:
+            return False
+        content = cached.dumps()
+        if len(content) > self.disk_max_bytes:
+            return False
+        try:
+            if not self._disk_ready:
+                shutil.rmtree(self.directory, ignore_errors=True)
+                os.makedirs(self.directory, exist_ok=True)
+                self._disk_ready = True
+            with open(self._path(key), "wb") as f:
+                f.write(content)
+        except OSError:
+            logger.exception("Failed to write a cached response to disk")
+            return False
+        self._disk[key] = len(content)
+        self._disk_size += len(content)
+        while self._disk_size > self.disk_max_bytes:
+            self._drop(next(iter(self._disk)))
+        return True
+
+    def _read(self, key: str) -> Optional[CachedResponse]:
+        try:
+            with open(self._path(key), "rb") as f:
+                return CachedResponse.loads(f.read())
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def invalidate(self, flow_id: str, run):
+        "Drops the responses about a run, given by its number or id"
+        now = time.time()
+        for run_key in {(flow_id, str(run)), self._run_key(flow_id, run)}:
+            self._remember(self._invalidated, run_key, now)
+            for key in list(self._runs.get(run_key, [])):
+                self._drop(key)
+
+    def invalidate_notified(
+        self, operation, resources, data, table_name=None, filter_dict={}
+    ):
+        "Handler of database notifications, drops the responses about the run of the data"
+        if data and data.get("flow_id") and data.get("run_number") is not None:
+            self.invalidate(data["flow_id"], data["run_number"])
+
+    async def completed_run_number(self, db, flow_id: str, run):
+        """
+        Returns the number of a run given by its number or id if the run has completed
+        successfully, or None. Completed runs are remembered, incomplete ones are looked
+        up again after a few seconds.
+        """
+        run_key = self._run_key(flow_id, run)
+        if run_key in self._completed:
+            self._completed.move_to_end(run_key)
+            return run_key[1]
+        checked_at = self._incomplete.get((flow_id, str(run)))
+        if checked_at and time.time() - checked_at < INCOMPLETE_RUN_RECHECK_SECONDS:
+            return None
+
+        run_column, run_value = translate_run_key(run)
+        res, _ = await db.run_table_postgres.execute_sql(
+            select_sql="""
+                SELECT runs.run_number FROM {run_table} AS runs
+                JOIN {run_status_table} AS run_status ON (
+                    runs.flow_id = run_status.flow_id AND
+                    runs.run_number = run_status.run_number
+                )
+                WHERE runs.flow_id = %s AND runs.{run_column} = %s
+                AND run_status.end_attempt_ok IS TRUE
+                """.format(
+                run_table=RUN_TABLE_NAME,
+                run_status_table=RUN_STATUS_TABLE_NAME,
+                run_column=run_column,
+            ),
+            values=[flow_id, run_value],
+            serialize=False,
+        )
+        if res.response_code != 200 or not res.body:
+            self._remember(self._incomplete, (flow_id, str(run)), time.time())
+            return None
+        run_number = str(res.body[0][0])
+        self._remember(self._completed, (flow_id, run_number), True)
+        self._alias(flow_id, run, (flow_id, run_number))
+        self._incomplete.pop((flow_id, str(run)), None)
+        return run_number
+
+
+response_cache = ResponseCache(
+    max_bytes=response_cache_max_bytes,
+    ttl=response_cache_ttl_seconds,
+    directory=response_cache_dir,
+    disk_max_bytes=response_cache_disk_max_bytes,
+)
+
+
+def response_cache_middleware(db, cache: ResponseCache = None, excluded_apps=()):
+    """
+    Returns a middleware serving the GET responses about completed runs from the cache.
+    Other requests about a run, such as tag mutations, invalidate the responses about it.
+
+    Parameters
+    ----------
+    db : AsyncPostgresDB
+        database adapter used to look up whether runs have completed.
+    cache : ResponseCache (optional)
+        defaults to the response cache shared by the services of the process.
+    excluded_apps : List[web.Application] (optional)
+        sub-applications whose requests are left to their own middlewares, if any.
+    """
+    cache = cache or response_cache
+
+    @web.middleware
+    async def middleware(request, handler):
+        flow_id = request.match_info.get("flow_id")
+        run = request.match_info.get("run_number")
+        # requests of sub-applications are handled by the outermost middleware only
+        if (
+            not cache.enabled
+            or flow_id is None
+            or run is None
+            or request.get(HANDLED_KEY)
+            or any(app in excluded_apps for app in request.match_info.apps)
+        ):
+            return await handler(request)
+        request[HANDLED_KEY] = True
+
+        if request.method != "GET":
+            try:
+                return await handler(request)
+            finally:
+                cache.invalidate(flow_id, run)
+
+        resource = request.match_info.route.resource
+        if (
+            resource is None
+            or not CACHED_ROUTE.search(resource.canonical)
+            or any(param in request.query for param in UNCACHED_QUERY_PARAMETERS)
+        ):
+            return await handler(request)
+
+        key = "{}?{}".format(format_baseurl(request), request.query_string)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached.response(request)
+
+        started = time.time()
+        response = await handler(request)
+        if (
+            type(response) is not web.Response
+            or response.status != 200
+            or not isinstance(response.body, bytes)
+        ):
+            return response
+        run_number = await cache.completed_run_number(db, flow_id, run)
+        if run_number is None:
+            return response
+        cached = cache.put(key, flow_id, run, run_number, response, started)
+        return cached.response(request) if cached is not None else response
+
+    return middleware
@@ -8,3 +8,74 @@ max_startup_retries = int(os.environ.get("MF_SERVICE_STARTUP_RETRIES", 5))
 startup_retry_wait_time_seconds = int(
     os.environ.get("MF_SERVICE_STARTUP_WAITTIME_SECONDS", 1)
 )
+# Interval for flushing accumulated heartbeats. Set to 0 to write every heartbeat synchronously.
+heartbeat_flush_interval_seconds = float(
+    os.environ.get("MF_SERVICE_HEARTBEAT_FLUSH_INTERVAL_SECONDS", 1)
+)
+# Number of rows fetched per round trip when streaming large result sets from a server-side cursor.
+stream_batch_size = int(os.environ.get("MF_SERVICE_STREAM_BATCH_SIZE", 1000))
+# Execute generated queries as server-side prepared statements, so their plans are reused.
+use_prepared_statements = os.environ.get("MF_SERVICE_PREPARED_STATEMENTS", "0") in [
+    "True",
+    "true",
+    "1",
+]
+# Log queries slower than this many seconds, along with their plan. Set to 0 to disable.
+slow_query_threshold_seconds = float(
+    os.environ.get("MF_SERVICE_SLOW_QUERY_THRESHOLD_SECONDS", 0)
+)
+# Explain the plan of each slow query shape at most once per this many seconds,
+# with at most slow_query_max_explains EXPLAINs in flight per process.
+slow_query_explain_interval_seconds = float(
+    os.environ.get("MF_SERVICE_SLOW_QUERY_EXPLAIN_INTERVAL_SECONDS", 600)
+)
+slow_query_max_explains = int(os.environ.get("MF_SERVICE_SLOW_QUERY_MAX_EXPLAINS", 2))
+# Maximum number of connections of the shared pool that each database adapter may hold at a time,
+# f.ex. "ui:notify=1,ui:heartbeat=2". Adapters without a quota may use the whole pool.
+# The background adapters of the UI service are limited by default, so that they leave
+# the connections of the API to it.
+DEFAULT_POOL_QUOTAS = "ui:notify=1,ui:heartbeat=2,ui:websocket=2,ui:cache=5"
+pool_quotas = {
+    purpose.strip(): int(quota)
+    for purpose, _, quota in (
+        item.rpartition("=")
+        for item in os.environ.get("MF_SERVICE_POOL_QUOTAS", DEFAULT_POOL_QUOTAS).split(
+            ","
+        )
+        if item.strip()
+    )
+}
+# Maximum size of the shared pool of a database host. Set to 0 for the pool size of the
+# database configuration plus the quotas of the adapters of the service, see shared_pool_size()
+shared_pool_max = int(os.environ.get("MF_SERVICE_POOL_MAX", 0))
+# Seconds to wait for a connection within the quota of an adapter. Set to 0 to wait indefinitely.
+pool_acquire_timeout_seconds = float(
+    os.environ.get("MF_SERVICE_POOL_ACQUIRE_TIMEOUT_SECONDS", 0)
+)
+# Pooled connections idle for longer than this are closed, shrinking the pool back towards its minimum size.
+# Defaults to ten times the connection timeout of the database configuration.
+pool_idle_seconds = float(os.environ.get("MF_SERVICE_POOL_IDLE_SECONDS", 0))
+# Reads about a run that was written to by this process within this many seconds
+# are routed to the writer instead of the read replica.
+read_after_write_seconds = float(
+    os.environ.get("MF_SERVICE_READ_AFTER_WRITE_SECONDS", 5)
+)
+# Responses about completed runs are cached in memory, up to this many bytes. Set to 0 to disable the response cache.
+response_cache_max_bytes = int(
+    os.environ.get("MF_SERVICE_RESPONSE_CACHE_MAX_BYTES", 64 * 1024 * 1024)
+)
+# Cached responses are revalidated after this many seconds, which bounds how long
+# tag mutations made through other service instances go unnoticed.
+response_cache_ttl_seconds = float(
+    os.environ.get("MF_SERVICE_RESPONSE_CACHE_TTL_SECONDS", 60)
+)
+# The metadata service usually runs as several instances, which do not see the tag mutations
+# made through each other, so that its responses are only cached when enabled.
+response_cache_metadata_service = os.environ.get(
+    "MF_SERVICE_RESPONSE_CACHE_METADATA_SERVICE", "0"
+) in ["True", "true", "1"]
+# Directory of an optional disk tier for the responses evicted from memory, emptied on startup.
+response_cache_dir = os.environ.get("MF_SERVICE_RESPONSE_CACHE_DIR") or None
+response_cache_disk_max_bytes = int(
+    os.environ.get("MF_SERVICE_RESPONSE_CACHE_DISK_MAX_BYTES", 1024 * 1024 * 1024)
+)
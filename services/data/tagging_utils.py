@@ -1,4 +1,5 @@
 from services.data.db_utils import DBResponse
+from contextlib import aclosing
 import copy
 
 
@@ -34,3 +35,27 @@ async def apply_run_tags_to_db_response(
         item_as_dict["tags"] = run["tags"]
         item_as_dict["system_tags"] = run["system_tags"]
     return new_db_response
+
+
+async def apply_run_tags_to_batches(flow_id, run_number, run_table_postgres, batches):
+    """
+    Streaming counterpart of apply_run_tags_to_db_response for batches of rows,
+    such as the ones yielded by AsyncPostgresTable.stream_sql.
+
+    The ancestral run is only read once the first row arrives, and a failure to read it
+    raises an exception instead of returning an error response.
+    """
+    run = None
+    async with aclosing(batches):
+        async for batch in batches:
+            if run is None:
+                db_response_for_run = await run_table_postgres.get_run(
+                    flow_id, run_number
+                )
+                if db_response_for_run.response_code != 200:
+                    raise Exception(db_response_for_run.body)
+                run = db_response_for_run.body
+            for item_as_dict in batch:
+                item_as_dict["tags"] = run["tags"]
+                item_as_dict["system_tags"] = run["system_tags"]
+            yield batch
@@ -8,6 +8,7 @@ from multidict import MultiDict
 from aiohttp import web
 from botocore.client import Config
 from services.data.postgres_async_db import AsyncPostgresDB
+from services.data.query_metrics import PROMETHEUS_CONTENT_TYPE, query_metrics
 from services.utils import get_traceback_str
 from services.metadata_service.api.utils import (
     METADATA_SERVICE_VERSION,
@@ -22,6 +23,7 @@ class AuthApi(object):
         app.router.add_route("GET", "/ping", self.ping)
         app.router.add_route("GET", "/version", self.version)
         app.router.add_route("GET", "/healthcheck", self.healthcheck)
+        app.router.add_route("GET", "/metrics", self.metrics)
 
     async def version(self, request):
         """
@@ -92,6 +94,26 @@ class AuthApi(object):
             cur.close()
         return web_response(status=status_code, body=json.dumps(status))
 
+    async def metrics(self, request):
+        """
+        ---
+        description: Returns database query and connection pool metrics
+            in the Prometheus text format
+        tags:
+        - Admin
+        produces:
+        - 'text/plain'
+        responses:
+            "200":
+                description: successful operation. Return the metrics
+            "405":
+                description: invalid HTTP Method
+        """
+        return web.Response(
+            body=query_metrics.render([AsyncPostgresDB.get_instance()]).encode(),
+            headers=MultiDict({"Content-Type": PROMETHEUS_CONTENT_TYPE}),
+        )
+
     async def get_authorization_token(self, request):
         """
         ---
@@ -7,12 +7,16 @@ from services.data.db_utils import (
     encode_cursor,
     decode_cursor,
 )
-from services.data.tagging_utils import apply_run_tags_to_db_response
+from services.data.tagging_utils import (
+    apply_run_tags_to_batches,
+    apply_run_tags_to_db_response,
+)
 from services.utils import read_body
 from services.metadata_service.api.utils import (
     format_response,
     handle_exceptions,
     http_500,
+    stream_json_array,
 )
 import json
 
@@ -523,22 +527,15 @@ class ArtificatsApi(object):
                 return DBResponse(response_code=400, body="Invalid cursor")
 
         if limit is None and cursor is None:
-
-            db_response = await self._async_table.get_artifacts_in_runs(
-                flow_id, run_number
+            return await stream_json_array(
+                request,
+                apply_run_tags_to_batches(
+                    flow_id,
+                    run_number,
+                    self._async_run_table,
+                    self._async_table.stream_artifacts_in_runs(flow_id, run_number),
+                ),
             )
-            if db_response.response_code == 200:
-                db_response = await apply_run_tags_to_db_response(
-                    flow_id, run_number, self._async_run_table, db_response
-                )
-                filtered_body = filter_artifacts_for_latest_attempt(db_response.body)
-                return db_response._replace(body=filtered_body)
-            else:
-                error_response = http_500(db_response.body)
-                return DBResponse(
-                    response_code=error_response.response_code,
-                    body=error_response.body,
-                )
         else:
             limit = min(int(limit), 500) if limit else 50
             db_response, pagination = (
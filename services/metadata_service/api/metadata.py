@@ -1,7 +1,11 @@
 from aiohttp import web
 import json
 from services.utils import read_body
-from services.metadata_service.api.utils import format_response, handle_exceptions
+from services.metadata_service.api.utils import (
+    format_response,
+    handle_exceptions,
+    stream_json_array,
+)
 import asyncio
 from services.data.postgres_async_db import AsyncPostgresDB
 from services.data.db_utils import DBResponse, encode_cursor, decode_cursor
@@ -169,7 +173,10 @@ class MetadataApi(object):
                 return DBResponse(response_code=400, body="Invalid cursor")
 
         if limit is None and cursor is None:
-            return await self._async_table.get_metadata_in_runs(flow_name, run_number)
+            return await stream_json_array(
+                request,
+                self._async_table.stream_metadata_in_runs(flow_name, run_number),
+            )
 
         limit = min(int(limit), 500) if limit else 50
 
@@ -4,7 +4,11 @@ from itertools import chain
 from services.data.db_utils import DBResponse, encode_cursor, decode_cursor
 from services.data.models import RunRow
 from services.utils import has_heartbeat_capable_version_tag, read_body
-from services.metadata_service.api.utils import format_response, handle_exceptions
+from services.metadata_service.api.utils import (
+    format_response,
+    handle_exceptions,
+    stream_json_array,
+)
 from services.data.postgres_async_db import AsyncPostgresDB
 from services.data.filter_grammar import (
     builtin_conditions_query_dict,
@@ -199,7 +203,9 @@ class RunApi(object):
         # expect. New clients support filtering and cursor pagination together, so any
         # filter or pagination param drops through to the paginated path below.
         if not filter_conditions and cursor is None and limit is None:
-            return await self._async_table.get_all_runs(flow_name)
+            return await stream_json_array(
+                request, self._async_table.stream_all_runs(flow_name)
+            )
 
         conditions = ['"flow_id" = %s'] + filter_conditions
         values = [flow_name] + list(builtin_vals) + list(custom_vals)
@@ -1,4 +1,4 @@
-import json
+from contextlib import aclosing
 from functools import wraps
 
 import collections
@@ -6,9 +6,16 @@ from aiohttp import web
 from multidict import MultiDict
 from importlib import metadata
 
-from services.utils import get_traceback_str
+from services.utils import (
+    RESPONSE_COMPRESSION_THRESHOLD,
+    encode_json,
+    get_traceback_str,
+    json_web_response,
+    logging,
+)
 
 from services.data.db_utils import DBPagination
+from services.data.pool_manager import consistency_key, read_consistency_key
 
 version = metadata.version("metadata_service")
 METADATA_SERVICE_VERSION = version
@@ -16,6 +23,8 @@ METADATA_SERVICE_HEADER = "METADATA_SERVICE_VERSION"
 
 ServiceResponse = collections.namedtuple("ServiceResponse", "response_code body")
 
+logger = logging.getLogger("MetadataServiceApi")
+
 
 def format_response(func):
     """handle formatting"""
@@ -23,6 +32,9 @@ def format_response(func):
     @wraps(func)
     async def wrapper(*args, **kwargs):
         result = await func(*args, **kwargs)
+        if isinstance(result, web.StreamResponse):
+            # already written to the client, see stream_json_array
+            return result
         if type(result) is tuple and isinstance(result[-1], DBPagination):
             db_response, db_pagination = result
             headers = MultiDict(
@@ -33,26 +45,72 @@ def format_response(func):
             )
             if db_pagination.next_cursor:
                 headers["X-Next-Cursor"] = db_pagination.next_cursor
-            return web.Response(
+            return json_web_response(
                 status=db_response.response_code,
-                body=json.dumps(db_response.body),
+                body=db_response.body,
                 headers=headers,
+                content_type="text/plain",
             )
 
         db_response = result
-        return web.Response(
+        return json_web_response(
             status=db_response.response_code,
-            body=json.dumps(db_response.body),
+            body=db_response.body,
             headers=MultiDict({METADATA_SERVICE_HEADER: METADATA_SERVICE_VERSION}),
+            content_type="text/plain",
         )
 
     return wrapper
 
 
+async def stream_json_array(request, batches) -> web.StreamResponse:
+    """
+    Writes batches of rows to the client as a single JSON array, without holding
+    more than one batch in memory.
+
+    The first batch is read before the response is started, so that errors raised
+    by the query are still answered with a regular error response. Errors after that
+    point can no longer change the status, so the connection is closed instead,
+    leaving the client with an incomplete body.
+    """
+    async with aclosing(batches):
+        batch = await anext(batches, None)
+
+        response = web.StreamResponse(
+            status=200,
+            headers=MultiDict({METADATA_SERVICE_HEADER: METADATA_SERVICE_VERSION}),
+        )
+        response.content_type = "text/plain"
+        response.charset = "utf-8"
+        if RESPONSE_COMPRESSION_THRESHOLD:
+            # the size is not known up front, and streamed results are expected to be large
+            response.enable_compression()
+        await response.prepare(request)
+
+        try:
+            await response.write(b"[")
+            separator = b""
+            while batch is not None:
+                if batch:
+                    await response.write(
+                        separator + b",".join(encode_json(row) for row in batch)
+                    )
+                    separator = b","
+                batch = await anext(batches, None)
+            await response.write(b"]")
+        except Exception:
+            logger.exception("Streaming response interrupted")
+            response.force_close()
+            return response
+
+    await response.write_eof()
+    return response
+
+
 def web_response(status: int, body):
-    return web.Response(
+    return json_web_response(
         status=status,
-        body=json.dumps(body),
+        body=body,
         headers=MultiDict(
             {
                 "Content-Type": "application/json",
@@ -90,3 +148,21 @@ def handle_exceptions(func):
             return http_500(str(err))
 
     return wrapper
+
+
+@web.middleware
+async def read_consistency(request, handler):
+    """
+    Marks the reads of the request as being about the flow or run in its path,
+    so that they see recent writes to it. See ReadRouting.
+    """
+    flow_id = request.match_info.get("flow_id")
+    if flow_id is None:
+        return await handler(request)
+    token = read_consistency_key.set(
+        consistency_key(flow_id, request.match_info.get("run_number"))
+    )
+    try:
+        return await handler(request)
+    finally:
+        read_consistency_key.reset(token)
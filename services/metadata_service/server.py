@@ -1,5 +1,6 @@
 import asyncio
 import os
+import signal
 
 from aiohttp import web
 
@@ -12,12 +13,25 @@ from .api.artifact import ArtificatsApi
 from .api.admin import AuthApi
 
 from .api.metadata import MetadataApi
+from .api.utils import read_consistency
 from services.data.postgres_async_db import AsyncPostgresDB
+from services.data.response_cache import response_cache_middleware
+from services.data.service_configs import response_cache_metadata_service
 from services.utils import DBConfiguration
 
 PATH_PREFIX = os.environ.get("PATH_PREFIX", "")
 
 
+def flush_heartbeats_on_shutdown(db):
+    "Writes the heartbeats accepted by the handlers before the service stops"
+
+    async def _flush_heartbeats(_):
+        if db.heartbeats is not None:
+            await db.heartbeats.close()
+
+    return _flush_heartbeats
+
+
 def app(loop=None, db_conf: DBConfiguration = None, middlewares=None, path_prefix=""):
 
     loop = loop or asyncio.get_event_loop()
@@ -34,8 +48,13 @@ def app(loop=None, db_conf: DBConfiguration = None, middlewares=None, path_prefi
     ArtificatsApi(app)
     AuthApi(app)
 
+    _app.on_shutdown.append(flush_heartbeats_on_shutdown(async_db))
+
     if path_prefix:
         _app.add_subapp(path_prefix, app)
+    _app.middlewares.append(read_consistency)
+    if response_cache_metadata_service:
+        _app.middlewares.append(response_cache_middleware(async_db))
     if middlewares:
         _app.middlewares.extend(middlewares)
     return _app
@@ -53,10 +72,13 @@ def main():
 
     srv = loop.run_until_complete(f)
     print("serving on", srv.sockets[0].getsockname())
+    loop.add_signal_handler(signal.SIGTERM, loop.stop)
     try:
         loop.run_forever()
     except KeyboardInterrupt:
         pass
+    finally:
+        loop.run_until_complete(handler.cleanup())
 
 
 if __name__ == "__main__":
@@ -255,6 +255,58 @@ async def test_run_artifacts_get(cli, db):
     )
 
 
+async def test_run_artifacts_streamed_in_batches(cli, db):
+    _flow = (await add_flow(db, "TestFlow")).body
+    _run = (await add_run(db, flow_id=_flow["flow_id"])).body
+    _step = (
+        await add_step(
+            db,
+            flow_id=_run["flow_id"],
+            run_number=_run["run_number"],
+            step_name="first_step",
+        )
+    ).body
+    _task = (
+        await add_task(
+            db,
+            flow_id=_step["flow_id"],
+            run_number=_step["run_number"],
+            step_name=_step["step_name"],
+        )
+    ).body
+
+    for artifact in [ARTIFACT_A, ARTIFACT_B, {**ARTIFACT_A, "attempt_id": 1}]:
+        await add_artifact(
+            db,
+            flow_id=_task["flow_id"],
+            run_number=_task["run_number"],
+            step_name=_task["step_name"],
+            task_id=_task["task_id"],
+            artifact=artifact,
+        )
+
+    batches = [
+        batch
+        async for batch in db.artifact_table_postgres.stream_artifacts_in_runs(
+            _task["flow_id"], _task["run_number"], batch_size=1
+        )
+    ]
+
+    # only the latest attempt of the task is streamed, one row per batch
+    assert [[(a["name"], a["attempt_id"]) for a in batch] for batch in batches] == [
+        [("artifact-A", 1)]
+    ]
+
+    # the endpoint writes the batches out as a single json array
+    artifacts = [artifact for batch in batches for artifact in batch]
+    update_objects_with_run_tags("artifact", artifacts, _run)
+    await assert_api_get_response(
+        cli,
+        "/flows/{flow_id}/runs/{run_number}/artifacts".format(**_task),
+        data=artifacts,
+    )
+
+
 async def test_run_artifacts_pagination_get(cli, db):
     # create a flow, run, step and task for the test
     _flow = (
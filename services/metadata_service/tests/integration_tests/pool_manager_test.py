@@ -0,0 +1,80 @@
+import asyncio
+
+from services.data.pool_manager import (
+    PurposePool,
+    consistency_key,
+    read_consistency_key,
+    read_routing,
+)
+from services.data.postgres_async_db import _AsyncPostgresDB
+from services.utils.tests import get_test_dbconf
+from .utils import (
+    cli,
+    db,
+    add_flow,
+    add_run,
+)
+import pytest
+
+pytestmark = [pytest.mark.integration_tests]
+
+
+async def test_adapters_share_pool(cli, db):
+    other = _AsyncPostgresDB("other")
+    await other._init(get_test_dbconf(), create_triggers=False)
+
+    assert other.pool.shared is db.pool.shared
+    assert other.pool is not db.pool.shared
+    assert other.pool.purpose == "other"
+
+    with await other.pool.cursor() as cur:
+        await cur.execute("SELECT 1")
+        assert other.pool.in_use == 1
+        cur.close()
+    assert other.pool.in_use == 0
+
+
+async def test_purpose_quota(cli, db):
+    pool = PurposePool(db.pool.shared, "quota", "writer", quota=1, acquire_timeout=0.1)
+
+    async with pool.acquire() as conn:
+        assert pool.in_use == 1
+        # the quota is exhausted, even though the shared pool has free capacity
+        with pytest.raises(asyncio.TimeoutError):
+            await pool.cursor()
+        assert pool.waiting == 0
+
+        waiting = asyncio.ensure_future(pool.acquire())
+        await asyncio.sleep(0)
+        assert pool.waiting == 1
+    conn = await waiting
+    assert pool.in_use == 1
+    await pool.release(conn)
+    assert pool.in_use == 0
+
+
+async def test_read_after_write_routing(cli, db):
+    _flow = (await add_flow(db)).body
+    _run = (await add_run(db, flow_id=_flow["flow_id"])).body
+    table = db.run_table_postgres
+    key = consistency_key(_flow["flow_id"], _run["run_number"])
+    assert read_routing.use_writer(key)
+
+    # AsyncPostgresDB only proxies attribute reads, so configure the underlying instance
+    _db = table.db
+    writer, reader = _db.pool, _db.reader_pool
+    _db.reader_pool = PurposePool(writer.shared, "replica", "reader")
+    try:
+        assert table._read_pool() is _db.reader_pool
+        token = read_consistency_key.set(key)
+        try:
+            assert table._read_pool() is writer
+        finally:
+            read_consistency_key.reset(token)
+        token = read_consistency_key.set(consistency_key(_flow["flow_id"], 999))
+        try:
+            assert table._read_pool() is _db.reader_pool
+        finally:
+            read_consistency_key.reset(token)
+    finally:
+        _db.reader_pool = reader
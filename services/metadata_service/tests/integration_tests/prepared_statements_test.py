@@ -0,0 +1,65 @@
+from services.data.query_cache import (
+    PreparedStatements,
+    query_cache_stats,
+    statement_name,
+)
+from .utils import (
+    cli,
+    db,
+    add_flow,
+    add_run,
+)
+import pytest
+
+pytestmark = [pytest.mark.integration_tests]
+
+
+async def test_prepared_statements(cli, db):
+    _flow = (await add_flow(db)).body
+    _run = (await add_run(db, flow_id=_flow["flow_id"])).body
+    expected = await db.run_table_postgres.get_run(_flow["flow_id"], _run["run_number"])
+
+    # AsyncPostgresDB only proxies attribute reads, so configure the underlying instance
+    _db = db.run_table_postgres.db
+    _db.prepared_statements = PreparedStatements()
+    try:
+        stats = dict(query_cache_stats)
+        for _ in range(3):
+            response = await db.run_table_postgres.get_run(
+                _flow["flow_id"], _run["run_number"]
+            )
+            assert response == expected
+        prepared = query_cache_stats["prepared"] - stats.get("prepared", 0)
+        hits = query_cache_stats["prepared_hits"] - stats.get("prepared_hits", 0)
+        assert prepared >= 1
+        assert prepared + hits == 3
+
+        # the type of the parameter can not be inferred, so the statement is not prepared
+        fallbacks = query_cache_stats["prepared_fallbacks"]
+        response, _ = await db.run_table_postgres.execute_sql(
+            select_sql="SELECT %s IS NULL AS is_null", values=[None], serialize=False
+        )
+        assert response.response_code == 200
+        assert response.body[0]["is_null"] is True
+        assert query_cache_stats["prepared_fallbacks"] == fallbacks + 1
+    finally:
+        _db.prepared_statements = None
+
+
+async def test_prepared_statements_shared_connection(cli, db):
+    # adapters sharing pooled connections prepare statements under the same names
+    adapters = [PreparedStatements(max_size=2), PreparedStatements(max_size=2)]
+    fallbacks = query_cache_stats["prepared_fallbacks"]
+    with await db.pool.cursor() as cur:
+        for sql in ["SELECT 1", "SELECT 2", "SELECT 3", "SELECT 1"]:
+            for adapter in adapters:
+                await adapter.execute(cur, sql)
+                assert (await cur.fetchall())[0][0] == int(sql[-1])
+
+        # the least recently used statements are deallocated
+        await cur.execute("SELECT name FROM pg_prepared_statements")
+        names = {row[0] for row in await cur.fetchall()}
+    assert statement_name("SELECT 3") in names
+    assert statement_name("SELECT 1") in names
+    assert statement_name("SELECT 2") not in names
+    assert query_cache_stats["prepared_fallbacks"] == fallbacks
@@ -0,0 +1,101 @@
+import asyncio
+import logging
+
+from services.data import postgres_async_db
+from services.data.query_metrics import PROMETHEUS_CONTENT_TYPE
+from .utils import (
+    cli,
+    db,
+    add_flow,
+    add_run,
+)
+import pytest
+
+pytestmark = [pytest.mark.integration_tests]
+
+
+async def test_metrics_endpoint(cli, db):
+    _flow = (await add_flow(db)).body
+    await add_run(db, flow_id=_flow["flow_id"])
+    # the listing is streamed, read it through to the end of the query
+    await (await cli.get("/flows/{}/runs".format(_flow["flow_id"]))).text()
+
+    resp = await cli.get("/metrics")
+    assert resp.status == 200
+    assert resp.headers["Content-Type"] == PROMETHEUS_CONTENT_TYPE
+    text = await resp.text()
+
+    assert (
+        'mf_db_query_duration_seconds_count{table="runs_v3",operation="insert"' in text
+    )
+    assert 'mf_db_query_rows_bucket{table="runs_v3",operation="stream"' in text
+    assert 'mf_db_connection_acquire_seconds_count{db="global",pool="writer"}' in text
+    assert 'mf_db_pool_connections{pool="writer",state="max"}' in text
+    assert (
+        'mf_db_pool_purpose_connections{db="global",pool="writer",state="quota"}'
+        in text
+    )
+    assert 'pool="reader"' not in text
+
+
+async def test_slow_query_log(cli, db, monkeypatch, caplog):
+    _flow = (await add_flow(db)).body
+    _run = (await add_run(db, flow_id=_flow["flow_id"])).body
+
+    monkeypatch.setattr(postgres_async_db, "slow_query_threshold_seconds", 1e-9)
+    explains = postgres_async_db.SlowQueryExplains(interval=60, max_in_flight=1)
+    monkeypatch.setattr(postgres_async_db, "slow_query_explains", explains)
+    with caplog.at_level(logging.WARNING):
+        await db.run_table_postgres.get_run(_flow["flow_id"], _run["run_number"])
+        await explains.join()
+        # queries of a shape that was explained recently are logged without a plan
+        await db.run_table_postgres.get_run(_flow["flow_id"], _run["run_number"])
+        await explains.join()
+
+    first, second = [
+        r.getMessage()
+        for r in caplog.records
+        if "Slow query on runs_v3" in r.getMessage()
+    ]
+    assert '"Node Type"' in first
+    assert 'Plan: "explained recently"' in second
+
+
+def test_slow_query_explains_limited():
+    explains = postgres_async_db.SlowQueryExplains(interval=60, max_in_flight=1)
+    assert explains.should_explain("runs_v3", "SELECT 1")
+    assert not explains.should_explain("runs_v3", "SELECT 1")
+    assert explains.should_explain("flows_v3", "SELECT 1")
+
+    # no more EXPLAINs than max_in_flight run at a time
+    explains._in_flight.add(object())
+    assert not explains.should_explain("runs_v3", "SELECT 2")
+    explains._in_flight.clear()
+    assert explains.should_explain("runs_v3", "SELECT 2")
+
+    explains.interval = 0
+    assert explains.should_explain("runs_v3", "SELECT 1")
+
+
+async def test_stream_duration_excludes_consumer(cli, db, monkeypatch):
+    _flow = (await add_flow(db)).body
+    for _ in range(3):
+        await add_run(db, flow_id=_flow["flow_id"])
+
+    observed = []
+    monkeypatch.setattr(
+        db.run_table_postgres,
+        "_observe_query",
+        lambda operation, sql, values, duration, rows: observed.append(
+            (operation, duration, rows)
+        ),
+    )
+    async for _ in db.run_table_postgres.stream_sql(
+        "SELECT * FROM runs_v3", batch_size=1
+    ):
+        await asyncio.sleep(0.1)
+
+    [(operation, duration, rows)] = observed
+    assert operation == "stream"
+    assert rows == 3
+    assert duration < 0.3
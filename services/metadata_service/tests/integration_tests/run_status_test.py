@@ -0,0 +1,84 @@
+from services.data.postgres_async_db import RUN_STATUS_TABLE_NAME
+from .utils import (
+    cli,
+    db,
+    add_flow,
+    add_run,
+    add_metadata,
+)
+import pytest
+
+pytestmark = [pytest.mark.integration_tests]
+
+
+async def _get_run_status(db, run):
+    result = await db.run_table_postgres.execute_sql(
+        select_sql="""
+            SELECT end_attempt_ok, end_attempt_ok_ts, end_attempt_started_at
+            FROM {table_name}
+            WHERE flow_id = %s AND run_number = %s
+        """.format(table_name=RUN_STATUS_TABLE_NAME),
+        values=(run["flow_id"], run["run_number"]),
+        serialize=False,
+    )
+    return [dict(row) for row in result[0].body]
+
+
+async def _add_end_metadata(db, run, field_name, value):
+    await add_metadata(
+        db,
+        flow_id=run["flow_id"],
+        run_number=run["run_number"],
+        step_name="end",
+        task_id=1,
+        metadata={"field_name": field_name, "value": value, "type": field_name},
+    )
+
+
+async def test_run_status_maintained_on_insert(cli, db):
+    _flow = (await add_flow(db)).body
+    _run = (await add_run(db, flow_id=_flow["flow_id"])).body
+
+    # metadata of other steps does not affect the run status
+    await add_metadata(
+        db,
+        flow_id=_run["flow_id"],
+        run_number=_run["run_number"],
+        step_name="start",
+        task_id=1,
+        metadata={"field_name": "attempt_ok", "value": "True", "type": "attempt_ok"},
+    )
+    assert await _get_run_status(db, _run) == []
+
+    await _add_end_metadata(db, _run, "attempt", "0")
+    await _add_end_metadata(db, _run, "attempt_ok", "False")
+    [status] = await _get_run_status(db, _run)
+    assert status["end_attempt_ok"] is False
+    assert status["end_attempt_started_at"] <= status["end_attempt_ok_ts"]
+
+    # a retry of the end step
+    await _add_end_metadata(db, _run, "attempt", "1")
+    [status] = await _get_run_status(db, _run)
+    assert status["end_attempt_ok_ts"] <= status["end_attempt_started_at"]
+
+    await _add_end_metadata(db, _run, "attempt_ok", "True")
+    [status] = await _get_run_status(db, _run)
+    assert status["end_attempt_ok"] is True
+
+
+async def test_run_status_backfill(cli, db):
+    _flow = (await add_flow(db)).body
+    _run = (await add_run(db, flow_id=_flow["flow_id"])).body
+    await _add_end_metadata(db, _run, "attempt", "0")
+    await _add_end_metadata(db, _run, "attempt_ok", "True")
+    expected = await _get_run_status(db, _run)
+
+    with await db.pool.cursor() as cur:
+        await cur.execute("DELETE FROM {}".format(RUN_STATUS_TABLE_NAME))
+    assert await _get_run_status(db, _run) == []
+
+    resp = await cli.patch("/migration/backfill/run_status")
+    assert resp.status == 200
+    assert (await resp.json())["rows"] == 1
+
+    assert await _get_run_status(db, _run) == expected
@@ -0,0 +1,97 @@
+import asyncio
+
+from services.data.postgres_async_db import TAG_DICTIONARY_TABLE_NAME
+from .utils import (
+    cli,
+    db,
+    add_flow,
+    add_run,
+)
+import pytest
+
+pytestmark = [pytest.mark.integration_tests]
+
+
+async def _get_tag_counts(db):
+    result = await db.run_table_postgres.execute_sql(
+        select_sql="SELECT tag, count FROM {table_name}".format(
+            table_name=TAG_DICTIONARY_TABLE_NAME
+        ),
+        serialize=False,
+    )
+    return {tag: count for tag, count in result[0].body}
+
+
+async def test_tag_dictionary_maintained_on_insert(cli, db):
+    _flow = (await add_flow(db)).body
+    await add_run(db, flow_id=_flow["flow_id"], tags=["a", "b"], system_tags=["b"])
+    assert await _get_tag_counts(db) == {"a": 1, "b": 1}
+
+    await add_run(db, flow_id=_flow["flow_id"], tags=["a"], system_tags=["c"])
+    assert await _get_tag_counts(db) == {"a": 2, "b": 1, "c": 1}
+
+
+async def test_tag_dictionary_maintained_on_tag_mutation(cli, db):
+    _flow = (await add_flow(db)).body
+    _run = (
+        await add_run(db, flow_id=_flow["flow_id"], tags=["a"], system_tags=["sys"])
+    ).body
+    await add_run(db, flow_id=_flow["flow_id"], tags=["a"], system_tags=["sys"])
+
+    resp = await cli.patch(
+        "/flows/{flow_id}/runs/{run_number}/tag/mutate".format(**_run),
+        json={"tags_to_add": ["b"], "tags_to_remove": ["a"]},
+    )
+    assert resp.status == 200
+    assert await _get_tag_counts(db) == {"a": 1, "b": 1, "sys": 2}
+
+    # unused tags are kept with a count of 0
+    await db.run_table_postgres.update_run_tags(_run["flow_id"], _run["run_number"], [])
+    assert await _get_tag_counts(db) == {"a": 1, "b": 0, "sys": 2}
+
+
+async def test_tag_dictionary_concurrent_writes(cli, db):
+    _flow = (await add_flow(db)).body
+    tags = ["tag-{}".format(i) for i in range(10)]
+    # concurrent runs write the rows of the same tags, listed in different orders
+    await asyncio.gather(
+        *(
+            add_run(
+                db,
+                flow_id=_flow["flow_id"],
+                tags=tags if i % 2 else list(reversed(tags)),
+                system_tags=[],
+            )
+            for i in range(20)
+        )
+    )
+    assert await _get_tag_counts(db) == {tag: 20 for tag in tags}
+
+
+async def test_tag_dictionary_backfill(cli, db):
+    _flow = (await add_flow(db)).body
+    await add_run(db, flow_id=_flow["flow_id"], tags=["a", "b"], system_tags=["c"])
+    await add_flow(db, flow_id="OtherFlow")
+    await add_run(db, flow_id="OtherFlow", tags=["a"], system_tags=["d"])
+    expected = await _get_tag_counts(db)
+
+    with await db.pool.cursor() as cur:
+        await cur.execute("UPDATE {} SET count = 5".format(TAG_DICTIONARY_TABLE_NAME))
+        await cur.execute(
+            "INSERT INTO {} (tag, count, last_seen) VALUES ('gone', 1, 0)".format(
+                TAG_DICTIONARY_TABLE_NAME
+            )
+        )
+
+    # only the tags used by the runs of the flow are recounted
+    resp = await cli.patch(
+        "/migration/backfill/tag_dictionary?flow_id={}".format(_flow["flow_id"])
+    )
+    assert resp.status == 200
+    assert (await resp.json())["rows"] == 3
+    assert await _get_tag_counts(db) == dict(expected, d=5, gone=1)
+
+    resp = await cli.patch("/migration/backfill/tag_dictionary")
+    assert resp.status == 200
+    assert (await resp.json())["rows"] == 2
+    assert await _get_tag_counts(db) == dict(expected, gone=0)
@@ -0,0 +1,146 @@
+from services.data.postgres_async_db import TASK_ATTEMPT_TABLE_NAME
+from .utils import (
+    cli,
+    db,
+    add_flow,
+    add_run,
+    add_step,
+    add_task,
+    add_metadata,
+    add_artifact,
+)
+import pytest
+
+pytestmark = [pytest.mark.integration_tests]
+
+
+async def _get_task_attempts(db, task):
+    result = await db.task_table_postgres.execute_sql(
+        select_sql="""
+            SELECT attempt_id, started_at, attempt_finished_at, attempt_ok,
+                task_ok_finished_at, task_ok_location
+            FROM {table_name}
+            WHERE flow_id = %s AND run_number = %s AND step_name = %s AND task_id = %s
+            ORDER BY attempt_id
+        """.format(table_name=TASK_ATTEMPT_TABLE_NAME),
+        values=(
+            task["flow_id"],
+            task["run_number"],
+            task["step_name"],
+            task["task_id"],
+        ),
+        serialize=False,
+    )
+    return [dict(row) for row in result[0].body]
+
+
+async def _add_attempts(db):
+    _flow = (await add_flow(db)).body
+    _run = (await add_run(db, flow_id=_flow["flow_id"])).body
+    _step = (
+        await add_step(db, flow_id=_run["flow_id"], run_number=_run["run_number"])
+    ).body
+    _task = (
+        await add_task(
+            db,
+            flow_id=_step["flow_id"],
+            run_number=_step["run_number"],
+            step_name=_step["step_name"],
+        )
+    ).body
+
+    for field_name, value, tags in [
+        ("attempt", "0", ["attempt_id:0"]),
+        ("attempt_ok", "False", ["attempt_id:0"]),
+        ("attempt", "1", ["attempt_id:1"]),
+        ("attempt-done", "1", ["attempt_id:1"]),
+        # malformed values are ignored instead of failing the insert
+        ("attempt", "not-an-attempt", []),
+    ]:
+        await add_metadata(
+            db,
+            flow_id=_task["flow_id"],
+            run_number=_task["run_number"],
+            step_name=_task["step_name"],
+            task_id=_task["task_id"],
+            metadata={"field_name": field_name, "value": value, "type": field_name},
+            tags=tags,
+        )
+    await add_artifact(
+        db,
+        flow_id=_task["flow_id"],
+        run_number=_task["run_number"],
+        step_name=_task["step_name"],
+        task_id=_task["task_id"],
+        artifact={"name": "_task_ok", "location": "location", "attempt_id": 1},
+    )
+    return _task
+
+
+def _assert_attempts(attempts):
+    assert [attempt["attempt_id"] for attempt in attempts] == [0, 1]
+    first, second = attempts
+
+    assert first["started_at"] is not None
+    assert first["attempt_finished_at"] is not None
+    assert first["attempt_ok"] is False
+    assert first["task_ok_location"] is None
+
+    assert second["started_at"] is not None
+    assert second["attempt_finished_at"] is not None
+    assert second["attempt_ok"] is None
+    assert second["task_ok_finished_at"] is not None
+    assert second["task_ok_location"] == "location"
+
+
+async def test_task_attempts_maintained_on_insert(cli, db):
+    _task = await _add_attempts(db)
+
+    _assert_attempts(await _get_task_attempts(db, _task))
+
+
+async def test_task_attempts_backfill(cli, db):
+    _task = await _add_attempts(db)
+    with await db.pool.cursor() as cur:
+        await cur.execute("DELETE FROM {}".format(TASK_ATTEMPT_TABLE_NAME))
+    assert await _get_task_attempts(db, _task) == []
+
+    resp = await cli.patch(
+        "/migration/backfill/task_attempts",
+        params={"flow_id": _task["flow_id"]},
+    )
+    assert resp.status == 200
+    assert (await resp.json())["rows"] == 2
+
+    _assert_attempts(await _get_task_attempts(db, _task))
+
+    resp = await cli.patch("/migration/backfill/unknown")
+    assert resp.status == 404
+
+
+@pytest.mark.parametrize(
+    "value, attempt_id, attempt_ok",
+    [
+        ("0", 0, False),
+        ('["1"]', 1, True),
+        ("[2]", 2, None),
+        ("True", None, True),
+        ('["false"]', None, False),
+        ("not-an-attempt", None, None),
+        ("99999999999", None, None),
+        ("[]", None, None),
+        (None, None, None),
+    ],
+)
+async def test_task_attempts_value_casts(cli, db, value, attempt_id, attempt_ok):
+    # malformed values are cast to NULL instead of raising
+    with await db.pool.cursor() as cur:
+        await cur.execute(
+            """
+            SELECT
+                task_attempts_to_int(task_attempts_metadata_value(%s)),
+                task_attempts_to_bool(task_attempts_metadata_value(%s))
+            """,
+            [value, value],
+        )
+        assert await cur.fetchone() == (attempt_id, attempt_ok)
@@ -212,6 +212,47 @@ async def test_task_heartbeat_post(cli, db):
     )
 
 
+async def test_task_heartbeats_batch_update(cli, db):
+    _flow = (await add_flow(db)).body
+    _run = (await add_run(db, flow_id=_flow["flow_id"])).body
+    _step = (
+        await add_step(db, flow_id=_run["flow_id"], run_number=_run["run_number"])
+    ).body
+    _tasks = [
+        (
+            await add_task(
+                db,
+                flow_id=_step["flow_id"],
+                run_number=_step["run_number"],
+                step_name=_step["step_name"],
+            )
+        ).body
+        for _ in range(2)
+    ]
+
+    key_columns = ["flow_id", "run_number", "step_name", "task_id"]
+    rows = [
+        tuple(str(task[col]) for col in key_columns) + (1000 + idx,)
+        for idx, task in enumerate(_tasks)
+    ]
+    updated = await db.task_table_postgres.update_heartbeats(key_columns, rows)
+    assert updated == 2
+
+    # heartbeats within the wait time are throttled
+    updated = await db.task_table_postgres.update_heartbeats(
+        key_columns, [row[:-1] + (row[-1] + 1,) for row in rows]
+    )
+    assert updated == 0
+
+    for idx, task in enumerate(_tasks):
+        _found = (
+            await db.task_table_postgres.get_task(
+                task["flow_id"], task["run_number"], task["step_name"], task["task_id"]
+            )
+        ).body
+        assert _found["last_heartbeat_ts"] == 1000 + idx
+
+
 async def test_tasks_get(cli, db):
     # create a flow, run and step for the test
     _flow = (
@@ -5,7 +5,12 @@ import pytest
 import psycopg2
 import psycopg2.extras
 from aiohttp import web
-from services.data.postgres_async_db import AsyncPostgresDB
+from services.data.postgres_async_db import (
+    AsyncPostgresDB,
+    TASK_ATTEMPT_TABLE_NAME,
+    RUN_STATUS_TABLE_NAME,
+    TAG_DICTIONARY_TABLE_NAME,
+)
 from services.utils.tests import get_test_dbconf
 from services.metadata_service.api.admin import AuthApi
 from services.metadata_service.api.flow import FlowApi
@@ -14,6 +19,7 @@ from services.metadata_service.api.step import StepApi
 from services.metadata_service.api.task import TaskApi
 from services.metadata_service.api.artifact import ArtificatsApi
 from services.metadata_service.api.metadata import MetadataApi
+from services.metadata_service.api.utils import read_consistency
 
 # Migration imports
 from services.migration_service.api.admin import AdminApi as MigrationAdminApi
@@ -25,7 +31,7 @@ from services.migration_service.data.postgres_async_db import (
 
 
 async def init_app(aiohttp_client, queue_ttl=30):
-    app = web.Application()
+    app = web.Application(middlewares=[read_consistency])
 
     # Migration routes as a subapp
     migration_app = web.Application()
@@ -75,6 +81,15 @@ async def clean_db(db: AsyncPostgresDB):
             await table.execute_sql(
                 select_sql="DELETE FROM {}".format(table.table_name), cur=cur
             )
+        # tables maintained by database triggers
+        for table_name in [
+            TASK_ATTEMPT_TABLE_NAME,
+            RUN_STATUS_TABLE_NAME,
+            TAG_DICTIONARY_TABLE_NAME,
+        ]:
+            await db.task_table_postgres.execute_sql(
+                select_sql="DELETE FROM {}".format(table_name), cur=cur
+            )
 
 
 @pytest.fixture
@@ -16,9 +16,7 @@ async def test_handle_exceptions():
     # wrapper should not touch successful calls.
     assert await do_not_raise()
 
-    # NOTE: aiohttp Response StringPayload only has the internal property _value for accessing the payload value.
-
     response_without_id = await raise_without_id()
     assert response_without_id.status == 500
-    _body = json.loads(response_without_id.body._value)
+    _body = json.loads(response_without_id.body)
     assert _body["traceback"] is not None
@@ -0,0 +1,114 @@
+import asyncio
+
+import pytest
+from aiohttp import web
+
+from services.data.db_utils import new_heartbeat_ts
+from services.data.heartbeats import HeartbeatAccumulator
+from services.metadata_service.server import flush_heartbeats_on_shutdown
+
+pytestmark = [pytest.mark.unit_tests]
+
+WAIT_TIME = 10
+
+
+class MockTable(object):
+    table_name = "tasks_v3"
+
+    def __init__(self):
+        self.updates = []
+
+    async def update_heartbeats(self, key_columns, rows):
+        self.updates.append((key_columns, rows))
+        await asyncio.sleep(0.01)
+        return len(rows)
+
+
+def _task(task_id):
+    return {
+        "flow_id": "HelloFlow",
+        "run_number": "1",
+        "step_name": "start",
+        "task_id": str(task_id),
+    }
+
+
+async def test_unknown_row_is_written_synchronously():
+    accumulator = HeartbeatAccumulator(flush_interval=60, wait_time=WAIT_TIME)
+    table = MockTable()
+
+    assert accumulator.register(table, _task(1), new_heartbeat_ts()) is None
+
+
+async def test_heartbeats_are_throttled_and_coalesced():
+    accumulator = HeartbeatAccumulator(flush_interval=60, wait_time=WAIT_TIME)
+    table = MockTable()
+    hb = new_heartbeat_ts()
+
+    for task_id in range(3):
+        accumulator.accepted(table, _task(task_id), hb - WAIT_TIME)
+
+    # throttled, same as a synchronous update
+    assert accumulator.register(table, _task(0), hb - 1) == 404
+
+    for task_id in range(3):
+        assert accumulator.register(table, _task(task_id), hb) == 200
+
+    # heartbeats within the wait time after an accumulated one are throttled as well
+    assert accumulator.register(table, _task(0), hb + 1) == 404
+
+    await accumulator.flush()
+
+    assert len(table.updates) == 1
+    key_columns, rows = table.updates[0]
+    assert key_columns == ["flow_id", "run_number", "step_name", "task_id"]
+    assert rows == [
+        ("HelloFlow", "1", "start", str(task_id), hb) for task_id in range(3)
+    ]
+
+    # nothing left to flush
+    await accumulator.flush()
+    assert len(table.updates) == 1
+
+
+async def test_heartbeats_registered_while_flushing_are_flushed():
+    accumulator = HeartbeatAccumulator(flush_interval=0.01, wait_time=WAIT_TIME)
+    table = MockTable()
+    hb = new_heartbeat_ts()
+    for task_id in range(2):
+        accumulator.accepted(table, _task(task_id), hb - WAIT_TIME)
+
+    assert accumulator.register(table, _task(0), hb) == 200
+    while not table.updates:
+        await asyncio.sleep(0.005)
+    # the first flush is writing its heartbeats
+    assert accumulator.register(table, _task(1), hb) == 200
+    await asyncio.sleep(0.1)
+
+    assert [rows for _, rows in table.updates] == [
+        [("HelloFlow", "1", "start", "0", hb)],
+        [("HelloFlow", "1", "start", "1", hb)],
+    ]
+
+
+async def test_heartbeats_flushed_on_shutdown():
+    accumulator = HeartbeatAccumulator(flush_interval=60, wait_time=WAIT_TIME)
+    table = MockTable()
+    hb = new_heartbeat_ts()
+    accumulator.accepted(table, _task(0), hb - WAIT_TIME)
+    assert accumulator.register(table, _task(0), hb) == 200
+
+    app = web.Application()
+    app.on_shutdown.append(
+        flush_heartbeats_on_shutdown(type("DB", (), {"heartbeats": accumulator}))
+    )
+    app.freeze()
+    await app.shutdown()
+
+    assert table.updates == [
+        (
+            ["flow_id", "run_number", "step_name", "task_id"],
+            [("HelloFlow", "1", "start", "0", hb)],
+        )
+    ]
+    assert accumulator._flush_timer is None
@@ -0,0 +1,40 @@
+import pytest
+
+from services.data.query_cache import (
+    QueryShapeCache,
+    query_cache_stats,
+    to_prepared_sql,
+)
+
+pytestmark = [pytest.mark.unit_tests]
+
+
+def test_to_prepared_sql():
+    assert to_prepared_sql("SELECT 1") == ("SELECT 1", 0)
+    assert to_prepared_sql(
+        "SELECT * FROM t WHERE a = %s AND b LIKE 'x%%' LIMIT %s"
+    ) == ("SELECT * FROM t WHERE a = $1 AND b LIKE 'x%' LIMIT $2", 2)
+
+
+def test_query_shape_cache():
+    cache = QueryShapeCache(max_size=2)
+    renders = []
+
+    def _render(sql):
+        def _fn():
+            renders.append(sql)
+            return sql
+
+        return _fn
+
+    hits = query_cache_stats["shape_hits"]
+    assert cache.get("a", _render("A")) == "A"
+    assert cache.get("a", _render("other")) == "A"
+    assert query_cache_stats["shape_hits"] == hits + 1
+
+    cache.get("b", _render("B"))
+    cache.get("a", _render("A"))
+    # least recently used shape is evicted
+    cache.get("c", _render("C"))
+    cache.get("b", _render("B"))
+    assert renders == ["A", "B", "C", "B"]
@@ -0,0 +1,46 @@
+import pytest
+
+from services.data.query_metrics import Histogram, QueryMetrics
+
+pytestmark = [pytest.mark.unit_tests]
+
+
+def test_histogram_samples():
+    histogram = Histogram((1, 10))
+    for value in [0, 1, 5, 50]:
+        histogram.observe(value)
+
+    assert histogram.samples("rows", 'a="b"') == [
+        'rows_bucket{a="b",le="1"} 2',
+        'rows_bucket{a="b",le="10"} 3',
+        'rows_bucket{a="b",le="+Inf"} 4',
+        'rows_sum{a="b"} 56',
+        'rows_count{a="b"} 4',
+    ]
+
+
+def test_query_metrics_render():
+    metrics = QueryMetrics()
+    metrics.observe_query("runs_v3", "select", "SELECT 1", 0.002, 1)
+    metrics.observe_query("runs_v3", "select", "SELECT 1", 0.2, 1)
+    metrics.observe_error("runs_v3", "update")
+    metrics.observe_acquire("global", "writer", 0.0005, waited=True)
+    shape = metrics.shape("SELECT 1")
+
+    lines = metrics.render().splitlines()
+    labels = 'table="runs_v3",operation="select",shape="{}"'.format(shape)
+    assert "mf_db_query_duration_seconds_count{%s} 2" % labels in lines
+    assert 'mf_db_query_duration_seconds_bucket{%s,le="0.0025"} 1' % labels in lines
+    assert 'mf_db_query_rows_bucket{%s,le="1"} 2' % labels in lines
+    assert 'mf_db_query_errors_total{table="runs_v3",operation="update"} 1' in lines
+    assert 'mf_db_pool_waits_total{db="global",pool="writer"} 1' in lines
+    assert "# TYPE mf_db_connection_acquire_seconds histogram" in lines
+
+
+def test_query_shapes_are_bounded(monkeypatch):
+    monkeypatch.setattr("services.data.query_metrics.MAX_SHAPES", 2)
+    metrics = QueryMetrics()
+    first = metrics.shape("SELECT 1")
+    assert metrics.shape("SELECT 2") != first
+    assert metrics.shape("SELECT 3") == "other"
+    assert metrics.shape("SELECT 1") == first
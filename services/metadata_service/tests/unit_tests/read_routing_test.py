@@ -0,0 +1,87 @@
+import time
+
+import pytest
+
+from services.data import pool_manager
+from services.data.pool_manager import (
+    ReadRouting,
+    consistency_key,
+    read_consistency_key,
+    shared_pool_size,
+    write_consistency_keys,
+)
+
+pytestmark = [pytest.mark.unit_tests]
+
+
+def test_write_consistency_keys():
+    assert write_consistency_keys({"flow_id": "HelloFlow"}) == [("HelloFlow", None)]
+    assert write_consistency_keys(
+        {"flow_id": "HelloFlow", "run_number": 1, "run_id": "argo-helloflow"}
+    ) == [("HelloFlow", "1"), ("HelloFlow", "argo-helloflow")]
+    assert write_consistency_keys({"flow_id": "HelloFlow", "run_id": None}) == [
+        ("HelloFlow", None)
+    ]
+    assert write_consistency_keys({"user_name": "tester"}) == []
+
+
+def test_reads_after_write_use_writer():
+    routing = ReadRouting(window=60)
+    routing.record_write(
+        write_consistency_keys({"flow_id": "HelloFlow", "run_number": 1})
+    )
+
+    assert routing.use_writer(consistency_key("HelloFlow", 1))
+    assert routing.use_writer(consistency_key("HelloFlow", "1"))
+    assert not routing.use_writer(consistency_key("HelloFlow", 2))
+    assert not routing.use_writer(consistency_key("HelloFlow"))
+
+    # reads without a key in the current context go to the reader
+    assert not routing.use_writer()
+    token = read_consistency_key.set(consistency_key("HelloFlow", 1))
+    try:
+        assert routing.use_writer()
+    finally:
+        read_consistency_key.reset(token)
+
+
+def test_writes_expire(monkeypatch):
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now)
+    routing = ReadRouting(window=5)
+    routing.record_write([consistency_key("HelloFlow", 1)])
+
+    now += 3
+    routing.record_write([consistency_key("HelloFlow", 2)])
+    assert routing.use_writer(consistency_key("HelloFlow", 1))
+
+    now += 3
+    assert not routing.use_writer(consistency_key("HelloFlow", 1))
+    assert routing.use_writer(consistency_key("HelloFlow", 2))
+
+    # expired writes are dropped on the next write
+    routing.record_write([consistency_key("HelloFlow", 3)])
+    assert list(routing._writes) == [
+        consistency_key("HelloFlow", 2),
+        consistency_key("HelloFlow", 3),
+    ]
+
+
+def test_read_routing_disabled():
+    routing = ReadRouting(window=0)
+    routing.record_write([consistency_key("HelloFlow", 1)])
+    assert not routing.use_writer(consistency_key("HelloFlow", 1))
+
+
+def test_shared_pool_size(monkeypatch):
+    monkeypatch.setattr(
+        pool_manager, "pool_quotas", {"ui:notify": 1, "ui:cache": 5, "other:x": 3}
+    )
+    monkeypatch.setattr(pool_manager, "shared_pool_max", 0)
+    # the quotas of the adapters of the service are added to the pool size
+    assert shared_pool_size(10, "ui") == 16
+    assert shared_pool_size(10, "ui:notify") == 16
+    assert shared_pool_size(10, "global") == 10
+
+    monkeypatch.setattr(pool_manager, "shared_pool_max", 60)
+    assert shared_pool_size(10, "ui") == 60
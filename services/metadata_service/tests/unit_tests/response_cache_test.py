@@ -0,0 +1,201 @@
+import time
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import make_mocked_request
+
+from services.data import response_cache
+from services.data.db_utils import DBResponse
+from services.data.response_cache import (
+    CachedResponse,
+    ResponseCache,
+    response_cache_middleware,
+)
+
+pytestmark = [pytest.mark.unit_tests]
+
+
+def _response(body: bytes) -> web.Response:
+    return web.Response(body=body, content_type="application/json")
+
+
+def test_cached_response_revalidation():
+    cached = CachedResponse.from_response(_response(b'{"a": 1}'))
+    assert cached.etag.startswith('W/"')
+
+    response = cached.response(make_mocked_request("GET", "/"))
+    assert response.status == 200
+    assert response.body == b'{"a": 1}'
+    assert response.content_type == "application/json"
+    assert response.headers["ETag"] == cached.etag
+    last_modified = response.headers["Last-Modified"]
+
+    for headers in [
+        {"If-None-Match": cached.etag},
+        {"If-None-Match": '"other", ' + cached.etag[2:]},
+        {"If-Modified-Since": last_modified},
+    ]:
+        response = cached.response(make_mocked_request("GET", "/", headers=headers))
+        assert response.status == 304
+        assert response.headers["ETag"] == cached.etag
+
+    response = cached.response(
+        make_mocked_request(
+            "GET",
+            "/",
+            headers={"If-None-Match": '"other"', "If-Modified-Since": last_modified},
+        )
+    )
+    assert response.status == 200
+
+
+def test_response_cache_eviction(tmp_path):
+    body = b"x" * 100
+    cache = ResponseCache(max_bytes=350, ttl=60)
+    for key in ["a", "b", "c"]:
+        assert cache.put(key, "F", 1, 1, _response(body), time.time()) is not None
+    # least recently used responses are evicted
+    assert cache.get("a") is None
+    assert cache.get("b").body == body
+
+    cache = ResponseCache(
+        max_bytes=350, ttl=60, directory=str(tmp_path), disk_max_bytes=10000
+    )
+    for key in ["a", "b", "c"]:
+        cache.put(key, "F", 1, 1, _response(body), time.time())
+    # evicted responses are kept on disk, and moved back to memory on use
+    assert len(list(tmp_path.glob("*/*"))) == 1
+    assert cache.get("a").body == body
+    assert cache.get("b").body == body
+    assert cache.get("c").body == body
+
+    # and dropped from disk along with the run
+    cache.invalidate("F", 1)
+    assert list(tmp_path.glob("*/*")) == []
+    assert [cache.get(key) for key in ["a", "b", "c"]] == [None, None, None]
+
+
+def test_response_cache_invalidation():
+    cache = ResponseCache(max_bytes=10000, ttl=60)
+    cache.put("a", "F", "my-run", 1, _response(b"a"), time.time())
+    cache.put("b", "F", 2, 2, _response(b"b"), time.time())
+
+    # runs are invalidated by their number or id
+    cache.invalidate("F", 1)
+    assert cache.get("a") is None
+    assert cache.get("b") is not None
+
+    started = time.time()
+    cache.put("c", "F", "my-run", 1, _response(b"c"), time.time())
+    cache.invalidate("F", "my-run")
+    assert cache.get("c") is None
+
+    # responses produced before an invalidation of their run are not cached
+    assert cache.put("c", "F", 1, 1, _response(b"c"), started) is None
+    assert cache.put("c", "F", 1, 1, _response(b"c"), time.time()) is not None
+
+    cache.invalidate_notified("UPDATE", [], {"flow_id": "F", "run_number": 2})
+    assert cache.get("b") is None
+
+    # responses are dropped after their ttl
+    cache.ttl = 0
+    assert cache.get("c") is None
+
+
+def test_response_cache_tracked_runs_bounded(monkeypatch):
+    monkeypatch.setattr(response_cache, "MAX_TRACKED_RUNS", 2)
+    cache = ResponseCache(max_bytes=10000, ttl=60)
+    for run_number in [1, 2, 3]:
+        cache.put(
+            str(run_number),
+            "F",
+            "run-{}".format(run_number),
+            run_number,
+            _response(b"x"),
+            time.time(),
+        )
+        cache.invalidate("G", run_number)
+    assert len(cache._aliases) == 2
+    assert len(cache._invalidated) == 2
+    # the responses of runs that can no longer be invalidated by their id are dropped
+    assert cache.get("1") is None
+    assert cache.get("2") is not None
+    assert cache.get("3") is not None
+
+
+class _RunTable(object):
+    def __init__(self):
+        self.completed = {}
+        self.queries = 0
+
+    async def execute_sql(self, select_sql, values=[], serialize=True):
+        self.queries += 1
+        flow_id, run = values
+        if run in self.completed:
+            return DBResponse(200, [[self.completed[run]]]), None
+        return DBResponse(200, []), None
+
+
+async def test_response_cache_middleware(aiohttp_client):
+    db = type("DB", (), {"run_table_postgres": _RunTable()})()
+    cache = ResponseCache(max_bytes=10000, ttl=60)
+    calls = []
+
+    async def _handler(request):
+        calls.append(request.path)
+        return web.json_response(len(calls))
+
+    excluded_app = web.Application()
+    excluded_app.router.add_route(
+        "GET", "/flows/{flow_id}/runs/{run_number}/steps", _handler
+    )
+    app = web.Application(
+        middlewares=[response_cache_middleware(db, cache, excluded_apps=[excluded_app])]
+    )
+    app.router.add_route("GET", "/flows/{flow_id}/runs/{run_number}/steps", _handler)
+    app.router.add_route("GET", "/flows/{flow_id}/runs/{run_number}/logs", _handler)
+    app.router.add_route("PATCH", "/flows/{flow_id}/runs/{run_number}/tag", _handler)
+    app.add_subapp("/excluded", excluded_app)
+    cli = await aiohttp_client(app)
+
+    # responses about incomplete runs are not cached
+    resp = await cli.get("/flows/F/runs/1/steps")
+    assert "ETag" not in resp.headers
+    db.run_table_postgres.completed = {"1": 1, "my-run": 1}
+    # nor looked up again right away
+    await cli.get("/flows/F/runs/1/steps")
+    assert len(calls) == 2
+    assert db.run_table_postgres.queries == 1
+
+    cache.clear()
+    resp = await cli.get("/flows/F/runs/1/steps")
+    etag = resp.headers["ETag"]
+    assert await resp.json() == 3
+    resp = await cli.get("/flows/F/runs/1/steps")
+    assert await resp.json() == 3
+    resp = await cli.get("/flows/F/runs/1/steps", headers={"If-None-Match": etag})
+    assert resp.status == 304
+    # the query string is part of the key
+    resp = await cli.get("/flows/F/runs/1/steps?_limit=1")
+    assert await resp.json() == 4
+    # completed runs are only looked up once
+    assert db.run_table_postgres.queries == 2
+
+    # other routes are not cached
+    await cli.get("/flows/F/runs/1/logs")
+    await cli.get("/flows/F/runs/1/logs")
+    assert len(calls) == 6
+
+    # writes about a run, by its number or id, invalidate it
+    await cli.get("/flows/F/runs/my-run/steps")
+    await cli.patch("/flows/F/runs/my-run/tag")
+    resp = await cli.get("/flows/F/runs/1/steps")
+    assert await resp.json() == 9
+    resp = await cli.get("/flows/F/runs/1/steps", headers={"If-None-Match": etag})
+    assert resp.status == 200
+
+    # requests of excluded applications are not cached
+    await cli.get("/excluded/flows/F/runs/1/steps")
+    resp = await cli.get("/excluded/flows/F/runs/1/steps")
+    assert "ETag" not in resp.headers
+    assert await resp.json() == 11
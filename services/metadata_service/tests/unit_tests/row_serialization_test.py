@@ -0,0 +1,161 @@
+import json
+from collections import OrderedDict
+
+import pytest
+from psycopg2.extras import DictRow
+
+from services.data.models import (
+    ArtifactRow,
+    FlowRow,
+    MetadataRow,
+    RunRow,
+    StepRow,
+    TaskRow,
+)
+
+pytestmark = [pytest.mark.unit_tests]
+
+TAGS = ["a_tag", "b_tag"]
+SYSTEM_TAGS = ["runtime:dev", "user:tester"]
+
+ROWS = {
+    FlowRow: [
+        dict(
+            flow_id="HelloFlow",
+            user_name="tester",
+            ts_epoch=1,
+            tags=TAGS,
+            system_tags=SYSTEM_TAGS,
+        ),
+    ],
+    RunRow: [
+        dict(
+            flow_id="HelloFlow",
+            run_number=1,
+            run_id=None,
+            user_name="tester",
+            ts_epoch=1,
+            last_heartbeat_ts=None,
+            tags=TAGS,
+            system_tags=SYSTEM_TAGS,
+        ),
+        dict(
+            flow_id="HelloFlow",
+            run_number=2,
+            run_id="argo-helloflow",
+            user_name="tester",
+            ts_epoch=1,
+            last_heartbeat_ts=2,
+            tags=TAGS,
+            system_tags=SYSTEM_TAGS,
+            status="running",
+            user="tester",
+        ),
+    ],
+    StepRow: [
+        dict(
+            flow_id="HelloFlow",
+            run_number=1,
+            run_id=None,
+            step_name="start",
+            user_name="tester",
+            ts_epoch=1,
+            tags=TAGS,
+            system_tags=SYSTEM_TAGS,
+        ),
+    ],
+    TaskRow: [
+        dict(
+            flow_id="HelloFlow",
+            run_number=1,
+            run_id="argo-helloflow",
+            step_name="start",
+            task_id=3,
+            task_name=None,
+            user_name="tester",
+            ts_epoch=1,
+            last_heartbeat_ts=2,
+            tags=TAGS,
+            system_tags=SYSTEM_TAGS,
+        ),
+    ],
+    MetadataRow: [
+        dict(
+            id=4,
+            flow_id="HelloFlow",
+            run_number=1,
+            run_id=None,
+            step_name="start",
+            task_id=3,
+            task_name="task-name",
+            field_name="attempt",
+            value="0",
+            type="attempt",
+            user_name="tester",
+            ts_epoch=1,
+            tags=TAGS,
+            system_tags=SYSTEM_TAGS,
+        ),
+    ],
+    ArtifactRow: [
+        dict(
+            flow_id="HelloFlow",
+            run_number=1,
+            run_id=None,
+            step_name="start",
+            task_id=3,
+            task_name=None,
+            name="name",
+            location="/location",
+            ds_type="s3",
+            sha="sha",
+            type="type",
+            content_type="content_type",
+            user_name="tester",
+            attempt_id=0,
+            ts_epoch=1,
+            tags=TAGS,
+            system_tags=SYSTEM_TAGS,
+        ),
+    ],
+}
+
+
+class _ResultDescription(object):
+    "Stands in for the cursor DictRow reads its column positions from"
+
+    def __init__(self, columns):
+        self.index = OrderedDict((column, i) for i, column in enumerate(columns))
+        self.description = columns
+
+
+def _dict_row(columns, values):
+    row = DictRow(_ResultDescription(columns))
+    row[:] = values
+    return row
+
+
+@pytest.mark.parametrize("expanded", [False, True])
+@pytest.mark.parametrize(
+    "row_type, record",
+    [(row_type, record) for row_type, records in ROWS.items() for record in records],
+)
+def test_serializer_matches_serialize(row_type, record, expanded):
+    columns = list(record.keys())
+    values = tuple(record.values())
+
+    expected = json.dumps(row_type(**record).serialize(expanded))
+
+    serialize_row = row_type.serializer(columns, expanded)
+    assert json.dumps(serialize_row(values)) == expected
+    assert json.dumps(serialize_row(_dict_row(columns, values))) == expected
+
+
+def test_serializer_missing_columns():
+    # columns that are not part of the result fall back to the constructor defaults
+    record = dict(ROWS[RunRow][0])
+    del record["last_heartbeat_ts"]
+    columns = list(record.keys())
+
+    serialize_row = RunRow.serializer(columns)
+    assert serialize_row(tuple(record.values())) == RunRow(**record).serialize()
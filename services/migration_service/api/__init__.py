@@ -15,7 +15,10 @@ version_dict = {
     "20260706000000": "20260706000000",
     "20260706000001": "20260706000001",
     "20260706000002": "20260706000002",
-    "20260706000003": "latest",
+    "20260706000003": "20260706000003",
+    "20261019000000": "20261019000000",
+    "20261019000001": "20261019000001",
+    "20261019000002": "latest",
 }
 
 latest = "latest"
@@ -6,6 +6,15 @@ from multidict import MultiDict
 from .utils import ApiUtils
 from . import make_goose_migration_template
 from services.migration_service.migration_config import db_conf
+from services.migration_service.data.postgres_async_db import AsyncPostgresDB
+
+# Projections maintained by database triggers, and the functions that (re)populate them
+# from existing data.
+BACKFILL_FUNCTIONS = {
+    "task_attempts": "backfill_task_attempts",
+    "run_status": "backfill_run_status",
+    "tag_dictionary": "backfill_tag_dictionary",
+}
 
 
 class AdminApi(object):
@@ -17,6 +26,7 @@ class AdminApi(object):
         endpoints_enabled = int(os.environ.get("MF_MIGRATION_ENDPOINTS_ENABLED", 1))
         if endpoints_enabled:
             app.router.add_route("PATCH", "/upgrade", self.upgrade)
+            app.router.add_route("PATCH", "/backfill/{projection}", self.backfill)
 
     async def ping(self, request):
         """
@@ -77,6 +87,63 @@ class AdminApi(object):
         else:
             return web.Response(text="upgrade failed", status=500)
 
+    async def backfill(self, request):
+        """
+        ---
+        description: This end-point populates a derived table from existing data.
+            Safe to run repeatedly.
+        tags:
+        - Admin
+        parameters:
+        - name: "projection"
+          in: "path"
+          description: "name of the derived table, f.ex. task_attempts"
+          required: true
+          type: "string"
+        - name: "flow_id"
+          in: "query"
+          description: "only backfill data of this flow"
+          required: false
+          type: "string"
+        produces:
+        - 'application/json'
+        responses:
+            "200":
+                description: successful operation. Returns the number of rows written
+            "404":
+                description: unknown projection
+            "500":
+                description: could not backfill
+        """
+        function = BACKFILL_FUNCTIONS.get(request.match_info.get("projection"))
+        if function is None:
+            return web.Response(
+                status=404,
+                body=json.dumps(
+                    {"detail": "Supported: {}".format(", ".join(BACKFILL_FUNCTIONS))}
+                ),
+                headers=MultiDict({"Content-Type": "application/json"}),
+            )
+        try:
+            with await AsyncPostgresDB.get_instance().pool.cursor() as cur:
+                await cur.execute(
+                    "SELECT {}(%s)".format(function),
+                    (request.query.get("flow_id"),),
+                )
+                (rows,) = await cur.fetchone()
+                cur.close()
+            return web.Response(
+                body=json.dumps({"rows": rows}),
+                headers=MultiDict({"Content-Type": "application/json"}),
+            )
+        except Exception as e:
+            body = {"detail": repr(e)}
+            return web.Response(
+                status=500,
+                body=json.dumps(body),
+                headers=MultiDict({"Content-Type": "application/json"}),
+            )
+
     async def db_schema_status(self, request):
         """
         ---
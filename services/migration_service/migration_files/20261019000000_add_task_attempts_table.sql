@@ -0,0 +1,227 @@
+-- +goose Up
+-- +goose StatementBegin
+-- Per-attempt summary of task progress, maintained on write by the triggers below.
+-- Replaces aggregating metadata_v3 and artifact_v3 for every task that is listed.
+CREATE TABLE IF NOT EXISTS task_attempts_v3 (
+    flow_id VARCHAR(255) NOT NULL,
+    run_number BIGINT NOT NULL,
+    step_name VARCHAR(255) NOT NULL,
+    task_id BIGINT NOT NULL,
+    attempt_id INT NOT NULL,
+    started_at BIGINT,
+    attempt_finished_at BIGINT,
+    attempt_ok BOOLEAN,
+    task_ok_finished_at BIGINT,
+    task_ok_location TEXT,
+    PRIMARY KEY(flow_id, run_number, step_name, task_id, attempt_id)
+);
+-- +goose StatementEnd
+
+-- +goose StatementBegin
+-- Metadata values are stored either as plain text or as a json array, depending on the deployment.
+-- Values are validated with pattern matches rather than by catching failed casts, so that
+-- malformed values never fail the metadata insert without an exception block per row.
+CREATE OR REPLACE FUNCTION task_attempts_metadata_value(value TEXT) RETURNS TEXT
+    LANGUAGE sql IMMUTABLE
+    AS $$
+SELECT CASE
+    WHEN value ~ '^\s*\[\s*"' THEN substring(value from '^\s*\[\s*"([^"]*)"')
+    WHEN value ~ '^\s*\[' THEN substring(value from '^\s*\[\s*([^\s,\]]*)')
+    WHEN value ~ '^\s*"' THEN substring(value from '^\s*"([^"]*)"')
+    ELSE value
+END;
+$$;
+-- +goose StatementEnd
+
+-- +goose StatementBegin
+-- At most nine digits, which always fit an INT.
+CREATE OR REPLACE FUNCTION task_attempts_to_int(value TEXT) RETURNS INT
+    LANGUAGE sql IMMUTABLE
+    AS $$
+SELECT CASE WHEN value ~ '^\s*[+-]?\d{1,9}\s*$' THEN value::int END;
+$$;
+-- +goose StatementEnd
+
+-- +goose StatementBegin
+-- The spellings, and unique prefixes thereof, that the boolean type accepts.
+CREATE OR REPLACE FUNCTION task_attempts_to_bool(value TEXT) RETURNS BOOLEAN
+    LANGUAGE sql IMMUTABLE
+    AS $$
+SELECT CASE
+    WHEN value ~* '^\s*(t(r(ue?)?)?|y(es?)?|on|1|f(a(l(se?)?)?)?|no?|off?|0)\s*$'
+    THEN value::boolean
+END;
+$$;
+-- +goose StatementEnd
+
+-- +goose StatementBegin
+CREATE OR REPLACE FUNCTION upsert_task_attempt(
+    p_flow_id VARCHAR,
+    p_run_number BIGINT,
+    p_step_name VARCHAR,
+    p_task_id BIGINT,
+    p_attempt_id INT,
+    p_started_at BIGINT,
+    p_attempt_finished_at BIGINT,
+    p_attempt_ok BOOLEAN,
+    p_task_ok_finished_at BIGINT,
+    p_task_ok_location TEXT
+) RETURNS VOID
+    LANGUAGE plpgsql
+    AS $$
+BEGIN
+    IF p_attempt_id IS NULL THEN
+        RETURN;
+    END IF;
+    INSERT INTO task_attempts_v3 AS attempt (
+        flow_id, run_number, step_name, task_id, attempt_id,
+        started_at, attempt_finished_at, attempt_ok, task_ok_finished_at, task_ok_location
+    )
+    VALUES (
+        p_flow_id, p_run_number, p_step_name, p_task_id, p_attempt_id,
+        p_started_at, p_attempt_finished_at, p_attempt_ok, p_task_ok_finished_at, p_task_ok_location
+    )
+    ON CONFLICT (flow_id, run_number, step_name, task_id, attempt_id) DO UPDATE SET
+        started_at = GREATEST(attempt.started_at, EXCLUDED.started_at),
+        attempt_finished_at = GREATEST(attempt.attempt_finished_at, EXCLUDED.attempt_finished_at),
+        attempt_ok = GREATEST(attempt.attempt_ok, EXCLUDED.attempt_ok),
+        task_ok_finished_at = GREATEST(attempt.task_ok_finished_at, EXCLUDED.task_ok_finished_at),
+        task_ok_location = GREATEST(attempt.task_ok_location, EXCLUDED.task_ok_location);
+END;
+$$;
+-- +goose StatementEnd
+
+-- +goose StatementBegin
+CREATE OR REPLACE FUNCTION task_attempts_from_metadata() RETURNS TRIGGER
+    LANGUAGE plpgsql
+    AS $$
+DECLARE
+    value TEXT := task_attempts_metadata_value(NEW.value::text);
+BEGIN
+    IF NEW.field_name = 'attempt' THEN
+        PERFORM upsert_task_attempt(
+            NEW.flow_id, NEW.run_number, NEW.step_name, NEW.task_id,
+            task_attempts_to_int(value), NEW.ts_epoch, NULL, NULL, NULL, NULL
+        );
+    ELSIF NEW.field_name = 'attempt-done' THEN
+        PERFORM upsert_task_attempt(
+            NEW.flow_id, NEW.run_number, NEW.step_name, NEW.task_id,
+            task_attempts_to_int(value), NULL, NEW.ts_epoch, NULL, NULL, NULL
+        );
+    ELSIF NEW.field_name = 'attempt_ok' THEN
+        PERFORM upsert_task_attempt(
+            NEW.flow_id, NEW.run_number, NEW.step_name, NEW.task_id,
+            task_attempts_to_int(substring(NEW.tags::text from 'attempt_id:(\d+)')),
+            NULL, NEW.ts_epoch, task_attempts_to_bool(value), NULL, NULL
+        );
+    END IF;
+    RETURN NULL;
+END;
+$$;
+-- +goose StatementEnd
+
+-- +goose StatementBegin
+CREATE OR REPLACE FUNCTION task_attempts_from_artifact() RETURNS TRIGGER
+    LANGUAGE plpgsql
+    AS $$
+BEGIN
+    PERFORM upsert_task_attempt(
+        NEW.flow_id, NEW.run_number, NEW.step_name, NEW.task_id,
+        NEW.attempt_id, NULL, NULL, NULL, NEW.ts_epoch, NEW.location
+    );
+    RETURN NULL;
+END;
+$$;
+-- +goose StatementEnd
+
+-- +goose StatementBegin
+DROP TRIGGER IF EXISTS task_attempts_from_metadata ON metadata_v3;
+CREATE TRIGGER task_attempts_from_metadata AFTER INSERT ON metadata_v3
+    FOR EACH ROW WHEN (NEW.field_name IN ('attempt', 'attempt-done', 'attempt_ok'))
+    EXECUTE PROCEDURE task_attempts_from_metadata();
+-- +goose StatementEnd
+
+-- +goose StatementBegin
+DROP TRIGGER IF EXISTS task_attempts_from_artifact ON artifact_v3;
+CREATE TRIGGER task_attempts_from_artifact AFTER INSERT ON artifact_v3
+    FOR EACH ROW WHEN (NEW.name = '_task_ok')
+    EXECUTE PROCEDURE task_attempts_from_artifact();
+-- +goose StatementEnd
+
+-- +goose StatementBegin
+-- Populates the summary from existing metadata and artifacts. Safe to run repeatedly,
+-- optionally limited to a single flow. Also available through the migration service.
+CREATE OR REPLACE FUNCTION backfill_task_attempts(p_flow_id VARCHAR DEFAULT NULL) RETURNS BIGINT
+    LANGUAGE plpgsql
+    AS $$
+DECLARE
+    affected BIGINT;
+BEGIN
+    INSERT INTO task_attempts_v3 AS attempt (
+        flow_id, run_number, step_name, task_id, attempt_id,
+        started_at, attempt_finished_at, attempt_ok, task_ok_finished_at, task_ok_location
+    )
+    SELECT
+        flow_id, run_number, step_name, task_id, attempt_id,
+        max(started_at), max(attempt_finished_at), bool_or(attempt_ok),
+        max(task_ok_finished_at), max(task_ok_location)
+    FROM (
+        SELECT
+            flow_id, run_number, step_name, task_id,
+            (CASE
+                WHEN field_name = 'attempt_ok'
+                THEN task_attempts_to_int(substring(tags::text from 'attempt_id:(\d+)'))
+                ELSE task_attempts_to_int(task_attempts_metadata_value(value::text))
+            END) as attempt_id,
+            (CASE WHEN field_name = 'attempt' THEN ts_epoch END) as started_at,
+            (CASE WHEN field_name != 'attempt' THEN ts_epoch END) as attempt_finished_at,
+            (CASE
+                WHEN field_name = 'attempt_ok'
+                THEN task_attempts_to_bool(task_attempts_metadata_value(value::text))
+            END) as attempt_ok,
+            NULL::bigint as task_ok_finished_at,
+            NULL::text as task_ok_location
+        FROM metadata_v3
+        WHERE
+            field_name IN ('attempt', 'attempt-done', 'attempt_ok')
+            AND (p_flow_id IS NULL OR flow_id = p_flow_id)
+        UNION ALL
+        SELECT
+            flow_id, run_number, step_name, task_id, attempt_id,
+            NULL, NULL, NULL, ts_epoch, location
+        FROM artifact_v3
+        WHERE
+            name = '_task_ok'
+            AND (p_flow_id IS NULL OR flow_id = p_flow_id)
+    ) a
+    WHERE a.attempt_id IS NOT NULL
+    GROUP BY flow_id, run_number, step_name, task_id, attempt_id
+    ON CONFLICT (flow_id, run_number, step_name, task_id, attempt_id) DO UPDATE SET
+        started_at = EXCLUDED.started_at,
+        attempt_finished_at = EXCLUDED.attempt_finished_at,
+        attempt_ok = EXCLUDED.attempt_ok,
+        task_ok_finished_at = EXCLUDED.task_ok_finished_at,
+        task_ok_location = EXCLUDED.task_ok_location;
+    GET DIAGNOSTICS affected = ROW_COUNT;
+    RETURN affected;
+END;
+$$;
+-- +goose StatementEnd
+
+-- +goose StatementBegin
+SELECT backfill_task_attempts();
+-- +goose StatementEnd
+
+-- +goose Down
+-- +goose StatementBegin
+DROP TRIGGER IF EXISTS task_attempts_from_metadata ON metadata_v3;
+DROP TRIGGER IF EXISTS task_attempts_from_artifact ON artifact_v3;
+DROP FUNCTION IF EXISTS backfill_task_attempts(VARCHAR);
+DROP FUNCTION IF EXISTS task_attempts_from_metadata();
+DROP FUNCTION IF EXISTS task_attempts_from_artifact();
+DROP FUNCTION IF EXISTS upsert_task_attempt(VARCHAR, BIGINT, VARCHAR, BIGINT, INT, BIGINT, BIGINT, BOOLEAN, BIGINT, TEXT);
+DROP FUNCTION IF EXISTS task_attempts_to_bool(TEXT);
+DROP FUNCTION IF EXISTS task_attempts_to_int(TEXT);
+DROP FUNCTION IF EXISTS task_attempts_metadata_value(TEXT);
+DROP TABLE IF EXISTS task_attempts_v3;
+-- +goose StatementEnd
@@ -0,0 +1,108 @@
+-- +goose Up
+-- +goose StatementBegin
+-- Outcome of the 'end' step per run, maintained on write by the trigger below.
+-- Only the heartbeat based liveness of a run is left to be evaluated at query time.
+CREATE TABLE IF NOT EXISTS run_status_v3 (
+    flow_id VARCHAR(255) NOT NULL,
+    run_number BIGINT NOT NULL,
+    end_attempt_ok BOOLEAN,
+    end_attempt_ok_ts BIGINT,
+    end_attempt_started_at BIGINT,
+    PRIMARY KEY(flow_id, run_number)
+);
+-- +goose StatementEnd
+
+-- +goose StatementBegin
+CREATE OR REPLACE FUNCTION run_status_from_metadata() RETURNS TRIGGER
+    LANGUAGE plpgsql
+    AS $$
+BEGIN
+    IF NEW.field_name = 'attempt_ok' THEN
+        -- the latest attempt_ok of the end step decides the outcome
+        INSERT INTO run_status_v3 AS status (flow_id, run_number, end_attempt_ok, end_attempt_ok_ts)
+        VALUES (
+            NEW.flow_id, NEW.run_number,
+            task_attempts_to_bool(task_attempts_metadata_value(NEW.value::text)), NEW.ts_epoch
+        )
+        ON CONFLICT (flow_id, run_number) DO UPDATE SET
+            end_attempt_ok = EXCLUDED.end_attempt_ok,
+            end_attempt_ok_ts = EXCLUDED.end_attempt_ok_ts
+        WHERE status.end_attempt_ok_ts IS NULL OR status.end_attempt_ok_ts <= EXCLUDED.end_attempt_ok_ts;
+    ELSIF NEW.field_name = 'attempt' THEN
+        INSERT INTO run_status_v3 AS status (flow_id, run_number, end_attempt_started_at)
+        VALUES (NEW.flow_id, NEW.run_number, NEW.ts_epoch)
+        ON CONFLICT (flow_id, run_number) DO UPDATE SET
+            end_attempt_started_at = GREATEST(status.end_attempt_started_at, EXCLUDED.end_attempt_started_at);
+    END IF;
+    RETURN NULL;
+END;
+$$;
+-- +goose StatementEnd
+
+-- +goose StatementBegin
+DROP TRIGGER IF EXISTS run_status_from_metadata ON metadata_v3;
+CREATE TRIGGER run_status_from_metadata AFTER INSERT ON metadata_v3
+    FOR EACH ROW WHEN (NEW.step_name = 'end' AND NEW.field_name IN ('attempt', 'attempt_ok'))
+    EXECUTE PROCEDURE run_status_from_metadata();
+-- +goose StatementEnd
+
+-- +goose StatementBegin
+-- Populates run statuses from existing metadata. Safe to run repeatedly,
+-- optionally limited to a single flow. Also available through the migration service.
+CREATE OR REPLACE FUNCTION backfill_run_status(p_flow_id VARCHAR DEFAULT NULL) RETURNS BIGINT
+    LANGUAGE plpgsql
+    AS $$
+DECLARE
+    affected BIGINT;
+BEGIN
+    INSERT INTO run_status_v3 AS status (
+        flow_id, run_number, end_attempt_ok, end_attempt_ok_ts, end_attempt_started_at
+    )
+    SELECT
+        COALESCE(attempt_ok.flow_id, attempt.flow_id),
+        COALESCE(attempt_ok.run_number, attempt.run_number),
+        attempt_ok.end_attempt_ok,
+        attempt_ok.end_attempt_ok_ts,
+        attempt.end_attempt_started_at
+    FROM (
+        SELECT DISTINCT ON (flow_id, run_number)
+            flow_id,
+            run_number,
+            task_attempts_to_bool(task_attempts_metadata_value(value::text)) as end_attempt_ok,
+            ts_epoch as end_attempt_ok_ts
+        FROM metadata_v3
+        WHERE
+            step_name = 'end' AND field_name = 'attempt_ok'
+            AND (p_flow_id IS NULL OR flow_id = p_flow_id)
+        ORDER BY flow_id, run_number, ts_epoch DESC
+    ) attempt_ok
+    FULL OUTER JOIN (
+        SELECT flow_id, run_number, max(ts_epoch) as end_attempt_started_at
+        FROM metadata_v3
+        WHERE
+            step_name = 'end' AND field_name = 'attempt'
+            AND (p_flow_id IS NULL OR flow_id = p_flow_id)
+        GROUP BY flow_id, run_number
+    ) attempt
+    ON attempt_ok.flow_id = attempt.flow_id AND attempt_ok.run_number = attempt.run_number
+    ON CONFLICT (flow_id, run_number) DO UPDATE SET
+        end_attempt_ok = EXCLUDED.end_attempt_ok,
+        end_attempt_ok_ts = EXCLUDED.end_attempt_ok_ts,
+        end_attempt_started_at = EXCLUDED.end_attempt_started_at;
+    GET DIAGNOSTICS affected = ROW_COUNT;
+    RETURN affected;
+END;
+$$;
+-- +goose StatementEnd
+
+-- +goose StatementBegin
+SELECT backfill_run_status();
+-- +goose StatementEnd
+
+-- +goose Down
+-- +goose StatementBegin
+DROP TRIGGER IF EXISTS run_status_from_metadata ON metadata_v3;
+DROP FUNCTION IF EXISTS backfill_run_status(VARCHAR);
+DROP FUNCTION IF EXISTS run_status_from_metadata();
+DROP TABLE IF EXISTS run_status_v3;
+-- +goose StatementEnd
@@ -0,0 +1,138 @@
+-- +goose Up
+-- +goose StatementBegin
+-- Distinct tags of runs along with the number of runs carrying them, maintained on write
+-- by the trigger below. Tags that are no longer used are kept with a count of 0,
+-- so that readers following last_seen also see their removal.
+CREATE TABLE IF NOT EXISTS tag_dictionary_v3 (
+    tag TEXT NOT NULL,
+    count BIGINT NOT NULL DEFAULT 0,
+    last_seen BIGINT NOT NULL,
+    PRIMARY KEY(tag)
+);
+CREATE INDEX IF NOT EXISTS tag_dictionary_v3_last_seen_idx ON tag_dictionary_v3 (last_seen);
+-- +goose StatementEnd
+
+-- +goose StatementBegin
+-- Distinct user and system tags of a run. Values that are not arrays have no tags.
+CREATE OR REPLACE FUNCTION tag_dictionary_run_tags(tags JSONB, system_tags JSONB) RETURNS TEXT[]
+    LANGUAGE sql IMMUTABLE
+    AS $$
+    SELECT COALESCE(ARRAY_AGG(tag ORDER BY tag), '{}') FROM (
+        SELECT JSONB_ARRAY_ELEMENTS_TEXT(
+            CASE WHEN JSONB_TYPEOF(tags) = 'array' THEN tags ELSE '[]'::jsonb END
+        ) AS tag
+        UNION
+        SELECT JSONB_ARRAY_ELEMENTS_TEXT(
+            CASE WHEN JSONB_TYPEOF(system_tags) = 'array' THEN system_tags ELSE '[]'::jsonb END
+        )
+    ) t
+$$;
+-- +goose StatementEnd
+
+-- +goose StatementBegin
+CREATE OR REPLACE FUNCTION tag_dictionary_from_runs() RETURNS TRIGGER
+    LANGUAGE plpgsql
+    AS $$
+DECLARE
+    old_tags TEXT[] := '{}';
+    new_tags TEXT[] := '{}';
+    changed_tags TEXT[];
+    deltas BIGINT[];
+    now_ms BIGINT := (EXTRACT(EPOCH FROM NOW()) * 1000)::BIGINT;
+BEGIN
+    IF TG_OP <> 'INSERT' THEN
+        old_tags := tag_dictionary_run_tags(OLD.tags, OLD.system_tags);
+    END IF;
+    IF TG_OP <> 'DELETE' THEN
+        new_tags := tag_dictionary_run_tags(NEW.tags, NEW.system_tags);
+    END IF;
+    IF old_tags = new_tags THEN
+        RETURN NULL;
+    END IF;
+
+    SELECT ARRAY_AGG(tag ORDER BY tag), ARRAY_AGG(delta ORDER BY tag)
+    INTO changed_tags, deltas
+    FROM (
+        SELECT tag, SUM(delta) AS delta FROM (
+            SELECT UNNEST(new_tags) AS tag, 1 AS delta
+            UNION ALL
+            SELECT UNNEST(old_tags), -1
+        ) changes
+        GROUP BY tag
+        HAVING SUM(delta) <> 0
+    ) t;
+
+    -- Rows of common tags are written by most runs. They are upserted one at a time
+    -- in the order of the tags, so that concurrent writers lock them in the same
+    -- order and wait for each other instead of deadlocking.
+    FOR i IN 1 .. COALESCE(ARRAY_LENGTH(changed_tags, 1), 0) LOOP
+        INSERT INTO tag_dictionary_v3 AS dictionary (tag, count, last_seen)
+        VALUES (changed_tags[i], GREATEST(deltas[i], 0), now_ms)
+        ON CONFLICT (tag) DO UPDATE SET
+            count = GREATEST(dictionary.count + deltas[i], 0),
+            last_seen = now_ms;
+    END LOOP;
+    RETURN NULL;
+END;
+$$;
+-- +goose StatementEnd
+
+-- +goose StatementBegin
+DROP TRIGGER IF EXISTS tag_dictionary_from_runs ON runs_v3;
+CREATE TRIGGER tag_dictionary_from_runs AFTER INSERT OR DELETE OR UPDATE OF tags, system_tags ON runs_v3
+    FOR EACH ROW EXECUTE PROCEDURE tag_dictionary_from_runs();
+-- +goose StatementEnd
+
+-- +goose StatementBegin
+-- Recounts the tags of runs from existing runs. Safe to run repeatedly, optionally limited
+-- to the tags used by the runs of a single flow. Also available through the migration service.
+CREATE OR REPLACE FUNCTION backfill_tag_dictionary(p_flow_id VARCHAR DEFAULT NULL) RETURNS BIGINT
+    LANGUAGE plpgsql
+    AS $$
+DECLARE
+    affected BIGINT;
+    zeroed BIGINT := 0;
+    now_ms BIGINT := (EXTRACT(EPOCH FROM NOW()) * 1000)::BIGINT;
+BEGIN
+    CREATE TEMPORARY TABLE tag_dictionary_counts ON COMMIT DROP AS
+    SELECT tag, COUNT(*) AS count
+    FROM runs_v3, UNNEST(tag_dictionary_run_tags(tags, system_tags)) AS tag
+    WHERE p_flow_id IS NULL OR tag IN (
+        SELECT UNNEST(tag_dictionary_run_tags(tags, system_tags))
+        FROM runs_v3
+        WHERE flow_id = p_flow_id
+    )
+    GROUP BY tag;
+
+    INSERT INTO tag_dictionary_v3 AS dictionary (tag, count, last_seen)
+    SELECT tag, count, now_ms FROM tag_dictionary_counts
+    ON CONFLICT (tag) DO UPDATE SET
+        count = EXCLUDED.count,
+        last_seen = EXCLUDED.last_seen
+    WHERE dictionary.count <> EXCLUDED.count;
+    GET DIAGNOSTICS affected = ROW_COUNT;
+
+    IF p_flow_id IS NULL THEN
+        UPDATE tag_dictionary_v3 SET count = 0, last_seen = now_ms
+        WHERE count > 0 AND tag NOT IN (SELECT tag FROM tag_dictionary_counts);
+        GET DIAGNOSTICS zeroed = ROW_COUNT;
+    END IF;
+
+    DROP TABLE tag_dictionary_counts;
+    RETURN affected + zeroed;
+END;
+$$;
+-- +goose StatementEnd
+
+-- +goose StatementBegin
+SELECT backfill_tag_dictionary();
+-- +goose StatementEnd
+
+-- +goose Down
+-- +goose StatementBegin
+DROP TRIGGER IF EXISTS tag_dictionary_from_runs ON runs_v3;
+DROP FUNCTION IF EXISTS backfill_tag_dictionary(VARCHAR);
+DROP FUNCTION IF EXISTS tag_dictionary_from_runs();
+DROP FUNCTION IF EXISTS tag_dictionary_run_tags(JSONB, JSONB);
+DROP TABLE IF EXISTS tag_dictionary_v3;
+-- +goose StatementEnd
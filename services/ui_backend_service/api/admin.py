@@ -12,6 +12,8 @@ from services.utils import (
     web_response,
 )
 
+from services.data.query_metrics import PROMETHEUS_CONTENT_TYPE, query_metrics
+
 from .utils import get_json_config
 
 UI_SERVICE_VERSION = "{metadata_v}-{timestamp}-{commit}".format(
@@ -24,17 +26,20 @@ UI_SERVICE_VERSION = "{metadata_v}-{timestamp}-{commit}".format(
 class AdminApi(object):
     """
     Provides administrative routes for the UI Service,
-    such as health checks, version info and custom navigation links.
+    such as health checks, version info, custom navigation links and
+    database metrics.
     """
 
-    def __init__(self, app, cache_store):
+    def __init__(self, app, cache_store, dbs=[]):
         self.cache_store = cache_store
+        self.dbs = dbs
 
         app.router.add_route("GET", "/ping", self.ping)
         app.router.add_route("GET", "/version", self.version)
         app.router.add_route("GET", "/links", self.links)
         app.router.add_route("GET", "/notifications", self.get_notifications)
         app.router.add_route("GET", "/status", self.status)
+        app.router.add_route("GET", "/metrics", self.metrics)
 
         defaults = [
             {"href": "https://docs.metaflow.org/", "label": "Documentation"},
@@ -79,6 +84,26 @@ class AdminApi(object):
             headers=MultiDict({METADATA_SERVICE_HEADER: METADATA_SERVICE_VERSION}),
         )
 
+    async def metrics(self, request):
+        """
+        ---
+        description: Returns database query and connection pool metrics
+            in the Prometheus text format
+        tags:
+        - Admin
+        produces:
+        - 'text/plain'
+        responses:
+            "200":
+                description: successful operation. Return the metrics
+            "405":
+                description: invalid HTTP Method
+        """
+        return web.Response(
+            body=query_metrics.render(self.dbs).encode(),
+            headers=MultiDict({"Content-Type": PROMETHEUS_CONTENT_TYPE}),
+        )
+
     async def links(self, request):
         """
         ---
@@ -283,6 +308,15 @@ class AdminApi(object):
                 ),
                 "workers": worker_list,
             }
+            if getattr(store, "prefetcher", None):
+                cache_status[store.__class__.__name__][
+                    "prefetch"
+                ] = store.prefetcher.status()
+
+        # Status and refresh lag of the tasks whose cards are being refreshed
+        cache_status["CardCacheStore"] = (
+            self.cache_store.card_cache.cache_manager.status()
+        )
 
         return web_response(status=200, body={"cache": cache_status})
 
@@ -6,23 +6,286 @@ from .utils import (
     custom_conditions_query,
     pagination_query,
     operators_to_filters,
+    operators_to_sql,
+    operators_to_sql_values,
+    SingleFlight,
 )
-import sys
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import Callable, Iterable, List, Optional
 import asyncio
+import os
+import re
+import time
 
-TAGS_FILL_INTERVAL_SECONDS = 60 * 5
+# The tag dictionary is maintained by the database, so refreshing the cached tags only
+# fetches the tags that changed since the previous refresh.
+TAGS_FILL_INTERVAL_SECONDS = 10
+# Tags are fetched again if they changed this long before the latest change seen,
+# to cover transactions that were committed after the previous refresh.
+TAGS_FILL_OVERLAP_SECONDS = 60
+
+# Flow ids, run keys of a flow, and step and artifact names of a run are cached in memory
+# for this long, and looked up in memory for each keystroke of the search boxes.
+# Flows, runs and steps are also refreshed on database notifications.
+AUTOCOMPLETE_CACHE_TTL_SECONDS = float(
+    os.environ.get("AUTOCOMPLETE_CACHE_TTL_SECONDS", 30)
+)
+# Maximum number of cached name sets, least recently used ones are dropped first.
+AUTOCOMPLETE_CACHE_MAX_SETS = int(os.environ.get("AUTOCOMPLETE_CACHE_MAX_SETS", 256))
+# Sets with more names than this are not cached, but queried from the database instead.
+AUTOCOMPLETE_CACHE_MAX_NAMES = int(
+    os.environ.get("AUTOCOMPLETE_CACHE_MAX_NAMES", 100000)
+)
+
+
+class PrefixIndex(object):
+    """
+    A sorted set of strings, answering prefix and exact lookups with binary search.
+
+    Parameters
+    ----------
+    items : Iterable[str] (optional)
+        initial items of the index.
+    """
+
+    # Changes of more than this share of the items rebuild the index instead of
+    # inserting and removing items one by one.
+    REBUILD_RATIO = 0.1
+
+    def __init__(self, items: Iterable[str] = ()):
+        self._items = sorted(set(items))
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __getitem__(self, index):
+        return self._items[index]
+
+    def __contains__(self, item):
+        i = bisect_left(self._items, item)
+        return i < len(self._items) and self._items[i] == item
+
+    def add(self, item: str):
+        i = bisect_left(self._items, item)
+        if i == len(self._items) or self._items[i] != item:
+            self._items.insert(i, item)
+
+    def discard(self, item: str):
+        i = bisect_left(self._items, item)
+        if i < len(self._items) and self._items[i] == item:
+            del self._items[i]
+
+    def update(self, added: Iterable[str] = (), removed: Iterable[str] = ()):
+        "Adds and removes items, removals last"
+        added, removed = list(added), list(removed)
+        if len(added) + len(removed) > self.REBUILD_RATIO * len(self._items):
+            self._items = sorted(set(self._items).union(added).difference(removed))
+            return
+        for item in added:
+            self.add(item)
+        for item in removed:
+            self.discard(item)
+
+    def _prefix_range(self, prefix: str):
+        "Returns the range of indices of the items starting with the prefix"
+        start = bisect_left(self._items, prefix)
+        # the first string after all strings starting with the prefix
+        end = prefix.rstrip(chr(0x10FFFF))
+        if not end:
+            return start, len(self._items)
+        end = end[:-1] + chr(ord(end[-1]) + 1)
+        return start, bisect_left(self._items, end, lo=start)
+
+    def with_prefix(self, prefix: str, offset: int = 0, limit: int = None) -> List[str]:
+        "Returns the items starting with the prefix, in order"
+        start, end = self._prefix_range(prefix)
+        start = start + offset
+        if limit is not None:
+            end = min(end, start + limit)
+        return self._items[start:end]
+
+
+def like_pattern(pattern: str):
+    """
+    Returns the lowercase literal prefix of an ILIKE pattern, along with a regular
+    expression matching the same strings as the pattern.
+    """
+    prefix, regex = [], []
+    literal = True
+    chars = iter(pattern)
+    for char in chars:
+        if char == "%":
+            regex.append(".*")
+            literal = False
+            continue
+        if char == "_":
+            regex.append(".")
+            literal = False
+            continue
+        if char == "\\":
+            char = next(chars, char)
+        regex.append(re.escape(char))
+        if literal:
+            prefix.append(char)
+    return "".join(prefix).lower(), re.compile(
+        "".join(regex), re.IGNORECASE | re.DOTALL
+    )
+
+
+class NameSet(object):
+    """
+    A set of names, such as the step names of a run, matched in memory the same way
+    that the autocomplete conditions match them in the database. Case-insensitive
+    patterns are narrowed down with a prefix index of the lowercase names.
+
+    Parameters
+    ----------
+    names : Iterable[str]
+    """
+
+    def __init__(self, names: Iterable[str]):
+        self._sorted = sorted(set(names))
+        self._names = {}  # lowercase name -> names
+        for name in self._sorted:
+            self._names.setdefault(name.lower(), []).append(name)
+        self._index = PrefixIndex(self._names)
+
+    def __len__(self):
+        return len(self._sorted)
+
+    def match(self, operator: str, term: str):
+        "Returns the set of names matching a condition, or None if the operator is not supported"
+        if term == "null":
+            # conditions on null values become 'IS NULL', and names are never null
+            return set()
+        if operator == "eq":
+            return {name for name in self._names.get(term.lower(), []) if name == term}
+        if operator not in ["sw", "co", "ew", "li"]:
+            return None
+        prefix, regex = like_pattern(operators_to_sql_values[operator].format(term))
+        return {
+            name
+            for lowercase in self._index.with_prefix(prefix)
+            for name in self._names[lowercase]
+            if regex.fullmatch(name)
+        }
+
+    def filter(self, query, field: str) -> Optional[List[str]]:
+        """
+        Returns the sorted names matching the conditions on the field in the query,
+        or None if some condition can not be evaluated in memory.
+        See custom_conditions_query_dict for the conditions.
+        """
+        matches = None
+        for key, val in query.items():
+            if key.startswith("_"):
+                continue
+            name, _, operator = key.partition(":")
+            operator = operator or "eq"
+            if name != field or operator not in operators_to_sql:
+                continue
+            matched = set()
+            for term in val.split(","):
+                term_matches = self.match(operator, term)
+                if term_matches is None:
+                    return None
+                matched |= term_matches
+            matches = matched if matches is None else matches & matched
+        if matches is None:
+            return self._sorted
+        return sorted(matches)
+
+
+class NameCache(object):
+    """
+    Sets of names cached in memory for up to `ttl` seconds, at most `max_sets` of them,
+    dropping the least recently used ones first. Concurrent loads of the same set share
+    a single query.
+
+    Parameters
+    ----------
+    ttl : float
+        Seconds to keep a set. Sets are not cached at all with a ttl of 0.
+    max_sets : int
+        Maximum number of sets to keep.
+    """
+
+    def __init__(self, ttl: float, max_sets: int):
+        self.ttl = ttl
+        self.max_sets = max_sets
+        self._sets = OrderedDict()  # key -> (time loaded, NameSet or None)
+        self._loads = SingleFlight()
+        # Loads that started before their set was discarded are not cached.
+        # Discards are numbered, and remembered by prefix while loads are in flight.
+        self._generation = 0
+        self._discarded = {}  # prefix -> generation of the latest discard
+        self._in_flight = 0
+
+    async def get(self, key: tuple, load: Callable) -> Optional[NameSet]:
+        "Returns a cached set, or one loaded with the `load` coroutine function"
+        cached = self._sets.get(key)
+        if cached is not None and time.monotonic() - cached[0] < self.ttl:
+            self._sets.move_to_end(key)
+            return cached[1]
+        self._in_flight += 1
+        try:
+            return await self._loads.do(key, self._load, key, load, self._generation)
+        finally:
+            self._in_flight -= 1
+            if not self._in_flight:
+                self._discarded.clear()
+
+    async def _load(
+        self, key: tuple, load: Callable, generation: int
+    ) -> Optional[NameSet]:
+        loaded_at = time.monotonic()
+        names = await load()
+        discarded = max(
+            self._discarded.get(key[:length], 0) for length in range(len(key) + 1)
+        )
+        if self.ttl > 0 and discarded <= generation:
+            self._sets[key] = (loaded_at, names)
+            self._sets.move_to_end(key)
+            while len(self._sets) > self.max_sets:
+                self._sets.popitem(last=False)
+        return names
+
+    def discard(self, *prefix):
+        "Drops the sets with keys starting with the prefix"
+        self._generation += 1
+        if self._in_flight:
+            self._discarded[prefix] = self._generation
+        for key in [key for key in self._sets if key[: len(prefix)] == prefix]:
+            del self._sets[key]
 
 
 class AutoCompleteApi(object):
 
-    def __init__(self, app, db):
+    def __init__(
+        self,
+        app,
+        db,
+        event_emitter=None,
+        cache_ttl: float = AUTOCOMPLETE_CACHE_TTL_SECONDS,
+    ):
         self.db = db
         # Cached resources
         # Cache tags so we don't have to request DB everytime
-        self.tags = []
+        self.tags = PrefixIndex()
+        # last_seen of the latest change of the tag dictionary in the cache
+        self._tags_seen = None
         self.logger = logging.getLogger("AutoCompleteApi")
+        # Name sets of the other resources, looked up in memory while cached
+        self.names = NameCache(cache_ttl, AUTOCOMPLETE_CACHE_MAX_SETS)
+        # Identical queries in flight, for the lookups that go to the database
+        self.queries = SingleFlight()
+        if event_emitter:
+            event_emitter.on("notify", self.discard_cached_names)
         app.router.add_route("GET", "/tags/autocomplete", self.get_tags)
-        # Non-cached resources
         app.router.add_route("GET", "/flows/autocomplete", self.get_flows)
         app.router.add_route(
             "GET", "/flows/{flow_id}/runs/autocomplete", self.get_runs_for_flow
@@ -42,22 +305,39 @@ class AutoCompleteApi(object):
 
     async def periodic_tags_fetch_and_cache(self):
         """
-        Async task that fill tags cache every 5minutes. Database query might take a while
-        so its better to cache the result.
+        Async task that keeps the tags cache up to date with the tag dictionary.
+        The first fill fetches all tags, later ones only the tags that changed.
         """
         while True:
-            await self.update_cached_tags()
+            try:
+                await self.update_cached_tags()
+            except Exception:
+                self.logger.exception("Failed to update cached tags")
             # Check tags again after some sleep
             await asyncio.sleep(TAGS_FILL_INTERVAL_SECONDS)
 
     async def update_cached_tags(self):
-        # Get all tags that are mentioned in runs table
-        res, _ = await self.db.run_table_postgres.get_tags()
-        if res.response_code == 200:
-            self.tags = sorted(res.body)
-        size = sys.getsizeof(self.tags) // 1024 // 1024
-        count = len(self.tags)
-        self.logger.info("{} cached tags in memory consuming {} Mb".format(count, size))
+        since = None
+        if self._tags_seen is not None:
+            since = self._tags_seen - TAGS_FILL_OVERLAP_SECONDS * 1000
+        res = await self.db.run_table_postgres.get_tag_dictionary(since=since)
+        if res.response_code != 200:
+            return
+        added, removed = [], []
+        for tag, count, last_seen in res.body:
+            if count > 0:
+                if tag not in self.tags:
+                    added.append(tag)
+            elif tag in self.tags:
+                removed.append(tag)
+            self._tags_seen = max(self._tags_seen or 0, last_seen)
+        if added or removed:
+            self.tags.update(added, removed)
+            self.logger.info(
+                "{} cached tags in memory, {} added and {} removed".format(
+                    len(self.tags), len(added), len(removed)
+                )
+            )
 
     @handle_exceptions
     async def get_tags(self, request):
@@ -77,7 +357,7 @@ class AutoCompleteApi(object):
         # pagination setup
         page, limit, offset, _, _, _ = pagination_query(request)
 
-        filter_func = None
+        filter_operator, term = None, None
         for key, val in request.query.items():
             deconstruct = key.split(":", 1)
             if len(deconstruct) > 1:
@@ -88,10 +368,16 @@ class AutoCompleteApi(object):
                 operator = None
 
             if field == "tag" and operator in operators_to_filters:
-                filter_func = operators_to_filters[operator]
+                filter_operator, term = operator, val
 
-        if filter_func:
-            tags = [tag for tag in self.tags if filter_func(tag, val)][
+        if filter_operator == "sw":
+            # prefix and exact matches are looked up from the sorted tags
+            tags = self.tags.with_prefix(term, offset, limit)
+        elif filter_operator == "eq":
+            tags = [term][offset : (offset + limit)] if term in self.tags else []
+        elif filter_operator:
+            filter_func = operators_to_filters[filter_operator]
+            tags = [tag for tag in self.tags if filter_func(tag, term)][
                 offset : (offset + limit)
             ]
         else:
@@ -105,6 +391,68 @@ class AutoCompleteApi(object):
         )
         return web_response(status, body)
 
+    def discard_cached_names(
+        self, operation, resources, data, table_name=None, filter_dict={}
+    ):
+        "Drops the cached names that a database notification adds to"
+        if operation != "INSERT" or table_name is None:
+            return
+        if table_name == self.db.flow_table_postgres.table_name:
+            self.names.discard("flows")
+        elif table_name == self.db.run_table_postgres.table_name:
+            self.names.discard("runs", data["flow_id"])
+        elif table_name == self.db.step_table_postgres.table_name:
+            self.names.discard("steps", data["flow_id"])
+
+    async def names_response(
+        self,
+        request,
+        key: tuple,
+        get_record_fun,
+        initial_conditions=[],
+        initial_values=[],
+        field: str = None,
+    ):
+        """
+        Responds with the names of a resource matching the conditions of the request.
+        Names are looked up from the cached set of names under the key, which is loaded
+        with the db getter, the same way as in resource_response. Sets too large to cache,
+        and conditions that can not be evaluated in memory, are queried from the database.
+        """
+
+        async def _load():
+            db_response, _ = await get_record_fun(
+                conditions=initial_conditions,
+                values=initial_values,
+                limit=AUTOCOMPLETE_CACHE_MAX_NAMES + 1,
+                offset=0,
+            )
+            if db_response.response_code != 200:
+                return None
+            if len(db_response.body) > AUTOCOMPLETE_CACHE_MAX_NAMES:
+                return None
+            return NameSet(db_response.body)
+
+        names = await self.names.get(key, _load)
+        matches = names.filter(request.query, field) if names is not None else None
+        if matches is None:
+            return await resource_response(
+                request,
+                get_record_fun,
+                initial_conditions=initial_conditions,
+                initial_values=initial_values,
+                allowed_keys=[field],
+                single_flight=self.queries,
+            )
+
+        page, limit, offset, _, _, _ = pagination_query(request)
+        body = matches[offset : (offset + limit)]
+        pagination = DBPagination(limit, offset, len(body), page)
+        status, body = format_response_list(
+            request, DBResponse(200, body), pagination, page
+        )
+        return web_response(status, body)
+
     @handle_exceptions
     async def get_flows(self, request):
         """
@@ -122,8 +470,11 @@ class AutoCompleteApi(object):
                     $ref: '#/definitions/ResponsesAutocompleteFlowList'
         """
 
-        return await resource_response(
-            request, self.db.flow_table_postgres.get_flow_ids, allowed_keys=["flow_id"]
+        return await self.names_response(
+            request,
+            ("flows",),
+            self.db.flow_table_postgres.get_flow_ids,
+            field="flow_id",
         )
 
     @handle_exceptions
@@ -144,12 +495,13 @@ class AutoCompleteApi(object):
         """
         flow_id = request.match_info.get("flow_id")
 
-        return await resource_response(
+        return await self.names_response(
             request,
+            ("runs", flow_id),
             self.db.run_table_postgres.get_run_keys,
             initial_conditions=["flow_id=%s"],
             initial_values=[flow_id],
-            allowed_keys=["run"],
+            field="run",
         )
 
     @handle_exceptions
@@ -173,12 +525,13 @@ class AutoCompleteApi(object):
 
         run_key, run_value = translate_run_key(run_id)
 
-        return await resource_response(
+        return await self.names_response(
             request,
+            ("steps", flow_id, run_key, run_value),
             self.db.step_table_postgres.get_step_names,
             initial_conditions=["flow_id=%s", "{}=%s".format(run_key)],
             initial_values=[flow_id, run_value],
-            allowed_keys=["step_name"],
+            field="step_name",
         )
 
     @handle_exceptions
@@ -202,17 +555,23 @@ class AutoCompleteApi(object):
 
         run_key, run_value = translate_run_key(run_id)
 
-        return await resource_response(
+        return await self.names_response(
             request,
+            ("artifacts", flow_id, run_key, run_value),
             self.db.artifact_table_postgres.get_artifact_names,
             initial_conditions=["flow_id=%s", "{}=%s".format(run_key)],
             initial_values=[flow_id, run_value],
-            allowed_keys=["name"],
+            field="name",
         )
 
 
 async def resource_response(
-    request, get_record_fun, initial_conditions=[], initial_values=[], allowed_keys=[]
+    request,
+    get_record_fun,
+    initial_conditions=[],
+    initial_values=[],
+    allowed_keys=[],
+    single_flight: SingleFlight = None,
 ):
     """
     Abstract resource fetch helper that processes query and pagination parameters from the request,
@@ -233,6 +592,8 @@ async def resource_response(
     allowed_keys : List (optional)
         optional list of allowed keys.
         Used to determine which keys are extracted from request parameters and which should be omitted.
+    single_flight : SingleFlight (optional)
+        identical queries in flight are only executed once, when given.
 
     Returns
     -------
@@ -250,9 +611,19 @@ async def resource_response(
     conditions = initial_conditions + custom_conditions
     values = initial_values + custom_vals
 
-    db_response, pagination = await get_record_fun(
-        conditions=conditions, values=values, limit=limit, offset=offset
-    )
+    if single_flight is None:
+        db_response, pagination = await get_record_fun(
+            conditions=conditions, values=values, limit=limit, offset=offset
+        )
+    else:
+        db_response, pagination = await single_flight.do(
+            (get_record_fun, tuple(conditions), tuple(values), limit, offset),
+            get_record_fun,
+            conditions=conditions,
+            values=values,
+            limit=limit,
+            offset=offset,
+        )
 
     status, body = format_response_list(request, db_response, pagination, page)
 
@@ -17,15 +17,42 @@ from services.ui_backend_service.data.cache.card_cache_manager import (
 from services.ui_backend_service.data.cache.card_cache_manager import (
     list_cards as list_cards_from_cache,
 )
+import re
 import time
 from aiohttp import web
 import asyncio
+from collections import Counter, defaultdict
+
+# Websocket subscription resource of the data of a card, pushed whenever it changes
+CARD_DATA_RESOURCE = re.compile(
+    r"^/flows/(?P<flow_id>[^/]+)/runs/(?P<run_number>[^/]+)/steps/(?P<step_name>[^/]+)"
+    r"/tasks/(?P<task_id>[^/]+)/cards/(?P<hash>[^/]+)/data$"
+)
 
 
 class CardsApi(object):
+    """
+    Serves the cards of tasks from the card cache.
+
+    The data of a card can also be subscribed to through the websocket, with the same
+    resource path as its endpoint. Subscribed tasks are watched by the card cache, and
+    their card data is pushed to the subscribers as an 'UPDATE' event whenever it changes.
+    """
+
     def __init__(self, app, db, cache=None):
         self.db = db
         self.cache = getattr(cache, "card_cache", None)
+        # card data resource -> number of subscriptions
+        self._subscription_counts = Counter()
+        # card data resource -> Future of the pathspec of the watched task,
+        # None if there is no such task
+        self._subscribed_pathspecs = {}
+        # pathspec of a watched task -> card data resources subscribed to
+        self._subscriptions = defaultdict(set)
+        if self.cache is not None:
+            self.cache.event_emitter.on("ws-subscribe", self.subscribe_card_data)
+            self.cache.event_emitter.on("ws-unsubscribe", self.unsubscribe_card_data)
+            self.cache.event_emitter.on("card-update", self.publish_card_data)
         app.router.add_route(
             "GET",
             "/flows/{flow_id}/runs/{run_number}/steps/{step_name}/tasks/{task_id}/cards",
@@ -44,7 +71,9 @@ class CardsApi(object):
 
     async def get_task_by_request(self, request):
         flow_id, run_number, step_name, task_id, _ = get_pathspec_from_request(request)
+        return await self.get_task(flow_id, run_number, step_name, task_id)
 
+    async def get_task(self, flow_id, run_number, step_name, task_id):
         run_id_key, run_id_value = translate_run_key(run_number)
         task_id_key, task_id_value = translate_task_key(task_id)
 
@@ -65,6 +94,76 @@ class CardsApi(object):
             return db_response.body
         return None
 
+    async def subscribe_card_data(self, resource):
+        "Watches the task of a card data resource on its first subscription"
+        match = CARD_DATA_RESOURCE.match(resource)
+        if match is None:
+            return
+        self._subscription_counts[resource] += 1
+        watching = self._subscribed_pathspecs.get(resource)
+        if watching is None:
+            # Recorded before the task is looked up, so that subscriptions meanwhile
+            # wait for the same lookup instead of watching the task again.
+            watching = self._subscribed_pathspecs[resource] = asyncio.ensure_future(
+                self._watch_task(resource, match)
+            )
+        try:
+            await asyncio.shield(watching)
+        except Exception:
+            if self._subscribed_pathspecs.get(resource) is watching:
+                del self._subscribed_pathspecs[resource]
+            raise
+
+    async def _watch_task(self, resource, match) -> Optional[str]:
+        "Watches the task of a card data resource, returning its pathspec if it exists"
+        task = await self.get_task(
+            match["flow_id"], match["run_number"], match["step_name"], match["task_id"]
+        )
+        if not task:
+            return None
+        pathspec = _task_pathspec(task)
+        self._subscriptions[pathspec].add(resource)
+        await self.cache.cache_manager.watch(pathspec)
+        return pathspec
+
+    async def unsubscribe_card_data(self, resource):
+        "Unwatches the task of a card data resource on its last unsubscription"
+        if self._subscription_counts[resource] <= 0:
+            return
+        self._subscription_counts[resource] -= 1
+        if self._subscription_counts[resource] > 0:
+            return
+        del self._subscription_counts[resource]
+        watching = self._subscribed_pathspecs.pop(resource, None)
+        if watching is None:
+            return
+        # A task that is being looked up is unwatched once it has been watched
+        try:
+            pathspec = await asyncio.shield(watching)
+        except Exception:
+            return
+        if pathspec is None:
+            return
+        self.cache.cache_manager.unwatch(pathspec)
+        if resource in self._subscribed_pathspecs:
+            # subscribed to again meanwhile
+            return
+        self._subscriptions[pathspec].discard(resource)
+        if not self._subscriptions[pathspec]:
+            del self._subscriptions[pathspec]
+
+    async def publish_card_data(self, pathspec, card_hash, update_type):
+        "Pushes the data of a card to its subscribers when it changed"
+        if update_type != "data" or pathspec not in self._subscriptions:
+            return
+        for resource in list(self._subscriptions[pathspec]):
+            if CARD_DATA_RESOURCE.match(resource)["hash"] != card_hash:
+                continue
+            local_cache = self.cache.cache_manager.get_local_cache(pathspec, card_hash)
+            data = _card_data_from_cache(local_cache)
+            if data is not None:
+                self.cache.event_emitter.emit("notify", "UPDATE", [resource], data)
+
     @handle_exceptions
     async def get_cards_list_for_task(self, request):
         """
@@ -218,6 +317,15 @@ class CardsApi(object):
             return web_response(200, data)
 
 
+def _task_pathspec(task):
+    return "{flow_id}/{run_id}/{step_name}/{task_id}".format(
+        flow_id=task.get("flow_id"),
+        run_id=task.get("run_id") or task.get("run_number"),
+        step_name=task.get("step_name"),
+        task_id=task.get("task_name") or task.get("task_id"),
+    )
+
+
 def _card_data_from_cache(local_cache):
     data = local_cache.read_data()
     if data is None:
@@ -245,12 +353,7 @@ async def get_card_html_for_task_async(
         "data": {}
     }
     """
-    pathspec = "{flow_id}/{run_id}/{step_name}/{task_id}".format(
-        flow_id=task.get("flow_id"),
-        run_id=task.get("run_id") or task.get("run_number"),
-        step_name=task.get("step_name"),
-        task_id=task.get("task_name") or task.get("task_id"),
-    )
+    pathspec = _task_pathspec(task)
     _local_cache = cache_client.cache_manager.get_local_cache(pathspec, card_hash)
     _html = await wait_until_card_is_ready(
         cache_client.cache_manager, _local_cache, max_wait_time=CARD_API_HTML_WAIT_TIME
@@ -274,12 +377,7 @@ async def get_card_data_for_task_async(
         "data": {}
     }
     """
-    pathspec = "{flow_id}/{run_id}/{step_name}/{task_id}".format(
-        flow_id=task.get("flow_id"),
-        run_id=task.get("run_id") or task.get("run_number"),
-        step_name=task.get("step_name"),
-        task_id=task.get("task_name") or task.get("task_id"),
-    )
+    pathspec = _task_pathspec(task)
     await cache_client.cache_manager.register(pathspec)
     _local_cache = cache_client.cache_manager.get_local_cache(pathspec, card_hash)
     if not _local_cache.read_ready():
@@ -291,12 +389,7 @@ async def get_card_data_for_task_async(
 
 
 async def get_card_list(cache_client, task, max_wait_time=3):
-    pathspec = "{flow_id}/{run_id}/{step_name}/{task_id}".format(
-        flow_id=task.get("flow_id"),
-        run_id=task.get("run_id") or task.get("run_number"),
-        step_name=task.get("step_name"),
-        task_id=task.get("task_name") or task.get("task_id"),
-    )
+    pathspec = _task_pathspec(task)
     return await list_cards_from_cache(
         cache_client.cache_manager, pathspec, max_wait_time
     )
@@ -1,7 +1,10 @@
 from services.data.db_utils import DBResponse, translate_run_key
 from services.utils import handle_exceptions
 from .utils import format_response, web_response, query_param_enabled
-from services.ui_backend_service.data.db.utils import get_run_dag_data
+from services.ui_backend_service.data.db.utils import (
+    get_run_dag_data,
+    get_dag_source_id,
+)
 
 
 class DagApi(object):
@@ -60,7 +63,10 @@ class DagApi(object):
         invalidate_cache = query_param_enabled(request, "invalidate")
 
         dag = await self._dag_store.cache.GenerateDag(
-            flow_name, run_id, invalidate_cache=invalidate_cache
+            flow_name,
+            run_id,
+            source_id=get_dag_source_id(db_response.body),
+            invalidate_cache=invalidate_cache,
         )
 
         if dag.has_pending_request():
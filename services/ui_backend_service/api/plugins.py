@@ -92,7 +92,7 @@ class PluginsApi(object):
 
         filename = request.match_info.get("filename")
         try:
-            return plugin.serve(filename)
+            return await plugin.serve(filename, request)
         except:
             return web_response(500, "Internal server error")
 
@@ -51,9 +51,17 @@ class RunApi(object):
         """
 
         flow_name = request.match_info.get("flow_id")
-        run_id_key, run_id_value = translate_run_key(
-            request.match_info.get("run_number")
-        )
+        run_key = request.match_info.get("run_number")
+        run_id_key, run_id_value = translate_run_key(run_key)
+
+        def _record_view(results, invalidate_cache=False):
+            # Viewed runs get prioritized when prefetching data, by their number
+            # as runs are scheduled for prefetching by number.
+            if results.response_code == 200 and results.body:
+                self._artifact_store.prefetcher.record_view(
+                    flow_name, results.body["run_number"]
+                )
+            return results
 
         return await find_records(
             request,
@@ -65,6 +73,7 @@ class RunApi(object):
             ],
             initial_values=[flow_name, run_id_value],
             enable_joins=True,
+            postprocess=_record_view if self._artifact_store else None,
         )
 
     @handle_exceptions
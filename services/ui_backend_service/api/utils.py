@@ -6,13 +6,25 @@ from collections import deque
 from typing import Callable, Dict, List, Tuple, Optional
 from urllib.parse import parse_qsl, urlsplit
 
+import asyncio
 from asyncio import iscoroutinefunction
 from aiohttp import web
 from multidict import MultiDict
-from services.data.db_utils import DBPagination, DBResponse
+from psycopg2.extras import Json
+from services.data.db_utils import (
+    DBPagination,
+    DBResponse,
+    decode_cursor,
+    encode_cursor,
+)
 from services.data.tagging_utils import apply_run_tags_to_db_response
-from services.utils import format_baseurl, format_qs, web_response
-from functools import reduce
+from services.utils import (
+    QueryStringFormatter,
+    format_baseurl,
+    format_qs,
+    web_response,
+)
+from functools import partial, reduce
 from services.utils import logging
 
 logger = logging.getLogger("Utils")
@@ -101,20 +113,30 @@ def format_response_list(
     prevPage = max(page - 1, 1)
 
     baseurl = format_baseurl(request)
+    qs = QueryStringFormatter(query)
+    if "_cursor" in query:
+        # Cursor pagination, page numbers do not apply.
+        next_cursor = pagination.next_cursor if pagination else None
+        nextPage = None
+        nextLink = (
+            "{}{}".format(baseurl, qs.format({"_cursor": next_cursor}))
+            if next_cursor
+            else None
+        )
+    else:
+        nextLink = (
+            "{}{}".format(baseurl, qs.format({"_page": nextPage})) if nextPage else None
+        )
     response_object = {
         "data": db_response.body,
         "status": db_response.response_code,
         "links": {
-            "self": "{}{}".format(baseurl, format_qs(query)),
-            "first": "{}{}".format(baseurl, format_qs(query, {"_page": 1})),
-            "prev": "{}{}".format(baseurl, format_qs(query, {"_page": prevPage})),
-            "next": (
-                "{}{}".format(baseurl, format_qs(query, {"_page": nextPage}))
-                if nextPage
-                else None
-            ),
+            "self": "{}{}".format(baseurl, qs.format()),
+            "first": "{}{}".format(baseurl, qs.format({"_page": 1})),
+            "prev": "{}{}".format(baseurl, qs.format({"_page": prevPage})),
+            "next": nextLink,
             "last": (
-                "{}{}".format(baseurl, format_qs(query, {"_page": page_count}))
+                "{}{}".format(baseurl, qs.format({"_page": page_count}))
                 if page_count
                 else None
             ),
@@ -207,6 +229,72 @@ def pagination_query(
     )
 
 
+order_clause = re.compile(r'^"?(\w+)"?(?:\s+(ASC|DESC))?$', re.IGNORECASE)
+
+
+def keyset_order(ordering: List[str], unique_keys: List[str]) -> List[Tuple[str, str]]:
+    """
+    Parse ORDER BY clauses into (column, direction) pairs for cursor pagination.
+    The unique keys are appended as tiebreakers, so that every row has a distinct position.
+
+    Raises ValueError for clauses that can not be used with cursor pagination.
+    """
+    columns = []
+    for clause in ordering or []:
+        match = order_clause.match(clause.strip())
+        if not match:
+            raise ValueError("unsupported_order")
+        column, direction = match.group(1), (match.group(2) or "ASC").upper()
+        if column not in [col for col, _ in columns]:
+            columns.append((column, direction))
+
+    for key in unique_keys:
+        if key not in [col for col, _ in columns]:
+            columns.append((key, "DESC"))
+
+    return columns
+
+
+def keyset_condition(
+    columns: List[Tuple[str, str]], cursor_values: List
+) -> Tuple[str, List]:
+    """
+    Construct a condition matching the rows positioned after cursor_values in the ordering
+    given by columns. NULL placement follows the PostgreSQL default of
+    NULLS LAST for ascending and NULLS FIRST for descending order.
+
+    Example:
+        [("ts_epoch", "DESC"), ("run_number", "DESC")], [1000, 5]
+        -> '(("ts_epoch" < %s) OR ("ts_epoch" = %s AND "run_number" < %s))', [1000, 1000, 5]
+    """
+    alternatives, values = [], []
+    equal, equal_values = [], []
+    for (column, direction), value in zip(columns, cursor_values):
+        if isinstance(value, (dict, list)):
+            value = Json(value)
+
+        if value is None:
+            after = '"{}" IS NOT NULL'.format(column) if direction == "DESC" else None
+            after_values = []
+            same, same_values = '"{}" IS NULL'.format(column), []
+        else:
+            after = (
+                '"{0}" < %s' if direction == "DESC" else '("{0}" > %s OR "{0}" IS NULL)'
+            ).format(column)
+            after_values = [value]
+            same, same_values = '"{}" = %s'.format(column), [value]
+
+        if after:
+            alternatives.append("({})".format(" AND ".join(equal + [after])))
+            values += equal_values + after_values
+        equal.append(same)
+        equal_values += same_values
+
+    if not alternatives:
+        return "FALSE", []
+    return "({})".format(" OR ".join(alternatives)), values
+
+
 # Built-in conditions (always prefixed with _)
 def builtin_conditions_query(request: web.BaseRequest):
     return builtin_conditions_query_dict(request.query)
@@ -525,7 +613,42 @@ async def find_records(
     benchmark = query_param_enabled(request, "benchmark")
     invalidate_cache = query_param_enabled(request, "invalidate")
 
-    results, pagination, benchmark_result = await async_table.find_records(
+    # Cursor (keyset) pagination, enabled by supplying _cursor. An empty value requests the first page.
+    cursor = request.query.get("_cursor")
+    keyset = None
+    if cursor is not None and not fetch_single:
+        try:
+            if groups:
+                raise ValueError("unsupported_group")
+            keyset = keyset_order(
+                ordering,
+                [
+                    key
+                    for key in (async_table.cursor_keys or async_table.primary_keys)
+                    if enable_joins or key in async_table.keys
+                ],
+            )
+            if cursor:
+                decoded = decode_cursor(cursor, required_keys=("order", "values"))
+                if decoded["order"] != [list(col) for col in keyset] or len(
+                    decoded["values"]
+                ) != len(keyset):
+                    raise ValueError("invalid_cursor")
+                condition, cursor_values = keyset_condition(keyset, decoded["values"])
+                conditions = conditions + [condition]
+                values = values + cursor_values
+        except ValueError:
+            return web_response(400, {"error": "Invalid cursor"})
+
+        ordering = ['"{}" {}'.format(col, direction) for col, direction in keyset]
+        page, offset = 1, 0
+        # Fetch one extra row to detect whether a further page exists,
+        # and leave it out before postprocessing.
+        postprocess = _limit_results(limit, postprocess)
+        limit = limit + 1
+
+    find = partial(
+        async_table.find_records,
         conditions=conditions,
         values=values,
         limit=limit,
@@ -541,6 +664,45 @@ async def find_records(
         benchmark=benchmark,
         overwrite_select_from=overwrite_select_from,
     )
+    if benchmark or invalidate_cache:
+        results, pagination, benchmark_result = await find()
+    else:
+        # Identical requests in flight share one query and postprocess. The path and
+        # query of the request are part of the key, as the postprocess depends on them.
+        key = repr(
+            (
+                request.path,
+                sorted(request.query.items()),
+                async_table.table_name,
+                conditions,
+                values,
+                limit,
+                offset,
+                ordering,
+                groups,
+                group_limit,
+                fetch_single,
+                enable_joins,
+                overwrite_select_from,
+            )
+        )
+        results, pagination, benchmark_result = await find_records_in_flight.do(
+            key, find
+        )
+
+    if keyset and pagination:
+        limit = limit - 1
+        next_cursor = None
+        if pagination.count > limit:
+            next_cursor = encode_cursor(
+                {
+                    "order": keyset,
+                    "values": [pagination.next_cursor_record[col] for col, _ in keyset],
+                }
+            )
+        pagination = pagination._replace(
+            limit=limit, count=min(pagination.count, limit), next_cursor=next_cursor
+        )
 
     if fetch_single:
         status, res = format_response(request, results)
@@ -553,6 +715,19 @@ async def find_records(
     return web_response(status, res)
 
 
+def _limit_results(limit: int, postprocess: Callable = None):
+    async def _postprocess(db_response: DBResponse, invalidate_cache=False):
+        if isinstance(db_response.body, list):
+            db_response = db_response._replace(body=db_response.body[:limit])
+        if postprocess is None:
+            return db_response
+        if iscoroutinefunction(postprocess):
+            return await postprocess(db_response, invalidate_cache=invalidate_cache)
+        return postprocess(db_response, invalidate_cache=invalidate_cache)
+
+    return _postprocess
+
+
 def query_param_enabled(request: web.BaseRequest, name: str) -> bool:
     """Parse boolean query parameter and return enabled status"""
     return request.query.get(name, False) in ["True", "true", "1", "t"]
@@ -583,6 +758,37 @@ class TTLQueue:
         return [value for value in await self.values() if value[0] >= since_epoch]
 
 
+class SingleFlight(object):
+    """
+    Runs at most one call per key at a time. Calls made with the key of a call in flight
+    await the result of that call instead of running again.
+
+    The call in flight is not cancelled along with the callers waiting for it.
+    """
+
+    def __init__(self):
+        self._calls = {}  # key -> Future of the call in flight
+
+    def in_flight(self, key) -> bool:
+        return key in self._calls
+
+    async def do(self, key, fn: Callable, *args, **kwargs):
+        future = self._calls.get(key)
+        if future is None:
+            future = self._calls[key] = asyncio.ensure_future(fn(*args, **kwargs))
+
+            def _done(_):
+                if self._calls.get(key) is future:
+                    del self._calls[key]
+
+            future.add_done_callback(_done)
+        return await asyncio.shield(future)
+
+
+# Queries of find_records in flight, shared by identical requests
+find_records_in_flight = SingleFlight()
+
+
 def get_pathspec_from_request(
     request: MultiDict,
 ) -> Tuple[str, str, str, str, Optional[str]]:
@@ -51,6 +51,9 @@ class Websocket(object):
 
     Example event:
     {"type": "UPDATE", "uuid": "myst3rySh4ck", "resource": "/runs", "data": {"foo": "bar"}}
+
+    Subscriptions are announced with 'ws-subscribe' and 'ws-unsubscribe' events carrying the
+    resource path, for resources whose events are produced on demand (f.ex. card data).
     """
 
     def __init__(
@@ -203,6 +206,7 @@ class Websocket(object):
             disconnected_ts=None,
         )
         self._subscriptions[ws].append(subscription)
+        self.event_emitter.emit("ws-subscribe", _resource)
 
         # Send previous events that client might have missed due to disconnection
         if since:
@@ -222,19 +226,27 @@ class Websocket(object):
         if ws not in self._subscriptions:
             return
         if uuid:
+            removed = [s for s in self._subscriptions[ws] if uuid == s.uuid]
             self._subscriptions[ws] = list(
                 filter(lambda s: uuid != s.uuid, self._subscriptions[ws])
             )
             if len(self._subscriptions[ws]) == 0:
                 del self._subscriptions[ws]
         else:
-            del self._subscriptions[ws]
+            removed = self._subscriptions.pop(ws)
+        for subscription in removed:
+            # subscriptions of disconnected clients were announced as unsubscribed already
+            if not subscription.disconnected_ts:
+                self.event_emitter.emit("ws-unsubscribe", subscription.resource)
 
     async def handle_disconnect(self, ws):
         """
         Sets disconnected timestamp on websocket subscription without removing it from the list.
         Removing is handled by event_handler that checks for expired subscriptions before emitting
         """
+        for subscription in self._subscriptions[ws]:
+            if not subscription.disconnected_ts:
+                self.event_emitter.emit("ws-unsubscribe", subscription.resource)
         self._subscriptions[ws] = list(
             map(
                 lambda sub: sub._replace(disconnected_ts=time.time()),
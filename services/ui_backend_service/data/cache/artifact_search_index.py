@@ -0,0 +1,168 @@
+import os
+import json
+import hashlib
+import sqlite3
+from typing import Dict, Iterable, List
+
+from services.ui_backend_service.data import unpack_processed_value
+
+# Location of the per-run search indices. The directories are handed to the cache
+# as ephemeral storage paths, so the index files are subject to the regular cache GC.
+SEARCH_INDEX_ROOT = os.path.join(".", "cache_data", "artifact_search", "SEARCH_INDEX")
+SEARCH_INDEX_FILENAME = "index.sqlite"
+
+# Seconds to wait for a concurrent writer to release the index.
+SEARCH_INDEX_LOCK_TIMEOUT = 30
+
+# Pathspecs to look up per query. SQLite limits the number of parameters of a query,
+# to 999 on versions before 3.32.
+SEARCH_INDEX_QUERY_BATCH = 500
+
+
+class ArtifactSearchIndex(object):
+    """
+    Persistent index of searchable artifact values for a single run.
+
+    Each indexed artifact stores the lowercase string representation of its value that
+    searches match against, so that subsequent searches over the same artifacts with
+    any search term or operator require neither fetching nor deserializing the artifacts again.
+
+    Entries are looked up by their pathspec primary key and matched with the filter
+    of the search operator in Python. There is no full-text index on the values, as
+    most operators (eq, lt, gt, sw, ew, re) are not served by one, and a search
+    matches a single artifact name across the tasks of a run, which are few enough
+    to read by primary key.
+
+    Parameters
+    ----------
+    path : str
+        Directory to store the index database in.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self._conn = sqlite3.connect(
+            os.path.join(path, SEARCH_INDEX_FILENAME),
+            timeout=SEARCH_INDEX_LOCK_TIMEOUT,
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS artifacts ("
+            "pathspec TEXT PRIMARY KEY, "
+            "included INTEGER NOT NULL, "
+            "searchable TEXT, "
+            "error TEXT)"
+        )
+        self._conn.commit()
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _select(self, columns: str, pathspecs: Iterable[str]):
+        "Yield the rows of the given pathspecs, looked up in batches"
+        pathspecs = list(set(pathspecs))
+        for i in range(0, len(pathspecs), SEARCH_INDEX_QUERY_BATCH):
+            batch = pathspecs[i : i + SEARCH_INDEX_QUERY_BATCH]
+            yield from self._conn.execute(
+                "SELECT {} FROM artifacts WHERE pathspec IN ({})".format(
+                    columns, ", ".join("?" * len(batch))
+                ),
+                batch,
+            )
+
+    def indexed_pathspecs(self, pathspecs: Iterable[str]) -> List[str]:
+        "Return the subset of pathspecs that are already present in the index"
+        return [pathspec for (pathspec,) in self._select("pathspec", pathspecs)]
+
+    def add(self, entries: Dict[str, str]):
+        """
+        Add cacheable artifact values to the index, replacing existing entries.
+
+        Parameters
+        ----------
+        entries : Dict[str, str]
+            pathspec -> cacheable artifact value (json string), as produced by
+            `cacheable_artifact_value` or `cacheable_exception_value`
+        """
+        rows = []
+        for pathspec, cached_value in entries.items():
+            load_success, value, detail, trace = unpack_processed_value(
+                json.loads(cached_value)
+            )
+            error = (
+                None
+                if load_success
+                else {
+                    "id": value or "artifact-handle-failed",
+                    "detail": detail or "Unknown error during artifact processing",
+                    "traceback": trace,
+                }
+            )
+            rows.append(
+                (
+                    pathspec,
+                    1 if load_success else 0,
+                    # keep the matching case-insensitive
+                    str(value).lower(),
+                    json.dumps(error) if error else None,
+                )
+            )
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO artifacts (pathspec, included, searchable, error) "
+                "VALUES (?, ?, ?, ?)",
+                rows,
+            )
+
+    def search(self, pathspecs: Iterable[str], searchterm: str, filter_fn) -> Dict:
+        """
+        Match the search term against indexed artifacts.
+
+        Pathspecs missing from the index are reported as not included in the search.
+
+        Returns
+        -------
+        Dict
+            pathspec -> {"included": bool, "matches": bool, "error": Optional[Dict]}
+        """
+        wanted = set(pathspecs)
+        term = searchterm.lower()
+        results = {}
+        for pathspec, included, searchable, error in self._select(
+            "pathspec, included, searchable, error", wanted
+        ):
+            results[pathspec] = {
+                "included": bool(included),
+                "matches": filter_fn(searchable, term),
+                "error": json.loads(error) if error else None,
+            }
+
+        for pathspec in wanted - results.keys():
+            results[pathspec] = {
+                "included": False,
+                "matches": filter_fn("none", term),
+                "error": {
+                    "id": "artifact-handle-failed",
+                    "detail": "Unknown error during artifact processing",
+                    "traceback": None,
+                },
+            }
+        return results
+
+
+def search_index_path(pathspecs: Iterable[str]) -> str:
+    """
+    Construct the index location for the run(s) that the artifact pathspecs belong to.
+
+    Example:
+        ["FlowId/RunNumber/StepName/TaskId/ArtifactName/0"] -> "./cache_data/artifact_search/SEARCH_INDEX/<sha1 of FlowId/RunNumber>"
+    """
+    runs = sorted(set("/".join(pathspec.split("/")[:2]) for pathspec in pathspecs))
+    _id = hashlib.sha1("-".join(runs).encode("utf-8")).hexdigest()
+    return os.path.join(SEARCH_INDEX_ROOT, _id)
@@ -1,13 +1,12 @@
 import time
-from subprocess import Popen
 import os
 import sys
+import json
 from services.utils import logging
 import uuid
-from asyncio.subprocess import Process
 import asyncio
+from collections import Counter, defaultdict
 from .card_cache_service import CardCache, cleanup_non_running_caches
-import contextlib
 
 _PARENT_DIR = os.path.dirname(__file__)
 PATH_TO_CACHE_SERVICE = os.path.join(_PARENT_DIR, "card_cache_service.py")
@@ -21,12 +20,18 @@ CARD_UPDATE_POLLING_FREQUENCY = os.environ.get(
 CARD_LIST_POLLING_FREQUENCY = os.environ.get(
     "CARD_CACHE_CARD_LIST_POLLING_FREQUENCY", 2
 )
-CARD_CACHE_PROCESS_MAX_UPTIME = os.environ.get(
-    "CARD_CACHE_PROCESS_MAX_UPTIME", 3 * 60  # 3 minutes
+# Cards that do not change are refreshed less and less often, down to once in this many seconds
+CARD_CACHE_MAX_REFRESH_INTERVAL = os.environ.get("CARD_CACHE_MAX_REFRESH_INTERVAL", 10)
+# Cards of a task are refreshed until nobody has viewed them for this many seconds
+CARD_CACHE_TASK_IDLE_TIME = os.environ.get(
+    "CARD_CACHE_TASK_IDLE_TIME",
+    os.environ.get("CARD_CACHE_PROCESS_MAX_UPTIME", 3 * 60),  # 3 minutes
 )
 CARD_CACHE_PROCESS_NO_CARD_WAIT_TIME = os.environ.get(
     "CARD_CACHE_PROCESS_NO_CARD_WAIT_TIME", 4  # 4 seconds
 )
+# Number of worker threads refreshing the cards of all viewed tasks
+CARD_CACHE_MAX_WORKERS = os.environ.get("CARD_CACHE_MAX_WORKERS", 8)
 DEFAULT_CACHE_STORAGE_PATH = "/tmp"
 CACHE_STORAGE_PATH = os.environ.get(
     "CARD_CACHE_STORAGE_PATH", DEFAULT_CACHE_STORAGE_PATH
@@ -36,141 +41,50 @@ CACHE_SERVICE_LOG_STORAGE_ROOT = os.environ.get("CACHE_SERVICE_LOG_STORAGE_ROOT"
 CARD_API_HTML_WAIT_TIME = float(os.environ.get("CARD_API_HTML_WAIT_TIME", 5))
 
 
-async def _get_latest_return_code(process: Process):
-    with contextlib.suppress(asyncio.TimeoutError):
-        await asyncio.wait_for(process.wait(), 1e-6)
-    return process.returncode
-
-
-async def process_status(process: Process):
-    return_code = await _get_latest_return_code(process)
-    if return_code is None:
-        return "running"
-    if return_code == 0:
-        return "completed"
-    return "failed"
-
-
-async def process_is_running(process: Process):
-    status = await process_status(process)
-    return status == "running"
-
-
-class AsyncProcessManager:
-
-    processes = {
-        # "procid": {
-        #     "proc": asyncio.subprocess.Process,
-        #     "started": time.time()
-        # }
-    }
-
-    def __init__(self, logger) -> None:
-        self.lock = asyncio.Lock()
-        self.logger = logger
-
-    def _register_process(self, procid, proc):
-        self.processes[procid] = {
-            "proc": proc,
-            "started": time.time(),
-        }
-
-    async def add(self, procid, cmd, logs_file_path=CACHE_SERVICE_LOG_STORAGE_ROOT):
-        running_proc = await self.is_running(procid)
-        if running_proc:
-            return procid, "running"
-        # The lock helps to ensure that the processes only get added one at a time
-        # This is important because the processes are added to a shared dictionary
-        async with self.lock:
-            proc, started_on = self.get(procid)
-            if proc is not None:
-                await self.remove(procid, delete_item=True)
-
-            logs_file = None
-            if logs_file_path is not None:
-                logs_file = open(
-                    os.path.join(
-                        logs_file_path,
-                        "card_cache_service_%s.log" % (procid),
-                    ),
-                    "w",
-                )
-
-            await self.spawn(procid, cmd, logs_file, logs_file)
-            return procid, "started"
-
-    def get(self, procid):
-        proc_dict = self.processes.get(procid, None)
-        if proc_dict is not None:
-            return proc_dict["proc"], proc_dict["started"]
-        return None, None
-
-    async def spawn(self, procid, cmd, stdout_file, std_err_file=None):
-        proc = await asyncio.create_subprocess_exec(
-            *cmd,
-            stdout=stdout_file,
-            stderr=std_err_file,
-            shell=False,
-        )
-        self._register_process(procid, proc)
-
-    async def remove(self, procid, delete_item=True):
-        if procid not in self.processes:
-            return
-        self.logger.info("Removing process: %s" % procid)
-        await self.processes[procid]["proc"].wait()
-        self.logger.info("Process removed: %s" % procid)
-        if self.processes[procid]["proc"].stdout is not None:
-            self.processes[procid]["proc"].stdout.close()
-        if delete_item:
-            del self.processes[procid]
-
-    async def cleanup(self):
-        # The lock ensures that when the dictionary is being modified,
-        # no other process can modify it at the same time.
-        async with self.lock:
-            removal_keys = []
-            for procid in self.processes:
-                running_proc = await self.is_running(procid)
-                if running_proc:
-                    continue
-                removal_keys.append(procid)
-                await self.remove(procid, delete_item=False)
-            for procid in removal_keys:
-                del self.processes[procid]
-            return removal_keys
-
-    async def is_running(self, procid):
-        if procid not in self.processes:
-            return False
-        return await process_is_running(self.processes[procid]["proc"])
-
-    async def get_status(self, procid):
-        if procid not in self.processes:
-            return None
-        return await process_status(self.processes[procid]["proc"])
-
-    async def running_processes(self):
-        return [procid for procid in self.processes if await self.is_running(procid)]
-
-
 class CardCacheManager:
-    def __init__(self) -> None:
+    """
+    Manages a single card cache service process, which refreshes the cards of all
+    viewed tasks with a bounded pool of workers (see CardRefreshScheduler).
+
+    Tasks are registered with the service every time their cards are viewed. The service
+    reports the status of each task ("running", "completed" or "failed") along with its
+    refresh lag, which are kept in memory. The service is started on the first
+    registration, and again if it exits.
+
+    The service also reports every update of the cache of a task, which is emitted as a
+    'card-update' event with the pathspec, card hash and update type ("html", "data" or
+    "list"), and wakes up the requests waiting for the cache (see wait_for_update).
+    Tasks that are watched, f.ex. by websocket subscriptions, are registered again
+    periodically so that they keep being refreshed until they are unwatched.
+    """
+
+    def __init__(self, event_emitter=None) -> None:
         self.logger = logging.getLogger("CardCacheManager")
-        self._process_manager = AsyncProcessManager(self.logger)
+        self.event_emitter = event_emitter
         self._manager_id = uuid.uuid4().hex
+        self._proc = None
+        self._reader = None
+        self.lock = asyncio.Lock()
+        self._tasks = {
+            # "pathspec": {"status": "running", "lag": 0.01}
+        }
+        # pathspec -> number of watchers
+        self._watched = Counter()
+        # pathspec -> futures of the requests waiting for an update
+        self._waiters = defaultdict(set)
         self.logger.info("CardCacheManager initialized")
 
-    def _make_task_command(self, pathspec):
+    def _make_service_command(self):
         return [
             str(i)
             for i in [
                 sys.executable,
                 PATH_TO_CACHE_SERVICE,
-                "task-updates",
-                pathspec,
-                "--uptime-seconds",
-                CARD_CACHE_PROCESS_MAX_UPTIME,
+                "serve",
+                "--max-workers",
+                CARD_CACHE_MAX_WORKERS,
+                "--idle-seconds",
+                CARD_CACHE_TASK_IDLE_TIME,
                 "--list-frequency",
                 CARD_LIST_POLLING_FREQUENCY,
                 "--data-update-frequency",
@@ -181,6 +95,8 @@ class CardCacheManager:
                 CACHE_STORAGE_PATH,
                 "--max-no-card-wait-time",
                 CARD_CACHE_PROCESS_NO_CARD_WAIT_TIME,
+                "--max-refresh-interval",
+                CARD_CACHE_MAX_REFRESH_INTERVAL,
             ]
         ]
 
@@ -192,55 +108,204 @@ class CardCacheManager:
         )
         return cache
 
+    def service_is_running(self):
+        return self._proc is not None and self._proc.returncode is None
+
+    async def _ensure_service(self):
+        if self.service_is_running():
+            return
+        async with self.lock:
+            if self.service_is_running():
+                return
+            logs_file = None
+            if CACHE_SERVICE_LOG_STORAGE_ROOT is not None:
+                logs_file = open(
+                    os.path.join(
+                        CACHE_SERVICE_LOG_STORAGE_ROOT,
+                        "card_cache_service_%s.log" % (self._manager_id),
+                    ),
+                    "a",
+                )
+            self.logger.info("Starting card cache service")
+            self._proc = await asyncio.create_subprocess_exec(
+                *self._make_service_command(),
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=logs_file,
+                shell=False,
+            )
+            if logs_file is not None:
+                logs_file.close()
+            # Tasks of a previous service are no longer refreshed
+            self._tasks.clear()
+            self._reader = asyncio.create_task(self._read_reports(self._proc))
+
+    async def _read_reports(self, proc):
+        async for line in proc.stdout:
+            try:
+                report = json.loads(line)
+                pathspec = report["pathspec"]
+                if "update" in report:
+                    if self.event_emitter is not None:
+                        self.event_emitter.emit(
+                            "card-update",
+                            pathspec,
+                            report.get("card_hash"),
+                            report["update"],
+                        )
+                else:
+                    self._tasks[pathspec] = {
+                        "status": report["status"],
+                        "lag": report.get("lag"),
+                    }
+            except (ValueError, KeyError, TypeError):
+                # not a report, f.ex. output of the Metaflow client
+                continue
+            self._wake(pathspec)
+        await proc.wait()
+        self.logger.warning(
+            "Card cache service exited with code %s" % (proc.returncode)
+        )
+        for task in self._tasks.values():
+            if task["status"] == "running":
+                task["status"] = "failed"
+        for pathspec in list(self._waiters):
+            self._wake(pathspec)
+
+    def _wake(self, pathspec):
+        for future in self._waiters.pop(pathspec, ()):
+            if not future.done():
+                future.set_result(None)
+
+    async def wait_for_update(self, pathspec, timeout):
+        """
+        Waits for at most timeout seconds for the next report about a task,
+        either an update of its cache or a change of its status.
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._waiters[pathspec].add(future)
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            waiters = self._waiters.get(pathspec)
+            if waiters is not None:
+                waiters.discard(future)
+                if not waiters:
+                    del self._waiters[pathspec]
+
     async def register(self, pathspec):
-        proc_id = pathspec
-        is_running = await self._process_manager.is_running(proc_id)
-        if is_running:
-            return proc_id, "running"
+        """
+        Registers a view of the cards of a task, so that the service keeps refreshing
+        them. Returns the pathspec and "started" if the task was not being refreshed,
+        or "running" if it was.
+        """
+        await self._ensure_service()
+        try:
+            self._proc.stdin.write(
+                (json.dumps({"op": "view", "pathspec": pathspec}) + "\n").encode()
+            )
+            await self._proc.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError):
+            self.logger.error("Card cache service is not accepting registrations")
+            return pathspec, "failed"
 
-        cmd = self._make_task_command(pathspec)
+        if self.get_status(pathspec) == "running":
+            return pathspec, "running"
         self.logger.info("Registering task [%s]" % (pathspec))
-        _id, status = await self._process_manager.add(
-            proc_id, cmd, logs_file_path=CACHE_SERVICE_LOG_STORAGE_ROOT
-        )
-        return _id, status
+        self._tasks[pathspec] = {"status": "running", "lag": None}
+        return pathspec, "started"
+
+    async def watch(self, pathspec):
+        "Keeps refreshing the cards of a task until it is unwatched as many times"
+        self._watched[pathspec] += 1
+        return await self.register(pathspec)
 
-    async def get_status(self, pathspec):
-        return await self._process_manager.get_status(pathspec)
+    def unwatch(self, pathspec):
+        self._watched[pathspec] -= 1
+        if self._watched[pathspec] <= 0:
+            del self._watched[pathspec]
 
-    async def start_process_cleanup_routine(self, interval=60):
+    async def keep_watched_routine(self, interval):
+        "Registers the watched tasks every interval seconds, before they go idle"
         try:
             while True:
-                cleanup_keys = (
-                    await self._process_manager.cleanup()
-                )  # Perform the cleanup
-                if len(cleanup_keys) > 0:
+                await asyncio.sleep(interval)
+                for pathspec in list(self._watched):
+                    await self.register(pathspec)
+        except asyncio.CancelledError:
+            self.logger.info("Watched tasks routine cancelled")
+
+    def get_status(self, pathspec):
+        "Returns the refresh status of a task, or None if it has not been registered"
+        return self._tasks.get(pathspec, {}).get("status")
+
+    def status(self):
+        "Returns the state of the card cache service, with the status and refresh lag of each task"
+        return {
+            "pid": self._proc.pid if self._proc else None,
+            "returncode": self._proc.returncode if self._proc else None,
+            "tasks": dict(self._tasks),
+        }
+
+    def running_tasks(self):
+        return [
+            pathspec
+            for pathspec, task in self._tasks.items()
+            if task["status"] == "running"
+        ]
+
+    async def start_status_cleanup_routine(self, interval=60):
+        try:
+            while True:
+                # Forget the tasks that are no longer refreshed
+                finished = [
+                    pathspec
+                    for pathspec, task in list(self._tasks.items())
+                    if task["status"] != "running"
+                ]
+                for pathspec in finished:
+                    self._tasks.pop(pathspec, None)
+                lags = [task["lag"] for task in self._tasks.values() if task["lag"]]
+                if lags:
                     self.logger.info(
-                        "Cleaned up processes: %s" % ", ".join(cleanup_keys)
+                        "Refreshing cards of %s tasks, max refresh lag %.3fs"
+                        % (len(lags), max(lags))
                     )
                 await asyncio.sleep(
                     interval
                 )  # Wait for a specified interval before the next cleanup
         except asyncio.CancelledError:
-            self.logger.info("Process cleanup routine cancelled")
+            self.logger.info("Status cleanup routine cancelled")
 
     async def cleanup_disk_routine(self, interval=60 * 60 * 4):
         try:
             while True:
                 await asyncio.sleep(interval)
-                # The lock ensure that new processes are not getting created or
-                # processes are not getting removed when the disk cleanup is happening.
-                async with self._process_manager.lock:
-                    running_proc_ids = await self._process_manager.running_processes()
+                # The lock ensure that the service does not get restarted
+                # when the disk cleanup is happening.
+                async with self.lock:
                     cleanup_non_running_caches(
-                        CACHE_STORAGE_PATH, CardCache.CACHE_DIR, running_proc_ids
+                        CACHE_STORAGE_PATH, CardCache.CACHE_DIR, self.running_tasks()
                     )
         except asyncio.CancelledError:
             self.logger.info("Disk cleanup routine cancelled")
 
+    async def stop(self, timeout=5):
+        "Stops the card cache service, which exits once its stdin is closed"
+        if not self.service_is_running():
+            return
+        self._proc.stdin.close()
+        try:
+            await asyncio.wait_for(self._proc.wait(), timeout)
+        except asyncio.TimeoutError:
+            self._proc.kill()
+            await self._proc.wait()
+
 
 async def verify_process_has_crashed(cache_manager: CardCacheManager, pathspec):
-    _status = await cache_manager.get_status(pathspec)
+    _status = cache_manager.get_status(pathspec)
     if _status in ["failed", None]:
         return True
     return False
@@ -264,13 +329,17 @@ async def wait_until_card_is_ready(
     cache_manager: CardCacheManager,
     local_cache: CardCache,
     max_wait_time=3,
-    frequency=0.1,
+    poll_interval=1,
 ):
+    """
+    Waits for the html of a card to be cached. The cache is checked again whenever the
+    service reports about the task, and at least every poll_interval seconds.
+    """
     html = None
     start_time = time.time()
     await cache_manager.register(local_cache.pathspec)
     # At this point in the function the process should aleady be running
-    while time.time() - start_time < max_wait_time:
+    while True:
         html = _get_html_or_refresh(local_cache)
         if html is not None:
             break
@@ -282,20 +351,29 @@ async def wait_until_card_is_ready(
                 f"Card {local_cache.card_hash} has crashed for {local_cache.pathspec}"
             )
             break
-        await asyncio.sleep(frequency)
+        remaining = max_wait_time - (time.time() - start_time)
+        if remaining <= 0:
+            break
+        await cache_manager.wait_for_update(
+            local_cache.pathspec, min(remaining, poll_interval)
+        )
     return html  # We ONLY return None if the card is not found after max_wait_time; This is because cards may not be ready
 
 
-async def list_cards(cache_manager: CardCacheManager, pathspec, max_wait_time=3):
+async def list_cards(
+    cache_manager: CardCacheManager, pathspec, max_wait_time=3, poll_interval=1
+):
     await cache_manager.register(pathspec)
     _cache = cache_manager.get_local_cache(pathspec, None)
     start_time = time.time()
-    while time.time() - start_time < max_wait_time:
+    while True:
         try:
             card_hashes = _cache.read_card_list()
             if card_hashes is not None:
                 return card_hashes
         except Exception as e:
             logging.error(f"Error reading card list for {pathspec}: {e}")
-        await asyncio.sleep(0.1)
-    return None
+        remaining = max_wait_time - (time.time() - start_time)
+        if remaining <= 0:
+            return None
+        await cache_manager.wait_for_update(pathspec, min(remaining, poll_interval))
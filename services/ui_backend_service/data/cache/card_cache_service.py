@@ -1,8 +1,10 @@
-from time import perf_counter
+from concurrent.futures import ThreadPoolExecutor
 from metaflow._vendor import click
 import time
 import os
-from threading import Thread
+import queue
+import sys
+from threading import Lock, Thread
 from metaflow import Task, namespace, Run
 from metaflow.cards import get_cards
 from metaflow.plugins.cards.card_client import Card
@@ -94,6 +96,8 @@ class CardCache:
         self.cache_path = cache_path
         self.card_id = None
         self.card_type = None
+        # file name: hash of the content last written to it
+        self._digests = {}
         if init:
             self._init_cache()
 
@@ -143,6 +147,27 @@ class CardCache:
         with open(os.path.join(self.base_dir, self._HTML_FILE), "w") as f:
             f.write(html)
 
+    def _changed(self, file_name, content):
+        digest = _make_hash(content)
+        if self._digests.get(file_name) == digest:
+            return False
+        self._digests[file_name] = digest
+        return True
+
+    def write_data_if_changed(self, data):
+        "Writes the card data unless it is the same as last written. Returns whether it was written"
+        if not self._changed(self._DATA_FILE, json.dumps(data)):
+            return False
+        self._write_data(data)
+        return True
+
+    def write_html_if_changed(self, html):
+        "Writes the card html unless it is the same as last written. Returns whether it was written"
+        if not self._changed(self._HTML_FILE, html):
+            return False
+        self._write_html(html)
+        return True
+
     def _set_card_metadata(self, card_id, card_type):
         self.card_id = card_id
         self.card_type = card_type
@@ -180,25 +205,33 @@ class CardCache:
         shutil.rmtree(self.base_dir, ignore_errors=True)
 
 
-def _eligible_for_refresh(update_timings, update_frequency):
+def _eligible_for_refresh(update_timings, update_frequency, now=None):
     if update_timings is None:
         return True
-    if time.time() - update_timings >= update_frequency:
+    if (now or time.time()) - update_timings >= update_frequency:
         return True
     return False
 
 
 def _update_card_cache(cache: CardCache, update_type: str, card: Card):
+    "Refreshes the html or data of the card in the cache. Returns whether they changed"
     if update_type == "data":
         data = card.get_data()
-        cache._write_data(data)
+        return cache.write_data_if_changed(data)
     elif update_type == "html":
         card._html = None
         html = card.get()
-        cache._write_html(html)
+        return cache.write_html_if_changed(html)
     else:
         raise Exception(f"Invalid update type {update_type}")
-    # def update_cache(self, card_hash, update_type):
+
+
+def _html_size(card: Card):
+    "Size of the card html in the datastore, or None if it can not be told without downloading it"
+    try:
+        return card._card_ds._backend.size_file(card.path)
+    except Exception:
+        return None
 
 
 class PeriodicLogger:
@@ -217,6 +250,18 @@ class PeriodicLogger:
 
 
 class TaskCardCacheService:
+    """
+    Keeps the cards of a task cached on disk.
+
+    The html and data of the cards are refreshed at HTML_UPDATE_FREQUENCY and
+    DATA_UPDATE_FREQUENCY. Content that has not changed is not written again, and while
+    it stays unchanged the interval between refreshes doubles, up to MAX_REFRESH_INTERVAL.
+    The html is only downloaded again when its size in the datastore changed, or when it
+    has not been downloaded for MAX_REFRESH_INTERVAL.
+
+    on_update is called with the task pathspec, the card hash and the type of update
+    ("html", "data", or "list" with no card hash) whenever the cache changed.
+    """
 
     LIST_FREQUENCY_SECONDS = 5
 
@@ -224,6 +269,8 @@ class TaskCardCacheService:
 
     HTML_UPDATE_FREQUENCY = 2
 
+    MAX_REFRESH_INTERVAL = 10
+
     def __init__(
         self,
         task_pathspec,
@@ -233,6 +280,8 @@ class TaskCardCacheService:
         data_update_frequency=0.2,
         html_update_frequency=2,
         max_no_card_wait_time=10,
+        max_refresh_interval=10,
+        on_update=None,
     ) -> None:
         self._task_pathspec = task_pathspec
         self._cache: Dict[str, CardCache] = {
@@ -251,7 +300,21 @@ class TaskCardCacheService:
         self.LIST_FREQUENCY_SECONDS = list_frequency_seconds
         self.DATA_UPDATE_FREQUENCY = data_update_frequency
         self.HTML_UPDATE_FREQUENCY = html_update_frequency
+        self.MAX_REFRESH_INTERVAL = max_refresh_interval
         self._max_no_card_wait_time = max_no_card_wait_time
+        self._timings = {"data": None, "html": None, "list": None}
+        # current interval between refreshes, backing off while the content is unchanged
+        self._intervals = {
+            "data": self.DATA_UPDATE_FREQUENCY,
+            "html": self.HTML_UPDATE_FREQUENCY,
+        }
+        self._html_downloads = {
+            # card_hash: (size of the html in the datastore, time of download)
+        }
+        self._available_cards = None
+        # Called with the pathspec, card hash and "html", "data" or "list" when the cache changed
+        self._on_update = on_update
+        self._started = None
 
     @property
     def base_dir(self):
@@ -279,6 +342,12 @@ class TaskCardCacheService:
             )
             self._cache[card.hash]._set_card_metadata(card.id, card.type)
             self._cards[card.hash] = card
+            # refresh the new card right away
+            self._intervals = {
+                "data": self.DATA_UPDATE_FREQUENCY,
+                "html": self.HTML_UPDATE_FREQUENCY,
+            }
+            self._timings["data"] = self._timings["html"] = None
 
         status = False
         if len(_cards) > 0:
@@ -286,16 +355,32 @@ class TaskCardCacheService:
 
         return status, resolved_cards.unresolvable
 
-    def update_card_cache(self, card_hash, update_type):
+    def update_card_cache(self, card_hash, update_type, now=None):
+        "Refreshes the html or data of a card. Returns whether they changed"
         if card_hash not in self._cache:
             raise Exception(
                 f"Card with hash {card_hash} not found for task {self._task_pathspec}"
             )
+        now = now or time.time()
         cache = self._cache[card_hash]
         card = self._cards[card_hash]
-        _update_card_cache(cache, update_type, card)
+        if update_type != "html":
+            return _update_card_cache(cache, update_type, card)
+
+        size = _html_size(card)
+        downloaded = self._html_downloads.get(card_hash)
+        if (
+            size is not None
+            and downloaded is not None
+            and downloaded[0] == size
+            and now - downloaded[1] < self.MAX_REFRESH_INTERVAL
+        ):
+            return False
+        self._html_downloads[card_hash] = (size, now)
+        return _update_card_cache(cache, update_type, card)
 
     def write_available_cards(self):
+        "Writes the list of cards of the task, unless it is unchanged. Returns whether it was written"
         _cardinfo = {}
         for chash in self._cards:
             _card = self._cards[chash]
@@ -303,8 +388,16 @@ class TaskCardCacheService:
                 "id": _card.id,
                 "type": _card.type,
             }
+        if _cardinfo == self._available_cards:
+            return False
         with open(os.path.join(self.base_dir, CardCache.LIST_METADATA), "w") as f:
             json.dump(_cardinfo, f)
+        self._available_cards = _cardinfo
+        return True
+
+    def _notify_update(self, card_hash, update_type):
+        if self._on_update is not None:
+            self._on_update(self._task_pathspec, card_hash, update_type)
 
     def _get_cards_safely(self) -> ResolvedCards:
         try:
@@ -349,46 +442,237 @@ class TaskCardCacheService:
                 True,
             )  # On other errors fail away too!
 
-    def refresh_loop(self):
-        timings = {"data": None, "html": None, "list": None}
-        start_time = time.time()
-        self.logger.info("Starting cache refresh loop for %s" % self._task_pathspec)
+    # Interval of polling for the cards of a task that has none yet
+    NO_CARD_POLL_INTERVAL = 0.25
+
+    def refresh_due(self, now=None):
+        """
+        Performs the updates of the card list, html and data that are due.
+
+        Returns the time at which the next update is due, or None when there is
+        nothing more to refresh because no cards were found for the task within
+        max_no_card_wait_time.
+        """
+        now = now or time.time()
+        if self._started is None:
+            self._started = now
+
         cards_are_unresolvable = False
-        _sleep_time = 0.25
-        while True:
-            if time.time() - start_time > self._uptime_seconds:  # exit condition
-                break
-            if _eligible_for_refresh(timings["list"], self.LIST_FREQUENCY_SECONDS):
-                list_status, cards_are_unresolvable = self.load_all_cards()
-                if list_status:
-                    self.write_available_cards()
-
-            cache_is_empty = len(self._cache) == 0
-            crossed_no_card_wait_time = (
-                time.time() - start_time > self._max_no_card_wait_time
-            )
-            if cache_is_empty and not crossed_no_card_wait_time:
-                time.sleep(_sleep_time)
-                continue
-            elif cache_is_empty and crossed_no_card_wait_time:
+        if not self._cache or _eligible_for_refresh(
+            self._timings["list"], self.LIST_FREQUENCY_SECONDS, now
+        ):
+            list_status, cards_are_unresolvable = self.load_all_cards()
+            if list_status and self.write_available_cards():
+                self._notify_update(None, "list")
+            self._timings["list"] = now
+
+        if not self._cache:
+            if now - self._started <= self._max_no_card_wait_time:
+                return now + self.NO_CARD_POLL_INTERVAL
+            if cards_are_unresolvable:
+                self.logger.error(
+                    f"Cache is empty for {self._task_pathspec} and cards were unresolvable"
+                )
+            else:
                 self.logger.info(
                     f"Cache is empty for {self._task_pathspec} and no cards were found for {self._max_no_card_wait_time} seconds"
                 )
-                break
-            elif cache_is_empty and cards_are_unresolvable:
-                self.logger.error(
-                    f"Cache is empty for {self._task_pathspec} and no cards were unresolvable"
+            return None
+
+        for update_type, frequency in (
+            ("html", self.HTML_UPDATE_FREQUENCY),
+            ("data", self.DATA_UPDATE_FREQUENCY),
+        ):
+            if _eligible_for_refresh(
+                self._timings[update_type], self._intervals[update_type], now
+            ):
+                changed = False
+                for card_hash in self._cache:
+                    if self.update_card_cache(card_hash, update_type, now):
+                        changed = True
+                        self._notify_update(card_hash, update_type)
+                self._timings[update_type] = now
+                self._intervals[update_type] = (
+                    frequency
+                    if changed
+                    else min(
+                        self._intervals[update_type] * 2,
+                        max(self.MAX_REFRESH_INTERVAL, frequency),
+                    )
                 )
+
+        return min(
+            self._timings["html"] + self._intervals["html"],
+            self._timings["data"] + self._intervals["data"],
+            self._timings["list"] + self.LIST_FREQUENCY_SECONDS,
+        )
+
+    def refresh_loop(self):
+        start_time = time.time()
+        self.logger.info("Starting cache refresh loop for %s" % self._task_pathspec)
+        while time.time() - start_time <= self._uptime_seconds:  # exit condition
+            next_due = self.refresh_due()
+            if next_due is None:
                 break
+            time.sleep(max(next_due - time.time(), 0))
+
+
+class _ScheduledTask(object):
+    def __init__(self, pathspec, now):
+        self.pathspec = pathspec
+        self.last_viewed = now
+        self.next_due = now
+        self.refresher = None
+        self.future = None
+        # delay between refreshes being due and starting, the latest and the largest since the last report
+        self.lag = 0.0
+        self.max_lag = 0.0
+
+
+class CardRefreshScheduler(object):
+    """
+    Refreshes the card caches of many tasks over a bounded pool of worker threads.
+
+    A task is refreshed for as long as it is being viewed: tasks that have not been
+    viewed for idle_seconds are dropped, as are tasks whose cards can not be found.
+    Each task has at most one refresh in flight at a time. The delay between an update
+    of a task being due and a worker starting it is reported as the refresh lag.
+
+    Parameters
+    ----------
+    create_refresher : Callable[[str], TaskCardCacheService]
+        Creates the refresher of a task pathspec. Called on a worker thread.
+    report : Callable[[dict], None]
+        Receives the status changes of tasks, along with periodic lag reports:
+        {"pathspec": "HelloFlow/1/start/2", "status": "running", "lag": 0.01}
+    """
+
+    def __init__(
+        self,
+        create_refresher,
+        max_workers=8,
+        idle_seconds=180,
+        report=None,
+        report_interval=5,
+    ):
+        self._create_refresher = create_refresher
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="card-refresh"
+        )
+        self.idle_seconds = idle_seconds
+        self._report = report or (lambda message: None)
+        self._report_interval = report_interval
+        self._reported = time.time()
+        self._tasks: Dict[str, _ScheduledTask] = {}
+        self.logger = get_logger()
 
-            for card_hash in self._cache:
-                if _eligible_for_refresh(timings["html"], self.HTML_UPDATE_FREQUENCY):
-                    self.update_card_cache(card_hash, "html")
+    @property
+    def pathspecs(self):
+        return list(self._tasks)
+
+    def view(self, pathspec, now=None):
+        "Starts refreshing the cards of the task, or keeps refreshing them"
+        now = now or time.time()
+        task = self._tasks.get(pathspec)
+        if task is None:
+            task = self._tasks[pathspec] = _ScheduledTask(pathspec, now)
+            self._report({"pathspec": pathspec, "status": "running", "lag": 0.0})
+        task.last_viewed = now
+
+    def tick(self, now=None):
+        "Collects finished refreshes and starts the ones that are due"
+        now = now or time.time()
+        for task in list(self._tasks.values()):
+            if task.future is not None:
+                if not task.future.done():
+                    continue
+                future, task.future = task.future, None
+                if future.exception() is not None:
+                    self.logger.error(
+                        "Refreshing cards of %s failed: %s"
+                        % (task.pathspec, future.exception())
+                    )
+                    self._finish(task, "failed")
+                    continue
+                task.next_due = future.result()
+                if task.next_due is None:
+                    self._finish(task, "completed")
+                    continue
+            if now - task.last_viewed > self.idle_seconds:
+                self._finish(task, "completed")
+            elif now >= task.next_due:
+                task.future = self._executor.submit(self._refresh, task, task.next_due)
+
+        if now - self._reported >= self._report_interval:
+            self._reported = now
+            for task in self._tasks.values():
+                self._report(
+                    {
+                        "pathspec": task.pathspec,
+                        "status": "running",
+                        "lag": round(task.max_lag, 3),
+                    }
+                )
+                task.max_lag = task.lag
+
+    def _refresh(self, task: _ScheduledTask, due):
+        task.lag = max(time.time() - due, 0.0)
+        task.max_lag = max(task.max_lag, task.lag)
+        if task.refresher is None:
+            task.refresher = self._create_refresher(task.pathspec)
+        return task.refresher.refresh_due()
+
+    def _finish(self, task: _ScheduledTask, status):
+        del self._tasks[task.pathspec]
+        self._report(
+            {"pathspec": task.pathspec, "status": status, "lag": round(task.lag, 3)}
+        )
+
+    def run(self, views: queue.Queue, tick_interval=0.05):
+        """
+        Refreshes the tasks viewed through the queue of pathspecs,
+        until None is put in the queue.
+        """
+        try:
+            while True:
+                try:
+                    while True:
+                        pathspec = views.get_nowait()
+                        if pathspec is None:
+                            return
+                        self.view(pathspec)
+                except queue.Empty:
+                    pass
+                self.tick()
+                time.sleep(tick_interval)
+        finally:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _read_views(stream, views: queue.Queue):
+    "Reads view requests, one JSON object per line, until the stream is closed"
+    for line in stream:
+        try:
+            message = json.loads(line)
+        except ValueError:
+            continue
+        if message.get("op") == "view" and message.get("pathspec"):
+            views.put(message["pathspec"])
+    views.put(None)
+
+
+_report_lock = Lock()
+
+
+def _write_report(message):
+    # reports are written by the scheduler and, for updates of the cache, its workers
+    with _report_lock:
+        sys.stdout.write(json.dumps(message) + "\n")
+        sys.stdout.flush()
 
-                if _eligible_for_refresh(timings["data"], self.DATA_UPDATE_FREQUENCY):
-                    self.update_card_cache(card_hash, "data")
 
-            time.sleep(_sleep_time)
+def _report_update(pathspec, card_hash, update_type):
+    _write_report({"pathspec": pathspec, "card_hash": card_hash, "update": update_type})
 
 
 @click.group()
@@ -416,6 +700,12 @@ def cli():
     default=10,
     help="Maximum time to wait a card to be present",
 )
+@click.option(
+    "--max-refresh-interval",
+    default=10,
+    type=float,
+    help="Maximum interval between refreshes of cards that do not change",
+)
 def task_updates(
     pathspec,
     cache_path,
@@ -424,6 +714,7 @@ def task_updates(
     data_update_frequency,
     html_update_frequency,
     max_no_card_wait_time,
+    max_refresh_interval,
 ):
     cache_service = TaskCardCacheService(
         pathspec,
@@ -433,9 +724,95 @@ def task_updates(
         data_update_frequency=data_update_frequency,
         html_update_frequency=html_update_frequency,
         max_no_card_wait_time=max_no_card_wait_time,
+        max_refresh_interval=max_refresh_interval,
     )
     cache_service.refresh_loop()
 
 
+@cli.command()
+@click.option("--cache-path", default="./", help="Path to the cache")
+@click.option(
+    "--max-workers",
+    default=8,
+    type=int,
+    help="Number of worker threads refreshing cards",
+)
+@click.option(
+    "--idle-seconds",
+    default=180,
+    type=float,
+    help="Stop refreshing the cards of tasks that have not been viewed for this long",
+)
+@click.option(
+    "--list-frequency",
+    default=5,
+    type=float,
+    help="Frequency for the listing cards to populate the cache",
+)
+@click.option(
+    "--data-update-frequency",
+    default=0.2,
+    type=float,
+    help="Frequency for the data update",
+)
+@click.option(
+    "--html-update-frequency",
+    default=2,
+    type=float,
+    help="Frequency for the html update",
+)
+@click.option(
+    "--max-no-card-wait-time",
+    default=10,
+    type=float,
+    help="Maximum time to wait a card to be present",
+)
+@click.option(
+    "--max-refresh-interval",
+    default=10,
+    type=float,
+    help="Maximum interval between refreshes of cards that do not change",
+)
+def serve(
+    cache_path,
+    max_workers,
+    idle_seconds,
+    list_frequency,
+    data_update_frequency,
+    html_update_frequency,
+    max_no_card_wait_time,
+    max_refresh_interval,
+):
+    """
+    Refreshes the cards of the tasks viewed through stdin, one JSON object per line:
+    {"op": "view", "pathspec": "HelloFlow/1/start/2"}. Writes the status and refresh
+    lag of the tasks to stdout, one JSON object per line, along with the updates of
+    their caches: {"pathspec": "HelloFlow/1/start/2", "card_hash": "abc", "update": "data"}.
+    Exits when stdin is closed.
+    """
+
+    def _create_refresher(pathspec):
+        return TaskCardCacheService(
+            pathspec,
+            cache_path=cache_path,
+            list_frequency_seconds=list_frequency,
+            data_update_frequency=data_update_frequency,
+            html_update_frequency=html_update_frequency,
+            max_no_card_wait_time=max_no_card_wait_time,
+            max_refresh_interval=max_refresh_interval,
+            on_update=_report_update,
+        )
+
+    views = queue.Queue()
+    Thread(target=_read_views, args=(sys.stdin, views), daemon=True).start()
+    scheduler = CardRefreshScheduler(
+        _create_refresher,
+        max_workers=max_workers,
+        idle_seconds=idle_seconds,
+        report=_write_report,
+    )
+    scheduler.run(views)
+
+
 if __name__ == "__main__":
     cli()
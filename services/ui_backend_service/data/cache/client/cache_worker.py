@@ -2,6 +2,7 @@ import os
 import json
 
 import signal
+import threading
 
 from .cache_action import import_action_class_spec
 
@@ -37,9 +38,13 @@ def execute(tempdir, action_cls, req):
         stream = None
         if req["stream_key"]:
             stream = open(os.path.join(tempdir, req["stream_key"]), "a", buffering=1)
+            # actions may produce stream output from multiple threads.
+            stream_lock = threading.Lock()
 
             def stream_output(obj):
-                stream.write(json.dumps(obj) + "\n")
+                line = json.dumps(obj) + "\n"
+                with stream_lock:
+                    stream.write(line)
 
         else:
             stream_output = None
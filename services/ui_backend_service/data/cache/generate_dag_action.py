@@ -23,6 +23,10 @@ class GenerateDag(CacheAction):
         Required for finding the correct class inside the parser logic.
     run_number : str
         Run number to construct rest of the pathspec
+    source_id : str
+        Optional content based identifier of the DAG source (e.g. code package sha).
+        When provided, the DAG is cached by source instead of by run, so that
+        all runs of a flow sharing the same code package share the cached DAG.
 
     Returns
     --------
@@ -46,9 +50,14 @@ class GenerateDag(CacheAction):
     """
 
     @classmethod
-    def format_request(cls, flow_id, run_number, invalidate_cache=False):
+    def format_request(
+        cls, flow_id, run_number, source_id=None, invalidate_cache=False
+    ):
         msg = {"flow_id": flow_id, "run_number": run_number}
-        key_identifier = "{}/{}".format(flow_id, run_number)
+        if source_id:
+            key_identifier = "{}:{}".format(flow_id, source_id)
+        else:
+            key_identifier = "{}/{}".format(flow_id, run_number)
         result_key = (
             "dag:result:%s" % hashlib.sha1((key_identifier).encode("utf-8")).hexdigest()
         )
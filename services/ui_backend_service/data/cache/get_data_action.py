@@ -2,7 +2,7 @@ import json
 import hashlib
 
 from .client import CacheAction
-from .utils import cacheable_exception_value
+from .utils import bounded_map, cacheable_exception_value
 
 from metaflow import namespace
 
@@ -57,19 +57,17 @@ class GetData(CacheAction):
         }
         """
 
+        prefix = "data:{}:".format(cls.__name__)
         target_keys = [
-            (key, val)
-            for key, val in keys_objs.items()
-            if key.startswith("data:{}:".format(cls.__name__))
+            (key, val) for key, val in keys_objs.items() if key.startswith(prefix)
         ]
 
-        collected = {}
-        for key, val in target_keys:
-            collected[target_from_cache_key(key, "data:{}:".format(cls.__name__))] = (
-                json.loads(val)
+        return dict(
+            zip(
+                (target_from_cache_key(key, prefix) for key, _ in target_keys),
+                decode_json_values([val for _, val in target_keys]),
             )
-
-        return collected
+        )
 
     @classmethod
     def stream_response(cls, it):
@@ -121,16 +119,22 @@ class GetData(CacheAction):
                 in existing_keys
             ]
 
-        for target in targets_to_fetch:
-            target_key = cache_key_from_target(target, "data:{}:".format(cls.__name__))
+        def fetch_target(target):
+            "Fetch a single target. Runs in a worker thread."
             try:
                 result = cls.fetch_data(target, stream_output)
                 if result is None or result is False:
                     # Do not persist None or False return values
-                    continue
-                results[target_key] = json.dumps(result)
+                    return None
+                return json.dumps(result)
             except Exception as ex:
-                results[target_key] = cacheable_exception_value(ex)
+                return cacheable_exception_value(ex)
+
+        for target, value in bounded_map(fetch_target, targets_to_fetch):
+            if value is not None:
+                results[
+                    cache_key_from_target(target, "data:{}:".format(cls.__name__))
+                ] = value
 
         return results
 
@@ -179,6 +183,21 @@ def target_from_cache_key(cache_key, prefix=DATA_CACHE_ID_PREFIX):
     return cache_key[len(prefix) :]
 
 
+def decode_json_values(values):
+    """
+    Decode a list of json encoded values (str or bytes) with a single decoder pass,
+    instead of decoding each value separately.
+    """
+    if not values:
+        return []
+    blobs = [val if isinstance(val, bytes) else val.encode("utf-8") for val in values]
+    try:
+        return json.loads(b"[" + b",".join(blobs) + b"]")
+    except ValueError:
+        # Fall back to decoding values one by one in order to surface the offending value.
+        return [json.loads(val) for val in values]
+
+
 def lookup_id(targets):
     "construct a unique id to be used with stream_key and result_key"
     _string = "-".join(list(frozenset(sorted(targets))))
@@ -0,0 +1,131 @@
+import asyncio
+import os
+import time
+from collections import Counter, OrderedDict
+from typing import Awaitable, Callable, Dict, List
+
+from services.utils import logging
+
+# Max number of runs that are prefetched concurrently.
+PREFETCH_RUNS_CONCURRENCY = int(os.environ.get("PREFETCH_RUNS_CONCURRENCY", 4))
+# Max number of runs whose views are counted, the least recently viewed are forgotten.
+MAX_VIEWED_RUNS = 10000
+
+logger = logging.getLogger("RunPrefetchScheduler")
+
+
+class RunPrefetchScheduler(object):
+    """
+    Schedules prefetching of data for runs with bounded concurrency.
+
+    Queued runs are prefetched in order of priority: most viewed runs first,
+    followed by the newest runs.
+
+    Parameters
+    ----------
+    prefetch : Callable[[Dict], Awaitable]
+        Coroutine function that prefetches data for a single run record.
+    concurrency : int
+        Max number of runs to prefetch concurrently.
+    """
+
+    def __init__(
+        self,
+        prefetch: Callable[[Dict], Awaitable],
+        concurrency: int = PREFETCH_RUNS_CONCURRENCY,
+    ):
+        self._prefetch = prefetch
+        self._concurrency = max(1, concurrency)
+        self._queued = {}
+        self._in_progress = set()
+        self._workers = set()
+        # run key -> view count, in order of the last view
+        self._views = OrderedDict()
+        self._stats = Counter()
+
+    def record_view(self, flow_id: str, run_number):
+        "Record that a run was viewed, raising its prefetch priority."
+        key = _run_key(flow_id, run_number)
+        self._views[key] = self._views.pop(key, 0) + 1
+        while len(self._views) > MAX_VIEWED_RUNS:
+            self._views.popitem(last=False)
+
+    def schedule(self, runs: List[Dict]):
+        """
+        Queue runs for prefetching. Runs that are already queued or in progress are ignored.
+
+        Parameters
+        ----------
+        runs : List[Dict]
+            Run records containing at least flow_id and run_number. ts_epoch is used for
+            prioritization when present.
+        """
+        for run in runs:
+            key = _run_key(run["flow_id"], run["run_number"])
+            if key in self._queued or key in self._in_progress:
+                continue
+            ts_epoch = run.get("ts_epoch")
+            self._queued[key] = {
+                **run,
+                "ts_epoch": (
+                    ts_epoch if ts_epoch is not None else int(time.time() * 1000)
+                ),
+            }
+            self._stats["scheduled"] += 1
+
+        while self._queued and len(self._workers) < self._concurrency:
+            worker = asyncio.ensure_future(self._worker())
+            self._workers.add(worker)
+            worker.add_done_callback(self._workers.discard)
+
+    def cancel(self):
+        "Cancel all queued and in progress prefetches."
+        self._stats["cancelled"] += len(self._queued) + len(self._in_progress)
+        self._queued.clear()
+        for worker in list(self._workers):
+            worker.cancel()
+
+    async def join(self):
+        "Wait until all currently scheduled prefetches have finished."
+        while self._workers:
+            await asyncio.gather(*list(self._workers), return_exceptions=True)
+
+    def status(self) -> Dict:
+        "Prefetch progress information"
+        return {
+            "concurrency": self._concurrency,
+            "queued": len(self._queued),
+            "in_progress": len(self._in_progress),
+            "scheduled": self._stats["scheduled"],
+            "completed": self._stats["completed"],
+            "failed": self._stats["failed"],
+            "cancelled": self._stats["cancelled"],
+        }
+
+    def _next(self):
+        key = max(
+            self._queued,
+            key=lambda key: (self._views.get(key, 0), self._queued[key]["ts_epoch"]),
+        )
+        # Views only prioritize the next prefetch of a run.
+        self._views.pop(key, None)
+        return key, self._queued.pop(key)
+
+    async def _worker(self):
+        while self._queued:
+            key, run = self._next()
+            self._in_progress.add(key)
+            try:
+                await self._prefetch(run)
+                self._stats["completed"] += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self._stats["failed"] += 1
+                logger.exception("Prefetching data for {} failed".format(key))
+            finally:
+                self._in_progress.discard(key)
+
+
+def _run_key(flow_id: str, run_number) -> str:
+    return "{}/{}".format(flow_id, run_number)
@@ -2,15 +2,17 @@ import hashlib
 import json
 
 from .client import CacheAction
+from .artifact_search_index import ArtifactSearchIndex, search_index_path
 from .utils import (
+    bounded_map,
     cacheable_artifact_value,
     cacheable_exception_value,
+    error_event_msg,
     progress_event_msg,
-    artifact_cache_id,
     unpack_pathspec_with_attempt_id,
     streamed_errors,
 )
-from services.ui_backend_service.data import unpack_processed_value
+from services.utils import get_traceback_str
 from services.ui_backend_service.api.utils import operators_to_filters
 
 
@@ -22,7 +24,8 @@ namespace(None)  # Always use global namespace by default
 class SearchArtifacts(CacheAction):
     """
     Fetches artifacts by pathspecs and performs a search against the object contents.
-    Caches artifacts based on pathspec, and search results based on a combination of query&artifacts searched
+    Artifact values are persisted in a per-run search index, so that they are only fetched once
+    regardless of the search term. Search results are cached based on a combination of query&artifacts searched
 
     Parameters
     ----------
@@ -51,27 +54,27 @@ class SearchArtifacts(CacheAction):
     def format_request(
         cls, pathspecs, searchterm, operator="eq", invalidate_cache=False
     ):
+        index_path = search_index_path(pathspecs)
         msg = {
             "pathspecs": list(frozenset(sorted(pathspecs))),
             "searchterm": searchterm,
             "operator": operator,
+            "index_path": index_path,
         }
 
-        artifact_keys = []
-        for pathspec in pathspecs:
-            artifact_keys.append(artifact_cache_id(pathspec))
-
         request_id = lookup_id(pathspecs, searchterm, operator)
         stream_key = "search:stream:%s" % request_id
         result_key = "search:result:%s" % request_id
 
+        # Artifact values are persisted in a per-run search index instead of individual cache keys.
+        # The index location is returned so that it can be picked up by GC.
         return (
             msg,
-            [result_key, *artifact_keys],
+            [result_key],
             stream_key,
             [stream_key, result_key],
             invalidate_cache,
-            None,
+            index_path,
         )
 
     @classmethod
@@ -111,46 +114,26 @@ class SearchArtifacts(CacheAction):
         **kwargs,
     ):
         pathspecs = message["pathspecs"]
-
-        if invalidate_cache:
-            results = {}
-            pathspecs_to_fetch = [loc for loc in pathspecs]
-        else:
-            # make a copy of already existing results, as the cache action has to produce all keys it promised
-            # in the format_request response.
-            results = {**existing_keys}
-            # Make a list of artifact pathspecs that require fetching (not cached previously)
-            pathspecs_to_fetch = [
-                loc for loc in pathspecs if not artifact_cache_id(loc) in existing_keys
-            ]
-
-        artifact_keys = [key for key in keys if key.startswith("search:artifactdata")]
         result_key = [key for key in keys if key.startswith("search:result")][0]
+        results = {}
 
         # Helper functions for streaming status updates.
         def stream_progress(num):
             return stream_output(progress_event_msg(num))
 
-        with streamed_errors(stream_output, re_raise=False):
-            # Fetch artifacts that are not cached already
-            for idx, pathspec in enumerate(pathspecs_to_fetch):
-                stream_progress((idx + 1) / len(pathspecs_to_fetch))
-
-                try:
-                    pathspec_without_attempt, attempt_id = (
-                        unpack_pathspec_with_attempt_id(pathspec)
-                    )
-                    artifact_key = "search:artifactdata:{}".format(pathspec)
-                    artifact = DataArtifact(
-                        pathspec_without_attempt, attempt=attempt_id
-                    )
-                    results[artifact_key] = cacheable_artifact_value(artifact)
-                except Exception as ex:
-                    results[artifact_key] = cacheable_exception_value(ex)
-                    raise ex from None  # re-raise errors in order to stream it in context
-
-        # Perform search on loaded artifacts.
-        search_results = {}
+        def fetch_artifact(pathspec):
+            "Fetch a single artifact value. Runs in a worker thread."
+            try:
+                pathspec_without_attempt, attempt_id = unpack_pathspec_with_attempt_id(
+                    pathspec
+                )
+                artifact = DataArtifact(pathspec_without_attempt, attempt=attempt_id)
+                return cacheable_artifact_value(artifact), None
+            except Exception as ex:
+                return cacheable_exception_value(ex), error_event_msg(
+                    str(ex), ex.__class__.__name__, get_traceback_str(), pathspec
+                )
+
         searchterm = message["searchterm"]
         operator = message["operator"]
         filter_fn = (
@@ -159,33 +142,29 @@ class SearchArtifacts(CacheAction):
             else operators_to_filters["eq"]
         )
 
-        def format_loc(x):
-            "extract pathspec from the artifact cache key"
-            return x[len("search:artifactdata:") :]
-
-        for key in artifact_keys:
-            if key in results:
-                load_success, value, detail, trace = unpack_processed_value(
-                    json.loads(results[key])
-                )
+        with ArtifactSearchIndex(message["index_path"]) as index:
+            if invalidate_cache:
+                pathspecs_to_fetch = [loc for loc in pathspecs]
             else:
-                load_success, value, detail, trace = False, None, None, None
-            # keep the matching case-insensitive
-            matches = filter_fn(str(value).lower(), searchterm.lower())
-
-            search_results[format_loc(key)] = {
-                "included": load_success,
-                "matches": matches,
-                "error": (
-                    None
-                    if load_success
-                    else {
-                        "id": value or "artifact-handle-failed",
-                        "detail": detail or "Unknown error during artifact processing",
-                        "traceback": trace,
-                    }
-                ),
-            }
+                # Make a list of artifact pathspecs that require fetching (not indexed previously)
+                indexed = set(index.indexed_pathspecs(pathspecs))
+                pathspecs_to_fetch = [loc for loc in pathspecs if loc not in indexed]
+
+            with streamed_errors(stream_output, re_raise=False):
+                # Fetch artifacts that are not indexed already, concurrently.
+                # Failures are indexed and streamed per artifact without interrupting the rest.
+                fetched = {}
+                for idx, (pathspec, (value, error)) in enumerate(
+                    bounded_map(fetch_artifact, pathspecs_to_fetch)
+                ):
+                    fetched[pathspec] = value
+                    if error:
+                        stream_output(error)
+                    stream_progress((idx + 1) / len(pathspecs_to_fetch))
+                index.add(fetched)
+
+            # Perform search on indexed artifacts.
+            search_results = index.search(pathspecs, searchterm, filter_fn)
 
         results[result_key] = json.dumps(search_results)
 
@@ -7,7 +7,10 @@ from services.data.db_utils import DBResponse
 
 from .client import CacheAsyncClient
 from pyee import AsyncIOEventEmitter
-from services.ui_backend_service.data.db.utils import get_run_dag_data
+from services.ui_backend_service.data.db.utils import (
+    get_run_dag_data,
+    get_dag_source_id,
+)
 from services.ui_backend_service.features import (
     FEATURE_CACHE_ENABLE,
     FEATURE_PREFETCH_ENABLE,
@@ -22,7 +25,8 @@ from .get_log_file_action import GetLogFile
 from .get_data_action import GetData
 from .get_parameters_action import GetParameters
 from .get_task_action import GetTask
-from .card_cache_manager import CardCacheManager
+from .card_cache_manager import CardCacheManager, CARD_CACHE_TASK_IDLE_TIME
+from .prefetch import RunPrefetchScheduler
 
 # Tagged logger
 logger = logging.getLogger("CacheStore")
@@ -122,21 +126,29 @@ class CardCacheStore(object):
         self.event_emitter = event_emitter or AsyncIOEventEmitter()
         self.cache = None
         self.loop = asyncio.get_event_loop()
-        self.cache_manager = CardCacheManager()
+        self.cache_manager = CardCacheManager(self.event_emitter)
 
     async def start_cache(self):
         self._cleanup_coroutine = asyncio.create_task(
-            self.cache_manager.start_process_cleanup_routine(120)
+            self.cache_manager.start_status_cleanup_routine(120)
         )
         self._disk_cleanup_coroutine = asyncio.create_task(
             self.cache_manager.cleanup_disk_routine(CARD_CACHE_DISK_CLEANUP_INTERVAL)
         )
+        self._watched_coroutine = asyncio.create_task(
+            self.cache_manager.keep_watched_routine(
+                float(CARD_CACHE_TASK_IDLE_TIME) / 3
+            )
+        )
 
     async def stop_cache(self):
         self._cleanup_coroutine.cancel()
         await self._cleanup_coroutine
         self._disk_cleanup_coroutine.cancel()
         await self._disk_cleanup_coroutine
+        self._watched_coroutine.cancel()
+        await self._watched_coroutine
+        await self.cache_manager.stop()
 
 
 class ArtifactCacheStore(object):
@@ -168,6 +180,7 @@ class ArtifactCacheStore(object):
 
         self.parameter_refiner = ParameterRefiner(cache=self)
         self.task_refiner = TaskRefiner(cache=self)
+        self.prefetcher = RunPrefetchScheduler(self.preload_data_for_run)
 
         # Bind an event handler for when we want to preload artifacts for
         # newly inserted content.
@@ -202,30 +215,40 @@ class ArtifactCacheStore(object):
 
     async def preload_data_for_runs(self, runs: List[Dict]):
         """
-        Preloads task statuses for given run numbers.
+        Schedules preloading of parameters and task statuses for given runs.
         Can be used to prefetch task statuses for newly generated runs.
 
         Parameters
         ----------
         runs : List[RunRow]
-            A list of run numbers to preload data for.
+            A list of runs to preload data for.
         """
-        for run in runs:
-            logger.debug(
-                "  - Preload parameters and task statuses for {flow_id}/{run_number}".format(
-                    **run
-                )
-            )
-            asyncio.gather(
-                # Preload run parameters
-                await self.get_run_parameters(run["flow_id"], run["run_number"]),
-                # Preload task statuses
-                await self._task_table.get_tasks_for_run(
-                    run["flow_id"],
-                    run["run_number"],
-                    postprocess=self.task_refiner.postprocess,
-                ),
+        self.prefetcher.schedule(runs)
+
+    async def preload_data_for_run(self, run: Dict):
+        """
+        Preloads parameters and task statuses for a single run.
+
+        Parameters
+        ----------
+        run : RunRow
+            Run to preload data for.
+        """
+        logger.debug(
+            "  - Preload parameters and task statuses for {flow_id}/{run_number}".format(
+                **run
             )
+        )
+        await asyncio.gather(
+            # Preload run parameters
+            self.get_run_parameters(run["flow_id"], run["run_number"]),
+            # Preload task statuses
+            self._task_table.get_tasks_for_run(
+                run["flow_id"],
+                run["run_number"],
+                postprocess=self.task_refiner.postprocess,
+            ),
+        )
 
     async def get_run_parameters(
         self, flow_id: str, run_key: str, invalidate_cache=False
@@ -304,6 +327,8 @@ class ArtifactCacheStore(object):
         )
 
     async def stop_cache(self):
+        # Prefetching against a stopped cache would only pile up failures.
+        self.prefetcher.cancel()
         await self.cache.stop()
 
 
@@ -324,6 +349,7 @@ class DAGCacheStore(object):
 
     def __init__(self, event_emitter, db):
         self.event_emitter = event_emitter or AsyncIOEventEmitter()
+        self.db = db
         self._run_table = db.run_table_postgres
         self.cache = None
         self.loop = asyncio.get_event_loop()
@@ -381,8 +407,6 @@ class DAGCacheStore(object):
         """
         logger.debug("  - Preload DAG for {}/{}".format(flow_name, run_number))
         # Check first if a DAG can be generated for the run.
-        # pylint-initial-ignore: Not sure where db comes from
-        # pylint: disable=no-member
         db_response = await get_run_dag_data(self.db, flow_name, run_number)
 
         if not db_response.response_code == 200:
@@ -393,7 +417,9 @@ class DAGCacheStore(object):
 
         # pylint-initial-ignore: Not sure where GenerateDag comes from
         # pylint: disable=no-member
-        res = await self.cache.GenerateDag(flow_name, run_id)
+        res = await self.cache.GenerateDag(
+            flow_name, run_id, source_id=get_dag_source_id(db_response.body)
+        )
         async for event in res.stream():
             if event["type"] == "error":
                 logger.error(event)
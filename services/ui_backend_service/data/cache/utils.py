@@ -4,6 +4,7 @@ import json
 from gzip import GzipFile
 from itertools import islice
 from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import Callable, Tuple
 
 from services.utils import get_traceback_str
@@ -33,6 +34,38 @@ def batchiter(it, batch_size):
             break
 
 
+def bounded_map(fn, items, max_workers=None):
+    """
+    Apply `fn` to each item using a bounded thread pool, yielding (item, result) tuples
+    in completion order. `fn` is expected to handle its own exceptions.
+
+    Parameters
+    ----------
+    fn : Callable
+        Function to apply for each item.
+    items : List
+        Items to process.
+    max_workers : int
+        Upper limit of concurrent threads, defaults to CACHE_ACTION_FETCH_CONCURRENCY
+    """
+    items = list(items)
+    if not items:
+        return
+    workers = min(max_workers or CACHE_ACTION_FETCH_CONCURRENCY, len(items))
+    if workers <= 1:
+        for item in items:
+            yield item, fn(item)
+        return
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        futures = {executor.submit(fn, item): item for item in items}
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+    finally:
+        # Do not block on pending fetches in case the consumer bails out early (e.g. worker timeout)
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
 def decode(path):
     "decodes a gzip+pickle compressed object from a file path"
     with GzipFile(path) as f:
@@ -45,6 +78,11 @@ def decode(path):
 
 MAX_S3_SIZE = int(os.environ.get("MAX_PROCESSABLE_S3_ARTIFACT_SIZE_KB", 4)) * 1024
 
+# Number of concurrent datastore fetches a single cache action is allowed to perform.
+CACHE_ACTION_FETCH_CONCURRENCY = int(
+    os.environ.get("CACHE_ACTION_FETCH_CONCURRENCY", 16)
+)
+
 # Cache Key helpers
 
 
@@ -1,5 +1,6 @@
 import math
 import os
+import re
 from asyncio import iscoroutinefunction
 from typing import Callable, List, Tuple
 
@@ -22,6 +23,9 @@ OLD_RUN_FAILURE_CUTOFF_TIME = int(
 # Default to 6 minutes (in seconds)
 RUN_INACTIVE_CUTOFF_TIME = int(os.environ.get("RUN_INACTIVE_CUTOFF_TIME", 60 * 6))
 
+# Name of a join column, f.ex. 'status' for "(CASE ... END) AS status"
+JOIN_COLUMN_ALIAS = re.compile(r"\bAS\s+\"?(\w+)\"?\s*$", re.IGNORECASE)
+
 
 class AsyncPostgresTable(MetadataAsyncPostgresTable):
     """
@@ -35,6 +39,7 @@ class AsyncPostgresTable(MetadataAsyncPostgresTable):
         - find_records() that supports grouping by column, and postprocessing of results with a callable
         - query benchmarking
         - constants for query thresholds related to heartbeats.
+        - cursor_keys for uniquely ordering results with cursor pagination.
     """
 
     db = None
@@ -47,6 +52,11 @@ class AsyncPostgresTable(MetadataAsyncPostgresTable):
     joins: List[str] = None
     select_columns: List[str] = keys
     join_columns: List[str] = None
+    # Columns that uniquely identify a result row. Used as tiebreakers for cursor pagination,
+    # defaults to the primary keys of the table.
+    cursor_keys: List[str] = None
+    # Whether the joins return several rows for a row of the table, f.ex. one per task attempt.
+    join_expands_rows = False
     _filters = None
     _row_type = None
 
@@ -106,119 +116,134 @@ class AsyncPostgresTable(MetadataAsyncPostgresTable):
             {offset}
             """
 
-            select_sql = sql_template.format(
-                keys=",".join(
-                    self.select_columns
-                    + (self.join_columns if enable_joins and self.join_columns else [])
-                ),
-                table_name=(
-                    overwrite_select_from if overwrite_select_from else self.table_name
-                ),
-                joins=" ".join(self.joins) if enable_joins and self.joins else "",
-                where="WHERE {}".format(" AND ".join(conditions)) if conditions else "",
-                order_by="ORDER BY {}".format(", ".join(order)) if order else "",
-                limit="LIMIT {}".format(limit) if limit else "",
-                offset="OFFSET {}".format(offset) if offset else "",
-            ).strip()
-        else:  # Grouping enabled
-            # NOTE: we are performing a DISTINCT select on the group labels before the actual window function, to limit the set
-            # being queried. Without this restriction the query planner kept hitting the whole table contents, resulting in very slow queries.
-
-            # Query for groups matching filters.
-            groups_sql_template = """
-            SELECT DISTINCT ON({group_by}) * FROM (
-                SELECT
-                    {keys}
-                FROM {table_name}
-                {joins}
-            ) T
-            {where}
-            ORDER BY {group_by} ASC NULLS LAST
-            {limit}
-            {offset}
-            """
+            def _render():
+                return sql_template.format(
+                    keys=",".join(
+                        self.select_columns
+                        + (
+                            self.join_columns
+                            if enable_joins and self.join_columns
+                            else []
+                        )
+                    ),
+                    table_name=(
+                        overwrite_select_from
+                        if overwrite_select_from
+                        else self.table_name
+                    ),
+                    joins=" ".join(self.joins) if enable_joins and self.joins else "",
+                    where=(
+                        "WHERE {}".format(" AND ".join(conditions))
+                        if conditions
+                        else ""
+                    ),
+                    order_by="ORDER BY {}".format(", ".join(order)) if order else "",
+                    limit="LIMIT %s" if limit else "",
+                    offset="OFFSET %s" if offset else "",
+                ).strip()
 
-            groups_sql = groups_sql_template.format(
-                keys=",".join(
-                    self.select_columns
-                    + (self.join_columns if enable_joins and self.join_columns else [])
+            # The rendered query only depends on the shape of the request, limit and
+            # offset values are passed along as parameters.
+            select_sql = self._query_shapes.get(
+                (
+                    tuple(conditions or ()),
+                    tuple(order or ()),
+                    bool(limit),
+                    bool(offset),
+                    bool(enable_joins),
+                    overwrite_select_from,
                 ),
-                table_name=self.table_name,
-                joins=(
-                    " ".join(self.joins)
-                    if enable_joins and self.joins is not None
-                    else ""
-                ),
-                where="WHERE {}".format(" AND ".join(conditions)) if conditions else "",
-                group_by=", ".join(groups),
-                limit="LIMIT {}".format(limit) if limit else "",
-                offset="OFFSET {}".format(offset) if offset else "",
-            ).strip()
-
-            group_results, _ = await self.execute_sql(
-                select_sql=groups_sql,
-                values=values,
-                fetch_single=fetch_single,
-                expanded=expanded,
-                limit=limit,
-                offset=offset,
+                _render,
             )
-            if len(group_results.body) == 0:
-                # Return early if no groups match the query.
-                return group_results, None, None
-
-            # construct the group_where clause.
-            group_label_selects = []
-            for group in groups:
-                _group_values = [row[group.strip('"')] for row in group_results.body]
-                if len(_group_values) > 0:
-                    _clause = "{group} = ANY(%s)".format(group=group)
-                    group_label_selects.append(_clause)
-                    values.append(_group_values)
+            values = list(values) + [value for value in (limit, offset) if value]
+        else:  # Grouping enabled
+            # The groups matching the filters are paginated first, and the rows of each group
+            # are then looked up with a LATERAL subquery limited to group_limit rows, so that
+            # every group is served from an index scan instead of numbering all the rows of
+            # all the groups. Rows without a group value are not listed.
+            deferred_joins = enable_joins and self._can_defer_joins(
+                conditions, order, groups
+            )
+            inner_joins = enable_joins and not deferred_joins
+            keys = ",".join(
+                self.select_columns
+                + (self.join_columns if inner_joins and self.join_columns else [])
+            )
+            joins = " ".join(self.joins) if inner_joins and self.joins else ""
+            group_aliases = ['"_group_{}"'.format(i) for i in range(len(groups))]
 
-            # Query for group content. Restricted by groups received from previous query.
             sql_template = """
-            SELECT * FROM (
-                SELECT
-                    *, ROW_NUMBER() OVER(PARTITION BY {group_by} {order_by})
-                FROM (
+            SELECT {columns} FROM (
+                SELECT DISTINCT {group_selects} FROM (
                     SELECT
                         {keys}
-                    FROM {table_name}
+                    FROM {groups_table_name}
                     {joins}
                 ) T
                 {where}
+                ORDER BY {group_order}
+                {limit}
+                {offset}
             ) G
-            {group_where}
+            CROSS JOIN LATERAL (
+                SELECT * FROM (
+                    SELECT
+                        {keys}
+                    FROM {table_name}
+                    {joins}
+                ) T
+                WHERE {group_where}
+                {order_by}
+                {group_limit}
+            ) AS {table_alias}
+            {deferred_joins}
+            ORDER BY {group_order}{outer_order_by}
             """
 
             select_sql = sql_template.format(
-                keys=",".join(
-                    self.select_columns
-                    + (self.join_columns if enable_joins and self.join_columns else [])
+                # With deferred joins, the join columns are only computed for the rows of
+                # the groups, which take the place of the table in the joins.
+                columns=",".join(
+                    ["{}.*".format(self.table_name)]
+                    + (
+                        self.join_columns
+                        if deferred_joins and self.join_columns
+                        else []
+                    )
                 ),
+                group_selects=", ".join(
+                    "{} AS {}".format(group, alias)
+                    for group, alias in zip(groups, group_aliases)
+                ),
+                keys=keys,
+                groups_table_name=self.table_name,
                 table_name=(
                     overwrite_select_from if overwrite_select_from else self.table_name
                 ),
-                joins=(
-                    " ".join(self.joins)
-                    if enable_joins and self.joins is not None
-                    else ""
-                ),
+                joins=joins,
                 where="WHERE {}".format(" AND ".join(conditions)) if conditions else "",
-                group_by=", ".join(groups),
+                group_order=", ".join(
+                    "{} ASC NULLS LAST".format(alias) for alias in group_aliases
+                ),
+                limit="LIMIT {}".format(limit) if limit else "",
+                offset="OFFSET {}".format(offset) if offset else "",
+                group_where=" AND ".join(
+                    (conditions or [])
+                    + [
+                        "T.{} = G.{}".format(group, alias)
+                        for group, alias in zip(groups, group_aliases)
+                    ]
+                ),
                 order_by="ORDER BY {}".format(", ".join(order)) if order else "",
-                group_where="""
-                    WHERE {group_limit} {group_selects}
-                """.format(
-                    group_limit=(
-                        "row_number <= {} AND ".format(group_limit)
-                        if group_limit
-                        else ""
-                    ),
-                    group_selects=" AND ".join(group_label_selects),
+                group_limit="LIMIT {}".format(group_limit) if group_limit else "",
+                table_alias=self.table_name,
+                deferred_joins=(
+                    " ".join(self.joins) if deferred_joins and self.joins else ""
                 ),
+                outer_order_by="".join(", {}".format(clause) for clause in order or []),
             ).strip()
+            # The filters apply to both the groups and their rows
+            values = list(values) + list(values)
 
         # Run benchmarking on query if requested
         benchmark_results = None
@@ -249,6 +274,30 @@ class AsyncPostgresTable(MetadataAsyncPostgresTable):
 
         return result, pagination, benchmark_results
 
+    def _can_defer_joins(
+        self, conditions: List[str], order: List[str], groups: List[str]
+    ) -> bool:
+        """
+        Whether the joins of a grouped query can be applied to the rows of the groups only,
+        which requires that the query does not filter, order or group by the join columns,
+        and that the joins return a single row for every row of the table.
+        """
+        if self.join_expands_rows:
+            return False
+        aliases = [
+            match.group(1)
+            for match in (
+                JOIN_COLUMN_ALIAS.search(column) for column in self.join_columns or []
+            )
+            if match
+        ]
+        if len(aliases) < len(self.join_columns or []):
+            return False
+        clauses = " ".join((conditions or []) + (order or []) + (groups or []))
+        return not any(
+            re.search(r"\b{}\b".format(re.escape(alias)), clauses) for alias in aliases
+        )
+
     async def benchmark_sql(
         self,
         select_sql: str,
@@ -15,6 +15,7 @@ class AsyncMetadataTablePostgres(AsyncPostgresTable):
     task_table_name = AsyncTaskTablePostgres.table_name
     keys = MetaserviceMetadataTable.keys
     primary_keys = MetaserviceMetadataTable.primary_keys
+    cursor_keys = ["id"]
     trigger_keys = MetaserviceMetadataTable.trigger_keys
     trigger_operations = ["INSERT"]
     trigger_conditions = [
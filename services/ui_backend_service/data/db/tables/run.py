@@ -15,6 +15,8 @@ from services.data.postgres_async_db import (
     AsyncMetadataTablePostgres as MetaMetadataTable,
     AsyncArtifactTablePostgres as MetadataArtifactTable,
     AsyncTaskTablePostgres as MetadataTaskTable,
+    RUN_STATUS_TABLE_NAME,
+    TAG_DICTIONARY_TABLE_NAME,
 )
 
 # Prefetch runs since 2 days ago (in seconds), limit maximum of 50 runs
@@ -33,42 +35,17 @@ class AsyncRunTablePostgres(AsyncPostgresTable):
     trigger_keys = MetadataRunTable.trigger_keys
     trigger_operations = ["INSERT"]
 
-    # NOTE: OSS Schema has metadata value column as TEXT, but for the time being we also need to support
-    # value columns of type jsonb, which is why there is additional logic when dealing with 'value'
+    run_status_table = RUN_STATUS_TABLE_NAME
+    tag_dictionary_table = TAG_DICTIONARY_TABLE_NAME
+    # The outcome of the 'end' step is maintained by the database on metadata inserts,
+    # only the heartbeat based liveness of a run depends on the time of the query.
     joins = [
         """
-        LEFT JOIN LATERAL (
-            SELECT
-                ts_epoch,
-                (CASE
-                    WHEN pg_typeof(value)='jsonb'::regtype
-                    THEN value::jsonb->>0
-                    ELSE value::text
-                END)::boolean as value
-            FROM {metadata_table} as attempt_ok
-            WHERE
-                {table_name}.flow_id = attempt_ok.flow_id AND
-                {table_name}.run_number = attempt_ok.run_number AND
-                attempt_ok.step_name = 'end' AND
-                attempt_ok.field_name = 'attempt_ok'
-            ORDER BY ts_epoch DESC
-            LIMIT 1
-        ) as end_attempt_ok ON true
-        """.format(table_name=table_name, metadata_table=metadata_table),
-        """
-        LEFT JOIN LATERAL (
-            SELECT ts_epoch
-            FROM {metadata_table} as attempt
-            WHERE
-                {table_name}.flow_id = attempt.flow_id AND
-                {table_name}.run_number = attempt.run_number AND
-                attempt.step_name = 'end' AND
-                attempt.field_name = 'attempt' AND
-                end_attempt_ok.value IS FALSE
-            ORDER BY ts_epoch DESC
-            LIMIT 1
-        ) as end_attempt ON true
-        """.format(table_name=table_name, metadata_table=metadata_table),
+        LEFT JOIN {run_status_table} as run_status ON (
+            {table_name}.flow_id = run_status.flow_id AND
+            {table_name}.run_number = run_status.run_number
+        )
+        """.format(table_name=table_name, run_status_table=run_status_table),
     ]
 
     @property
@@ -95,11 +72,11 @@ class AsyncRunTablePostgres(AsyncPostgresTable):
     join_columns = [
         """
         (CASE
-            WHEN end_attempt IS NOT NULL
-                AND end_attempt_ok.ts_epoch < end_attempt.ts_epoch
+            WHEN run_status.end_attempt_ok IS FALSE
+                AND run_status.end_attempt_ok_ts < run_status.end_attempt_started_at
             THEN NULL
-            WHEN end_attempt_ok IS NOT NULL
-            THEN end_attempt_ok.ts_epoch
+            WHEN run_status.end_attempt_ok_ts IS NOT NULL
+            THEN run_status.end_attempt_ok_ts
             WHEN {table_name}.last_heartbeat_ts IS NOT NULL
                 AND @(extract(epoch from now())-{table_name}.last_heartbeat_ts)<={heartbeat_cutoff}
             THEN NULL
@@ -111,12 +88,12 @@ class AsyncRunTablePostgres(AsyncPostgresTable):
         ),
         """
         (CASE
-            WHEN end_attempt IS NOT NULL
-                AND end_attempt_ok.ts_epoch < end_attempt.ts_epoch
+            WHEN run_status.end_attempt_ok IS FALSE
+                AND run_status.end_attempt_ok_ts < run_status.end_attempt_started_at
             THEN 'running'
-            WHEN end_attempt_ok IS NOT NULL AND end_attempt_ok.value IS TRUE
+            WHEN run_status.end_attempt_ok IS TRUE
             THEN 'completed'
-            WHEN end_attempt_ok IS NOT NULL AND end_attempt_ok.value IS FALSE
+            WHEN run_status.end_attempt_ok IS FALSE
             THEN 'failed'
             WHEN {table_name}.last_heartbeat_ts IS NOT NULL
                 AND @(extract(epoch from now())-{table_name}.last_heartbeat_ts)<={heartbeat_cutoff}
@@ -129,12 +106,12 @@ class AsyncRunTablePostgres(AsyncPostgresTable):
         ),
         """
         (CASE
-            WHEN end_attempt IS NOT NULL
-                AND end_attempt_ok.ts_epoch < end_attempt.ts_epoch
+            WHEN run_status.end_attempt_ok IS FALSE
+                AND run_status.end_attempt_ok_ts < run_status.end_attempt_started_at
                 AND {table_name}.last_heartbeat_ts IS NOT NULL
             THEN {table_name}.last_heartbeat_ts*1000-{table_name}.ts_epoch
-            WHEN end_attempt_ok IS NOT NULL
-            THEN end_attempt_ok.ts_epoch - {table_name}.ts_epoch
+            WHEN run_status.end_attempt_ok_ts IS NOT NULL
+            THEN run_status.end_attempt_ok_ts - {table_name}.ts_epoch
             WHEN {table_name}.last_heartbeat_ts IS NOT NULL
             THEN {table_name}.last_heartbeat_ts*1000-{table_name}.ts_epoch
             WHEN {table_name}.last_heartbeat_ts IS NULL
@@ -271,3 +248,37 @@ class AsyncRunTablePostgres(AsyncPostgresTable):
         _body = [row[0] for row in res.body]
 
         return DBResponse(res.response_code, _body), pag
+
+    async def get_tag_dictionary(self, since: int = None) -> DBResponse:
+        """
+        Fetch the tags of runs from the tag dictionary maintained by the database.
+
+        Parameters
+        ----------
+        since : int (optional)
+            Only fetch tags whose run count changed at or after this time, in milliseconds
+            since epoch, including tags that are no longer used (with a count of 0).
+            By default all tags in use are fetched.
+
+        Returns
+        -------
+        DBResponse
+            Containing a list of [tag, count, last_seen] records.
+        """
+        if since is None:
+            conditions, values = ["count > 0"], []
+        else:
+            conditions, values = ["last_seen >= %s"], [since]
+        select_sql = """
+            SELECT tag, count, last_seen FROM {table_name}
+            WHERE {conditions}
+            """.format(
+            table_name=self.tag_dictionary_table,
+            conditions=" AND ".join(conditions),
+        )
+        res, _ = await self.execute_sql(
+            select_sql=select_sql, values=values, serialize=False
+        )
+        if res.response_code != 200:
+            return res
+        return DBResponse(res.response_code, [list(row) for row in res.body])
@@ -1,3 +1,6 @@
+import json
+from typing import Dict, Optional
+
 from services.data.db_utils import DBResponse
 from services.ui_backend_service.data.db.postgres_async_db import AsyncPostgresDB
 
@@ -19,3 +22,26 @@ async def get_run_dag_data(
         )
 
     return db_response
+
+
+def get_dag_source_id(record: Dict) -> Optional[str]:
+    """
+    Derives a content based identifier for the source of a run DAG from a record returned by get_run_dag_data.
+    Runs sharing the same code package (or _graph_info artifact) produce the same identifier,
+    which allows sharing a generated DAG between them.
+
+    Returns None if no content based identifier is available.
+    """
+    if record.get("field_name") == "code-package":
+        # 'code-package' value contains json with dstype, sha1 hash and location
+        try:
+            sha = json.loads(record["value"]).get("sha")
+        except Exception:
+            sha = None
+        return "code-package:{}".format(sha) if sha else None
+    elif record.get("field_name") == "code-package-url":
+        # 'code-package-url' value contains only location, which is content addressed
+        return "code-package-url:{}".format(record["value"])
+    elif record.get("name") == "_graph_info" and record.get("sha"):
+        return "graph-info:{}".format(record["sha"])
+    return None
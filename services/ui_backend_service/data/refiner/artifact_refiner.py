@@ -31,6 +31,6 @@ class ArtifactRefiner(Refinery):
             attempt_id=record["attempt_id"],
         )
 
-    async def refine_record(self, record, values):
+    def refine_record(self, record, values):
         record["content"] = str(values)
         return record
@@ -40,7 +40,7 @@ class ParameterRefiner(Refinery):
             run_id=record.get("run_id") or record["run_number"],
         )
 
-    async def refine_record(self, record, values):
+    def refine_record(self, record, values):
         return {k: {"value": v} for k, v in values.items()}
 
 
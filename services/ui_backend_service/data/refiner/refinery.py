@@ -35,16 +35,10 @@ class Refinery(object):
             _res.get() or {}
         )  # cache get() might return None if no keys are produced.
 
-    async def refine_record(self, record, values):
+    def refine_record(self, record, values):
         """No refinement necessary here"""
         return record
 
-    def _response_to_action_input(self, response: DBResponse):
-        if isinstance(response.body, list):
-            return [self._record_to_action_input(task) for task in response.body]
-        else:
-            return [self._record_to_action_input(response.body)]
-
     def _record_to_action_input(self, record):
         return "{flow_id}/{run_number}/{step_name}/{task_id}".format(**record)
 
@@ -67,7 +61,9 @@ class Refinery(object):
         if response.response_code != 200 or not response.body:
             return response
 
-        input = self._response_to_action_input(response)
+        records = response.body if isinstance(response.body, list) else [response.body]
+        # Compute action targets once, they are needed both for fetching and refining.
+        targets = [self._record_to_action_input(record) for record in records]
 
         errors = {}
 
@@ -78,43 +74,45 @@ class Refinery(object):
                 errors[target] = event
 
         data = await self.fetch_data(
-            input, event_stream=_event_stream, invalidate_cache=invalidate_cache
+            targets, event_stream=_event_stream, invalidate_cache=invalidate_cache
         )
 
-        async def _process(record):
-            target = self._record_to_action_input(record)
+        # Refinement is pure record manipulation, so all records are processed
+        # in a single synchronous pass without yielding to the event loop per record.
+        body = [
+            self._process(record, target, data, errors)
+            for record, target in zip(records, targets)
+        ]
+        if not isinstance(response.body, list):
+            body = body[0]
 
-            if target in errors:
-                # Add streamed postprocess errors if any
-                record["postprocess_error"] = format_error_body(
-                    errors[target].get("id"),
-                    errors[target].get("message"),
-                    errors[target].get("traceback"),
-                )
+        return DBResponse(response_code=response.response_code, body=body)
 
-            if target in data:
-                success, value, detail, trace = unpack_processed_value(data[target])
-                if success:
-                    record = await self.refine_record(record, value)
-                else:
-                    record["postprocess_error"] = format_error_body(
-                        value if value else "artifact-handle-failed",
-                        detail if detail else "Unknown error during postprocessing",
-                        trace,
-                    )
+    def _process(self, record, target, data, errors):
+        if target in errors:
+            # Add streamed postprocess errors if any
+            record["postprocess_error"] = format_error_body(
+                errors[target].get("id"),
+                errors[target].get("message"),
+                errors[target].get("traceback"),
+            )
+
+        if target in data:
+            success, value, detail, trace = unpack_processed_value(data[target])
+            if success:
+                record = self.refine_record(record, value)
             else:
                 record["postprocess_error"] = format_error_body(
-                    "artifact-value-not-found", "Artifact value not found"
+                    value if value else "artifact-handle-failed",
+                    detail if detail else "Unknown error during postprocessing",
+                    trace,
                 )
-
-            return record
-
-        if isinstance(response.body, list):
-            body = [await _process(task) for task in response.body]
         else:
-            body = await _process(response.body)
+            record["postprocess_error"] = format_error_body(
+                "artifact-value-not-found", "Artifact value not found"
+            )
 
-        return DBResponse(response_code=response.response_code, body=body)
+        return record
 
 
 def format_error_body(id=None, detail=None, traceback=None):
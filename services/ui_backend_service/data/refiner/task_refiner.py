@@ -30,7 +30,7 @@ class TaskRefiner(Refinery):
             attempt_id=record["attempt_id"],
         )
 
-    async def refine_record(self, record, values):
+    def refine_record(self, record, values):
         if record["status"] == "unknown" and values.get("_task_ok") is not None:
             value = values["_task_ok"]
             if value is False:
@@ -1,8 +1,11 @@
+import asyncio
 import os
 import glob
 
 from aiohttp import web
 
+from .static_assets import REVALIDATE_CACHE_CONTROL, StaticAsset, StaticFiles
+
 dirname = os.path.dirname(os.path.realpath(__file__))
 static_ui_path = os.path.join(dirname, "ui")
 
@@ -18,12 +21,16 @@ class Frontend(object):
     """
     Provides routes for the static UI webpage.
     Require this as the last Api, as it is a catch-all route.
+
+    Files are served from memory with ETags and compressed variants (see StaticFiles).
+    index.html is rendered once, and again only when the file changes.
     """
 
     def __init__(self, app):
-        app.router.add_static(
-            "/static", path=os.path.join(static_ui_path, "static"), name="static"
-        )
+        self.static_files = StaticFiles(static_ui_path)
+        self._index = None  # ((mtime, size) of index.html, StaticAsset)
+
+        app.router.add_route("GET", "/static/{filename:.+}", self.serve_static)
 
         # serve the root static files separately.
         static_files = glob.glob(os.path.join(static_ui_path, "*.*"))
@@ -39,43 +46,67 @@ class Frontend(object):
         "Generator for single static file serving handlers"
 
         async def filehandler(request):
-            return web.FileResponse(os.path.join(static_ui_path, filename))
+            return await self.static_files.serve(request, filename)
 
         return filehandler
 
+    async def serve_static(self, request):
+        return await self.static_files.serve(
+            request, os.path.join("static", request.match_info["filename"])
+        )
+
+    async def _index_asset(self) -> StaticAsset:
+        path = os.path.join(static_ui_path, "index.html")
+        file_stat = os.stat(path)
+        version = (file_stat.st_mtime_ns, file_stat.st_size)
+        if self._index is None or self._index[0] != version:
+            with open(path, encoding="utf-8") as f:
+                content = render_index_html(f.read())
+            asset = await asyncio.get_event_loop().run_in_executor(
+                None,
+                StaticAsset,
+                content.encode("utf-8"),
+                "text/html; charset=utf-8",
+                REVALIDATE_CACHE_CONTROL,
+            )
+            self._index = (version, asset)
+        return self._index[1]
+
     async def serve_index_html(self, request):
         "Serve index.html by injecting `METAFLOW_SERVICE` variable to define API base url."
         try:
-            with open(os.path.join(static_ui_path, "index.html")) as f:
-                content = f.read().replace(
-                    "</head>",
-                    '<script>window.METAFLOW_SERVICE="{METAFLOW_SERVICE}";</script></head>'.format(
-                        METAFLOW_SERVICE=METAFLOW_SERVICE
-                    ),
-                )
-
-                if METAFLOW_HEAD:
-                    content = content.replace(
-                        "</head>",
-                        "{METAFLOW_HEAD}</head>".format(METAFLOW_HEAD=METAFLOW_HEAD),
-                    )
-
-                if METAFLOW_BODY_BEFORE:
-                    content = content.replace(
-                        "<body>",
-                        "<body>{METAFLOW_BODY_BEFORE}".format(
-                            METAFLOW_BODY_BEFORE=METAFLOW_BODY_BEFORE
-                        ),
-                    )
-
-                if METAFLOW_BODY_AFTER:
-                    content = content.replace(
-                        "</body>",
-                        "{METAFLOW_BODY_AFTER}</body>".format(
-                            METAFLOW_BODY_AFTER=METAFLOW_BODY_AFTER
-                        ),
-                    )
-
-                return web.Response(text=content, content_type="text/html")
+            return (await self._index_asset()).response(request)
         except Exception as err:
             return web.Response(text=str(err), status=500, content_type="text/plain")
+
+
+def render_index_html(content: str) -> str:
+    content = content.replace(
+        "</head>",
+        '<script>window.METAFLOW_SERVICE="{METAFLOW_SERVICE}";</script></head>'.format(
+            METAFLOW_SERVICE=METAFLOW_SERVICE
+        ),
+    )
+
+    if METAFLOW_HEAD:
+        content = content.replace(
+            "</head>",
+            "{METAFLOW_HEAD}</head>".format(METAFLOW_HEAD=METAFLOW_HEAD),
+        )
+
+    if METAFLOW_BODY_BEFORE:
+        content = content.replace(
+            "<body>",
+            "<body>{METAFLOW_BODY_BEFORE}".format(
+                METAFLOW_BODY_BEFORE=METAFLOW_BODY_BEFORE
+            ),
+        )
+
+    if METAFLOW_BODY_AFTER:
+        content = content.replace(
+            "</body>",
+            "{METAFLOW_BODY_AFTER}</body>".format(
+                METAFLOW_BODY_AFTER=METAFLOW_BODY_AFTER
+            ),
+        )
+    return content
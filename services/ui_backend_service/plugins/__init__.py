@@ -70,6 +70,17 @@ def init_plugins():
     logger.info("Plugins ready: {}".format(list(map(lambda p: p.identifier, _PLUGINS))))
 
 
+def reload_plugins():
+    "Fetches changes of the plugins, checking out and indexing only what changed"
+    for plugin in list_plugins():
+        try:
+            plugin.reload()
+        except Exception as err:
+            logger.error(
+                "  [{}] Error reloading plugin {}".format(plugin.identifier, err)
+            )
+
+
 def _load_plugin(
     identifier: str,
     repository: str = None,
@@ -1,11 +1,11 @@
 import os
 import json
-import glob
 import collections
 import pygit2
 from typing import List
 from services.utils import logging
 from aiohttp import web
+from ..static_assets import StaticFiles
 
 CONFIG_FILENAME = "manifest.json"
 INSTALLED_PLUGINS_DIR = "installed"
@@ -53,6 +53,7 @@ class Plugin(object):
         # Path to plugin files such as manifest.json.
         # Differs from root path in case of multi-plugin repositories.
         self.filepath = os.path.join(self.basepath, path or "")
+        self.static_files = StaticFiles(self.filepath)
 
         self.credentials = _get_credentials(auth)
         self.callbacks = (
@@ -63,9 +64,11 @@ class Plugin(object):
 
     def init(self):
         """
-        Init plugin by loading manifest.json and listing available files from filesystem.
+        Init plugin by loading manifest.json and indexing available files from filesystem.
+        Files are then served from the index and memory, without accessing the filesystem.
 
         In case of Git repository, clone, fetch changes and checkout to target ref.
+        Changes to the files after init are not seen until the plugin is reloaded.
         """
         local_repository = pygit2.discover_repository(self.basepath)
         if local_repository:
@@ -90,8 +93,37 @@ class Plugin(object):
 
         return self
 
-    def checkout(self, repository_url: str = None):
-        """Fetch latest changes and checkout repository"""
+    def reload(self):
+        """
+        Fetch changes and pick up the files that changed since init, without repeating
+        the rest of it. The repository is only checked out again when the ref resolves to
+        another commit, files are only read again when their modification time or size
+        changed, and the config is only loaded again when manifest.json changed.
+        """
+        if self._repo:
+            self.checkout(force=False)
+
+        manifest = self.static_files.version(CONFIG_FILENAME)
+        files = self._list_files()
+        if not files:
+            raise PluginException("Error loading plugin files", "plugin-error-files")
+        self.files = files
+
+        if self.static_files.version(CONFIG_FILENAME) != manifest:
+            config = self._load_config()
+            if not config:
+                raise PluginException(
+                    "Error loading plugin config", "plugin-error-config"
+                )
+            self.config = config
+
+        return self
+
+    def checkout(self, repository_url: str = None, force: bool = True):
+        """
+        Fetch latest changes and checkout repository. Unless forced, the checkout is skipped
+        when the ref still resolves to the commit that is checked out.
+        """
         if self._repo:
             # Update repository url in case it has changed
             if repository_url:
@@ -105,6 +137,17 @@ class Plugin(object):
             commit, resolved_refish = self._repo.resolve_refish(
                 self.ref if self.ref else "origin/master"
             )
+            if (
+                not force
+                and not self._repo.head_is_unborn
+                and self._repo.head.target == commit.id
+            ):
+                self.logger.info(
+                    "{} is up to date at {}".format(
+                        resolved_refish.name, commit.short_id
+                    )
+                )
+                return
             self._repo.checkout(resolved_refish, strategy=pygit2.GIT_CHECKOUT_FORCE)
 
             self.logger.info(
@@ -127,34 +170,31 @@ class Plugin(object):
             return None
 
     def _list_files(self) -> List[str]:
-        files = []
-        static_files = glob.glob(os.path.join(self.filepath, "**"), recursive=True)
-        for filepath in static_files:
-            filename = os.path.basename(filepath)
-            if not os.path.isdir(filepath):
-                files.append(filename)
-        return files
+        "Indexes the files of the plugin, returning their paths relative to the plugin"
+        return self.static_files.index()
 
     def has_file(self, filename) -> bool:
-        return filename in self.files
+        return self.static_files.has_file(filename)
 
     def get_file(self, filename):
         """Return file contents"""
-        if not self.has_file(filename):
-            return None
-
         try:
-            with open(os.path.join(self.filepath, filename), "r") as file:
-                return file.read()
+            content = self.static_files.read(filename)
+            return content.decode() if content is not None else None
         except Exception as e:
             self.logger.info("get_file exception for: {}: {}".format(filename, e))
             return None
 
-    def serve(self, filename):
-        """Serve files from plugin repository"""
+    async def serve(self, filename, request=None):
+        """
+        Serve files from plugin repository. Given the request, files are served
+        from memory with ETags and compressed variants (see StaticFiles).
+        """
         if not self.has_file(filename):
             return web.Response(status=404, body="File not found")
-        return web.FileResponse(os.path.join(self.filepath, filename))
+        if request is None:
+            return web.FileResponse(os.path.join(self.filepath, filename))
+        return await self.static_files.serve(request, filename)
 
     def __iter__(self):
         for key in [
@@ -0,0 +1,298 @@
+import asyncio
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import stat
+from typing import Dict, List, Optional, Set
+
+from aiohttp import web
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Files larger than this are served from disk as they are, without being cached in memory.
+STATIC_ASSET_MAX_CACHED_SIZE = int(
+    os.environ.get("STATIC_ASSET_MAX_CACHED_SIZE", 10 * 1024 * 1024)
+)
+# Files smaller than this are not worth compressing.
+STATIC_ASSET_MIN_COMPRESSED_SIZE = 1024
+# Quality of brotli compression on the fly, from 0 to 11. Pre-built variants are best
+# for the highest qualities, which take seconds for large files.
+STATIC_ASSET_BROTLI_QUALITY = int(os.environ.get("STATIC_ASSET_BROTLI_QUALITY", 5))
+
+# Build output with a content hash in the file name, f.ex. main.3f2a1b9c.chunk.js,
+# never changes and can be cached for good. Other files are revalidated with their ETag.
+HASHED_FILENAME = re.compile(r"\.[0-9a-f]{8,}\.")
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/javascript",
+    "application/json",
+    "application/xml",
+    "image/svg+xml",
+)
+
+# Preferred content encodings first, along with the suffix of their pre-built files.
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+def cache_control_for(filename: str) -> str:
+    if HASHED_FILENAME.search(os.path.basename(filename)):
+        return IMMUTABLE_CACHE_CONTROL
+    return REVALIDATE_CACHE_CONTROL
+
+
+def content_type_for(filename: str) -> str:
+    content_type, encoding = mimetypes.guess_type(filename)
+    if encoding is not None:
+        # f.ex. a pre-built main.js.gz requested as such
+        return "application/octet-stream"
+    return content_type or "application/octet-stream"
+
+
+def accepted_encodings(header: str) -> Set[str]:
+    "Returns the content codings accepted by an Accept-Encoding header"
+    accepted = set()
+    for item in (header or "").split(","):
+        coding, _, params = item.partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0
+        if coding.strip() and quality > 0:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+class StaticAsset(object):
+    """
+    Content served from memory, along with its compressed variants and a strong ETag
+    derived from its hash. Each variant has its own ETag, as required for strong ETags.
+
+    Parameters
+    ----------
+    body : bytes
+        The content
+    content_type : str
+        Value of the Content-Type header of responses, including a charset if any
+    cache_control : str
+        Value of the Cache-Control header of responses
+    variants : Dict[str, bytes] (optional)
+        Content encoding -> pre-built compressed content. Variants that are not given are
+        compressed here: gzip always, brotli if the 'brotli' package is installed.
+    """
+
+    __slots__ = ("content_type", "cache_control", "etag", "encoded")
+
+    def __init__(
+        self,
+        body: bytes,
+        content_type: str,
+        cache_control: str = REVALIDATE_CACHE_CONTROL,
+        variants: Dict[str, bytes] = None,
+    ):
+        self.content_type = content_type
+        self.cache_control = cache_control
+        self.etag = hashlib.sha1(body).hexdigest()
+        self.encoded = {"identity": body}
+        variants = variants or {}
+        if content_type.startswith(COMPRESSIBLE_TYPES) and (
+            variants or len(body) >= STATIC_ASSET_MIN_COMPRESSED_SIZE
+        ):
+            if "br" not in variants and brotli is not None:
+                variants["br"] = brotli.compress(
+                    body, quality=STATIC_ASSET_BROTLI_QUALITY
+                )
+            if "gzip" not in variants:
+                variants["gzip"] = gzip.compress(body, mtime=0)
+            for encoding, content in variants.items():
+                if len(content) < len(body):
+                    self.encoded[encoding] = content
+
+    @property
+    def body(self) -> bytes:
+        return self.encoded["identity"]
+
+    def _etag(self, encoding: str) -> str:
+        if encoding == "identity":
+            return '"{}"'.format(self.etag)
+        return '"{}-{}"'.format(self.etag, encoding)
+
+    def response(self, request: web.Request) -> web.Response:
+        "Returns the response to a request, 304 Not Modified if the client has the content"
+        accepted = accepted_encodings(request.headers.get("Accept-Encoding"))
+        encoding = next(
+            (
+                encoding
+                for encoding, _ in ENCODINGS
+                if encoding in self.encoded and encoding in accepted
+            ),
+            "identity",
+        )
+        headers = {
+            "ETag": self._etag(encoding),
+            "Cache-Control": self.cache_control,
+            "Vary": "Accept-Encoding",
+        }
+        if_none_match = request.headers.get("If-None-Match")
+        if if_none_match:
+            tags = {
+                tag.strip().replace("W/", "", 1) for tag in if_none_match.split(",")
+            }
+            if "*" in tags or any(self._etag(e) in tags for e in self.encoded):
+                return web.Response(status=304, headers=headers)
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        # set as a header, as the content_type argument does not take a charset
+        headers["Content-Type"] = self.content_type
+        return web.Response(body=self.encoded[encoding], headers=headers)
+
+
+class StaticFiles(object):
+    """
+    Serves the files of a directory from memory.
+
+    Files are read, and compressed in an executor, on their first request. They are read
+    again when their modification time or size changes. Pre-built variants next to a
+    file, such as main.js.br and main.js.gz for main.js, are served instead of
+    compressing it here.
+    Files larger than max_cached_size are served from disk.
+
+    Once the directory has been indexed (see index()), files are looked up from the index
+    instead of the filesystem, and changes are only seen when it is indexed again.
+    """
+
+    def __init__(self, root: str, max_cached_size: int = STATIC_ASSET_MAX_CACHED_SIZE):
+        self.root = os.path.realpath(root)
+        self.max_cached_size = max_cached_size
+        self._assets = {
+            # filename: ((mtime, size), StaticAsset)
+        }
+        self._loading = {
+            # filename: ((mtime, size), Future of a StaticAsset)
+        }
+        self._index = None  # filename: (mtime, size)
+
+    def index(self) -> List[str]:
+        """
+        Indexes the files of the directory, except hidden ones, and drops the cached files
+        that changed since. Returns the relative paths of the files.
+        """
+        index = {}
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            dirnames[:] = sorted(name for name in dirnames if not name.startswith("."))
+            for name in sorted(filenames):
+                if name.startswith("."):
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    file_stat = os.stat(path)
+                except OSError:
+                    continue
+                if stat.S_ISREG(file_stat.st_mode):
+                    filename = os.path.relpath(path, self.root).replace(os.sep, "/")
+                    index[filename] = (file_stat.st_mtime_ns, file_stat.st_size)
+        self._index = index
+        self._assets = {
+            filename: cached
+            for filename, cached in self._assets.items()
+            if index.get(filename) == cached[0]
+        }
+        return list(index)
+
+    def has_file(self, filename: str) -> bool:
+        return self.version(filename) is not None
+
+    def path(self, filename: str) -> Optional[str]:
+        "Returns the path of a file of the directory, or None if it is outside of it"
+        path = os.path.realpath(os.path.join(self.root, filename))
+        if not path.startswith(self.root + os.sep):
+            return None
+        return path
+
+    def version(self, filename: str):
+        "Returns the (modification time, size) of a file, or None if there is no such file"
+        if self._index is not None:
+            return self._index.get(filename)
+        path = self.path(filename)
+        try:
+            file_stat = os.stat(path) if path else None
+        except OSError:
+            return None
+        if file_stat is None or not stat.S_ISREG(file_stat.st_mode):
+            return None
+        return (file_stat.st_mtime_ns, file_stat.st_size)
+
+    def _load(self, filename: str, path: str) -> StaticAsset:
+        with open(path, "rb") as f:
+            body = f.read()
+        variants = {}
+        for encoding, suffix in ENCODINGS:
+            try:
+                with open(path + suffix, "rb") as f:
+                    variants[encoding] = f.read()
+            except OSError:
+                continue
+        return StaticAsset(
+            body,
+            content_type_for(filename),
+            cache_control_for(filename),
+            variants=variants,
+        )
+
+    async def _asset(self, filename: str, version) -> StaticAsset:
+        cached = self._assets.get(filename)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        # Files are compressed off the event loop, once for concurrent requests.
+        loading = self._loading.get(filename)
+        if loading is None or loading[0] != version:
+            future = asyncio.get_event_loop().run_in_executor(
+                None, self._load, filename, os.path.join(self.root, filename)
+            )
+            loading = self._loading[filename] = (version, future)
+        try:
+            asset = await asyncio.shield(loading[1])
+        finally:
+            if self._loading.get(filename) is loading and loading[1].done():
+                del self._loading[filename]
+        self._assets[filename] = (version, asset)
+        return asset
+
+    def read(self, filename: str) -> Optional[bytes]:
+        """
+        Returns the content of a file, or None if there is no such file.
+        Reads the file in the calling thread, f.ex. while initializing a plugin.
+        """
+        version = self.version(filename)
+        if version is None:
+            return None
+        if version[1] > self.max_cached_size:
+            with open(os.path.join(self.root, filename), "rb") as f:
+                return f.read()
+        cached = self._assets.get(filename)
+        if cached is None or cached[0] != version:
+            asset = self._load(filename, os.path.join(self.root, filename))
+            cached = self._assets[filename] = (version, asset)
+        return cached[1].body
+
+    async def serve(self, request: web.Request, filename: str) -> web.StreamResponse:
+        version = self.version(filename)
+        if version is None:
+            return web.Response(status=404, body="File not found")
+        if version[1] > self.max_cached_size:
+            return web.FileResponse(
+                os.path.join(self.root, filename),
+                headers={"Cache-Control": cache_control_for(filename)},
+            )
+        return (await self._asset(filename, version)).response(request)
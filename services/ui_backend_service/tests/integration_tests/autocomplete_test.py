@@ -1,4 +1,5 @@
 import pytest
+from services.ui_backend_service.api.autocomplete import NameCache
 from .utils import (
     cli,
     db,
@@ -32,6 +33,32 @@ async def test_flows_autocomplete(cli, db):
     await _test_list_resources(cli, db, "/flows/autocomplete?flow_id:co=test", 200, [])
 
 
+async def test_flows_autocomplete_cached(cli, db):
+    api = cli.server.app.AutoCompleteApi
+    api.names = NameCache(ttl=60, max_sets=10)
+    await add_flow(db, flow_id="HelloFlow")
+    await _test_list_resources(cli, db, "/flows/autocomplete", 200, ["HelloFlow"])
+
+    # served from the cached flow ids until notified of new flows
+    await add_flow(db, flow_id="HelloFlow2")
+    await _test_list_resources(
+        cli, db, "/flows/autocomplete?flow_id:sw=hello", 200, ["HelloFlow"]
+    )
+    api.discard_cached_names(
+        "INSERT",
+        ["/flows"],
+        {"flow_id": "HelloFlow2"},
+        db.flow_table_postgres.table_name,
+    )
+    await _test_list_resources(
+        cli,
+        db,
+        "/flows/autocomplete?flow_id:sw=hello",
+        200,
+        ["HelloFlow", "HelloFlow2"],
+    )
+
+
 async def test_runs_autocomplete(cli, db):
     await _test_list_resources(cli, db, "/flows/HelloFlow/runs/autocomplete", 200, [])
     await add_flow(db, flow_id="HelloFlow")
@@ -143,6 +170,30 @@ async def test_tags_autocomplete(cli, db):
         cli, db, "/tags/autocomplete?tag:re=tag:.*thing", 200, ["tag:something"]
     )
 
+    # Prefix and exact matches
+    await add_run(db, flow_id="HelloFlow", run_id="HelloRun2", tags=["tag:other"])
+    await cli.server.app.AutoCompleteApi.update_cached_tags()
+    await _test_list_resources(
+        cli, db, "/tags/autocomplete?tag:sw=tag:", 200, ["tag:other", "tag:something"]
+    )
+    await _test_list_resources(
+        cli, db, "/tags/autocomplete?tag:sw=tag:s", 200, ["tag:something"]
+    )
+    await _test_list_resources(
+        cli, db, "/tags/autocomplete?tag:eq=tag:other", 200, ["tag:other"]
+    )
+    await _test_list_resources(cli, db, "/tags/autocomplete?tag:eq=tag:", 200, [])
+
+    # Tags no longer used by any run are dropped on refresh
+    await db.run_table_postgres.update_row(
+        filter_dict={"flow_id": "HelloFlow", "run_id": "HelloRun2"},
+        update_dict={"tags": "[]"},
+    )
+    await cli.server.app.AutoCompleteApi.update_cached_tags()
+    await _test_list_resources(
+        cli, db, "/tags/autocomplete?tag:sw=tag:", 200, ["tag:something"]
+    )
+
 
 async def test_artifacts_autocomplete(cli, db):
     _flow = (await add_flow(db, flow_id="HelloFlow")).body
@@ -1,5 +1,4 @@
 import pytest
-import time
 from .utils import (
     cli,
     db,
@@ -17,7 +16,6 @@ from .utils import (
 pytestmark = [pytest.mark.integration_tests]
 
 
-@pytest.mark.skip("Test failing due to refactor. TODO: fix later if applicable")
 async def test_list_runs_group_by_flow_id(cli, db):
     await _test_list_resources(cli, db, "/runs", 200, [])
     await _test_list_resources(cli, db, "/runs?_group=flow_id", 200, [])
@@ -29,7 +27,7 @@ async def test_list_runs_group_by_flow_id(cli, db):
     await _test_list_resources(
         cli,
         db,
-        "/runs?_group=flow_id",
+        "/runs?_group=flow_id&_order=%2Brun_number",
         200,
         [*first_runs[:10], *second_runs[:10]],
         approx_keys=["duration"],
@@ -39,7 +37,7 @@ async def test_list_runs_group_by_flow_id(cli, db):
     await _test_list_resources(
         cli,
         db,
-        "/runs?_group=flow_id&_group_limit=1",
+        "/runs?_group=flow_id&_group_limit=1&_order=%2Brun_number",
         200,
         [first_runs[0], second_runs[0]],
         approx_keys=["duration"],
@@ -66,7 +64,6 @@ async def test_list_runs_group_by_flow_id(cli, db):
     )
 
 
-@pytest.mark.skip("Test failing due to refactor. TODO: fix later if applicable")
 async def test_list_runs_group_by_user(cli, db):
     await _test_list_resources(cli, db, "/runs", 200, [])
     await _test_list_resources(cli, db, "/runs?_group=user", 200, [])
@@ -106,6 +103,43 @@ async def test_list_runs_group_by_user(cli, db):
     )
 
 
+async def test_list_runs_group_by_flow_id_with_join_filters(cli, db):
+    first_runs = await create_n_runs(db, 3, "A-FirstFlow")
+    second_runs = await create_n_runs(db, 2, "B-SecondFlow")
+    # without a heartbeat, the run has failed
+    await add_run(db, flow_id="A-FirstFlow")
+
+    # filters on join columns apply to the rows of the groups
+    await _test_list_resources(
+        cli,
+        db,
+        "/runs?_group=flow_id&status=running&_order=%2Brun_number",
+        200,
+        [*first_runs, *second_runs],
+        approx_keys=["duration"],
+    )
+
+    # as does ordering by join columns
+    await _test_list_resources(
+        cli,
+        db,
+        "/runs?_group=flow_id&_group_limit=1&_order=-status,%2Brun_number",
+        200,
+        [first_runs[0], second_runs[0]],
+        approx_keys=["duration"],
+    )
+
+    # pages are pages of groups
+    await _test_list_resources(
+        cli,
+        db,
+        "/runs?_group=flow_id&_group_limit=1&_limit=1&_page=2&_order=%2Brun_number",
+        200,
+        [second_runs[0]],
+        approx_keys=["duration"],
+    )
+
+
 async def create_n_runs(db, n=1, flow_id="TestFlow", user="TestUser"):
     await add_flow(db, flow_id=flow_id)
     created_runs = []
@@ -116,13 +150,12 @@ async def create_n_runs(db, n=1, flow_id="TestFlow", user="TestUser"):
                 flow_id=flow_id,
                 user_name=user,
                 system_tags=["runtime:dev", "user:{}".format(user)],
+                last_heartbeat_ts=get_heartbeat_ts(),
             )
         ).body
         _run["run"] = _run["run_number"]
         _run["status"] = "running"
-        _run["duration"] = max(
-            int(round(time.time() * 1000)) - _run["ts_epoch"], 1
-        )  # approx assert breaks in the odd case when duration==0
+        _run["duration"] = _run["last_heartbeat_ts"] * 1000 - _run["ts_epoch"]
         _run["user"] = user
         created_runs.append(_run)
     return created_runs
@@ -300,7 +300,7 @@ class MockPlugin(Plugin):
         }
         return _files.get(filename, None)
 
-    def serve(self, filename):
+    async def serve(self, filename, request=None):
         _file = self.get_file(filename)
         if _file:
             return web.Response(status=200, body=_file)
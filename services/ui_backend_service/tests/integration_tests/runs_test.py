@@ -47,6 +47,40 @@ async def test_list_runs(cli, db):
     )
 
 
+async def test_list_runs_cursor_pagination(cli, db):
+    _flow = (await add_flow(db, flow_id="HelloFlow")).body
+    _runs = [(await add_run(db, flow_id=_flow["flow_id"])).body for _ in range(5)]
+    expected = sorted((int(run["run_number"]) for run in _runs), reverse=True)
+
+    for order in ["", "&_order=-ts_epoch", "&_order=+user_name,status"]:
+        path = "/flows/HelloFlow/runs?_limit=2&_cursor={}".format(order)
+        pages = []
+        while path:
+            resp = await cli.get(path)
+            assert resp.status == 200
+            body = await resp.json()
+            pages.append([run["run_number"] for run in body["data"]])
+            path = body["links"]["next"]
+            if path:
+                # follow the links relative to the test client
+                path = path[path.index("/flows") :]
+
+        assert [len(page) for page in pages] == [2, 2, 1]
+        run_numbers = [run_number for page in pages for run_number in page]
+        assert sorted(run_numbers, reverse=True) == expected
+        if not order:
+            # defaults to ordering by primary key
+            assert run_numbers == expected
+
+
+async def test_list_runs_invalid_cursor(cli, db):
+    resp = await cli.get("/runs?_cursor=invalid")
+    assert resp.status == 400
+
+    resp = await cli.get("/runs?_cursor=&_group=flow_id")
+    assert resp.status == 400
+
+
 @pytest.mark.skip("Test failing due to refactor. TODO: fix later if applicable")
 async def test_list_runs_real_user(cli, db):
     _flow = (await add_flow(db, flow_id="HelloFlow")).body
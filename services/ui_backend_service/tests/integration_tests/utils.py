@@ -9,6 +9,11 @@ import datetime
 import contextlib
 
 from services.ui_backend_service.data.db import AsyncPostgresDB
+from services.data.postgres_async_db import (
+    TASK_ATTEMPT_TABLE_NAME,
+    RUN_STATUS_TABLE_NAME,
+    TAG_DICTIONARY_TABLE_NAME,
+)
 from services.ui_backend_service.data.cache.store import CacheStore
 from services.utils.tests import get_test_dbconf
 
@@ -69,7 +74,7 @@ async def init_app(aiohttp_client, queue_ttl=30):
 
     cache_store = CacheStore(db=db, event_emitter=app.event_emitter)
 
-    app.AutoCompleteApi = AutoCompleteApi(app, db)
+    app.AutoCompleteApi = AutoCompleteApi(app, db, cache_ttl=0)
     FlowApi(app, db)
     RunApi(app, db)
     StepApi(app, db)
@@ -121,6 +126,15 @@ async def clean_db(db: AsyncPostgresDB):
             await table.execute_sql(
                 select_sql="DELETE FROM {}".format(table.table_name), cur=cur
             )
+        # tables maintained by database triggers
+        for table_name in [
+            TASK_ATTEMPT_TABLE_NAME,
+            RUN_STATUS_TABLE_NAME,
+            TAG_DICTIONARY_TABLE_NAME,
+        ]:
+            await db.task_table_postgres.execute_sql(
+                select_sql="DELETE FROM {}".format(table_name), cur=cur
+            )
 
 
 @pytest.fixture
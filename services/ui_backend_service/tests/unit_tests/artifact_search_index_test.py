@@ -0,0 +1,118 @@
+import json
+import pytest
+
+from services.ui_backend_service.api.utils import operators_to_filters
+from services.ui_backend_service.data.cache import search_artifacts_action
+from services.ui_backend_service.data.cache.artifact_search_index import (
+    ArtifactSearchIndex,
+    search_index_path,
+)
+from services.ui_backend_service.data.cache.search_artifacts_action import (
+    SearchArtifacts,
+)
+
+pytestmark = [pytest.mark.unit_tests]
+
+
+def test_search_index_path_per_run():
+    a = search_index_path(["Flow/1/start/1/foo/0", "Flow/1/end/2/foo/0"])
+    b = search_index_path(["Flow/1/start/3/bar/1"])
+    c = search_index_path(["Flow/2/start/1/foo/0"])
+
+    assert a == b
+    assert not a == c
+
+
+def test_search_index_matches(tmp_path):
+    with ArtifactSearchIndex(str(tmp_path)) as index:
+        index.add(
+            {
+                "Flow/1/start/1/foo/0": '[true, "Value"]',
+                "Flow/1/start/2/foo/0": "[true, 123]",
+                "Flow/1/start/3/foo/0": '[false, "artifact-too-large", "3 bytes"]',
+            }
+        )
+        assert sorted(index.indexed_pathspecs(["Flow/1/start/1/foo/0", "other"])) == [
+            "Flow/1/start/1/foo/0"
+        ]
+
+        results = index.search(
+            [
+                "Flow/1/start/1/foo/0",
+                "Flow/1/start/2/foo/0",
+                "Flow/1/start/3/foo/0",
+                "Flow/1/start/4/foo/0",
+            ],
+            "VAL",
+            operators_to_filters["co"],
+        )
+
+    assert results["Flow/1/start/1/foo/0"] == {
+        "included": True,
+        "matches": True,
+        "error": None,
+    }
+    assert results["Flow/1/start/2/foo/0"]["matches"] is False
+    assert results["Flow/1/start/3/foo/0"] == {
+        "included": False,
+        "matches": False,
+        "error": {
+            "id": "artifact-too-large",
+            "detail": "3 bytes",
+            "traceback": None,
+        },
+    }
+    assert results["Flow/1/start/4/foo/0"]["included"] is False
+
+
+def test_search_index_batches_lookups(tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        "services.ui_backend_service.data.cache.artifact_search_index.SEARCH_INDEX_QUERY_BATCH",
+        3,
+    )
+    pathspecs = ["Flow/1/start/%s/foo/0" % i for i in range(10)]
+    with ArtifactSearchIndex(str(tmp_path)) as index:
+        index.add({pathspec: "[true, 1]" for pathspec in pathspecs[:7]})
+        index.add({"Flow/2/start/1/foo/0": "[true, 1]"})
+
+        assert sorted(index.indexed_pathspecs(pathspecs)) == sorted(pathspecs[:7])
+        results = index.search(pathspecs, "1", operators_to_filters["eq"])
+
+    assert sorted(results.keys()) == sorted(pathspecs)
+    assert [results[pathspec]["included"] for pathspec in pathspecs] == [True] * 7 + [
+        False
+    ] * 3
+
+
+def test_search_artifacts_fetches_once(tmp_path, monkeypatch):
+    fetched = []
+
+    class MockArtifact:
+        def __init__(self, pathspec, attempt=None):
+            fetched.append(pathspec)
+            self.pathspec = pathspec
+            self.size = 1
+            self.data = pathspec.split("/")[3]
+
+    monkeypatch.setattr(search_artifacts_action, "DataArtifact", MockArtifact)
+    monkeypatch.setattr(
+        "services.ui_backend_service.data.cache.artifact_search_index.SEARCH_INDEX_ROOT",
+        str(tmp_path),
+    )
+    pathspecs = ["Flow/1/start/%s/foo/0" % i for i in range(20)]
+
+    def _search(term):
+        msg, keys, stream_key, _, _, _ = SearchArtifacts.format_request(
+            pathspecs, term, "eq"
+        )
+        res = SearchArtifacts.execute(
+            message=msg, keys=keys, existing_keys={}, stream_output=lambda x: None
+        )
+        return json.loads(res[keys[0]])
+
+    first = _search("3")
+    second = _search("12")
+
+    assert len(fetched) == 20
+    assert [k for k, v in first.items() if v["matches"]] == ["Flow/1/start/3/foo/0"]
+    assert [k for k, v in second.items() if v["matches"]] == ["Flow/1/start/12/foo/0"]
@@ -0,0 +1,179 @@
+import asyncio
+
+import pytest
+from multidict import MultiDict
+
+from services.ui_backend_service.api.autocomplete import (
+    NameCache,
+    NameSet,
+    PrefixIndex,
+    like_pattern,
+)
+from services.ui_backend_service.api.utils import SingleFlight
+
+pytestmark = [pytest.mark.unit_tests]
+
+
+def test_prefix_index_lookups():
+    index = PrefixIndex(["b", "ab", "a", "abc", "b", "ac", "b\U0010ffff", "c"])
+    assert list(index) == ["a", "ab", "abc", "ac", "b", "b\U0010ffff", "c"]
+
+    assert index.with_prefix("a") == ["a", "ab", "abc", "ac"]
+    assert index.with_prefix("ab") == ["ab", "abc"]
+    assert index.with_prefix("b") == ["b", "b\U0010ffff"]
+    assert index.with_prefix("b\U0010ffff") == ["b\U0010ffff"]
+    assert index.with_prefix("d") == []
+    assert index.with_prefix("") == list(index)
+    assert index.with_prefix("a", offset=1, limit=2) == ["ab", "abc"]
+    assert index.with_prefix("a", offset=3, limit=2) == ["ac"]
+    assert index.with_prefix("a", offset=5, limit=2) == []
+
+    assert "abc" in index
+    assert "abd" not in index
+
+
+def test_prefix_index_updates():
+    index = PrefixIndex(str(i) for i in range(100))
+    index.add("5a")
+    index.add("5a")
+    index.discard("50")
+    index.discard("missing")
+    assert index.with_prefix("5") == [
+        "5",
+        "51",
+        "52",
+        "53",
+        "54",
+        "55",
+        "56",
+        "57",
+        "58",
+        "59",
+        "5a",
+    ]
+
+    # small and large batches of changes end up the same
+    for added in (["x", "y"], ["z{}".format(i) for i in range(50)]):
+        index.update(added=added, removed=["1", "x"])
+        assert "1" not in index
+        assert all(item in index for item in added if item != "x")
+        assert list(index) == sorted(set(index))
+
+
+def test_like_pattern():
+    def _matches(pattern, value):
+        return like_pattern(pattern)[1].fullmatch(value) is not None
+
+    assert like_pattern("Hello%")[0] == "hello"
+    assert like_pattern("a_b%")[0] == "a"
+    assert like_pattern("%ab")[0] == ""
+    assert like_pattern("a\\_b%")[0] == "a_b"
+    assert _matches("a_b", "AXB")
+    assert not _matches("a\\_b", "aXb")
+    assert _matches("a%", "a\nb")
+    assert _matches("a.*", "a.*")
+    assert not _matches("a.*", "abc")
+
+
+def test_name_set_filter():
+    names = NameSet(["start", "regular_step", "RegularStep", "step3", "end", "end"])
+
+    def _filter(**query):
+        return names.filter(
+            MultiDict((key.replace("__", ":"), val) for key, val in query.items()),
+            "step_name",
+        )
+
+    assert _filter() == ["RegularStep", "end", "regular_step", "start", "step3"]
+    # same semantics as the ILIKE conditions of the database
+    assert _filter(step_name__sw="reg") == ["RegularStep", "regular_step"]
+    assert _filter(step_name__co="ar_s") == ["regular_step"]
+    assert _filter(step_name__co="LAR") == ["RegularStep", "regular_step"]
+    assert _filter(step_name__ew="3") == ["step3"]
+    assert _filter(step_name__li="s%t") == ["start"]
+    assert _filter(step_name="end") == ["end"]
+    assert _filter(step_name="End") == []
+    assert _filter(step_name="null") == []
+    # values are alternatives, conditions all apply
+    assert _filter(step_name__sw="end,start") == ["end", "start"]
+    assert _filter(step_name__sw="s", step_name__ew="3") == ["step3"]
+    # other fields, and unknown operators, are ignored
+    assert _filter(name="end", step_name__xx="end", _limit="1") == _filter()
+    # operators that can not be evaluated in memory
+    assert _filter(step_name__lt="m") is None
+
+
+async def test_single_flight():
+    calls = []
+
+    async def _query(value):
+        calls.append(value)
+        await asyncio.sleep(0.01)
+        return value
+
+    single_flight = SingleFlight()
+    results = await asyncio.gather(
+        single_flight.do("a", _query, 1),
+        single_flight.do("a", _query, 2),
+        single_flight.do("b", _query, 3),
+    )
+    assert results == [1, 1, 3]
+    assert calls == [1, 3]
+    assert not single_flight.in_flight("a")
+
+    # callers giving up do not cancel the call for the others
+    cancelled = asyncio.ensure_future(single_flight.do("a", _query, 4))
+    waiting = asyncio.ensure_future(single_flight.do("a", _query, 5))
+    await asyncio.sleep(0)
+    cancelled.cancel()
+    assert await waiting == 4
+
+
+async def test_name_cache():
+    loads = []
+
+    def _loader(names):
+        async def _load():
+            loads.append(names)
+            await asyncio.sleep(0.01)
+            return NameSet(names)
+
+        return _load
+
+    cache = NameCache(ttl=60, max_sets=2)
+    # concurrent loads of a set are shared
+    first, second = await asyncio.gather(
+        cache.get(("steps", "HelloFlow", 1), _loader(["start"])),
+        cache.get(("steps", "HelloFlow", 1), _loader(["start"])),
+    )
+    assert first is second
+    assert await cache.get(("steps", "HelloFlow", 1), _loader(["start"])) is first
+    assert loads == [["start"]]
+
+    # least recently used sets are dropped
+    await cache.get(("steps", "HelloFlow", 2), _loader(["end"]))
+    await cache.get(("steps", "HelloFlow", 1), _loader(["start"]))
+    await cache.get(("runs", "HelloFlow"), _loader(["1", "2"]))
+    await cache.get(("steps", "HelloFlow", 2), _loader(["end"]))
+    assert loads == [["start"], ["end"], ["1", "2"], ["end"]]
+
+    # sets are dropped by key prefix, and loads of the prefix in flight at the time
+    # are not cached, while loads of other sets are
+    loading = asyncio.gather(
+        cache.get(("runs", "OtherFlow"), _loader(["3"])),
+        cache.get(("steps", "HelloFlow", 3), _loader(["join"])),
+    )
+    await asyncio.sleep(0)
+    cache.discard("steps", "HelloFlow")
+    await loading
+    await cache.get(("runs", "OtherFlow"), _loader(["3"]))
+    await cache.get(("steps", "HelloFlow", 3), _loader(["join"]))
+    await cache.get(("steps", "HelloFlow", 2), _loader(["end"]))
+    assert loads[4:] == [["3"], ["join"], ["join"], ["end"]]
+    assert cache._discarded == {}
+
+    # nothing is cached without a ttl
+    cache = NameCache(ttl=0, max_sets=2)
+    await cache.get(("flows",), _loader(["HelloFlow"]))
+    await cache.get(("flows",), _loader(["HelloFlow"]))
+    assert loads[8:] == [["HelloFlow"], ["HelloFlow"]]
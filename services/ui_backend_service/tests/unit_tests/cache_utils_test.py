@@ -10,6 +10,7 @@ from services.ui_backend_service.data.cache.utils import (
     streamed_errors,
     cacheable_artifact_value,
     artifact_value,
+    bounded_map,
 )
 
 pytestmark = [pytest.mark.unit_tests]
@@ -139,6 +140,21 @@ def test_artifact_value():
     )
 
 
+def test_bounded_map_processes_all_items():
+    items = list(range(50))
+    results = dict(bounded_map(lambda x: x * 2, items, max_workers=4))
+    assert results == {x: x * 2 for x in items}
+
+
+def test_bounded_map_sequential_and_empty():
+    assert list(bounded_map(lambda x: x, [])) == []
+    assert list(bounded_map(lambda x: x + 1, [1, 2, 3], max_workers=1)) == [
+        (1, 2),
+        (2, 3),
+        (3, 4),
+    ]
+
+
 class MockArtifact:
     def __init__(self, pathspec, size, data):
         self.pathspec = pathspec
@@ -0,0 +1,142 @@
+import asyncio
+import os
+import sys
+import time
+
+import pytest
+from aiohttp import web
+from pyee import AsyncIOEventEmitter
+
+from services.ui_backend_service.api.card import CardsApi
+from services.ui_backend_service.data.cache import card_cache_manager
+from services.ui_backend_service.data.cache.card_cache_manager import (
+    CardCacheManager,
+    list_cards,
+)
+from services.ui_backend_service.data.cache.card_cache_service import CardCache
+
+pytestmark = [pytest.mark.unit_tests]
+
+RESOURCE = "/flows/HelloFlow/runs/1/steps/start/tasks/2/cards/abc/data"
+
+
+async def test_card_cache_manager_emits_updates(monkeypatch, tmp_path):
+    monkeypatch.setattr(card_cache_manager, "CACHE_STORAGE_PATH", str(tmp_path))
+    cache = CardCache("HelloFlow/1/start/2", None, cache_path=str(tmp_path))
+    list_path = os.path.join(cache.parent_dir, CardCache.LIST_METADATA)
+    # Stands in for the card cache service: writes the card list of every viewed
+    # task after a delay, and reports the update
+    service = (
+        "import json, os, sys, time\n"
+        "for line in sys.stdin:\n"
+        "    view = json.loads(line)\n"
+        "    time.sleep(0.2)\n"
+        "    os.makedirs(os.path.dirname(%r), exist_ok=True)\n"
+        "    with open(%r, 'w') as f:\n"
+        "        json.dump({'abc': {'id': None, 'type': 'default'}}, f)\n"
+        "    print(json.dumps({'pathspec': view['pathspec'], 'card_hash': None, 'update': 'list'}), flush=True)\n"
+    ) % (list_path, list_path)
+    emitter = AsyncIOEventEmitter()
+    updates = []
+    emitter.on("card-update", lambda *args: updates.append(args))
+    manager = CardCacheManager(emitter)
+    monkeypatch.setattr(
+        manager, "_make_service_command", lambda: [sys.executable, "-c", service]
+    )
+
+    # waiting for the card list is woken up by the update, instead of polling for it
+    started = time.time()
+    cards = await list_cards(
+        manager, "HelloFlow/1/start/2", max_wait_time=10, poll_interval=10
+    )
+    assert cards == {"abc": {"id": None, "type": "default"}}
+    assert time.time() - started < 5
+    assert updates == [("HelloFlow/1/start/2", None, "list")]
+
+    # updates are not status reports
+    assert manager.get_status("HelloFlow/1/start/2") == "running"
+    await manager.stop()
+
+
+class _CacheManager(object):
+    def __init__(self, cache_path):
+        self.cache_path = cache_path
+        self.watched = []
+
+    async def watch(self, pathspec):
+        self.watched.append(pathspec)
+
+    def unwatch(self, pathspec):
+        self.watched.remove(pathspec)
+
+    def get_local_cache(self, pathspec, card_hash):
+        return CardCache.load_from_disk(pathspec, card_hash, self.cache_path)
+
+
+class _CardCacheStore(object):
+    def __init__(self, cache_path):
+        self.event_emitter = AsyncIOEventEmitter()
+        self.cache_manager = _CacheManager(cache_path)
+
+
+async def test_card_data_subscriptions(monkeypatch, tmp_path):
+    card_cache = _CardCacheStore(str(tmp_path))
+    api = CardsApi(
+        web.Application(), None, type("Cache", (), {"card_cache": card_cache})
+    )
+
+    async def _get_task(flow_id, run_number, step_name, task_id):
+        await asyncio.sleep(0.01)
+        return {
+            "flow_id": flow_id,
+            "run_number": int(run_number),
+            "step_name": step_name,
+            "task_id": int(task_id),
+        }
+
+    monkeypatch.setattr(api, "get_task", _get_task)
+    pushed = []
+    card_cache.event_emitter.on(
+        "notify", lambda operation, resources, data: pushed.append((resources, data))
+    )
+
+    # other resources, and subscriptions cancelled while being resolved, are not watched
+    await api.subscribe_card_data("/flows/HelloFlow/runs/1")
+    subscribing = asyncio.ensure_future(api.subscribe_card_data(RESOURCE))
+    await asyncio.sleep(0)
+    await api.unsubscribe_card_data(RESOURCE)
+    await subscribing
+    assert card_cache.cache_manager.watched == []
+
+    # resubscribing while the task of an unsubscribed resource is looked up
+    # watches it once
+    subscribing = asyncio.ensure_future(api.subscribe_card_data(RESOURCE))
+    await asyncio.sleep(0)
+    unsubscribing = asyncio.ensure_future(api.unsubscribe_card_data(RESOURCE))
+    await asyncio.sleep(0)
+    await asyncio.gather(subscribing, unsubscribing, api.subscribe_card_data(RESOURCE))
+    assert card_cache.cache_manager.watched == ["HelloFlow/1/start/2"]
+    await api.unsubscribe_card_data(RESOURCE)
+    assert card_cache.cache_manager.watched == []
+
+    await asyncio.gather(
+        api.subscribe_card_data(RESOURCE), api.subscribe_card_data(RESOURCE)
+    )
+    assert card_cache.cache_manager.watched == ["HelloFlow/1/start/2"]
+
+    cache = CardCache("HelloFlow/1/start/2", "abc", cache_path=str(tmp_path), init=True)
+    cache._set_card_metadata(None, "default")
+    cache.write_data_if_changed({"progress": 1})
+    await api.publish_card_data("HelloFlow/1/start/2", "abc", "html")
+    await api.publish_card_data("HelloFlow/1/start/2", "other", "data")
+    await api.publish_card_data("HelloFlow/1/start/2", "abc", "data")
+    assert pushed == [
+        ([RESOURCE], {"data": {"progress": 1}, "id": None, "type": "default"})
+    ]
+
+    await api.unsubscribe_card_data(RESOURCE)
+    assert card_cache.cache_manager.watched == ["HelloFlow/1/start/2"]
+    await api.unsubscribe_card_data(RESOURCE)
+    assert card_cache.cache_manager.watched == []
+    await api.publish_card_data("HelloFlow/1/start/2", "abc", "data")
+    assert len(pushed) == 1
@@ -0,0 +1,240 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+from services.ui_backend_service.data.cache.card_cache_manager import (
+    CardCacheManager,
+    verify_process_has_crashed,
+)
+from services.ui_backend_service.data.cache import card_cache_service
+from services.ui_backend_service.data.cache.card_cache_service import (
+    CardCache,
+    CardRefreshScheduler,
+    TaskCardCacheService,
+)
+
+pytestmark = [pytest.mark.unit_tests]
+
+
+class _Refresher(object):
+    "Stands in for TaskCardCacheService, with refreshes due every `interval` seconds"
+
+    def __init__(self, pathspec, interval=0.01, refreshes=None, duration=0):
+        self.pathspec = pathspec
+        self.interval = interval
+        self.refreshes = refreshes
+        self.duration = duration
+        self.count = 0
+
+    def refresh_due(self):
+        self.count += 1
+        time.sleep(self.duration)
+        if self.refreshes is not None and self.count >= self.refreshes:
+            return None
+        return time.time() + self.interval
+
+
+def _run_until(scheduler, condition, timeout=2):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, "timed out"
+        scheduler.tick()
+        time.sleep(0.005)
+
+
+def test_scheduler_refreshes_viewed_tasks():
+    reports = []
+    refreshers = {}
+
+    def _create(pathspec):
+        refreshers[pathspec] = _Refresher(pathspec, refreshes=3)
+        return refreshers[pathspec]
+
+    scheduler = CardRefreshScheduler(_create, max_workers=2, report=reports.append)
+    scheduler.view("HelloFlow/1/start/1")
+    scheduler.view("HelloFlow/1/start/1")
+    scheduler.view("HelloFlow/1/start/2")
+    assert scheduler.pathspecs == ["HelloFlow/1/start/1", "HelloFlow/1/start/2"]
+
+    _run_until(scheduler, lambda: not scheduler.pathspecs)
+    assert [refresher.count for refresher in refreshers.values()] == [3, 3]
+    assert [(r["pathspec"], r["status"]) for r in reports[:2]] == [
+        ("HelloFlow/1/start/1", "running"),
+        ("HelloFlow/1/start/2", "running"),
+    ]
+    assert sorted((r["pathspec"], r["status"]) for r in reports[2:]) == [
+        ("HelloFlow/1/start/1", "completed"),
+        ("HelloFlow/1/start/2", "completed"),
+    ]
+
+
+def test_scheduler_drops_idle_and_failed_tasks():
+    reports = []
+
+    def _create(pathspec):
+        if pathspec.endswith("missing"):
+            raise Exception("Task not found")
+        return _Refresher(pathspec)
+
+    scheduler = CardRefreshScheduler(_create, idle_seconds=0.05, report=reports.append)
+    scheduler.view("HelloFlow/1/start/missing")
+    scheduler.view("HelloFlow/1/start/1")
+    _run_until(scheduler, lambda: not scheduler.pathspecs)
+
+    statuses = {report["pathspec"]: report["status"] for report in reports}
+    assert statuses == {
+        "HelloFlow/1/start/missing": "failed",
+        "HelloFlow/1/start/1": "completed",
+    }
+
+
+def test_scheduler_bounded_workers_and_lag():
+    reports = []
+    running = 0
+    max_running = 0
+    lock = threading.Lock()
+
+    class _SlowRefresher(_Refresher):
+        def refresh_due(self):
+            nonlocal running, max_running
+            with lock:
+                running += 1
+                max_running = max(max_running, running)
+            try:
+                return super().refresh_due()
+            finally:
+                with lock:
+                    running -= 1
+
+    scheduler = CardRefreshScheduler(
+        lambda pathspec: _SlowRefresher(pathspec, refreshes=2, duration=0.05),
+        max_workers=2,
+        report=reports.append,
+        report_interval=0,
+    )
+    for i in range(6):
+        scheduler.view("HelloFlow/1/start/{}".format(i))
+    _run_until(scheduler, lambda: not scheduler.pathspecs)
+
+    assert max_running == 2
+    # tasks waiting for a free worker report their refresh lag
+    assert max(report["lag"] for report in reports) >= 0.05
+
+
+async def test_card_cache_manager_service(monkeypatch):
+    # Stands in for the card cache service: reports every viewed task as running
+    service = (
+        "import json, sys\n"
+        "for line in sys.stdin:\n"
+        "    view = json.loads(line)\n"
+        "    print('not a report', flush=True)\n"
+        "    print(json.dumps({'pathspec': view['pathspec'], 'status': 'running', 'lag': 0.5}), flush=True)\n"
+    )
+    manager = CardCacheManager()
+    monkeypatch.setattr(
+        manager, "_make_service_command", lambda: [sys.executable, "-c", service]
+    )
+
+    assert await verify_process_has_crashed(manager, "HelloFlow/1/start/1")
+    assert await manager.register("HelloFlow/1/start/1") == (
+        "HelloFlow/1/start/1",
+        "started",
+    )
+    assert await manager.register("HelloFlow/1/start/1") == (
+        "HelloFlow/1/start/1",
+        "running",
+    )
+    assert not await verify_process_has_crashed(manager, "HelloFlow/1/start/1")
+
+    for _ in range(100):
+        if manager.status()["tasks"]["HelloFlow/1/start/1"]["lag"] is not None:
+            break
+        await asyncio.sleep(0.01)
+    assert manager.status()["tasks"] == {
+        "HelloFlow/1/start/1": {"status": "running", "lag": 0.5}
+    }
+
+    await manager.stop()
+    assert not manager.service_is_running()
+    await manager._reader
+    # tasks of a service that exited are no longer refreshed
+    assert await verify_process_has_crashed(manager, "HelloFlow/1/start/1")
+
+
+class _Backend(object):
+    def __init__(self):
+        self.sizes = {}
+
+    def size_file(self, path):
+        return self.sizes.get(path)
+
+
+class _Card(object):
+    "Stands in for a Metaflow Card, counting the downloads of its html and data"
+
+    def __init__(self, backend, hash="abc", html="<html></html>", data=None):
+        self.hash = hash
+        self.id = None
+        self.type = "default"
+        self.path = "cards/" + hash
+        self._html = None
+        self._card_ds = type("CardDatastore", (), {"_backend": backend})()
+        self.html = html
+        self.data = data or {"progress": 0}
+        self.downloads = {"html": 0, "data": 0}
+
+    def get(self):
+        self.downloads["html"] += 1
+        return self.html
+
+    def get_data(self):
+        self.downloads["data"] += 1
+        return self.data
+
+
+def test_task_card_cache_service_backs_off_unchanged_cards(monkeypatch, tmp_path):
+    backend = _Backend()
+    card = _Card(backend)
+    backend.sizes[card.path] = len(card.html)
+    monkeypatch.setattr(card_cache_service, "_get_task", lambda pathspec: object())
+    monkeypatch.setattr(card_cache_service, "get_cards", lambda *args, **kw: [card])
+
+    service = TaskCardCacheService(
+        "HelloFlow/1/start/1",
+        cache_path=str(tmp_path),
+        data_update_frequency=1,
+        html_update_frequency=1,
+        list_frequency_seconds=1000,
+        max_refresh_interval=4,
+    )
+    cache = CardCache("HelloFlow/1/start/1", card.hash, cache_path=str(tmp_path))
+    data_file = os.path.join(cache.base_dir, CardCache._DATA_FILE)
+
+    # unchanged cards are refreshed after 1, 2, 4 and then every 4 seconds
+    now = 100
+    assert service.refresh_due(now) == 101
+    assert cache.read_data()["data"] == {"progress": 0}
+    assert cache.read_html() == card.html
+    written_at = os.stat(data_file).st_mtime_ns
+    due = [service.refresh_due(t) for t in (101, 103, 107)]
+    assert due == [103, 107, 111]
+    assert os.stat(data_file).st_mtime_ns == written_at
+    # the html of the same size was only downloaded again after max_refresh_interval
+    assert card.downloads == {"html": 2, "data": 4}
+
+    # the html is downloaded again once its size changes, or after max_refresh_interval
+    card.html = "<html>changed</html>"
+    backend.sizes[card.path] = len(card.html)
+    card.data = {"progress": 1}
+    assert service.refresh_due(111) == 112
+    assert cache.read_data()["data"] == {"progress": 1}
+    assert cache.read_html() == card.html
+    assert service.refresh_due(112) == 114
+    assert card.downloads == {"html": 3, "data": 6}
+    assert service.refresh_due(114) == 118
+    assert service.refresh_due(118) == 122
+    assert card.downloads == {"html": 4, "data": 8}
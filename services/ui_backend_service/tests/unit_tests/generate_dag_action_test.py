@@ -0,0 +1,49 @@
+import json
+import pytest
+
+from services.ui_backend_service.data.cache.generate_dag_action import GenerateDag
+from services.ui_backend_service.data.db.utils import get_dag_source_id
+
+pytestmark = [pytest.mark.unit_tests]
+
+
+async def test_cache_key_shared_by_source():
+    a = GenerateDag.format_request("HelloFlow", "1", source_id="code-package:abc")
+    b = GenerateDag.format_request("HelloFlow", "2", source_id="code-package:abc")
+    c = GenerateDag.format_request("HelloFlow", "3", source_id="code-package:def")
+
+    # result keys
+    assert a[1] == b[1]
+    assert not a[1] == c[1]
+    # messages still point to the requested run
+    assert b[0] == {"flow_id": "HelloFlow", "run_number": "2"}
+
+
+async def test_cache_key_per_run_without_source():
+    a = GenerateDag.format_request("HelloFlow", "1")
+    b = GenerateDag.format_request("HelloFlow", "2")
+
+    assert not a[1] == b[1]
+
+
+async def test_get_dag_source_id():
+    assert (
+        get_dag_source_id(
+            {
+                "field_name": "code-package",
+                "value": json.dumps(
+                    {"ds_type": "s3", "sha": "abc", "location": "s3://"}
+                ),
+            }
+        )
+        == "code-package:abc"
+    )
+    assert (
+        get_dag_source_id(
+            {"field_name": "code-package-url", "value": "s3://bucket/abc"}
+        )
+        == "code-package-url:s3://bucket/abc"
+    )
+    assert get_dag_source_id({"name": "_graph_info", "sha": "123"}) == "graph-info:123"
+    assert get_dag_source_id({"field_name": "code-package", "value": "{}"}) is None
+    assert get_dag_source_id({"field_name": "code-package", "value": "invalid"}) is None
@@ -0,0 +1,98 @@
+import asyncio
+import pytest
+
+from services.ui_backend_service.data.cache import prefetch
+from services.ui_backend_service.data.cache.prefetch import RunPrefetchScheduler
+
+pytestmark = [pytest.mark.unit_tests]
+
+
+async def test_prefetch_bounded_concurrency():
+    running = 0
+    max_running = 0
+
+    async def _prefetch(run):
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+
+    scheduler = RunPrefetchScheduler(_prefetch, concurrency=3)
+    scheduler.schedule(
+        [{"flow_id": "HelloFlow", "run_number": i, "ts_epoch": i} for i in range(10)]
+    )
+    await scheduler.join()
+
+    assert max_running == 3
+    assert scheduler.status()["completed"] == 10
+    assert scheduler.status()["queued"] == 0
+
+
+async def test_prefetch_priority():
+    order = []
+
+    async def _prefetch(run):
+        order.append(run["run_number"])
+
+    scheduler = RunPrefetchScheduler(_prefetch, concurrency=1)
+    scheduler.record_view("HelloFlow", 1)
+    scheduler.record_view("HelloFlow", 1)
+    scheduler.record_view("HelloFlow", 2)
+    scheduler.schedule(
+        [{"flow_id": "HelloFlow", "run_number": i, "ts_epoch": i} for i in range(5)]
+    )
+    await scheduler.join()
+
+    # most viewed first, then newest.
+    assert order == [1, 2, 4, 3, 0]
+    # views are forgotten once they have been used
+    assert len(scheduler._views) == 0
+
+
+async def test_prefetch_views_bounded(monkeypatch):
+    monkeypatch.setattr(prefetch, "MAX_VIEWED_RUNS", 2)
+
+    async def _prefetch(run):
+        pass
+
+    scheduler = RunPrefetchScheduler(_prefetch, concurrency=1)
+    scheduler.record_view("HelloFlow", 1)
+    scheduler.record_view("HelloFlow", "2")
+    scheduler.record_view("HelloFlow", 1)
+    scheduler.record_view("HelloFlow", 3)
+    # the least recently viewed runs are forgotten
+    assert dict(scheduler._views) == {"HelloFlow/1": 2, "HelloFlow/3": 1}
+
+
+async def test_prefetch_failures_and_duplicates():
+    async def _prefetch(run):
+        if run["run_number"] == 1:
+            raise Exception("failed")
+
+    scheduler = RunPrefetchScheduler(_prefetch, concurrency=2)
+    runs = [{"flow_id": "HelloFlow", "run_number": i} for i in range(3)]
+    scheduler.schedule(runs + runs)
+    await scheduler.join()
+
+    status = scheduler.status()
+    assert status["scheduled"] == 3
+    assert status["completed"] == 2
+    assert status["failed"] == 1
+
+
+async def test_prefetch_cancel():
+    async def _prefetch(run):
+        await asyncio.sleep(10)
+
+    scheduler = RunPrefetchScheduler(_prefetch, concurrency=2)
+    scheduler.schedule([{"flow_id": "HelloFlow", "run_number": i} for i in range(5)])
+    await asyncio.sleep(0)
+    scheduler.cancel()
+    await scheduler.join()
+
+    status = scheduler.status()
+    assert status["queued"] == 0
+    assert status["in_progress"] == 0
+    assert status["cancelled"] == 5
+    assert status["completed"] == 0
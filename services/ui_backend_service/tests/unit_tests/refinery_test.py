@@ -0,0 +1,101 @@
+import json
+
+import pytest
+
+from services.data.db_utils import DBResponse
+from services.ui_backend_service.data.cache.get_data_action import decode_json_values
+from services.ui_backend_service.data.cache.get_task_action import GetTask
+from services.ui_backend_service.data.refiner import TaskRefiner
+
+pytestmark = [pytest.mark.unit_tests]
+
+
+def test_decode_json_values():
+    assert decode_json_values([]) == []
+    assert decode_json_values([b'[true, "a"]', '[false, "b"]', b"1"]) == [
+        [True, "a"],
+        [False, "b"],
+        1,
+    ]
+
+
+def test_decode_json_values_invalid():
+    with pytest.raises(ValueError):
+        decode_json_values([b"[true]", b"{broken"])
+
+
+def test_get_data_response_decodes_all_targets():
+    keys_objs = {
+        "data:GetTask:Flow/1/start/1/0": b'[true, {"_task_ok": true}]',
+        "data:GetTask:Flow/1/start/2/0": b'[false, "artifact-too-large"]',
+        "data:stream:GetTask:123": b"",
+    }
+    assert GetTask.response(keys_objs) == {
+        "Flow/1/start/1/0": [True, {"_task_ok": True}],
+        "Flow/1/start/2/0": [False, "artifact-too-large"],
+    }
+
+
+def _cached_tasks(num_tasks):
+    return {
+        "data:GetTask:Flow/1/start/{}/0".format(i): json.dumps(
+            [True, {"_task_ok": i % 2 == 0, "_foreach_stack": [[0, 1, 2, i]]}]
+        ).encode("utf-8")
+        for i in range(num_tasks - 1)  # last task has no cached value
+    }
+
+
+def _task_records(num_tasks):
+    return [
+        {
+            "flow_id": "Flow",
+            "run_number": 1,
+            "step_name": "start",
+            "task_id": i,
+            "attempt_id": 0,
+            "status": "unknown",
+        }
+        for i in range(num_tasks)
+    ]
+
+
+async def test_task_refiner_postprocess():
+    num_tasks = 10000
+    refiner = TaskRefiner(cache=MockCacheStore(_cached_tasks(num_tasks)))
+    records = _task_records(num_tasks)
+
+    response = await refiner.postprocess(DBResponse(200, records))
+
+    assert response.response_code == 200
+    assert len(response.body) == num_tasks
+    assert response.body[0]["status"] == "completed"
+    assert response.body[1]["status"] == "failed"
+    assert response.body[5]["foreach_label"] == "5[5]"
+    assert response.body[-1]["postprocess_error"]["id"] == "artifact-value-not-found"
+
+    single = await refiner.postprocess(DBResponse(200, dict(records[2])))
+    assert single.body["status"] == "completed"
+
+
+class MockCacheResult:
+    def __init__(self, keys_objs):
+        self.keys_objs = keys_objs
+
+    def has_pending_request(self):
+        return False
+
+    def get(self):
+        return GetTask.response(self.keys_objs)
+
+
+class MockCache:
+    def __init__(self, keys_objs):
+        self.keys_objs = keys_objs
+
+    async def GetTask(self, targets, invalidate_cache=False):
+        return MockCacheResult(self.keys_objs)
+
+
+class MockCacheStore:
+    def __init__(self, keys_objs):
+        self.cache = MockCache(keys_objs)
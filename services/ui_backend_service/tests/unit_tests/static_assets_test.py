@@ -0,0 +1,270 @@
+import asyncio
+import gzip
+import os
+
+import pygit2
+import pytest
+from aiohttp.test_utils import make_mocked_request
+
+# api ahead of the plugins it imports
+from services.ui_backend_service import api, frontend
+from services.ui_backend_service.frontend import Frontend
+from services.ui_backend_service import plugins as plugins_module
+from services.ui_backend_service.plugins import plugin as plugin_module
+from services.ui_backend_service.plugins.plugin import Plugin, PluginException
+from services.ui_backend_service.static_assets import (
+    IMMUTABLE_CACHE_CONTROL,
+    REVALIDATE_CACHE_CONTROL,
+    StaticFiles,
+    accepted_encodings,
+)
+
+pytestmark = [pytest.mark.unit_tests]
+
+SCRIPT = b"console.log('hello');\n" * 100
+
+
+def _request(path="/", **headers):
+    return make_mocked_request("GET", path, headers=headers)
+
+
+def test_accepted_encodings():
+    assert accepted_encodings("gzip, deflate, br") == {"gzip", "deflate", "br"}
+    assert accepted_encodings("br;q=0, gzip;q=0.5") == {"gzip"}
+    assert accepted_encodings(None) == set()
+
+
+async def test_static_files_compression_and_etags(tmp_path):
+    os.makedirs(tmp_path / "static" / "js")
+    (tmp_path / "static" / "js" / "main.3f2a1b9c.chunk.js").write_bytes(SCRIPT)
+    (tmp_path / "favicon.txt").write_bytes(b"tiny")
+    files = StaticFiles(str(tmp_path))
+
+    response = await files.serve(
+        _request(**{"Accept-Encoding": "gzip"}), "static/js/main.3f2a1b9c.chunk.js"
+    )
+    assert response.status == 200
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.headers["Cache-Control"] == IMMUTABLE_CACHE_CONTROL
+    assert gzip.decompress(response.body) == SCRIPT
+    etag = response.headers["ETag"]
+
+    # the client has the content
+    response = await files.serve(
+        _request(**{"Accept-Encoding": "gzip", "If-None-Match": etag}),
+        "static/js/main.3f2a1b9c.chunk.js",
+    )
+    assert response.status == 304
+    assert response.body is None
+
+    # clients not accepting compression get the content as is, with another ETag
+    response = await files.serve(_request(), "static/js/main.3f2a1b9c.chunk.js")
+    assert response.status == 200
+    assert "Content-Encoding" not in response.headers
+    assert response.body == SCRIPT
+    assert response.headers["ETag"] != etag
+
+    # small files are not compressed, and files without a hash are revalidated
+    response = await files.serve(_request(**{"Accept-Encoding": "gzip"}), "favicon.txt")
+    assert "Content-Encoding" not in response.headers
+    assert response.headers["Cache-Control"] == REVALIDATE_CACHE_CONTROL
+
+    assert (await files.serve(_request(), "missing.js")).status == 404
+    assert (await files.serve(_request(), "../outside.js")).status == 404
+    assert (await files.serve(_request(), "static")).status == 404
+
+
+async def test_static_files_prebuilt_variants_and_changes(tmp_path):
+    (tmp_path / "app.js").write_bytes(SCRIPT)
+    (tmp_path / "app.js.br").write_bytes(b"prebuilt brotli")
+    files = StaticFiles(str(tmp_path))
+
+    response = await files.serve(_request(**{"Accept-Encoding": "gzip, br"}), "app.js")
+    assert response.headers["Content-Encoding"] == "br"
+    assert response.body == b"prebuilt brotli"
+
+    # changed files are read again
+    (tmp_path / "app.js.br").unlink()
+    (tmp_path / "app.js").write_bytes(SCRIPT * 2)
+    response = await files.serve(_request(**{"Accept-Encoding": "gzip"}), "app.js")
+    assert gzip.decompress(response.body) == SCRIPT * 2
+
+
+async def test_static_files_compressed_once(tmp_path):
+    (tmp_path / "app.js").write_bytes(SCRIPT)
+    files = StaticFiles(str(tmp_path))
+    loads = []
+    load = files._load
+
+    def _load(filename, path):
+        loads.append(filename)
+        return load(filename, path)
+
+    files._load = _load
+    # concurrent first requests share the compression, done in an executor
+    responses = await asyncio.gather(
+        *(
+            files.serve(_request(**{"Accept-Encoding": "gzip"}), "app.js")
+            for _ in range(3)
+        )
+    )
+    assert [gzip.decompress(response.body) for response in responses] == [SCRIPT] * 3
+    await files.serve(_request(), "app.js")
+    assert loads == ["app.js"]
+    assert files._loading == {}
+
+
+async def test_frontend_index_rendered_once(monkeypatch, tmp_path):
+    (tmp_path / "index.html").write_text("<html><head></head><body></body></html>")
+    monkeypatch.setattr(frontend, "static_ui_path", str(tmp_path))
+    renders = []
+
+    def _render(content):
+        renders.append(content)
+        return content.replace("</head>", "<script>api</script></head>")
+
+    monkeypatch.setattr(frontend, "render_index_html", _render)
+
+    class _Router(object):
+        def add_route(self, *args):
+            pass
+
+    ui = Frontend(type("App", (), {"router": _Router()}))
+    response = await ui.serve_index_html(_request("/flows"))
+    assert (
+        response.body == b"<html><head><script>api</script></head><body></body></html>"
+    )
+    assert response.headers["Content-Type"] == "text/html; charset=utf-8"
+    response = await ui.serve_index_html(
+        _request("/runs", **{"If-None-Match": response.headers["ETag"]})
+    )
+    assert response.status == 304
+    assert len(renders) == 1
+
+
+async def test_static_files_index(tmp_path):
+    os.makedirs(tmp_path / "dist")
+    os.makedirs(tmp_path / ".git")
+    (tmp_path / "manifest.json").write_text('{"name": "plugin"}')
+    (tmp_path / "dist" / "index.html").write_text("<h1>plugin</h1>")
+    (tmp_path / ".git" / "HEAD").write_text("ref")
+    files = StaticFiles(str(tmp_path))
+
+    assert sorted(files.index()) == ["dist/index.html", "manifest.json"]
+    assert files.has_file("dist/index.html")
+    assert not files.has_file(".git/HEAD")
+    assert files.read("dist/index.html") == b"<h1>plugin</h1>"
+
+    # indexed files are served without checking the filesystem, until indexed again
+    (tmp_path / "dist" / "index.html").write_text("<h1>changed plugin</h1>")
+    (tmp_path / "dist" / "new.js").write_text("")
+    assert (await files.serve(_request(), "dist/index.html")).body == b"<h1>plugin</h1>"
+    assert (await files.serve(_request(), "dist/new.js")).status == 404
+    files.index()
+    assert (
+        await files.serve(_request(), "dist/index.html")
+    ).body == b"<h1>changed plugin</h1>"
+    assert (await files.serve(_request(), "dist/new.js")).status == 200
+
+
+async def test_plugin_serves_indexed_files(monkeypatch, tmp_path):
+    monkeypatch.setattr(plugin_module, "installed_plugins_base_dir", str(tmp_path))
+    basepath = tmp_path / plugin_module.INSTALLED_PLUGINS_DIR / "my-plugin"
+    os.makedirs(basepath / "dist")
+    (basepath / "manifest.json").write_text(
+        '{"name": "my-plugin", "version": "1.0.0", "entrypoint": "dist/index.html"}'
+    )
+    (basepath / "dist" / "index.html").write_text("<h1>Hello</h1>")
+
+    plugin = Plugin("my-plugin", repository=None).init()
+    assert plugin.files == ["manifest.json", "dist/index.html"]
+    assert plugin.config["entrypoint"] == "dist/index.html"
+    assert plugin.get_file("dist/index.html") == "<h1>Hello</h1>"
+    assert (await plugin.serve("dist/index.html", _request())).body == b"<h1>Hello</h1>"
+    assert (await plugin.serve("index.html", _request())).status == 404
+
+    # reloading picks up changed files
+    (basepath / "dist" / "main.js").write_text("")
+    assert not plugin.has_file("dist/main.js")
+    plugin.reload()
+    assert plugin.has_file("dist/main.js")
+
+
+def _commit(repo, message):
+    repo.index.add_all()
+    repo.index.write()
+    signature = pygit2.Signature("tester", "tester@example.com")
+    parents = [] if repo.head_is_unborn else [repo.head.target]
+    repo.create_commit(
+        "refs/heads/master",
+        signature,
+        signature,
+        message,
+        repo.index.write_tree(),
+        parents,
+    )
+
+
+async def test_plugin_reload_only_what_changed(monkeypatch, tmp_path):
+    monkeypatch.setattr(plugin_module, "installed_plugins_base_dir", str(tmp_path))
+    origin = tmp_path / "origin"
+    os.makedirs(origin / "dist")
+    (origin / "manifest.json").write_text(
+        '{"name": "my-plugin", "version": "1.0.0", "entrypoint": "dist/index.html"}'
+    )
+    (origin / "dist" / "index.html").write_text("<h1>Hello</h1>")
+    (origin / "dist" / "main.js").write_text("one")
+    origin_repo = pygit2.init_repository(str(origin), initial_head="master")
+    _commit(origin_repo, "first")
+
+    checkouts, configs = [], []
+    checkout, load_config = pygit2.Repository.checkout, Plugin._load_config
+
+    def _checkout(repo, *args, **kwargs):
+        checkouts.append(args)
+        return checkout(repo, *args, **kwargs)
+
+    def _load_config(plugin):
+        configs.append(plugin)
+        return load_config(plugin)
+
+    monkeypatch.setattr(pygit2.Repository, "checkout", _checkout)
+    monkeypatch.setattr(Plugin, "_load_config", _load_config)
+
+    plugin = Plugin("my-plugin", repository=str(origin)).init()
+    index = await plugin.serve("dist/index.html", _request())
+    assert (len(checkouts), len(configs)) == (1, 1)
+
+    # nothing changed, nothing is checked out or read again
+    plugin.reload()
+    assert (len(checkouts), len(configs)) == (1, 1)
+    assert (await plugin.serve("dist/index.html", _request())).headers[
+        "ETag"
+    ] == index.headers["ETag"]
+
+    # a new commit is checked out, and only its changed files are read
+    (origin / "dist" / "main.js").write_text("two")
+    _commit(origin_repo, "second")
+    plugin.reload()
+    assert (len(checkouts), len(configs)) == (2, 1)
+    assert plugin.get_file("dist/main.js") == "two"
+
+
+def test_reload_plugins(monkeypatch):
+    reloaded = []
+
+    class _Plugin(object):
+        identifier = "plugin"
+
+        def __init__(self, error=None):
+            self.error = error
+
+        def reload(self):
+            if self.error:
+                raise self.error
+            reloaded.append(self)
+
+    plugins = [_Plugin(PluginException()), _Plugin()]
+    monkeypatch.setattr(plugins_module, "_PLUGINS", plugins)
+    plugins_module.reload_plugins()
+    assert reloaded == plugins[1:]
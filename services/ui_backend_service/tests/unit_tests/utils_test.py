@@ -1,3 +1,4 @@
+import asyncio
 import pytest
 from services.data.db_utils import DBResponse, DBPagination
 import json
@@ -12,6 +13,9 @@ from services.ui_backend_service.api.utils import (
     custom_conditions_query,
     resource_conditions,
     filter_from_conditions_query,
+    keyset_order,
+    keyset_condition,
+    find_records,
 )
 
 pytestmark = [pytest.mark.unit_tests]
@@ -363,3 +367,100 @@ def test_filter_from_conditions_query():
 
     _list = list(filter(_filter, _test_data))
     assert _list == [_run_1, _run_2, _run_3]
+
+
+def test_keyset_order():
+    assert keyset_order(
+        ['"ts_epoch" DESC', "attempt_id ASC", '"ts_epoch" ASC'],
+        ["flow_id", "run_number", "attempt_id"],
+    ) == [
+        ("ts_epoch", "DESC"),
+        ("attempt_id", "ASC"),
+        ("flow_id", "DESC"),
+        ("run_number", "DESC"),
+    ]
+    assert keyset_order(None, ["flow_id"]) == [("flow_id", "DESC")]
+
+    with pytest.raises(ValueError):
+        keyset_order(["lower(flow_id) DESC"], ["flow_id"])
+
+
+def test_keyset_condition():
+    condition, values = keyset_condition(
+        [("ts_epoch", "DESC"), ("run_number", "ASC")], [1000, 5]
+    )
+    assert (
+        condition
+        == '(("ts_epoch" < %s) OR ("ts_epoch" = %s AND ("run_number" > %s OR "run_number" IS NULL)))'
+    )
+    assert values == [1000, 1000, 5]
+
+
+def test_keyset_condition_nulls():
+    # NULLS FIRST for descending order
+    condition, values = keyset_condition(
+        [("finished_at", "DESC"), ("run_number", "DESC")], [None, 5]
+    )
+    assert (
+        condition
+        == '(("finished_at" IS NOT NULL) OR ("finished_at" IS NULL AND "run_number" < %s))'
+    )
+    assert values == [5]
+
+    # NULLS LAST for ascending order
+    condition, values = keyset_condition(
+        [("finished_at", "ASC"), ("run_number", "DESC")], [None, 5]
+    )
+    assert condition == '(("finished_at" IS NULL AND "run_number" < %s))'
+    assert values == [5]
+
+    assert keyset_condition([("finished_at", "ASC")], [None]) == ("FALSE", [])
+
+
+class _Table(object):
+    table_name = "runs_v3"
+    keys = primary_keys = ["flow_id", "run_number"]
+    cursor_keys = None
+
+    def __init__(self):
+        self.queries = []
+
+    async def find_records(self, **kwargs):
+        self.queries.append(kwargs)
+        await asyncio.sleep(0.01)
+        return (
+            DBResponse(200, [{"flow_id": "HelloFlow", "run_number": 1}]),
+            DBPagination(10, 0, 1, 1),
+            None,
+        )
+
+
+async def test_find_records_single_flight():
+    table = _Table()
+
+    def _request(path):
+        return make_mocked_request("GET", path, headers={"Host": "test"})
+
+    async def _find(path):
+        response = await find_records(
+            _request(path), table, allowed_filters=["flow_id"]
+        )
+        return json.loads(response.body)
+
+    # identical requests in flight share a query
+    first, second, other = await asyncio.gather(
+        _find("/runs?flow_id=HelloFlow"),
+        _find("/runs?flow_id=HelloFlow"),
+        _find("/runs?flow_id=OtherFlow"),
+    )
+    assert first == second
+    assert first["data"] == [{"flow_id": "HelloFlow", "run_number": 1}]
+    assert len(table.queries) == 2
+
+    # later requests query again, as do benchmarks and cache invalidations
+    await _find("/runs?flow_id=HelloFlow")
+    await asyncio.gather(
+        _find("/runs?flow_id=HelloFlow&benchmark=true"),
+        _find("/runs?flow_id=HelloFlow&benchmark=true"),
+    )
+    assert len(table.queries) == 5
@@ -8,6 +8,7 @@ from pyee import AsyncIOEventEmitter
 from services.utils import DBConfiguration, logging, ORIGIN_TO_ALLOW_CORS_FROM
 
 from services.metadata_service.server import app as metadata_service_app
+from services.data.response_cache import response_cache, response_cache_middleware
 
 # service processes and routes
 from .api import (
@@ -85,25 +86,29 @@ def app(loop=None, db_conf: DBConfiguration = None):
 
     async_db_cache = AsyncPostgresDB("ui:cache")
     loop.run_until_complete(async_db_cache._init(db_conf))
+    dbs = [async_db, async_db_cache]
     cache_store = CacheStore(app=app, db=async_db_cache, event_emitter=event_emitter)
 
     if FEATURE_DB_LISTEN_ENABLE:
         async_db_notify = AsyncPostgresDB("ui:notify")
         loop.run_until_complete(async_db_notify._init(db_conf))
+        dbs.append(async_db_notify)
         ListenNotify(app, db=async_db_notify, event_emitter=event_emitter)
 
     if FEATURE_HEARTBEAT_ENABLE:
         async_db_heartbeat = AsyncPostgresDB("ui:heartbeat")
         loop.run_until_complete(async_db_heartbeat._init(db_conf))
+        dbs.append(async_db_heartbeat)
         RunHeartbeatMonitor(event_emitter, db=async_db_heartbeat)
         TaskHeartbeatMonitor(event_emitter, db=async_db_heartbeat, cache=cache_store)
 
     if FEATURE_WS_ENABLE:
         async_db_ws = AsyncPostgresDB("ui:websocket")
         loop.run_until_complete(async_db_ws._init(db_conf))
+        dbs.append(async_db_ws)
         Websocket(app, db=async_db_ws, event_emitter=event_emitter, cache=cache_store)
 
-    AutoCompleteApi(app, async_db)
+    AutoCompleteApi(app, async_db, event_emitter)
     FlowApi(app, async_db)
     RunApi(app, async_db, cache_store)
     StepApi(app, async_db)
@@ -119,19 +124,24 @@ def app(loop=None, db_conf: DBConfiguration = None):
     CardsApi(app, async_db, cache_store)
 
     LogApi(app, async_db, cache_store)
-    AdminApi(app, cache_store)
+    AdminApi(app, cache_store, dbs)
 
     # Add Metadata Service as a sub application so that Metaflow Client
     # can use it as a service backend in case none provided via METAFLOW_SERVICE_URL
     #
     # Metadata service exposed through UI service is intended for read-only use only.
     # 'allow_get_requests_only' middleware will only accept GET requests.
-    app.add_subapp(
-        "/metadata",
-        metadata_service_app(
-            loop=loop, db_conf=db_conf, middlewares=[allow_get_requests_only]
-        ),
+    metadata_app = metadata_service_app(
+        loop=loop, db_conf=db_conf, middlewares=[allow_get_requests_only]
     )
+    app.add_subapp("/metadata", metadata_app)
+
+    # Responses about completed runs are served from memory until the run changes.
+    # The metadata service caches its own responses only if enabled.
+    app.middlewares.append(
+        response_cache_middleware(async_db, excluded_apps=[metadata_app])
+    )
+    event_emitter.on("notify", response_cache.invalidate_notified)
 
     if os.environ.get("UI_ENABLED", "1") == "1":
         # Serve UI bundle only if enabled
@@ -38,6 +38,59 @@ logging.basicConfig(level=log_level)
 # Setting to '*' to be maximally loose.
 ORIGIN_TO_ALLOW_CORS_FROM = os.environ.get("ORIGIN_TO_ALLOW_CORS_FROM", None)
 
+# JSON library used for encoding response bodies, one of 'orjson', 'ujson' or 'json'.
+# Defaults to the fastest one that is installed, orjson being a service requirement.
+JSON_ENCODER = os.environ.get("MF_JSON_ENCODER", None)
+
+# Response bodies of at least this many bytes are compressed for clients that accept it.
+# Disabled by default.
+RESPONSE_COMPRESSION_THRESHOLD = int(
+    os.environ.get("MF_RESPONSE_COMPRESSION_THRESHOLD", 0)
+)
+
+
+def _load_json_encoder(name: str = None):
+    """
+    Returns a function encoding an object as JSON bytes with the given library,
+    or with the fastest installed library when no name is given.
+
+    The decoded output of orjson matches that of the standard library, non-string keys
+    included, with one exception: non-finite floats are encoded as null, where the
+    standard library writes NaN and Infinity, which are not valid JSON and fail to
+    parse in browsers. Separators are compact.
+    """
+    for candidate in [name] if name else ["orjson", "ujson", "json"]:
+        if candidate == "orjson":
+            try:
+                import orjson
+            except ImportError:
+                if name:
+                    raise
+                continue
+
+            def _encode(obj):
+                try:
+                    return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+                except TypeError:
+                    # e.g. integers beyond 64 bits, which the standard library supports
+                    return json.dumps(obj).encode()
+
+            return _encode
+        elif candidate == "ujson":
+            try:
+                import ujson
+            except ImportError:
+                if name:
+                    raise
+                continue
+            return lambda obj: ujson.dumps(obj, escape_forward_slashes=False).encode()
+        elif candidate == "json":
+            return lambda obj: json.dumps(obj).encode()
+    raise ValueError("Unsupported JSON encoder: {}".format(name))
+
+
+encode_json = _load_json_encoder(JSON_ENCODER)
+
 
 async def read_body(request_content):
     byte_array = bytearray()
@@ -106,15 +159,43 @@ def format_response(func):
     @wraps(func)
     async def wrapper(*args, **kwargs):
         db_response = await func(*args, **kwargs)
-        return web.Response(
+        return json_web_response(
             status=db_response.response_code,
-            body=json.dumps(db_response.body),
+            body=db_response.body,
             headers=MultiDict({METADATA_SERVICE_HEADER: METADATA_SERVICE_VERSION}),
+            content_type="text/plain",
         )
 
     return wrapper
 
 
+def json_web_response(
+    status: int, body, headers: MultiDict, content_type: str = None
+) -> web.Response:
+    """
+    Returns a web.Response with the body encoded as JSON. Bodies over
+    RESPONSE_COMPRESSION_THRESHOLD bytes are compressed if the client accepts it.
+    """
+    # The envelope is encoded along with the data in a single encoder call, as
+    # encoding its few keys separately saves nothing measurable. Bodies are not
+    # streamed here as list responses are capped by _limit, unpaginated metadata
+    # service listings stream with stream_json_array instead.
+    encoded = encode_json(body)
+    response = web.Response(
+        status=status,
+        body=encoded,
+        headers=headers,
+        content_type=content_type,
+        charset="utf-8" if content_type else None,
+    )
+    if (
+        RESPONSE_COMPRESSION_THRESHOLD
+        and len(encoded) >= RESPONSE_COMPRESSION_THRESHOLD
+    ):
+        response.enable_compression()
+    return response
+
+
 def web_response(status: int, body):
     headers = MultiDict(
         {
@@ -129,7 +210,7 @@ def web_response(status: int, body):
         # Therefore, we only want to add this blanket response header iff ORIGIN_TO_ALLOW_CORS_FROM
         # is not configured (default).
         headers["Access-Control-Allow-Origin"] = "*"
-    return web.Response(status=status, body=json.dumps(body), headers=headers)
+    return json_web_response(status, body, headers)
 
 
 def format_qs(query: Dict[str, str], overwrite=None):
@@ -141,6 +222,29 @@ def format_qs(query: Dict[str, str], overwrite=None):
     return ("?" if len(qs) > 0 else "") + qs
 
 
+class QueryStringFormatter(object):
+    """
+    Formats a query string the same way as format_qs, for building several links
+    from the same query. Every parameter is only encoded once.
+    """
+
+    def __init__(self, query: Dict[str, str]):
+        self._encoded = {key: self._encode(key, value) for key, value in query.items()}
+
+    @staticmethod
+    def _encode(key, value):
+        return urlencode({key: value}, safe=":,")
+
+    def format(self, overwrite=None):
+        encoded = self._encoded
+        if overwrite:
+            encoded = dict(encoded)
+            for key in overwrite:
+                encoded[key] = self._encode(key, overwrite[key])
+        qs = "&".join(encoded.values())
+        return ("?" if len(qs) > 0 else "") + qs
+
+
 def format_baseurl(request: web.BaseRequest):
     scheme = request.headers.get("X-Forwarded-Proto") or request.scheme
     host = request.headers.get("X-Forwarded-Host") or request.host
@@ -3,7 +3,17 @@ import os
 import contextlib
 import json
 from aiohttp.test_utils import make_mocked_request
-from services.utils import format_qs, format_baseurl, DBConfiguration, handle_exceptions
+from multidict import MultiDict
+import services.utils
+from services.utils import (
+    format_qs,
+    format_baseurl,
+    DBConfiguration,
+    handle_exceptions,
+    QueryStringFormatter,
+    _load_json_encoder,
+    json_web_response,
+)
 
 pytestmark = [pytest.mark.unit_tests]
 
@@ -15,6 +25,57 @@ def test_format_qs():
     assert qs == "?foo=bar&_tags=runtime:dev&status=completed,running"
 
 
+def test_query_string_formatter():
+    query = {"foo": "bar baz", "_tags": "runtime:dev", "_page": "2"}
+    qs = QueryStringFormatter(query)
+    for overwrite in [None, {"_page": 3}, {"_cursor": "abc="}, {"_page": None}]:
+        assert qs.format(overwrite) == format_qs(query, overwrite)
+    assert QueryStringFormatter({}).format() == ""
+
+
+@pytest.mark.parametrize("name", ["orjson", "json", None])
+def test_json_encoder(name):
+    encode = _load_json_encoder(name)
+    body = {
+        "data": [{"id": 1, "tags": ["a", "ü"], "value": None, "ok": True}],
+        "counts": {1: 2},
+        "big": 2**70,
+    }
+    assert json.loads(encode(body)) == json.loads(json.dumps(body))
+
+
+@pytest.mark.parametrize("name", ["orjson", "json"])
+def test_json_encoder_non_string_keys(name):
+    encode = _load_json_encoder(name)
+    body = {None: 1, True: 2, 3: 3, 4.5: 4, "5": 5}
+    assert json.loads(encode(body)) == json.loads(json.dumps(body))
+
+
+def test_json_encoder_non_finite_floats():
+    body = {"values": [1.5, float("nan"), float("inf"), float("-inf")]}
+    assert json.dumps(body) == '{"values": [1.5, NaN, Infinity, -Infinity]}'
+    assert _load_json_encoder("orjson")(body) == b'{"values":[1.5,null,null,null]}'
+
+
+def test_json_encoder_unsupported():
+    with pytest.raises(ValueError):
+        _load_json_encoder("pickle")
+
+
+def test_json_web_response_compression(monkeypatch):
+    headers = MultiDict({"Content-Type": "application/json"})
+    response = json_web_response(200, {"data": []}, headers)
+    assert response.headers["Content-Type"] == "application/json"
+    assert not response.compression
+
+    monkeypatch.setattr(services.utils, "RESPONSE_COMPRESSION_THRESHOLD", 10)
+    assert not json_web_response(200, [], headers).compression
+    assert json_web_response(200, ["a" * 10], headers).compression
+
+    response = json_web_response(200, [], MultiDict(), content_type="text/plain")
+    assert response.headers["Content-Type"] == "text/plain; charset=utf-8"
+
+
 def test_format_baseurl():
     request = make_mocked_request("GET", "/foo/bar?foo=bar", headers={"Host": "test"})
     baseurl = format_baseurl(request)
@@ -201,15 +262,14 @@ async def test_handle_exceptions():
     # wrapper should not touch successful calls.
     assert await do_not_raise()
 
-    # NOTE: aiohttp Response StringPayload only has the internal property _value for accessing the payload value.
     response_with_id = await raise_with_id()
     assert response_with_id.status == 500
-    _body = json.loads(response_with_id.body._value)
+    _body = json.loads(response_with_id.body)
     assert _body["id"] == "test-id"
     assert _body["traceback"] == "test-trace"
 
     response_without_id = await raise_without_id()
     assert response_without_id.status == 500
-    _body = json.loads(response_without_id.body._value)
+    _body = json.loads(response_without_id.body)
     assert _body["id"] == "generic-error"
     assert _body["traceback"] is not None
@@ -31,7 +31,7 @@ setup(
     url="https://github.com/Netflix/metaflow-service",
     keywords=["metaflow", "machinelearning", "ml"],
     py_modules=["services.metadata_service"],
-    packages=find_packages(exclude=("tests",)),
+    packages=find_packages(exclude=("tests", "benchmarks")),
     entry_points="""
         [console_scripts]
         metadata_service=services.metadata_service.server:main